@@ -0,0 +1,131 @@
+"""
+Artist enrichment Lambda benchmarks against the fake Spotify API and S3 stand-in.
+
+Cases:
+    scan_<N>_files             discover_artists(full_rescan=True) over N raw files
+    handler_first_run          lambda_handler on a bucket it has never seen (every artist fetched)
+    handler_warm_no_new_files  lambda_handler when nothing was written since the last run
+
+Usage: python benchmarks/bench_artists.py [--quick] [--latency-ms 0] [--throttle-every 0] [--output FILE]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import harness  # noqa: E402
+
+harness.use_lambda('spotify-artist-enrichment')
+harness.lambda_environment()
+
+import auth_cache  # noqa: E402
+import handler  # noqa: E402
+import storage  # noqa: E402
+from artist_discovery import discover_artists  # noqa: E402
+from fake_spotify import Catalog, FakeSpotifyAPI, format_played_at, token_file  # noqa: E402
+from raw_format import PLAY_FIELDS  # noqa: E402
+from s3_stand_in import LocalS3, patch_boto3  # noqa: E402
+
+SUITE = 'artists'
+PLAYS_PER_FILE = 50
+FILE_INTERVAL_MS = 3_600_000  # one ingestion run per hour
+
+
+def play_record(ms: int, track: dict) -> dict:
+    artist = track['artists'][0]
+    values = (
+        format_played_at(ms), ms, track['id'], track['name'], artist['id'], artist['name'],
+        track['album']['id'], track['album']['name'], track['album']['release_date'],
+        track['duration_ms'], track['popularity'],
+    )
+    return dict(zip(PLAY_FIELDS, values))
+
+
+def seed_raw_files(s3: LocalS3, catalog: Catalog, files: int) -> None:
+    """Write `files` flat json envelopes in the raw/year=/month=/day= layout."""
+    tracks = catalog.tracks
+    start_ms = catalog.history[-1][0]
+    for n in range(files):
+        run_ms = start_ms + n * FILE_INTERVAL_MS
+        plays = [
+            play_record(run_ms - i * 60_000, tracks[(n * PLAYS_PER_FILE + i * 7) % len(tracks)])
+            for i in range(PLAYS_PER_FILE)
+        ]
+        at = datetime.fromtimestamp(run_ms / 1000, tz=timezone.utc)
+        key = (f"raw/year={at.year}/month={at.month:02d}/day={at.day:02d}/"
+               f"spotify_plays_{at.strftime('%Y%m%d_%H%M%S')}.json")
+        body = {'fetched_at': at.strftime('%Y-%m-%dT%H:%M:%SZ'), 'track_count': len(plays), 'tracks': plays}
+        s3.put_object(Bucket=harness.BUCKET, Key=key, Body=json.dumps(body, indent=2))
+
+
+def run(quick: bool = False, latency_ms: float = 0.0, throttle_every: int = 0):
+    sizes = (10, 1000) if quick else (10, 1000, 10000)
+    repeat = 3 if quick else 10
+    catalog = Catalog(plays=1, tracks=2000, artists=600)
+    results = []
+
+    for files in sizes:
+        s3 = LocalS3()
+        seed_raw_files(s3, catalog, files)
+        size_mb = s3.bytes_stored(harness.BUCKET, 'raw/') / 1e6
+        case = f'scan_{files}_files'
+        runs = max(1, repeat if files < 10000 else repeat // 3)
+        samples = harness.measure(lambda: discover_artists(storage.S3Storage(harness.BUCKET, client=s3), full_rescan=True), runs)
+        best_s = min(samples) / 1000
+        results += harness.latency_results(SUITE, case, samples)
+        results.append(harness.result(SUITE, case, 'files_per_second', files / best_s, 'files/s', files=files))
+        results.append(harness.result(SUITE, case, 'mb_per_second', size_mb / best_s, 'MB/s', mb=round(size_mb, 2)))
+
+    seeded = LocalS3()
+    seeded.put_object(Bucket=harness.BUCKET, Key=auth_cache.DEFAULT_TOKEN_KEY, Body=token_file())
+    seed_raw_files(seeded, catalog, 1000)
+    s3 = LocalS3()
+
+    def fresh_bucket() -> None:
+        s3.buckets = {b: dict(objects) for b, objects in seeded.buckets.items()}
+        auth_cache.clear_cache()
+        storage.reset_shared_s3_client()
+
+    api = FakeSpotifyAPI(catalog, latency_ms=latency_ms, throttle_every=throttle_every)
+    with api, api.patch_spotipy(), patch_boto3(s3):
+        invoke = lambda: handler.lambda_handler({}, None)  # noqa: E731
+
+        samples = harness.measure(invoke, repeat, setup=fresh_bucket)
+        results += harness.latency_results(SUITE, 'handler_first_run', samples)
+
+        fresh_bucket()
+        api.reset_counters()
+        s3.calls.clear()
+        with harness.quiet():
+            invoke()
+        results.append(harness.result(SUITE, 'handler_first_run', 'api_requests', api.requests, 'count'))
+        results.append(harness.result(SUITE, 'handler_first_run', 's3_requests', sum(s3.calls.values()), 'count'))
+        results.append(harness.result(SUITE, 'handler_first_run', 'throttled', api.throttled, 'count'))
+
+        samples = harness.measure(invoke, repeat)
+        results += harness.latency_results(SUITE, 'handler_warm_no_new_files', samples)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--quick', action='store_true', help='Skip the 10k-file scan and repeat less')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Injected API latency per request')
+    parser.add_argument('--throttle-every', type=int, default=0, help='Answer every Nth API request with 429')
+    parser.add_argument('--output', help='Write results JSON here (default: print a table)')
+    args = parser.parse_args()
+
+    results = run(args.quick, args.latency_ms, args.throttle_every)
+    if args.output:
+        harness.write_results(args.output, results, vars(args))
+    else:
+        harness.print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Ingestion Lambda benchmarks against the fake Spotify API and S3 stand-in.
+
+Cases:
+    handler_cold_no_new_plays   lambda_handler after dropping warm auth and the S3 client
+    handler_warm_no_new_plays   lambda_handler in a warm container, nothing new (the common run)
+    handler_warm_new_plays      lambda_handler with one full page of new plays to save
+    get_all_recent_history      SpotifyClient.get_all_recent_history over the whole history
+
+Usage: python benchmarks/bench_ingestion.py [--quick] [--latency-ms 0] [--throttle-every 0] [--output FILE]
+"""
+import argparse
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import harness  # noqa: E402
+
+harness.use_lambda('spotify-ingestion')
+harness.lambda_environment()
+
+import auth_cache  # noqa: E402
+import handler  # noqa: E402
+import storage  # noqa: E402
+from fake_spotify import Catalog, FakeSpotifyAPI, token_file  # noqa: E402
+from s3_stand_in import LocalS3, patch_boto3  # noqa: E402
+from spotify_client import SpotifyClient  # noqa: E402
+
+SUITE = 'ingestion'
+STEP_MS = 180_000
+
+
+def run(quick: bool = False, latency_ms: float = 0.0, throttle_every: int = 0):
+    repeat = 5 if quick else 20
+    history_plays = 1000 if quick else 5000  # get_all_recent_history stops at 100 pages
+    catalog = Catalog(plays=history_plays, tracks=500, artists=150, step_ms=STEP_MS)
+    newest_ms = catalog.history[0][0]
+    results = []
+
+    s3 = LocalS3()
+    s3.put_object(Bucket=harness.BUCKET, Key=auth_cache.DEFAULT_TOKEN_KEY, Body=token_file())
+
+    def set_state(last_ms: int) -> None:
+        state = {'last_processed_timestamp': last_ms}
+        s3.put_object(Bucket=harness.BUCKET, Key='state/last_run_state.json', Body=json.dumps(state))
+
+    def cold() -> None:
+        auth_cache.clear_cache()
+        storage.reset_shared_s3_client()
+        handler.STORAGE = storage.S3Storage(harness.BUCKET)
+
+    api = FakeSpotifyAPI(catalog, latency_ms=latency_ms, throttle_every=throttle_every)
+    with api, api.patch_spotipy(), patch_boto3(s3):
+        invoke = lambda: handler.lambda_handler({}, None)  # noqa: E731
+
+        samples = harness.measure(invoke, repeat, setup=lambda: (set_state(newest_ms), cold()))
+        results += harness.latency_results(SUITE, 'handler_cold_no_new_plays', samples)
+
+        with harness.quiet():
+            invoke()  # warm up
+        samples = harness.measure(invoke, repeat, setup=lambda: set_state(newest_ms))
+        results += harness.latency_results(SUITE, 'handler_warm_no_new_plays', samples)
+
+        samples = harness.measure(invoke, repeat, setup=lambda: set_state(newest_ms - 50 * STEP_MS - 1))
+        results += harness.latency_results(SUITE, 'handler_warm_new_plays', samples)
+
+        set_state(newest_ms - 50 * STEP_MS - 1)
+        api.reset_counters()
+        s3.calls.clear()
+        with harness.quiet():
+            invoke()
+        results.append(harness.result(SUITE, 'handler_warm_new_plays', 'api_requests', api.requests, 'count'))
+        results.append(harness.result(SUITE, 'handler_warm_new_plays', 's3_requests', sum(s3.calls.values()), 'count'))
+
+        client = SpotifyClient()
+        client.authenticate()
+        plays = []
+        api.reset_counters()
+        samples = harness.measure(lambda: plays.append(len(client.get_all_recent_history())), max(1, repeat // 5))
+        best_s = min(samples) / 1000
+        case = 'get_all_recent_history'
+        results += harness.latency_results(SUITE, case, samples)
+        results.append(harness.result(SUITE, case, 'plays_per_second', plays[-1] / best_s, 'plays/s', plays=plays[-1]))
+        results.append(harness.result(SUITE, case, 'pages_per_second', -(-plays[-1] // 50) / best_s, 'pages/s'))
+        results.append(harness.result(SUITE, case, 'throttled', api.throttled, 'count'))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--quick', action='store_true', help='Fewer repeats and a smaller history')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Injected API latency per request')
+    parser.add_argument('--throttle-every', type=int, default=0, help='Answer every Nth API request with 429')
+    parser.add_argument('--output', help='Write results JSON here (default: print a table)')
+    args = parser.parse_args()
+
+    results = run(args.quick, args.latency_ms, args.throttle_every)
+    if args.output:
+        harness.write_results(args.output, results, vars(args))
+    else:
+        harness.print_results(results)
+
+
+if __name__ == '__main__':
+    main()
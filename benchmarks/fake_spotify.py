@@ -0,0 +1,261 @@
+"""
+Local fake of the Spotify Web API for benchmarks.
+
+Serves the endpoints the pipeline calls, on 127.0.0.1, from a generated
+catalog:
+
+    GET /v1/me                             current user
+    GET /v1/me/player/recently-played      limit / before / after paging
+    GET /v1/artists?ids=...                up to 50 artists
+    POST /api/token                        token refresh (always succeeds)
+
+Latency and throttling are injectable: every response waits `latency_ms`,
+and every `throttle_every`-th request gets a 429 with `Retry-After`.
+
+`FakeSpotifyAPI.patch_spotipy()` points spotipy at the server, so the
+Lambda code runs unchanged (auth cache, rate limiter, paging, retries).
+"""
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+BASE62 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+
+def spotify_id(kind: str, n: int) -> str:
+    """Deterministic 22-char base62 ID (kind prefix keeps tracks/artists/albums apart)."""
+    digits = []
+    value = n
+    while True:
+        value, rem = divmod(value, 62)
+        digits.append(BASE62[rem])
+        if not value:
+            break
+    return (kind + ''.join(reversed(digits))).rjust(22, '0')
+
+
+def format_played_at(ms: int) -> str:
+    dt = datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f"{ms % 1000:03d}Z"
+
+
+class Catalog:
+    """Generated tracks, artists and a play history (newest first)."""
+
+    def __init__(
+        self,
+        plays: int = 500,
+        tracks: int = 200,
+        artists: int = 60,
+        newest_ms: int = 1766394051968,
+        step_ms: int = 180_000,
+        seed: int = 7,
+    ):
+        rng = random.Random(seed)
+        self.artists = {
+            spotify_id('ar', i): {
+                'id': spotify_id('ar', i),
+                'name': f"Artist {i}",
+                'genres': [f"genre-{i % 13}"],
+                'popularity': rng.randint(0, 100),
+                'followers': {'href': None, 'total': rng.randint(0, 10 ** 6)},
+                'images': [],
+                'type': 'artist',
+                'uri': f"spotify:artist:{spotify_id('ar', i)}",
+            }
+            for i in range(artists)
+        }
+        artist_ids = sorted(self.artists)
+        self.tracks = []
+        for i in range(tracks):
+            artist_id = artist_ids[i % len(artist_ids)]
+            self.tracks.append({
+                'id': spotify_id('tr', i),
+                'name': f"Track {i}",
+                'duration_ms': 150_000 + rng.randint(0, 120_000),
+                'popularity': rng.randint(0, 100),
+                'explicit': False,
+                'artists': [{'id': artist_id, 'name': self.artists[artist_id]['name']}],
+                'album': {
+                    'id': spotify_id('al', i // 10),
+                    'name': f"Album {i // 10}",
+                    'release_date': '2020-01-01',
+                },
+            })
+        self.history: List[Dict] = []
+        self.extend(plays, newest_ms, step_ms, rng)
+
+    def extend(self, plays: int, newest_ms: int, step_ms: int = 180_000, rng=None) -> None:
+        """Add `plays` plays ending at newest_ms (history stays newest first)."""
+        rng = rng or random.Random(len(self.history))
+        new = [
+            (newest_ms - step_ms * i, self.tracks[rng.randrange(len(self.tracks))])
+            for i in range(plays)
+        ]
+        self.history = sorted(self.history + new, key=lambda p: p[0], reverse=True)
+
+    def recently_played(self, limit: int, before: Optional[int], after: Optional[int]) -> Dict:
+        if after is not None:
+            newer = [p for p in self.history if p[0] > after]
+            page = newer[-limit:]  # the `limit` plays right after the cursor
+        else:
+            older = [p for p in self.history if before is None or p[0] < before]
+            page = older[:limit]
+        items = [
+            {'played_at': format_played_at(ms), 'track': track, 'context': None}
+            for ms, track in page
+        ]
+        cursors = {'after': str(page[0][0]), 'before': str(page[-1][0])} if page else None
+        return {'items': items, 'limit': limit, 'cursors': cursors, 'next': None}
+
+
+class FakeSpotifyAPI:
+    """Threaded HTTP server with the fake API; use as a context manager."""
+
+    def __init__(
+        self,
+        catalog: Optional[Catalog] = None,
+        latency_ms: float = 0.0,
+        throttle_every: int = 0,
+        retry_after: int = 0,
+    ):
+        self.catalog = catalog or Catalog()
+        self.latency_ms = latency_ms
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self.by_endpoint: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> 'FakeSpotifyAPI':
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are separate writes; without this, delayed ACKs add ~40 ms per call
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                api._handle(self)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                api._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.throttled = 0
+            self.by_endpoint = {}
+
+    @contextmanager
+    def patch_spotipy(self):
+        """Send every spotipy API call (and token refresh) to this server."""
+        import spotipy
+        import spotipy.oauth2
+
+        original_init = spotipy.Spotify.__init__
+        original_token_url = spotipy.oauth2.SpotifyOAuth.OAUTH_TOKEN_URL
+        prefix = f"{self.url}/v1/"
+
+        def init(client, *args, **kwargs):
+            original_init(client, *args, **kwargs)
+            client.prefix = prefix
+
+        spotipy.Spotify.__init__ = init
+        spotipy.oauth2.SpotifyOAuth.OAUTH_TOKEN_URL = f"{self.url}/api/token"
+        try:
+            yield self
+        finally:
+            spotipy.Spotify.__init__ = original_init
+            spotipy.oauth2.SpotifyOAuth.OAUTH_TOKEN_URL = original_token_url
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+        parsed = urlparse(request.path)
+        path = parsed.path.rstrip('/')  # spotipy sends "artists/?ids=..."
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        with self._lock:
+            self.requests += 1
+            self.by_endpoint[path] = self.by_endpoint.get(path, 0) + 1
+            throttle = self.throttle_every and self.requests % self.throttle_every == 0
+            if throttle:
+                self.throttled += 1
+
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        if throttle:
+            self._send(request, 429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                       {'Retry-After': str(self.retry_after)})
+            return
+
+        status, body = self._route(path, query)
+        self._send(request, status, body)
+
+    def _route(self, path: str, query: Dict[str, str]):
+        if path == '/v1/me':
+            return 200, {'id': 'bench-user', 'display_name': 'Bench User'}
+        if path == '/v1/me/player/recently-played':
+            before = int(query['before']) if 'before' in query else None
+            after = int(query['after']) if 'after' in query else None
+            return 200, self.catalog.recently_played(int(query.get('limit', 20)), before, after)
+        if path == '/v1/artists':
+            ids = [i for i in query.get('ids', '').split(',') if i]
+            if len(ids) > 50:
+                return 400, {'error': {'status': 400, 'message': 'Too many ids requested'}}
+            return 200, {'artists': [self.catalog.artists.get(i) for i in ids]}
+        if path == '/api/token':
+            return 200, {'access_token': 'bench-refreshed', 'token_type': 'Bearer',
+                         'expires_in': 3600, 'scope': 'user-read-recently-played'}
+        return 404, {'error': {'status': 404, 'message': 'Service not found'}}
+
+    @staticmethod
+    def _send(request, status: int, body: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json; charset=utf-8')
+        request.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+
+def token_file(expires_in: int = 86400) -> bytes:
+    """A spotipy token cache file that stays valid for the whole benchmark."""
+    return json.dumps({
+        'access_token': 'bench-token',
+        'token_type': 'Bearer',
+        'expires_in': expires_in,
+        'expires_at': int(time.time()) + expires_in,
+        'refresh_token': 'bench-refresh',
+        'scope': 'user-read-recently-played',
+    }).encode('utf-8')
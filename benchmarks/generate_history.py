@@ -0,0 +1,288 @@
+"""
+Synthetic listening-history generator for scale and load testing.
+
+Writes play histories in exactly the layout ingestion produces (through
+utils.write_tracks), plus matching artist payloads in the enrichment
+Lambda's layout, so every later stage can run offline at any volume:
+
+    raw/user_id=<id>/year=/month=/day=/spotify_plays_<ts>.<fmt>   one file per simulated ingestion run
+    raw/year=/...                                                 same, with --users 1 (single-user layout)
+    state/users/<id>/last_run_state.json                          state the next real run continues from
+    artists/year=/month=/day=/artist_data_<ts>.json               artist records for the whole catalog
+
+Model:
+    catalog   artist popularity is Zipf(s) by rank; each artist's tracks are
+              Zipf(s) within the artist, grouped into albums of ~10
+    users     a personal favourites list drawn from global popularity, an
+              activity level (lognormal) and a listening-hour profile
+    sessions  daily sessions start at diurnal peak hours; tracks play back to
+              back (skips cut a play short), some sessions play an album in order
+
+Memory stays bounded: each user is generated one run at a time, and users
+are split across worker processes.
+
+Usage:
+    python benchmarks/generate_history.py --out data/synthetic --users 50 --days 365
+    python benchmarks/generate_history.py --bucket my-load-test --users 5000 --days 730 --workers 8
+"""
+import argparse
+import bisect
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import harness  # noqa: E402
+
+harness.use_lambda('spotify-ingestion')
+
+from play_batch import PlayBatch  # noqa: E402
+from raw_format import format_played_at  # noqa: E402
+from storage import LocalStorage, S3Storage, StorageBackend  # noqa: E402
+from utils import write_state, write_tracks  # noqa: E402
+
+DAY_MS = 86_400_000
+ARTISTS_PER_FILE = 5000
+# Relative chance of a session starting in each UTC hour (commute and evening peaks)
+HOUR_WEIGHTS = (1, 0.5, 0.3, 0.2, 0.2, 0.4, 1.5, 3, 4, 3, 2, 2, 2.5, 2.5, 2, 2, 2.5, 3.5, 4, 4, 3.5, 3, 2.5, 1.5)
+SKIP_RATE = 0.15
+ALBUM_SESSION_RATE = 0.1
+
+
+def synthetic_id(kind: str, n: int) -> str:
+    """22-char base62 ID, unique per kind ('ar', 'al', 'tr')."""
+    return f"{kind}{n:020d}"
+
+
+def zipf_cum_weights(n: int, s: float) -> List[float]:
+    """Cumulative Zipf weights for ranks 1..n (for random.choices / bisect)."""
+    return list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+
+class Catalog:
+    """Artists, albums and tracks with Zipf popularity, deterministic per seed."""
+
+    def __init__(self, artists: int, tracks_per_artist: int, zipf_s: float, seed: int):
+        rng = random.Random(seed)
+        self.artists = []
+        self.tracks: List[Tuple] = []  # (track_id, name, artist_id, artist_name, album_id, album_name, release_date, duration_ms, popularity)
+        self.albums: Dict[str, List[int]] = {}
+        weights = []
+        artist_cum = zipf_cum_weights(artists, zipf_s)
+        top = artist_cum[0]
+        for a in range(artists):
+            artist_weight = (artist_cum[a] - (artist_cum[a - 1] if a else 0)) / top
+            artist_id = synthetic_id('ar', a)
+            popularity = max(0, min(100, round(100 + 15 * math.log10(artist_weight))))
+            self.artists.append({
+                'artist_id': artist_id,
+                'artist_name': f"Synthetic Artist {a}",
+                'genres': [f"genre-{rng.randrange(60)}"],
+                'followers': int(5_000_000 * artist_weight) + rng.randrange(1000),
+                'popularity': popularity,
+                'image_url': None,
+            })
+            count = max(1, int(tracks_per_artist * rng.uniform(0.5, 1.5)))
+            for t in range(count):
+                album_index = t // 10
+                album_id = synthetic_id('al', a * 1000 + album_index)
+                year = 1970 + (a * 7 + album_index) % 55
+                self.albums.setdefault(album_id, []).append(len(self.tracks))
+                self.tracks.append((
+                    synthetic_id('tr', len(self.tracks)), f"Track {t} by {a}", artist_id,
+                    f"Synthetic Artist {a}", album_id, f"Album {album_index} by {a}",
+                    f"{year}-{1 + t % 12:02d}-01", rng.randint(90_000, 360_000),
+                    max(0, popularity - rng.randrange(20)),
+                ))
+                weights.append(artist_weight / ((t + 1) ** zipf_s))
+        self.track_cum = list(itertools.accumulate(weights))
+
+    def sample_tracks(self, rng: random.Random, k: int) -> List[int]:
+        return rng.choices(range(len(self.tracks)), cum_weights=self.track_cum, k=k)
+
+
+class Listener:
+    """One synthetic user's taste and habits."""
+
+    def __init__(self, user_id: str, catalog: Catalog, plays_per_day: float, seed: int):
+        self.user_id = user_id
+        self.rng = random.Random(seed)
+        self.catalog = catalog
+        self.plays_per_day = plays_per_day * self.rng.lognormvariate(0, 0.6)
+        favourites = sorted(set(catalog.sample_tracks(self.rng, self.rng.randint(50, 400))))
+        self.rng.shuffle(favourites)  # personal ranking, not global rank order
+        self.favourites = favourites
+        self.favourite_cum = zipf_cum_weights(len(favourites), 1.0)
+        shift = self.rng.randint(-3, 3)  # personal hour offset
+        self.hour_cum = list(itertools.accumulate(HOUR_WEIGHTS[(h - shift) % 24] for h in range(24)))
+
+    def _next_track(self) -> int:
+        if self.rng.random() < 0.7:
+            return self.rng.choices(self.favourites, cum_weights=self.favourite_cum)[0]
+        return self.catalog.sample_tracks(self.rng, 1)[0]
+
+    def day(self, day_start_ms: int) -> Iterator[Tuple[int, int]]:
+        """(played_at ms, track index) for one day, in time order."""
+        rng = self.rng
+        plays = max(0, int(rng.gauss(self.plays_per_day, self.plays_per_day * 0.4)))
+        if not plays:
+            return
+        sessions = max(1, round(plays / rng.uniform(8, 20)))
+        starts = sorted(
+            day_start_ms + bisect.bisect(self.hour_cum, rng.random() * self.hour_cum[-1]) * 3_600_000
+            + rng.randrange(3_600_000)
+            for _ in range(sessions)
+        )
+        remaining = plays
+        cursor = day_start_ms
+        for n, start in enumerate(starts):
+            length = remaining if n == len(starts) - 1 else max(1, remaining // (len(starts) - n))
+            remaining -= length
+            at = max(start, cursor)
+            if rng.random() < ALBUM_SESSION_RATE:
+                album = self.catalog.albums[self.catalog.tracks[self._next_track()][4]]
+                picks = [album[i % len(album)] for i in range(length)]
+            else:
+                picks = [self._next_track() for _ in range(length)]
+            for track in picks:
+                duration = self.catalog.tracks[track][7]
+                played = rng.randint(30_000, duration) if rng.random() < SKIP_RATE else duration
+                at += played
+                if at >= day_start_ms + DAY_MS:
+                    return
+                # played_at is when the track finished, like the API reports it
+                yield at, track
+            cursor = at
+
+
+def _row(at_ms: int, track: Tuple) -> Tuple:
+    """A play in PLAY_FIELDS order."""
+    return (format_played_at(at_ms), at_ms, *track)
+
+
+def generate_user(args, index: int, storage: StorageBackend, catalog: Catalog) -> Dict:
+    """Write one user's history run by run; returns counts."""
+    single = args.users == 1
+    user_id = None if single else f"synthetic-{index:06d}"
+    listener = Listener(user_id or 'single', catalog, args.plays_per_day, args.seed * 1_000_003 + index)
+    prefix = "raw" if single else f"raw/user_id={user_id}"
+    state_key = "state/last_run_state.json" if single else f"state/users/{user_id}/last_run_state.json"
+    metadata = None if single else {"user_id": user_id}
+
+    interval_ms = int(args.run_interval_hours * 3_600_000)
+    start_ms = args.end_ms - args.days * DAY_MS
+    next_run = start_ms + interval_ms
+    rows: List[Tuple] = []
+    plays = files = 0
+    last_ms = None
+
+    def flush(run_ms: int) -> None:
+        nonlocal rows, files, plays
+        if rows:
+            write_tracks(
+                storage, PlayBatch.from_rows(rows), prefix=prefix, metadata=metadata,
+                output_format=args.format, encoding=args.encoding,
+                fetched_at=datetime.fromtimestamp(run_ms / 1000, tz=timezone.utc),
+            )
+            files += 1
+            plays += len(rows)
+            rows = []
+
+    for day in range(args.days):
+        for at, track in listener.day(start_ms + day * DAY_MS):
+            while at >= next_run:
+                flush(next_run)
+                next_run += interval_ms
+            rows.append(_row(at, catalog.tracks[track]))
+            last_ms = at
+    flush(max(next_run, last_ms or 0))
+
+    if last_ms is not None:
+        write_state(storage, last_ms, key=state_key)
+    return {'plays': plays, 'files': files}
+
+
+def write_artists(storage: StorageBackend, catalog: Catalog, fetched_at: datetime) -> int:
+    """Artist payloads in write_artists' json layout (one file per ARTISTS_PER_FILE)."""
+    stamp = fetched_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+    artists = [{**artist, 'fetched_at': stamp} for artist in catalog.artists]
+    files = 0
+    for n in range(0, len(artists), ARTISTS_PER_FILE):
+        at = fetched_at + timedelta(seconds=files)  # keys are per second
+        key = (f"artists/year={at.year}/month={at.month:02d}/day={at.day:02d}/"
+               f"artist_data_{at.strftime('%Y%m%d_%H%M%S')}.json")
+        chunk = artists[n:n + ARTISTS_PER_FILE]
+        storage.put_json(key, {"fetched_at": stamp, "artist_count": len(chunk), "artists": chunk})
+        files += 1
+    return files
+
+
+def _storage(args) -> StorageBackend:
+    return S3Storage(args.bucket) if args.bucket else LocalStorage(args.out)
+
+
+def _run_users(args, user_indexes: List[int]) -> Dict:
+    catalog = Catalog(args.artists, args.tracks_per_artist, args.zipf, args.seed)
+    storage = _storage(args)
+    totals = {'plays': 0, 'files': 0}
+    for index in user_indexes:
+        counts = generate_user(args, index, storage, catalog)
+        totals['plays'] += counts['plays']
+        totals['files'] += counts['files']
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--out', default='data/synthetic', help='Local directory (LocalStorage)')
+    target.add_argument('--bucket', help='Write to this S3 bucket instead')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--plays-per-day', type=float, default=40.0, help='Mean across users')
+    parser.add_argument('--artists', type=int, default=5000)
+    parser.add_argument('--tracks-per-artist', type=int, default=12)
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent for popularity')
+    parser.add_argument('--run-interval-hours', type=float, default=24.0, help='Simulated ingestion schedule')
+    parser.add_argument('--end', default=None, help='Last simulated day, YYYY-MM-DD (default: today)')
+    parser.add_argument('--format', default='json', help="Raw format: json, ndjson.gz or ndjson.zst")
+    parser.add_argument('--encoding', default='flat', help="flat or normalized (json only)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    end = datetime.strptime(args.end, '%Y-%m-%d') if args.end else datetime.now(timezone.utc)
+    end = end.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
+    args.end_ms = int(end.timestamp() * 1000)
+    expected = args.users * args.days * args.plays_per_day
+    print(f"Generating ~{expected:,.0f} plays for {args.users} users over {args.days} days "
+          f"-> {'s3://' + args.bucket if args.bucket else args.out}")
+
+    started = time.perf_counter()
+    workers = max(1, min(args.workers, args.users))
+    chunks = [list(range(i, args.users, workers)) for i in range(workers)]
+    if workers == 1:
+        results = [_run_users(args, chunks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_users, [args] * workers, chunks))
+
+    catalog = Catalog(args.artists, args.tracks_per_artist, args.zipf, args.seed)
+    artist_files = write_artists(_storage(args), catalog, end)
+    elapsed = time.perf_counter() - started
+    plays = sum(r['plays'] for r in results)
+    files = sum(r['files'] for r in results)
+    print(f"Wrote {plays:,} plays in {files:,} raw files and {len(catalog.artists):,} artists "
+          f"in {artist_files} files ({elapsed:.1f}s, {plays / elapsed:,.0f} plays/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Shared plumbing for the benchmark scripts: import paths, Lambda-like
+environment, timing statistics and the machine-readable result format.
+
+Every result is one flat record:
+
+    {"suite": "ingestion", "case": "handler_warm_no_new_plays",
+     "metric": "latency_p50", "value": 3.1, "unit": "ms"}
+
+Units ending in "/s" are throughputs (higher is better); everything else
+is a cost (lower is better). `compare()` uses that to flag regressions.
+"""
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDAS = os.path.join(ROOT, 'lambda-functions')
+BUCKET = 'bench-bucket'
+SCHEMA_VERSION = 1
+
+
+def use_lambda(name: str) -> None:
+    """Put one Lambda's src/ (and the shared modules) first on sys.path."""
+    sys.path.insert(0, os.path.join(LAMBDAS, 'shared'))
+    sys.path.insert(0, os.path.join(LAMBDAS, name, 'src'))
+
+
+def lambda_environment(rate_limit: float = 1000.0) -> None:
+    """
+    Environment the handlers see in Lambda (set before importing them).
+
+    The Spotify rate limit is raised so the benchmark measures our code and
+    the fake API, not the token bucket (pass a real value to include it).
+    """
+    os.environ.update({
+        'AWS_EXECUTION_ENV': 'AWS_Lambda_python3.11',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'S3_BUCKET': BUCKET,
+        'SPOTIFY_CLIENT_ID': 'bench-client',
+        'SPOTIFY_CLIENT_SECRET': 'bench-secret',
+        'SPOTIFY_REDIRECT_URI': 'http://127.0.0.1/callback',
+        'SPOTIFY_RATE_LIMIT': str(rate_limit),
+        'SPOTIFY_RATE_CEILING': str(rate_limit),
+    })
+    os.environ.pop('ARTIST_QUEUE_URL', None)
+    logging.disable(logging.WARNING)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow handler print() progress output."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def measure(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], object]] = None) -> List[float]:
+    """Wall-clock milliseconds of `repeat` calls (setup runs untimed before each)."""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        with quiet():
+            fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100)."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_results(suite: str, case: str, samples: List[float]) -> List[Dict]:
+    """p50/p95/mean/min records for a list of millisecond samples."""
+    stats = {
+        'latency_p50': percentile(samples, 50),
+        'latency_p95': percentile(samples, 95),
+        'latency_mean': statistics.fmean(samples),
+        'latency_min': min(samples),
+    }
+    return [result(suite, case, metric, value, 'ms') for metric, value in stats.items()]
+
+
+def result(suite: str, case: str, metric: str, value: float, unit: str, **params) -> Dict:
+    record = {'suite': suite, 'case': case, 'metric': metric, 'value': round(value, 3), 'unit': unit}
+    if params:
+        record['params'] = params
+    return record
+
+
+def environment() -> Dict:
+    """Where and on what the numbers were taken."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def write_results(path: str, results: List[Dict], params: Dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'schema': SCHEMA_VERSION, **environment(), 'params': params, 'results': results}, f, indent=2)
+
+
+def load_results(path: str) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def compare(baseline: List[Dict], current: List[Dict], threshold: float) -> List[Dict]:
+    """
+    Metrics that got worse by more than `threshold` (0.25 = 25%).
+
+    Returns:
+        One dict per regression: suite, case, metric, baseline, current, change
+    """
+    before = {(r['suite'], r['case'], r['metric']): r for r in baseline}
+    regressions = []
+    for record in current:
+        old = before.get((record['suite'], record['case'], record['metric']))
+        if not old or not old['value']:
+            continue
+        change = (record['value'] - old['value']) / old['value']
+        if record['unit'].endswith('/s'):
+            change = -change  # a throughput drop is the regression
+        if change > threshold:
+            regressions.append({
+                'suite': record['suite'], 'case': record['case'], 'metric': record['metric'],
+                'baseline': old['value'], 'current': record['value'], 'change': round(change, 3),
+            })
+    return regressions
+
+
+def print_results(results: List[Dict]) -> None:
+    width = max((len(f"{r['suite']}.{r['case']}") for r in results), default=0)
+    for r in results:
+        name = f"{r['suite']}.{r['case']}"
+        print(f"{name:<{width}}  {r['metric']:<16} {r['value']:>12,.2f} {r['unit']}")
@@ -0,0 +1,75 @@
+"""
+Run every benchmark suite and write one machine-readable results file.
+
+Each suite runs in its own interpreter (both Lambdas have a `handler`
+module, and a fresh process keeps imports and warm caches honest). With
+--baseline, metrics that got worse by more than --threshold are listed and
+the exit status is 1, so CI or a pre-merge check can gate on it.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--quick] [--output benchmarks/results/latest.json]
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/baseline.json --threshold 0.25
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import harness  # noqa: E402
+
+SUITES = {
+    'ingestion': 'bench_ingestion.py',
+    'artists': 'bench_artists.py',
+}
+
+
+def run_suite(script: str, args) -> list:
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'results.json')
+        command = [
+            sys.executable, os.path.join(HERE, script), '--output', output,
+            '--latency-ms', str(args.latency_ms), '--throttle-every', str(args.throttle_every),
+        ]
+        if args.quick:
+            command.append('--quick')
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        return harness.load_results(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--suite', choices=sorted(SUITES), action='append', help='Run only these suites')
+    parser.add_argument('--quick', action='store_true', help='Smaller inputs and fewer repeats')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Injected API latency per request')
+    parser.add_argument('--throttle-every', type=int, default=0, help='Answer every Nth API request with 429')
+    parser.add_argument('--output', default=os.path.join(HERE, 'results', 'latest.json'))
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown before flagging (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    results = []
+    for name in args.suite or SUITES:
+        print(f"Running {name} benchmarks...", flush=True)
+        results += run_suite(SUITES[name], args)
+
+    params = {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')}
+    harness.write_results(args.output, results, params)
+    harness.print_results(results)
+    print(f"\nResults: {args.output}")
+
+    if args.baseline:
+        regressions = harness.compare(harness.load_results(args.baseline), results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions over {args.threshold:.0%}:")
+            print(json.dumps(regressions, indent=2))
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
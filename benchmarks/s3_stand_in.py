@@ -0,0 +1,217 @@
+"""
+In-memory stand-in for the boto3 S3 client, in the spirit of moto.
+
+Implements the S3 calls the Lambdas make (objects, listing with
+Prefix/Delimiter/StartAfter pagination, multipart uploads, file transfers),
+keyed by bucket, with the same error shapes (ClientError NoSuchKey).
+
+`patch_boto3(s3)` makes `boto3.client('s3', ...)` return it and resets the
+process-wide shared client, so handlers run unchanged. Request counts per
+operation are kept in `calls` for the benchmark report.
+"""
+import io
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+PAGE_SIZE = 1000  # list_objects_v2 MaxKeys default
+
+
+class _Body(io.BytesIO):
+    """StreamingBody look-alike."""
+
+    def iter_chunks(self, chunk_size: int = 1024) -> Iterator[bytes]:
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _client_error(code: str, operation: str):
+    from botocore.exceptions import ClientError
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+class LocalS3:
+    """Thread-safe in-memory S3 client."""
+
+    def __init__(self):
+        self.buckets: Dict[str, Dict[str, bytes]] = {}
+        self.calls: Counter = Counter()
+        self._uploads: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, name: str) -> Dict[str, bytes]:
+        return self.buckets.setdefault(name, {})
+
+    def _count(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] += 1
+
+    # Objects
+
+    def put_object(self, Bucket, Key, Body=b'', **kwargs):
+        self._count('PutObject')
+        data = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        with self._lock:
+            self._bucket(Bucket)[Key] = data
+        return {'ETag': f'"{hash(data) & 0xffffffff:08x}"'}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._count('GetObject')
+        data = self._bucket(Bucket).get(Key)
+        if data is None:
+            raise _client_error('NoSuchKey', 'GetObject')
+        return {'Body': _Body(data), 'ContentLength': len(data)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._count('HeadObject')
+        data = self._bucket(Bucket).get(Key)
+        if data is None:
+            raise _client_error('404', 'HeadObject')
+        return {'ContentLength': len(data)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._count('DeleteObject')
+        with self._lock:
+            self._bucket(Bucket).pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        self._count('DeleteObjects')
+        with self._lock:
+            for obj in Delete.get('Objects', []):
+                self._bucket(Bucket).pop(obj['Key'], None)
+        return {'Deleted': Delete.get('Objects', [])}
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        with open(Filename, 'rb') as f:
+            self.put_object(Bucket=Bucket, Key=Key, Body=f.read())
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        body = self.get_object(Bucket=Bucket, Key=Key)['Body'].read()
+        with open(Filename, 'wb') as f:
+            f.write(body)
+
+    # Listing
+
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, StartAfter=None,
+                        ContinuationToken=None, MaxKeys=PAGE_SIZE, **kwargs):
+        self._count('ListObjectsV2')
+        with self._lock:
+            keys = sorted(k for k in self._bucket(Bucket) if k.startswith(Prefix))
+        after = ContinuationToken or StartAfter
+        if after:
+            keys = [k for k in keys if k > after]
+
+        contents: List[Dict] = []
+        prefixes: List[str] = []
+        last = None
+        truncated = False
+        for key in keys:
+            if last is not None and key <= last:
+                continue  # inside a common prefix already returned
+            if len(contents) + len(prefixes) >= MaxKeys:
+                truncated = True
+                break
+            last = key
+            if Delimiter:
+                cut = key.find(Delimiter, len(Prefix))
+                if cut >= 0:
+                    common = key[:cut + len(Delimiter)]
+                    prefixes.append(common)
+                    last = common + '\U0010ffff'  # continue after everything under it
+                    continue
+            contents.append({'Key': key, 'Size': len(self._bucket(Bucket)[key])})
+
+        response = {
+            'KeyCount': len(contents) + len(prefixes),
+            'IsTruncated': truncated,
+            'Contents': contents,
+        }
+        if prefixes:
+            response['CommonPrefixes'] = [{'Prefix': p} for p in prefixes]
+        if truncated:
+            response['NextContinuationToken'] = last
+        return response
+
+    def get_paginator(self, operation: str):
+        if operation != 'list_objects_v2':
+            raise NotImplementedError(operation)
+        return _ListPaginator(self)
+
+    # Multipart uploads
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._count('CreateMultipartUpload')
+        with self._lock:
+            upload_id = f"upload-{len(self._uploads) + 1}"
+            self._uploads[upload_id] = {'Bucket': Bucket, 'Key': Key, 'parts': {}}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._count('UploadPart')
+        with self._lock:
+            self._uploads[UploadId]['parts'][PartNumber] = bytes(Body)
+        return {'ETag': f'"part-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._count('CompleteMultipartUpload')
+        with self._lock:
+            upload = self._uploads.pop(UploadId)
+            numbers = [p['PartNumber'] for p in MultipartUpload['Parts']]
+            self._bucket(Bucket)[Key] = b''.join(upload['parts'][n] for n in numbers)
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._count('AbortMultipartUpload')
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+    # Helpers for seeding and reporting
+
+    def object_count(self, bucket: str, prefix: str = '') -> int:
+        return sum(1 for k in self._bucket(bucket) if k.startswith(prefix))
+
+    def bytes_stored(self, bucket: str, prefix: str = '') -> int:
+        return sum(len(v) for k, v in self._bucket(bucket).items() if k.startswith(prefix))
+
+
+class _ListPaginator:
+    def __init__(self, s3: LocalS3):
+        self.s3 = s3
+
+    def paginate(self, **params) -> Iterator[Dict]:
+        token = None
+        while True:
+            page = self.s3.list_objects_v2(ContinuationToken=token, **params)
+            yield page
+            if not page['IsTruncated']:
+                return
+            token = page['NextContinuationToken']
+
+
+@contextmanager
+def patch_boto3(s3: Optional[LocalS3] = None):
+    """Make boto3.client('s3') return the stand-in (and reset the shared client)."""
+    import boto3
+    import storage
+
+    s3 = s3 or LocalS3()
+    original = boto3.client
+
+    def client(service_name, *args, **kwargs):
+        if service_name == 's3':
+            return s3
+        return original(service_name, *args, **kwargs)
+
+    boto3.client = client
+    storage.reset_shared_s3_client()
+    try:
+        yield s3
+    finally:
+        boto3.client = original
+        storage.reset_shared_s3_client()
@@ -0,0 +1,52 @@
+"""
+Import a Spotify Extended Streaming History export into the pipeline.
+
+Writes plays from Streaming_History_Audio_*.json files into the raw (or
+processed) layout, locally or in S3. See history_import.py (ingestion) for
+the raw import and history_merge.py (processing) for the processed layout.
+
+Usage:
+    python import_streaming_history.py ~/Downloads/my_spotify_data --out data
+    python import_streaming_history.py ~/Downloads/my_spotify_data --bucket <bucket> --layout processed
+"""
+import json
+import logging
+import sys
+import tempfile
+
+# Add lambda functions to path
+sys.path.insert(0, 'lambda-functions/shared')
+sys.path.insert(0, 'lambda-functions/spotify-ingestion/src')
+sys.path.insert(0, 'lambda-functions/spotify-processing/src')
+
+from history_import import build_parser, catalog_client, destination, import_history
+from storage import LocalStorage
+
+
+def main():
+    parser = build_parser()
+    parser.add_argument(
+        '--layout', choices=('raw', 'processed'), default='raw',
+        help="processed: merge straight into processed/plays Parquet (needs pyarrow)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    storage = destination(args)
+    options = dict(user_id=args.user_id, chunk_size=args.chunk_size, min_ms_played=args.min_ms_played,
+                   workers=args.workers, spotify=catalog_client(args))
+
+    if args.layout == 'raw':
+        summary = import_history(args.paths, storage, output_format=args.format, encoding=args.encoding, **options)
+    else:
+        from history_merge import STAGING_FORMAT, merge_staged_history
+
+        # Stage compact per-day chunks locally, then merge each day into its Parquet partition
+        with tempfile.TemporaryDirectory(prefix='history_import_') as staging_root:
+            summary = import_history(args.paths, LocalStorage(staging_root), output_format=STAGING_FORMAT, **options)
+            summary.update(merge_staged_history(staging_root, storage, workers=args.workers))
+
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
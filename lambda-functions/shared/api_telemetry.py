@@ -0,0 +1,188 @@
+"""
+Per-endpoint Spotify API telemetry for one invocation.
+
+Every attempt sent through the rate-limited session (rate_limiter.py)
+is recorded here by endpoint: wall-clock latency including the body
+download, status, payload size, urllib3 5xx retries, and for 429s the
+Retry-After value. Endpoints are URL paths with Spotify IDs replaced by
+{id}, so /v1/tracks/<id> calls group together.
+
+Handlers wrap their body in `invocation()`. On exit it prints a short
+per-endpoint summary and attaches the summary to the invocation's metrics record (as the
+`api` property, see metrics.py). The summary holds p50/p95/p99 latency
+per endpoint and the scheduler's headroom: its current rate against its
+ceiling, plus the time spent waiting for slots. These numbers drive page
+sizes, concurrency and schedule frequency.
+"""
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import metrics
+
+PERCENTILES = (50, 95, 99)
+_ID_SEGMENT = re.compile(r'^[0-9A-Za-z]{22}$')
+
+
+def endpoint_of(url: str) -> str:
+    """'/v1/artists' for 'https://api.spotify.com/v1/artists/?ids=...'; IDs become {id}."""
+    path = urlsplit(url).path.rstrip('/') or '/'
+    return '/'.join('{id}' if _ID_SEGMENT.match(part) else part for part in path.split('/'))
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class EndpointStats:
+    """Attempts to one endpoint."""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.statuses: Dict[int, int] = {}
+        self.bytes = 0
+        self.max_bytes = 0
+        self.retries = 0
+        self.throttled = 0
+        self.retry_after: List[float] = []
+
+    def summary(self) -> Dict:
+        latencies = sorted(self.latencies_ms)
+        responses = len(latencies) - self.throttled
+        result = {
+            'requests': len(latencies),
+            **{f"p{p}_ms": round(percentile(latencies, p), 1) for p in PERCENTILES},
+            'max_ms': round(latencies[-1], 1) if latencies else 0.0,
+            'statuses': {str(code): n for code, n in sorted(self.statuses.items())},
+            'bytes': self.bytes,
+            'mean_bytes': round(self.bytes / responses) if responses > 0 else 0,
+            'max_bytes': self.max_bytes,
+            'retries': self.retries,
+            'throttled': self.throttled,
+        }
+        if self.retry_after:
+            result['retry_after_s'] = sorted(self.retry_after)
+        return result
+
+
+class ApiTelemetry:
+    """Thread-safe per-endpoint recorder (one per process, reset per invocation)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.scheduler = None
+        self._baseline = (0, 0.0)  # scheduler (requests, waited_seconds) at reset
+
+    def reset(self) -> None:
+        with self._lock:
+            self.endpoints = {}
+            if self.scheduler is not None:
+                self._baseline = (self.scheduler.requests, self.scheduler.waited_seconds)
+
+    def record(
+        self,
+        url: str,
+        latency_ms: float,
+        status: int,
+        size: Optional[int] = None,
+        retries: int = 0,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """
+        Record one attempt.
+
+        Args:
+            url: Request URL
+            latency_ms: Send to last body byte (headers only for 429s)
+            status: HTTP status
+            size: Response body bytes (None if not read)
+            retries: urllib3 retries behind this attempt (5xx, connection errors)
+            retry_after: Parsed Retry-After header of a 429
+        """
+        endpoint = endpoint_of(url)
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.latencies_ms.append(latency_ms)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.retries += retries
+            if size is not None:
+                stats.bytes += size
+                stats.max_bytes = max(stats.max_bytes, size)
+            if status == 429:
+                stats.throttled += 1
+                if retry_after is not None:
+                    stats.retry_after.append(retry_after)
+
+    def watch(self, scheduler) -> None:
+        """Report headroom for this scheduler (the session's adapter calls this)."""
+        with self._lock:
+            if self.scheduler is not scheduler:
+                self.scheduler = scheduler
+                self._baseline = (0, 0.0)
+
+    def summary(self) -> Dict:
+        """Per-endpoint stats plus scheduler headroom."""
+        with self._lock:
+            result = {'endpoints': {name: stats.summary() for name, stats in sorted(self.endpoints.items())}}
+            scheduler = self.scheduler
+            baseline = self._baseline
+        if scheduler is not None:
+            result['scheduler'] = {
+                'rate': round(scheduler.rate, 2),
+                'max_rate': scheduler.max_rate,
+                'headroom': round(1 - scheduler.rate / scheduler.max_rate, 2),
+                'slots': scheduler.requests - baseline[0],
+                'waited_s': round(scheduler.waited_seconds - baseline[1], 3),
+            }
+        return result
+
+
+_telemetry = ApiTelemetry()
+
+
+def get_telemetry() -> ApiTelemetry:
+    """The process-wide recorder."""
+    return _telemetry
+
+
+def format_summary(summary: Dict) -> str:
+    """One line per endpoint, for the invocation log."""
+    lines = []
+    for name, stats in summary['endpoints'].items():
+        lines.append(
+            f"{name}: {stats['requests']} req, p50 {stats['p50_ms']} / p95 {stats['p95_ms']} / "
+            f"p99 {stats['p99_ms']} ms, {stats['bytes'] / 1024:.1f} KiB, "
+            f"{stats['retries']} retries, {stats['throttled']} throttled"
+        )
+    if 'scheduler' in summary:
+        s = summary['scheduler']
+        lines.append(f"rate {s['rate']}/{s['max_rate']} req/s, waited {s['waited_s']} s for {s['slots']} slots")
+    return '\n'.join(lines)
+
+
+@contextmanager
+def invocation():
+    """
+    Reset the recorder, run the block, then log and attach the summary.
+
+    Use inside metrics.invocation() so the summary lands on the EMF record.
+    """
+    _telemetry.reset()
+    try:
+        yield _telemetry
+    finally:
+        summary = _telemetry.summary()
+        if summary['endpoints']:
+            print(f"API telemetry:\n{format_summary(summary)}")
+            recorder = metrics.current()
+            if recorder is not None:
+                recorder.set_property('api', summary)
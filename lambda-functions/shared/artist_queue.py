@@ -0,0 +1,162 @@
+"""
+Queue of newly seen artist IDs (ingestion → artist enrichment).
+
+Ingestion sends one message per run with the artist IDs it has not seen
+before; the enrichment Lambda consumes them within seconds instead of
+waiting for the weekly full run.
+
+    SQSArtistQueue    production (ARTIST_QUEUE_URL)
+    LocalArtistQueue  in-process stand-in for tests and local runs
+
+`coalesce()` is the micro-batcher: it drains messages until it has a full
+50-ID request or the wait window closes, so bursts from many ingestion runs
+become a few full-size API calls.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUE_URL = os.environ.get('ARTIST_QUEUE_URL')
+ARTIST_BATCH_SIZE = 50
+# SQS limit is 256 KiB; 22-char IDs stay far below it at this count
+MAX_IDS_PER_MESSAGE = 5000
+
+Message = Tuple[str, List[str]]  # (receipt handle, artist IDs)
+
+
+def encode_message(artist_ids: Iterable[str], **context) -> str:
+    """Message body: {"artist_ids": [...], **context}."""
+    return json.dumps({'artist_ids': sorted(set(artist_ids)), **context})
+
+
+def decode_message(body: str) -> List[str]:
+    """Artist IDs from a message body."""
+    return list(json.loads(body).get('artist_ids', []))
+
+
+class SQSArtistQueue:
+    """Artist-ID queue backed by SQS."""
+
+    def __init__(self, queue_url: str, sqs_client=None):
+        self.queue_url = queue_url
+        if sqs_client is None:
+            import boto3
+            sqs_client = boto3.client('sqs')
+        self.sqs = sqs_client
+
+    def send(self, artist_ids: Iterable[str], **context) -> int:
+        """
+        Send artist IDs (split into messages of MAX_IDS_PER_MESSAGE).
+
+        Returns:
+            Number of messages sent
+        """
+        ids = sorted(set(artist_ids))
+        chunks = [ids[i:i + MAX_IDS_PER_MESSAGE] for i in range(0, len(ids), MAX_IDS_PER_MESSAGE)]
+        for chunk in chunks:
+            self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=encode_message(chunk, **context))
+        return len(chunks)
+
+    def receive(self, max_messages: int = 10, wait_seconds: float = 0) -> List[Message]:
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            WaitTimeSeconds=min(20, math.ceil(wait_seconds)),
+        )
+        return [(m['ReceiptHandle'], decode_message(m['Body'])) for m in response.get('Messages', [])]
+
+    def delete(self, receipts: List[str]) -> None:
+        for i in range(0, len(receipts), 10):
+            self.sqs.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{'Id': str(n), 'ReceiptHandle': r} for n, r in enumerate(receipts[i:i + 10])],
+            )
+
+
+class LocalArtistQueue:
+    """In-memory queue with SQS-like receive/delete semantics (no visibility timeout)."""
+
+    def __init__(self):
+        self._messages: deque = deque()
+        self._inflight: Dict[str, str] = {}
+        self._ready = threading.Condition()
+        self._next = 0
+
+    def send(self, artist_ids: Iterable[str], **context) -> int:
+        body = encode_message(artist_ids, **context)
+        with self._ready:
+            self._messages.append(body)
+            self._ready.notify()
+        return 1
+
+    def receive(self, max_messages: int = 10, wait_seconds: float = 0) -> List[Message]:
+        with self._ready:
+            if not self._messages and wait_seconds > 0:
+                self._ready.wait(wait_seconds)  # long polling
+            messages = []
+            while self._messages and len(messages) < max_messages:
+                self._next += 1
+                receipt = f"local-{self._next}"
+                body = self._messages.popleft()
+                self._inflight[receipt] = body
+                messages.append((receipt, decode_message(body)))
+            return messages
+
+    def delete(self, receipts: List[str]) -> None:
+        with self._ready:
+            for receipt in receipts:
+                self._inflight.pop(receipt, None)
+
+    def release(self) -> None:
+        """Return undeleted messages to the queue (like a visibility timeout expiring)."""
+        with self._ready:
+            self._messages.extend(self._inflight.values())
+            self._inflight.clear()
+            self._ready.notify_all()
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+
+def get_artist_queue(queue_url: Optional[str] = QUEUE_URL):
+    """SQS queue if configured, else None (event-driven enrichment disabled)."""
+    return SQSArtistQueue(queue_url) if queue_url else None
+
+
+def coalesce(
+    queue,
+    batch_size: int = ARTIST_BATCH_SIZE,
+    max_wait: float = 2.0,
+    clock: Callable[[], float] = time.monotonic,
+) -> Tuple[List[str], List[Message]]:
+    """
+    Drain messages into one batch of unique artist IDs.
+
+    Stops as soon as `batch_size` IDs are collected or `max_wait` seconds
+    have passed. A message is never split: the batch may exceed
+    `batch_size`; callers fetch it in 50-ID requests.
+
+    Returns:
+        (sorted unique artist IDs, the (receipt, artist IDs) messages they came from)
+    """
+    deadline = clock() + max_wait
+    ids = set()
+    received: List[Message] = []
+    while len(ids) < batch_size:
+        remaining = deadline - clock()
+        if remaining <= 0:
+            break
+        messages = queue.receive(max_messages=10, wait_seconds=min(remaining, 1))
+        if not messages:
+            continue
+        for message in messages:
+            received.append(message)
+            ids.update(message[1])
+    return sorted(ids), received
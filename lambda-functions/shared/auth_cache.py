@@ -0,0 +1,171 @@
+"""
+Warm-container cache for Spotify authentication.
+
+Lambda keeps module globals alive between invocations of a warm container,
+so the OAuth manager and spotipy client built on the first (cold) run are
+reused afterwards. A warm run whose cached access token is still valid
+makes no network calls at all to authenticate: no S3 token download, no
+`current_user()` validation, and no token upload. The token is only
+uploaded back to S3 when its access token actually changed (refreshed).
+
+Used by both Lambdas; deploy scripts copy this module next to the handler.
+"""
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Optional
+
+from storage import shared_s3_client
+
+if TYPE_CHECKING:
+    import requests
+    import spotipy
+
+logger = logging.getLogger(__name__)
+
+SCOPE = "user-read-recently-played"
+DEFAULT_TOKEN_KEY = 'secrets/spotify_token'
+
+
+class _CachedAuth:
+    """Everything needed to reuse one user's Spotify auth across invocations."""
+
+    __slots__ = ('sp', 'auth_manager', 'cache_path', 'uploaded_token', 'lock')
+
+    def __init__(self, sp, auth_manager, cache_path):
+        self.sp = sp
+        self.auth_manager = auth_manager
+        self.cache_path = cache_path
+        self.uploaded_token = None
+        self.lock = threading.Lock()
+
+
+_cache: Dict[str, _CachedAuth] = {}
+_cache_lock = threading.Lock()
+
+
+def _default_s3_client():
+    """Process-wide S3 client, created on first use and kept warm."""
+    return shared_s3_client()
+
+
+def get_spotify(
+    client_id: str,
+    client_secret: str,
+    redirect_uri: str,
+    token_key: str = DEFAULT_TOKEN_KEY,
+    cache_path: Optional[str] = None,
+    requests_session: Optional['requests.Session'] = None,
+    s3_client=None,
+) -> 'spotipy.Spotify':
+    """
+    Return an authenticated spotipy client, reusing warm-container state.
+
+    In Lambda: downloads the cached token from S3 on the first call only and
+    uploads it back whenever the access token changed.
+    Locally: uses the token cache file and browser-based OAuth flow.
+
+    Args:
+        client_id: Spotify app client ID
+        client_secret: Spotify app client secret
+        redirect_uri: OAuth redirect URI
+        token_key: S3 key of the cached OAuth token (also the cache key)
+        cache_path: Local token cache file (defaults per environment)
+        requests_session: HTTP session for Spotify calls (rate limited if None)
+        s3_client: boto3 S3 client for the token round-trip
+
+    Returns:
+        Authenticated spotipy.Spotify
+    """
+    is_lambda = 'AWS_EXECUTION_ENV' in os.environ
+    bucket = os.environ.get('S3_BUCKET')
+
+    with _cache_lock:
+        entry = _cache.get(token_key)
+
+    if entry is None:
+        entry = _build_entry(
+            client_id, client_secret, redirect_uri, token_key, cache_path,
+            requests_session, s3_client, is_lambda, bucket,
+        )
+        with _cache_lock:
+            entry = _cache.setdefault(token_key, entry)
+    else:
+        logger.info(f"Reusing warm Spotify auth for {token_key}")
+
+    with entry.lock:
+        token_info = entry.auth_manager.cache_handler.get_cached_token()
+        if not token_info or entry.auth_manager.is_token_expired(token_info):
+            # Refreshes (or runs the browser flow locally) and rewrites the cache file
+            logger.info("Access token expired - refreshing")
+            entry.auth_manager.get_access_token(as_dict=False)
+            token_info = entry.auth_manager.cache_handler.get_cached_token()
+
+        access_token = token_info['access_token'] if token_info else None
+        if is_lambda and access_token and access_token != entry.uploaded_token:
+            try:
+                s3 = s3_client or _default_s3_client()
+                s3.upload_file(entry.cache_path, bucket, token_key)
+                entry.uploaded_token = access_token
+                logger.info("Uploaded refreshed token to S3")
+            except Exception as e:
+                logger.error(f"Failed to upload refreshed token to S3: {str(e)}")
+                # Don't raise - authentication already worked
+
+    return entry.sp
+
+
+def _build_entry(
+    client_id, client_secret, redirect_uri, token_key, cache_path,
+    requests_session, s3_client, is_lambda, bucket,
+) -> _CachedAuth:
+    """Cold path: fetch the token file and build OAuth manager + client."""
+    # Heavy imports are deferred to the first authentication in a container
+    import spotipy
+    from spotipy.oauth2 import CacheFileHandler, SpotifyOAuth
+
+    from rate_limiter import build_session
+
+    if is_lambda:
+        # Lambda: Download cached token from S3 (once per container)
+        cache_path = cache_path or '/tmp/.spotify_cache'
+        try:
+            s3 = s3_client or _default_s3_client()
+            s3.download_file(bucket, token_key, cache_path)
+            logger.info(f"Downloaded Spotify token from S3: {token_key}")
+        except Exception as e:
+            logger.error(f"Failed to download token from S3: {str(e)}")
+            raise
+        open_browser = False
+    else:
+        # Local: Use current directory
+        cache_path = cache_path or ".spotify_cache"
+        open_browser = True
+
+    # Every Spotify request (including token refresh) goes through
+    # the process-wide rate-limit scheduler
+    session = requests_session or build_session()
+
+    auth_manager = SpotifyOAuth(
+        client_id=client_id,
+        client_secret=client_secret,
+        redirect_uri=redirect_uri,
+        scope=SCOPE,
+        cache_handler=CacheFileHandler(cache_path=cache_path),
+        open_browser=open_browser,
+        requests_session=session,
+    )
+    sp = spotipy.Spotify(auth_manager=auth_manager, requests_session=session)
+
+    entry = _CachedAuth(sp, auth_manager, cache_path)
+    # The token we just downloaded is what S3 already has
+    token_info = auth_manager.cache_handler.get_cached_token()
+    if is_lambda and token_info:
+        entry.uploaded_token = token_info.get('access_token')
+    return entry
+
+
+def clear_cache() -> None:
+    """Forget all cached auth (next call behaves like a cold start)."""
+    with _cache_lock:
+        _cache.clear()
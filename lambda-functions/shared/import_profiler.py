@@ -0,0 +1,192 @@
+"""
+Cold-start import profiler for the Lambda handlers.
+
+Imports a module in a fresh interpreter with `-X importtime` (the only way
+to see true cold-import cost once modules are cached in-process), parses
+the per-module timings and reports the slowest ones. Tests use
+`check_budget()` to fail when a handler's import time exceeds its budget
+or when a heavy dependency is imported eagerly again.
+
+Usage:
+    python import_profiler.py <src_dir> [module] [--top 15] [--budget-ms 150]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+# Modules the handlers must only import on first use
+HEAVY_MODULES = ('boto3', 'botocore', 'spotipy', 'requests')
+
+DEFAULT_BUDGET_MS = float(os.environ.get('COLD_START_BUDGET_MS', '150'))
+SHARED_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass
+class ImportTiming:
+    """One `-X importtime` line."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+@dataclass
+class ImportProfile:
+    """All timings for one cold import of `module`."""
+
+    module: str
+    timings: List[ImportTiming]
+
+    @property
+    def total_ms(self) -> float:
+        """Cumulative import time of the profiled module itself."""
+        for timing in self.timings:
+            if timing.module == self.module and timing.depth == 0:
+                return timing.cumulative_us / 1000
+        return 0.0
+
+    @property
+    def modules(self) -> List[str]:
+        """Every module imported as a side effect (stdlib included)."""
+        return [timing.module for timing in self.timings]
+
+    def heavy_imports(self, heavy: Iterable[str] = HEAVY_MODULES) -> List[str]:
+        """Top-level heavy packages that were imported eagerly."""
+        loaded = {name.split('.')[0] for name in self.modules}
+        return sorted(loaded.intersection(heavy))
+
+    def slowest(self, top: int = 15) -> List[ImportTiming]:
+        """Modules with the highest self time."""
+        return sorted(self.timings, key=lambda t: t.self_us, reverse=True)[:top]
+
+
+def parse_importtime(stderr: str) -> List[ImportTiming]:
+    """
+    Parse `-X importtime` output.
+
+    Args:
+        stderr: Interpreter stderr with lines like
+            'import time:       210 |      52642 |       spotipy'
+
+    Returns:
+        Timings in the order modules finished importing
+    """
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            timings.append(ImportTiming(
+                module=name.strip(),
+                self_us=int(self_us),
+                cumulative_us=int(cumulative_us),
+                depth=(len(name) - len(name.lstrip()) - 1) // 2,
+            ))
+        except ValueError:
+            continue  # header line ('self [us] | cumulative | ...')
+    return timings
+
+
+def profile_imports(src_dir: str, module: str = 'handler', extra_paths: Optional[List[str]] = None) -> ImportProfile:
+    """
+    Cold-import `module` from `src_dir` in a fresh interpreter.
+
+    Args:
+        src_dir: Lambda source directory (what gets zipped into the package)
+        module: Module to import (the Lambda handler by default)
+        extra_paths: Additional sys.path entries (shared/ is always added)
+
+    Returns:
+        ImportProfile for the run
+
+    Raises:
+        RuntimeError: If the import fails
+    """
+    paths = [os.path.abspath(src_dir), SHARED_DIR] + list(extra_paths or [])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(paths))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=env, cwd=os.path.abspath(src_dir),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return ImportProfile(module=module, timings=parse_importtime(result.stderr))
+
+
+def check_budget(
+    src_dir: str,
+    module: str = 'handler',
+    budget_ms: float = DEFAULT_BUDGET_MS,
+    heavy: Iterable[str] = HEAVY_MODULES,
+    runs: int = 3,
+) -> ImportProfile:
+    """
+    Assert a handler stays inside its cold-start import budget.
+
+    Takes the best of `runs` fresh imports to smooth out disk-cache noise.
+
+    Args:
+        src_dir: Lambda source directory
+        module: Module to import
+        budget_ms: Max allowed cumulative import time
+        heavy: Packages that must not be imported at module load
+        runs: Fresh interpreters to try
+
+    Returns:
+        Fastest ImportProfile
+
+    Raises:
+        AssertionError: If over budget or a heavy package was imported eagerly
+    """
+    profiles = [profile_imports(src_dir, module) for _ in range(max(1, runs))]
+    best = min(profiles, key=lambda p: p.total_ms)
+
+    eager = best.heavy_imports(heavy)
+    assert not eager, f"{module} imports {', '.join(eager)} at load time"
+    assert best.total_ms <= budget_ms, (
+        f"{module} import took {best.total_ms:.1f} ms (budget {budget_ms:.0f} ms)\n"
+        + format_report(best)
+    )
+    return best
+
+
+def format_report(profile: ImportProfile, top: int = 15) -> str:
+    """Render the slowest imports as a small table."""
+    lines = [
+        f"Cold import of {profile.module}: {profile.total_ms:.1f} ms "
+        f"({len(profile.timings)} modules)",
+        f"{'self ms':>9} {'cumul ms':>9}  module",
+    ]
+    for timing in profile.slowest(top):
+        lines.append(
+            f"{timing.self_us / 1000:9.2f} {timing.cumulative_us / 1000:9.2f}  {timing.module}"
+        )
+    eager = profile.heavy_imports()
+    if eager:
+        lines.append(f"Eager heavy imports: {', '.join(eager)}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a Lambda handler's cold-start imports")
+    parser.add_argument('src_dir', help="Lambda source directory (e.g. spotify-ingestion/src)")
+    parser.add_argument('module', nargs='?', default='handler')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=None, help="Exit 1 if over budget")
+    args = parser.parse_args()
+
+    profile = profile_imports(args.src_dir, args.module)
+    print(format_report(profile, args.top))
+
+    if args.budget_ms is not None and profile.total_ms > args.budget_ms:
+        print(f"Over budget: {profile.total_ms:.1f} ms > {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Per-invocation metrics emitted as CloudWatch Embedded Metric Format.
+
+A handler wraps its body in `invocation()`; while it runs, code anywhere in
+the process (including worker threads) records into it through the
+module-level helpers:
+
+    with metrics.invocation('ingestion', mode='incremental'):
+        with metrics.span('auth'):
+            client.authenticate()
+        metrics.count('plays', len(tracks))
+
+When the block exits, one EMF log line is written with every span (as
+`<name>_ms`) and counter, under the `Function` dimension. CloudWatch turns
+the line into metrics without any API calls, so there is nothing to flush
+or batch. Outside an invocation the helpers do nothing.
+
+Lambda runs one invocation per container at a time, so a process-wide
+recorder is enough; worker threads do not need to be handed a context.
+
+Counters recorded by the shared modules:
+
+    api_requests    Spotify HTTP requests sent, including re-sends (rate_limiter)
+    api_throttled   429 responses (rate_limiter)
+    s3_requests     S3 API calls on the shared client (storage)
+    bytes_written   Object bytes written by the pipeline
+
+Tests pass a LocalSink (or call set_sink) to collect the records.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'SpotifyPipeline')
+DIMENSION = 'Function'
+
+
+class StdoutSink:
+    """Print each record as one JSON line (Lambda ships stdout to CloudWatch Logs)."""
+
+    def emit(self, record: Dict) -> None:
+        print(json.dumps(record, separators=(',', ':')), flush=True)
+
+
+class LocalSink:
+    """Keep records in memory (tests, local runs)."""
+
+    def __init__(self):
+        self.records: List[Dict] = []
+
+    def emit(self, record: Dict) -> None:
+        self.records.append(record)
+
+    @property
+    def last(self) -> Optional[Dict]:
+        return self.records[-1] if self.records else None
+
+
+class Metrics:
+    """Spans and counters for one invocation (thread-safe)."""
+
+    def __init__(self, function: str, properties: Optional[Dict] = None):
+        self.function = function
+        self.properties = dict(properties or {})
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def timing(self, name: str, ms: float) -> None:
+        """Add ms to span `name` (repeated spans accumulate)."""
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + ms
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_property(self, name: str, value) -> None:
+        """Attach a non-metric field to the log line (searchable in Logs Insights)."""
+        with self._lock:
+            self.properties[name] = value
+
+    def to_emf(self, timestamp_ms: Optional[int] = None) -> Dict:
+        """Build the EMF record: metric values, the dimension and properties at top level."""
+        with self._lock:
+            values = {f"{name}_ms": round(ms, 1) for name, ms in self.timings.items()}
+            values.update(self.counters)
+            properties = dict(self.properties)
+
+        return {
+            '_aws': {
+                'Timestamp': timestamp_ms if timestamp_ms is not None else int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [[DIMENSION]],
+                    'Metrics': [{'Name': name, 'Unit': _unit(name)} for name in values],
+                }],
+            },
+            DIMENSION: self.function,
+            **properties,
+            **values,
+        }
+
+
+def _unit(name: str) -> str:
+    if name.endswith('_ms'):
+        return 'Milliseconds'
+    if name.startswith('bytes_'):
+        return 'Bytes'
+    return 'Count'
+
+
+_sink = StdoutSink()
+_active: Optional[Metrics] = None
+
+
+def set_sink(sink) -> object:
+    """Replace the default sink; returns the previous one."""
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def current() -> Optional[Metrics]:
+    """The recorder of the running invocation, or None."""
+    return _active
+
+
+@contextmanager
+def invocation(function: str, sink=None, **properties):
+    """
+    Record metrics for one handler invocation and emit them on exit.
+
+    The record is emitted even if the handler raises (with an `error`
+    property naming the exception type), so failed runs still show their
+    stage timings.
+
+    Args:
+        function: Value of the Function dimension (e.g., 'ingestion')
+        sink: Where to emit (default: the module sink, stdout unless set_sink was called)
+        **properties: Extra fields for the log line (e.g., mode)
+
+    Yields:
+        Metrics recorder
+    """
+    global _active
+    recorder = Metrics(function, properties)
+    started = time.perf_counter()
+    _active = recorder
+    try:
+        yield recorder
+    except Exception as e:
+        recorder.set_property('error', type(e).__name__)
+        raise
+    finally:
+        _active = None
+        recorder.timing('total', (time.perf_counter() - started) * 1000)
+        (sink or _sink).emit(recorder.to_emf())
+
+
+@contextmanager
+def span(name: str):
+    """Time the block into span `name` of the running invocation."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder = _active
+        if recorder is not None:
+            recorder.timing(name, (time.perf_counter() - start) * 1000)
+
+
+def timing(name: str, ms: float) -> None:
+    """Record an already measured duration."""
+    recorder = _active
+    if recorder is not None:
+        recorder.timing(name, ms)
+
+
+def count(name: str, value: float = 1) -> None:
+    """Increment counter `name` of the running invocation."""
+    recorder = _active
+    if recorder is not None:
+        recorder.count(name, value)
@@ -0,0 +1,248 @@
+"""
+On-demand CPU and memory profiling for Lambda invocations.
+
+`profiled()` wraps a handler. It is off unless switched on for a run:
+
+    PROFILE=cpu|memory|all         environment variable (every invocation)
+    {"profile": "cpu"}             event flag (one invocation; true means all)
+
+With the switch on, the invocation runs under cProfile and/or tracemalloc
+and the results are stored through the storage layer:
+
+    profiles/<function>/<YYYYmmdd_HHMMSS>_<request id>/cpu.pstats    marshalled pstats
+    profiles/<function>/<YYYYmmdd_HHMMSS>_<request id>/memory.json   peak + top allocations
+
+Profiles are stored even when the handler raises. When the switch is off
+the wrapper only reads the flag; cProfile and tracemalloc are not imported.
+
+Usage (summarize stored profiles):
+    python profiling.py --bucket <bucket> [--function ingestion] [--top 20]
+    python profiling.py --local data --key profiles/ingestion/<run>/cpu.pstats
+"""
+import functools
+import logging
+import marshal
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+from storage import LocalStorage, S3Storage, StorageBackend
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PREFIX = 'profiles'
+PROFILE_ENV = 'PROFILE'
+MODES = frozenset({'cpu', 'memory'})
+TOP_ALLOCATIONS = int(os.environ.get('PROFILE_TOP_ALLOCATIONS', '50'))
+CPU_FILE = 'cpu.pstats'
+MEMORY_FILE = 'memory.json'
+
+
+def parse_modes(value) -> FrozenSet[str]:
+    """
+    Normalize a switch value to the set of profilers to run.
+
+    Accepts 'cpu', 'memory', comma-separated lists, 'all'/'true'/'1' and
+    booleans. Anything else means off.
+    """
+    if value is True:
+        return MODES
+    if not value or not isinstance(value, str):
+        return frozenset()
+    modes = set()
+    for part in value.lower().split(','):
+        part = part.strip()
+        if part in ('all', 'true', '1'):
+            return MODES
+        if part in MODES:
+            modes.add(part)
+        elif part:
+            logger.warning(f"Ignoring unknown profile mode: {part}")
+    return frozenset(modes)
+
+
+def requested_modes(event) -> FrozenSet[str]:
+    """Profilers requested by the event flag, else by the PROFILE variable."""
+    if isinstance(event, dict) and 'profile' in event:
+        return parse_modes(event['profile'])
+    return parse_modes(os.environ.get(PROFILE_ENV))
+
+
+def profiled(function: str, storage: Callable[[], StorageBackend]):
+    """
+    Decorate a Lambda handler with the on-demand profiling switch.
+
+    Args:
+        function: Name used in the profile prefix (e.g., 'ingestion')
+        storage: Returns the backend to store profiles in; called per profiled
+            run, so a handler's module-level STORAGE can be swapped in tests
+
+    Returns:
+        Decorator for `handler(event, context)`
+    """
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            modes = requested_modes(event)
+            if not modes:
+                return handler(event, context)
+            return run_profiled(handler, event, context, modes, function, storage())
+        return wrapper
+    return decorate
+
+
+def run_profiled(handler, event, context, modes: FrozenSet[str], function: str, storage: StorageBackend):
+    """Run the handler under the requested profilers and store what they collected."""
+    import cProfile
+    import tracemalloc
+
+    started_at = datetime.now(timezone.utc)
+    profiler = cProfile.Profile() if 'cpu' in modes else None
+    # Leave tracemalloc alone if someone else (e.g. python -X tracemalloc) started it
+    trace_memory = 'memory' in modes and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            return profiler.runcall(handler, event, context)
+        return handler(event, context)
+    finally:
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        snapshot = peak = None
+        if 'memory' in modes and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()
+        if trace_memory:
+            tracemalloc.stop()
+        try:
+            prefix = profile_prefix(function, started_at, getattr(context, 'aws_request_id', None))
+            save_profile(storage, prefix, profiler, snapshot, peak, function, started_at, duration_ms)
+            logger.info(f"Stored {'+'.join(sorted(modes))} profile at {storage.location(prefix)}")
+        except Exception as e:
+            # Never fail (or mask the failure of) the invocation over its profile
+            logger.error(f"Failed to store profile: {str(e)}")
+
+
+def profile_prefix(function: str, started_at: datetime, request_id: Optional[str] = None) -> str:
+    """Key prefix for one profiled run."""
+    run = started_at.strftime('%Y%m%d_%H%M%S')
+    if request_id:
+        run = f"{run}_{request_id}"
+    return f"{PROFILE_PREFIX}/{function}/{run}"
+
+
+def save_profile(storage, prefix, profiler, snapshot, peak, function, started_at, duration_ms) -> None:
+    """Write cpu.pstats and/or memory.json under prefix."""
+    if profiler is not None:
+        profiler.create_stats()
+        storage.put_bytes(f"{prefix}/{CPU_FILE}", marshal.dumps(profiler.stats), 'application/octet-stream')
+
+    if snapshot is not None:
+        storage.put_json(f"{prefix}/{MEMORY_FILE}", {
+            'function': function,
+            'started_at': started_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'duration_ms': duration_ms,
+            'current_bytes': peak[0],
+            'peak_bytes': peak[1],
+            'top': top_allocations(snapshot),
+        })
+
+
+def top_allocations(snapshot, limit: int = TOP_ALLOCATIONS) -> List[Dict]:
+    """Largest live allocations by source line, tracemalloc's own frames excluded."""
+    import tracemalloc
+
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ])
+    return [
+        {
+            'where': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            'size_bytes': stat.size,
+            'count': stat.count,
+        }
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+def load_stats(body: bytes):
+    """pstats.Stats from stored cpu.pstats bytes."""
+    import pstats
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(suffix='.pstats', delete=False) as f:
+        f.write(body)
+    try:
+        return pstats.Stats(f.name)
+    finally:
+        os.unlink(f.name)
+
+
+def list_runs(storage: StorageBackend, function: Optional[str] = None) -> List[str]:
+    """Profiled run prefixes, oldest first."""
+    prefix = f"{PROFILE_PREFIX}/{function}/" if function else f"{PROFILE_PREFIX}/"
+    runs = {key.rsplit('/', 1)[0] for key in storage.list_keys(prefix)}
+    return sorted(runs, key=lambda run: run.rsplit('/', 1)[-1])
+
+
+def format_run(storage: StorageBackend, run: str, top: int = 15, sort: str = 'cumulative') -> str:
+    """Summarize one run: hottest functions and largest allocations."""
+    import io
+
+    lines = [f"== {run}"]
+    cpu = storage.get_bytes(f"{run}/{CPU_FILE}")
+    if cpu is not None:
+        out = io.StringIO()
+        stats = load_stats(cpu)
+        stats.stream = out
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+        lines.append(out.getvalue().strip())
+
+    memory = storage.get_json(f"{run}/{MEMORY_FILE}")
+    if memory is not None:
+        lines.append(
+            f"Memory: peak {memory['peak_bytes'] / 1e6:.1f} MB, "
+            f"{memory['current_bytes'] / 1e6:.1f} MB live at exit, {memory['duration_ms']} ms"
+        )
+        lines.append(f"{'KiB':>10} {'blocks':>8}  where")
+        for alloc in memory['top'][:top]:
+            lines.append(f"{alloc['size_bytes'] / 1024:10.1f} {alloc['count']:8d}  {alloc['where']}")
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize stored invocation profiles")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket', help="S3 bucket holding profiles/")
+    source.add_argument('--local', help="Local storage root holding profiles/")
+    parser.add_argument('--function', help="Only this function's profiles (e.g. ingestion)")
+    parser.add_argument('--key', help="Summarize this run (or one of its files) instead of the latest")
+    parser.add_argument('--runs', type=int, default=1, help="How many of the latest runs to summarize")
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--sort', default='cumulative', help="pstats sort key (cumulative, tottime, ...)")
+    args = parser.parse_args()
+
+    storage = S3Storage(args.bucket) if args.bucket else LocalStorage(args.local)
+    if args.key:
+        runs = [args.key.rsplit('/', 1)[0] if args.key.endswith((CPU_FILE, MEMORY_FILE)) else args.key]
+    else:
+        runs = list_runs(storage, args.function)
+        print(f"{len(runs)} stored profiles")
+        for run in runs:
+            print(f"  {run}")
+        runs = runs[-args.runs:] if runs else []
+
+    for run in runs:
+        print()
+        print(format_run(storage, run, args.top, args.sort))
+
+
+if __name__ == '__main__':
+    main()
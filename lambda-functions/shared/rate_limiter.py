@@ -0,0 +1,260 @@
+"""
+App-wide rate-limit scheduler for Spotify Web API calls.
+
+Spotify enforces one rolling request budget per app, so every request made
+by this process (play paging, artist batches, token refreshes) takes a slot
+from a single token bucket before it is sent. The bucket learns the budget
+from the API itself: a 429 pauses every caller for Retry-After seconds and
+halves the rate, and each success nudges the rate back up towards the
+ceiling (AIMD). That keeps us close to the ceiling without throttle storms
+where every thread sleeps and retries in lockstep.
+
+Used by both Lambdas; deploy scripts copy this module next to the handler.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from api_telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = float(os.environ.get('SPOTIFY_RATE_LIMIT', '10'))        # requests/second
+DEFAULT_MAX_RATE = float(os.environ.get('SPOTIFY_RATE_CEILING', '25'))  # never exceed
+DEFAULT_BURST = 10
+MIN_RATE = 0.5
+DEFAULT_RETRY_AFTER = 1.0   # seconds, when a 429 has no usable header
+MAX_THROTTLE_RETRIES = 5
+
+
+class RateLimitScheduler:
+    """
+    Thread-safe token bucket with Retry-After aware backoff.
+
+    One instance is shared by all threads and users in a process;
+    `acquire()` blocks until the caller may send its request.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_rate: float = DEFAULT_MAX_RATE,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Initialize scheduler.
+
+        Args:
+            rate: Starting refill rate in requests per second
+            burst: Bucket capacity (max requests sent back-to-back)
+            max_rate: Ceiling the rate may recover to after throttling
+            clock: Monotonic time source (injectable for tests)
+            sleep: Sleep function (injectable for tests)
+        """
+        self.rate = min(rate, max_rate)
+        self.burst = burst
+        self.max_rate = max_rate
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+
+        self.requests = 0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def acquire(self) -> float:
+        """
+        Block until a request slot is available and take it.
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                delay = self._paused_until - now
+                if delay <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.requests += 1
+                        self.waited_seconds += waited
+                        return waited
+                    delay = (1 - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+    def on_throttle(self, retry_after: Optional[float]) -> None:
+        """
+        Record a 429: pause every caller and halve the rate.
+
+        Args:
+            retry_after: Seconds from the Retry-After header (None if absent)
+        """
+        pause = retry_after if retry_after and retry_after > 0 else DEFAULT_RETRY_AFTER
+        with self._lock:
+            now = self._clock()
+            self._paused_until = max(self._paused_until, now + pause)
+            self._tokens = 0.0
+            self._updated = self._paused_until
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self.throttled += 1
+        logger.warning(f"Spotify throttled (429): pausing {pause:.1f}s, rate now {self.rate:.2f}/s")
+
+    def on_success(self) -> None:
+        """Record a successful response: recover the rate additively."""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def _refill(self, now: float) -> None:
+        """Add tokens for the time elapsed since the last refill (lock held)."""
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTP adapter that routes every request through a RateLimitScheduler.
+
+    429s are handled here (wait for the scheduler, then re-send) instead
+    of by urllib3's Retry, which would sleep inside the calling thread
+    without telling anyone else to slow down.
+    """
+
+    def __init__(self, scheduler: RateLimitScheduler, max_throttle_retries: int = MAX_THROTTLE_RETRIES, **kwargs):
+        """
+        Initialize adapter.
+
+        Args:
+            scheduler: Shared scheduler handing out request slots
+            max_throttle_retries: Re-sends allowed per request after a 429
+            **kwargs: Passed to HTTPAdapter (pool sizes, max_retries)
+        """
+        super().__init__(**kwargs)
+        self.scheduler = scheduler
+        self.max_throttle_retries = max_throttle_retries
+
+    def send(self, request, **kwargs):
+        """
+        Send a request once a slot is free, re-sending after 429s.
+
+        Each attempt is recorded in the API telemetry (api_telemetry.py);
+        latency is measured after the slot is granted, so it excludes
+        time spent waiting on the scheduler.
+        """
+        telemetry = get_telemetry()
+        telemetry.watch(self.scheduler)
+        for attempt in range(self.max_throttle_retries + 1):
+            self.scheduler.acquire()
+            start = time.perf_counter()
+            response = super().send(request, **kwargs)
+            metrics.count('api_requests')
+            if response.status_code != 429:
+                # Read the body here (spotipy never streams) so latency covers the download
+                size = None if kwargs.get('stream') else len(response.content)
+                telemetry.record(request.url, _ms_since(start), response.status_code, size, _retries(response))
+                self.scheduler.on_success()
+                return response
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            telemetry.record(request.url, _ms_since(start), 429, retries=_retries(response), retry_after=retry_after)
+            metrics.count('api_throttled')
+            self.scheduler.on_throttle(retry_after)
+            if attempt < self.max_throttle_retries:
+                response.close()
+        return response
+
+
+def _ms_since(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+def _retries(response) -> int:
+    """urllib3 retries (5xx, connection errors) behind a response."""
+    retries = getattr(response.raw, 'retries', None)
+    return len(retries.history) if retries is not None else 0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given in seconds.
+
+    Args:
+        value: Raw header value
+
+    Returns:
+        Seconds to wait, or None if missing/unparseable
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def build_session(
+    scheduler: Optional[RateLimitScheduler] = None,
+    pool_size: int = 10,
+) -> requests.Session:
+    """
+    Build an HTTP session whose every request is rate limited.
+
+    5xx responses keep spotipy's urllib3 retry/backoff; 429 is left to
+    the scheduler.
+
+    Args:
+        scheduler: Scheduler to use (defaults to the process-wide one)
+        pool_size: Max pooled connections per host
+
+    Returns:
+        Configured requests.Session
+    """
+    retry = Retry(
+        total=3,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status=3,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        respect_retry_after_header=False,
+    )
+    adapter = RateLimitedAdapter(
+        scheduler or get_scheduler(),
+        pool_connections=2,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_scheduler: Optional[RateLimitScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """Return the process-wide scheduler (created on first use)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateLimitScheduler()
+        return _scheduler
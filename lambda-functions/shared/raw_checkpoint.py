@@ -0,0 +1,216 @@
+"""
+Checkpointed listing of raw/ for the incremental discovery stages.
+
+Artist and track discovery each keep a per-root checkpoint
+
+    {"roots": {"raw/year=": "<last key read>", "raw/user_id=u1/": "...", ...},
+     "backfill": "<last backfill manifest read>"}
+
+Raw keys are time-ordered within each root (raw/year=... for the single-user
+layout, raw/user_id=<id>/ per listener), so a run lists each root with
+StartAfter its checkpoint key and only reads objects written since the last
+run. CheckpointCursor moves a root's checkpoint over the keys that were read
+successfully, in listing order, and stops at the root's first failure: that
+object and everything after it are read again next run.
+
+Writers that add objects to past partitions (the streaming-history import)
+would be skipped by that listing, so they announce their keys in a backfill
+manifest, state/raw_backfills/<time>_<digest>.json = {"keys": [...]}. Each
+run also reads the keys of manifests newer than its "backfill" mark that
+sort at or before their root's checkpoint (later keys are listed anyway).
+The mark only passes a manifest once all of its keys were read.
+
+Compaction writes objects whose keys sort before the ones they replace
+(compacted_... < spotify_plays_..., month=12/compacted_... < month=12/day=...),
+which StartAfter would never list again. It therefore only compacts raw
+partitions that every discovery checkpoint has passed and that hold no
+backfilled key a discovery stage has yet to read (read_by_discovery).
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from raw_format import format_for_key
+
+logger = logging.getLogger(__name__)
+
+RAW_PREFIX = "raw/"
+ARTIST_DISCOVERY_CHECKPOINT = "state/artist_discovery/checkpoint.json"
+TRACK_DISCOVERY_CHECKPOINT = "state/track_discovery/checkpoint.json"
+# Every stage that lists raw/ from a checkpoint (compaction must wait for all of them)
+DISCOVERY_CHECKPOINTS = (ARTIST_DISCOVERY_CHECKPOINT, TRACK_DISCOVERY_CHECKPOINT)
+BACKFILL_PREFIX = "state/raw_backfills/"
+
+Backfill = Tuple[str, List[str]]  # (manifest key, raw keys the root listings will not reach)
+
+
+def empty_checkpoint() -> Dict:
+    """Checkpoint of a stage that has read nothing yet."""
+    return {'roots': {}, 'backfill': ''}
+
+
+def load_checkpoint(storage, key: str) -> Dict:
+    """Last key read per raw root and last backfill manifest read (empty on the first run)."""
+    return _parse_checkpoint(storage.get_json(key) or {})
+
+
+def _parse_checkpoint(data: Dict) -> Dict:
+    return {'roots': data.get('roots', {}), 'backfill': data.get('backfill', '')}
+
+
+def save_checkpoint(storage, checkpoint: Dict, key: str) -> None:
+    """Persist a checkpoint."""
+    data = {'roots': checkpoint['roots'], 'backfill': checkpoint.get('backfill', '')}
+    body = json.dumps(data, indent=2, sort_keys=True).encode('utf-8')
+    storage.put_bytes(key, body, 'application/json')
+
+
+def record_backfill(storage, keys: Iterable[str], now: Optional[datetime] = None) -> Optional[str]:
+    """
+    Announce raw keys written behind the discovery checkpoints.
+
+    Call once the objects exist; manifests are named by creation time, so
+    stages read them in the order they were written.
+
+    Returns:
+        Manifest key (None if there were no keys)
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return None
+    now = now or datetime.now(timezone.utc)
+    digest = hashlib.sha1('\n'.join(keys).encode('utf-8')).hexdigest()[:12]
+    key = f"{BACKFILL_PREFIX}{now.strftime('%Y%m%dT%H%M%S')}_{digest}.json"
+    storage.put_json(key, {'keys': keys}, indent=None)
+    logger.info(f"Recorded {len(keys)} backfilled raw keys in {storage.location(key)}")
+    return key
+
+
+def pending_backfills(storage, checkpoint: Dict) -> List[Backfill]:
+    """Manifests after the checkpoint's backfill mark, with their keys the root listings will not reach."""
+    roots = checkpoint['roots']
+    backfills = []
+    for manifest in storage.list_keys(BACKFILL_PREFIX, start_after=checkpoint.get('backfill', '')):
+        keys = (storage.get_json(manifest) or {}).get('keys', [])
+        # A key after its root's checkpoint (or in a root never listed) is listed anyway
+        backfills.append((manifest, [k for k in keys if k <= roots.get(raw_root(k), '')]))
+    return backfills
+
+
+def raw_root(key: str, prefix: str = RAW_PREFIX) -> str:
+    """Root of a raw key: 'raw/user_id=<id>/' or 'raw/year=' (single-user layout)."""
+    user_prefix = f"{prefix}user_id="
+    if key.startswith(user_prefix):
+        return key[:key.index('/', len(user_prefix)) + 1]
+    return f"{prefix}year="
+
+
+def list_roots(storage, prefix: str = RAW_PREFIX) -> List[str]:
+    """
+    Key ranges under raw/ whose keys increase with write time.
+
+    Returns:
+        'raw/year=' (single-user layout, if present) and 'raw/user_id=<id>/' per listener
+    """
+    roots = []
+    for child in storage.list_prefixes(prefix):
+        if child.startswith(f"{prefix}user_id="):
+            roots.append(child)
+        elif child.startswith(f"{prefix}year=") and f"{prefix}year=" not in roots:
+            roots.append(f"{prefix}year=")
+    return roots
+
+
+def iter_new_raw_keys(
+    storage, checkpoint: Dict, backfills: Sequence[Backfill] = (), prefix: str = RAW_PREFIX
+) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (stream, key) for raw objects not read yet.
+
+    First the keys of pending backfill manifests (stream: the manifest key),
+    then each root's keys after its checkpoint key (stream: the root).
+    Roots are paged lazily so callers can start fetching before listing
+    finishes.
+    """
+    for manifest, keys in backfills:
+        for key in keys:
+            yield manifest, key
+    for root in list_roots(storage, prefix):
+        for key in storage.list_keys(root, start_after=checkpoint['roots'].get(root, '')):
+            if format_for_key(key):
+                yield root, key
+
+
+class CheckpointCursor:
+    """Advances a checkpoint over the keys iter_new_raw_keys yielded, as they are read."""
+
+    def __init__(self, checkpoint: Dict, backfills: Sequence[Backfill] = ()):
+        self.roots: Dict[str, str] = dict(checkpoint['roots'])
+        self.backfill: str = checkpoint.get('backfill', '')
+        self.manifests = [manifest for manifest, _ in backfills]
+        self.blocked = set()  # roots and manifests with a failed key: the checkpoint stays before it
+        self.failed = 0
+
+    def advance(self, stream: str, key: str, ok: bool) -> bool:
+        """
+        Record whether one key was read. Call in listing order within each root.
+
+        Returns:
+            True if the key is now behind the checkpoint (its results count);
+            False if it, or an earlier key of its stream, failed
+        """
+        if not ok:
+            self.failed += 1
+            self.blocked.add(stream)
+            return False
+        if stream in self.blocked:
+            return False
+        if not stream.startswith(BACKFILL_PREFIX) and key > self.roots.get(stream, ''):
+            self.roots[stream] = key
+        return True
+
+    @property
+    def checkpoint(self) -> Dict:
+        """The advanced checkpoint: the backfill mark stops before the first manifest with a failure."""
+        backfill = self.backfill
+        for manifest in self.manifests:
+            if manifest in self.blocked:
+                break
+            backfill = manifest
+        return {'roots': self.roots, 'backfill': backfill}
+
+
+def load_discovery_checkpoints(storage, keys: Iterable[str] = DISCOVERY_CHECKPOINTS) -> List[Dict]:
+    """
+    Checkpoints of the discovery stages that have run at least once.
+
+    Each also gets 'unread': the backfilled keys its pending manifests still
+    have to deliver to that stage.
+    """
+    checkpoints = []
+    for data in map(storage.get_json, keys):
+        if data is None:
+            continue
+        checkpoint = _parse_checkpoint(data)
+        checkpoint['unread'] = {k for _, pending in pending_backfills(storage, checkpoint) for k in pending}
+        checkpoints.append(checkpoint)
+    return checkpoints
+
+
+def read_by_discovery(keys: Iterable[str], checkpoints: List[Dict]) -> bool:
+    """
+    True if every discovery stage has read every one of the given raw keys.
+
+    A root missing from a checkpoint has never been listed, so its next
+    listing starts from the beginning and will read whatever is there.
+    """
+    keys = list(keys)
+    for checkpoint in checkpoints:
+        roots, unread = checkpoint['roots'], checkpoint.get('unread', ())
+        for key in keys:
+            mark = roots.get(raw_root(key))
+            if key in unread or (mark is not None and key > mark):
+                return False
+    return True
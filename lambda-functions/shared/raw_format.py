@@ -0,0 +1,314 @@
+"""
+Raw-layer output formats shared by both Lambdas.
+
+    json        Pretty-printed envelope ({"fetched_at", ..., "tracks": [...]}).
+                The original format; Snowflake loads one VARIANT per file and
+                the staging models `lateral flatten` it.
+    ndjson.gz   One record per line, gzip-compressed.
+    ndjson.zst  One record per line, zstd-compressed (needs `zstandard`).
+
+In the NDJSON formats the batch metadata (fetched_at, user_id, ...) is
+repeated on every line, so each line is a self-contained row that Snowflake
+can COPY straight into columns and load in parallel.
+
+NDJSONEncoder compresses incrementally: callers feed record batches and get
+compressed bytes back as they are produced, so a long backfill never holds
+the whole uncompressed body in memory.
+
+Play envelopes (json format) come in two encodings, named by the envelope's
+"encoding" field:
+
+    (absent)      Flat: "tracks" holds one full play dict per play.
+    normalized/1  "track_table" holds each distinct track once (the play
+                  fields other than played_at) and "plays" holds
+                  [track index, played_at_timestamp] pairs. A third element
+                  carries played_at verbatim when it is not the canonical
+                  millisecond rendering of the timestamp.
+
+On looped listening the normalized body is several times smaller. Readers
+go through envelope_records(), which returns flat plays for both encodings.
+"""
+import gzip
+import io
+import json
+import os
+import zlib
+import time
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Sequence, Union
+
+FORMATS = ('json', 'ndjson.gz', 'ndjson.zst')
+DEFAULT_FORMAT = os.environ.get('RAW_OUTPUT_FORMAT', 'json')
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# Flat play schema, in the column order written to S3 since day one
+PLAY_FIELDS = (
+    'played_at',
+    'played_at_timestamp',
+    'track_id',
+    'track_name',
+    'artist_id',
+    'artist_name',
+    'album_id',
+    'album_name',
+    'release_date',
+    'duration_ms',
+    'popularity',
+)
+# Per-track columns of a normalized track table
+TRACK_FIELDS = PLAY_FIELDS[2:]
+
+ENCODINGS = ('flat', 'normalized')
+DEFAULT_ENCODING = os.environ.get('RAW_ENCODING', 'flat')
+NORMALIZED_ENCODING = 'normalized/1'
+# Envelope fields that are not batch metadata
+_ENVELOPE_DATA_FIELDS = ('tracks', 'track_count', 'encoding', 'track_table', 'plays')
+
+_COMPRESSION = {'ndjson.gz': 'gzip', 'ndjson.zst': 'zstd'}
+_DEFAULT_LEVEL = {'gzip': 6, 'zstd': 3}
+
+
+def resolve_format(output_format: Optional[str] = None) -> str:
+    """
+    Validate an output format name (None means RAW_OUTPUT_FORMAT).
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    output_format = output_format or DEFAULT_FORMAT
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown raw output format: {output_format} (expected one of {FORMATS})")
+    return output_format
+
+
+def resolve_encoding(encoding: Optional[str] = None) -> str:
+    """
+    Validate a play encoding name (None means RAW_ENCODING).
+
+    Raises:
+        ValueError: If the encoding is unknown
+    """
+    encoding = encoding or DEFAULT_ENCODING
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown raw encoding: {encoding} (expected one of {ENCODINGS})")
+    return encoding
+
+
+def format_for_key(key: str) -> Optional[str]:
+    """Format of an S3 object from its key suffix, None if not a raw file."""
+    for output_format in FORMATS:
+        if key.endswith('.' + output_format):
+            return output_format
+    return None
+
+
+def _zstandard():
+    """Import zstandard lazily; it is only needed for ndjson.zst."""
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("ndjson.zst requires the 'zstandard' package") from e
+    return zstandard
+
+
+class NDJSONEncoder:
+    """
+    Streaming NDJSON encoder with gzip or zstd compression.
+
+    Example:
+        encoder = NDJSONEncoder('ndjson.gz', metadata={'fetched_at': ...})
+        for page in pages:
+            body += encoder.encode(page)
+        body += encoder.finish()
+    """
+
+    def __init__(self, output_format: str = 'ndjson.gz', metadata: Optional[Dict] = None, level: Optional[int] = None):
+        """
+        Initialize encoder.
+
+        Args:
+            output_format: 'ndjson.gz' or 'ndjson.zst'
+            metadata: Batch columns repeated on every line
+            level: Compression level (codec default if None)
+        """
+        if output_format not in _COMPRESSION:
+            raise ValueError(f"Not an NDJSON format: {output_format}")
+
+        self.output_format = output_format
+        compression = _COMPRESSION[output_format]
+        level = _DEFAULT_LEVEL[compression] if level is None else level
+
+        if compression == 'gzip':
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+        else:
+            self._compressor = _zstandard().ZstdCompressor(level=level).compressobj()
+
+        # Metadata is serialized once and spliced in front of every record.
+        # Records that are empty or repeat a metadata key are merged as dicts
+        # instead, so every line stays valid JSON without duplicate keys.
+        self._metadata = dict(metadata or {})
+        head = json.dumps(self._metadata, ensure_ascii=False) if self._metadata else ''
+        self._prefix = head[:-1] + ', ' if head else '{'
+
+        self.line_count = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def encode(self, records: Iterable[Dict]) -> bytes:
+        """
+        Add records; return whatever compressed output is ready.
+
+        Args:
+            records: Flat dicts (one output line each)
+
+        Returns:
+            Compressed bytes (may be empty while the codec buffers)
+        """
+        prefix = self._prefix
+        dumps = json.dumps
+        metadata = self._metadata
+        if not metadata:
+            lines = [dumps(record, ensure_ascii=False) for record in records]
+        else:
+            disjoint = metadata.keys().isdisjoint
+            lines = [
+                prefix + dumps(record, ensure_ascii=False)[1:]
+                if record and disjoint(record)
+                else dumps({**metadata, **record}, ensure_ascii=False)
+                for record in records
+            ]
+        if not lines:
+            return b''
+
+        chunk = ('\n'.join(lines) + '\n').encode('utf-8')
+        self.line_count += len(lines)
+        self.raw_bytes += len(chunk)
+        out = self._compressor.compress(chunk)
+        self.compressed_bytes += len(out)
+        return out
+
+    def finish(self) -> bytes:
+        """Flush the codec and return the final compressed bytes."""
+        out = self._compressor.flush()
+        self.compressed_bytes += len(out)
+        return out
+
+
+def encode_ndjson(records: Iterable[Dict], output_format: str = 'ndjson.gz', metadata: Optional[Dict] = None) -> bytes:
+    """Encode a whole batch in one call."""
+    encoder = NDJSONEncoder(output_format, metadata)
+    return encoder.encode(records) + encoder.finish()
+
+
+def iter_ndjson(body: Union[bytes, IO[bytes]], output_format: str) -> Iterator[Dict]:
+    """
+    Decode NDJSON records, streaming.
+
+    Args:
+        body: Compressed bytes or a readable binary stream (e.g. an S3 Body)
+        output_format: 'ndjson.gz' or 'ndjson.zst'
+
+    Yields:
+        One dict per line
+    """
+    if isinstance(body, (bytes, bytearray)):
+        body = io.BytesIO(body)
+
+    if output_format == 'ndjson.gz':
+        stream = gzip.GzipFile(fileobj=body)
+    elif output_format == 'ndjson.zst':
+        stream = _zstandard().ZstdDecompressor().stream_reader(body)
+    else:
+        raise ValueError(f"Not an NDJSON format: {output_format}")
+
+    with io.TextIOWrapper(stream, encoding='utf-8') as lines:
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+
+def format_played_at(timestamp: int) -> str:
+    """Canonical Spotify played_at string for Unix milliseconds ('2024-12-23T10:15:00.123Z')."""
+    seconds, millis = divmod(timestamp, 1000)
+    return '%04d-%02d-%02dT%02d:%02d:%02d.%03dZ' % (*time.gmtime(seconds)[:6], millis)
+
+
+def normalize_plays(rows: Iterable[Sequence]) -> Dict:
+    """
+    Build the normalized/1 envelope fields for a batch of plays.
+
+    Args:
+        rows: Plays as tuples in PLAY_FIELDS order (e.g. PlayBatch.iter_rows())
+
+    Returns:
+        {"encoding", "track_count", "track_table", "plays"} to merge into an envelope
+    """
+    index: Dict[tuple, int] = {}
+    table: List[Dict] = []
+    plays: List[list] = []
+    for row in rows:
+        played_at, timestamp, track = row[0], row[1], tuple(row[2:])
+        position = index.get(track)
+        if position is None:
+            position = index[track] = len(table)
+            table.append(dict(zip(TRACK_FIELDS, track)))
+        play = [position, timestamp]
+        if played_at != format_played_at(timestamp):
+            play.append(played_at)
+        plays.append(play)
+    return {
+        'encoding': NORMALIZED_ENCODING,
+        'track_count': len(plays),
+        'track_table': table,
+        'plays': plays,
+    }
+
+
+def denormalize_plays(data: Dict) -> Iterator[Dict]:
+    """Flat play dicts (PLAY_FIELDS order) from a normalized/1 envelope."""
+    table = data.get('track_table', [])
+    for play in data.get('plays', []):
+        timestamp = play[1]
+        played_at = play[2] if len(play) > 2 else format_played_at(timestamp)
+        record = {'played_at': played_at, 'played_at_timestamp': timestamp}
+        record.update(table[play[0]])
+        yield record
+
+
+def envelope_records(data: Dict, records_field: str = 'tracks') -> Iterator[Dict]:
+    """
+    Records of a parsed json envelope, in the flat schema whatever the encoding.
+
+    Raises:
+        ValueError: If the envelope uses an encoding this version cannot read
+    """
+    encoding = data.get('encoding')
+    if encoding is None:
+        return iter(data.get(records_field, []))
+    if encoding == NORMALIZED_ENCODING:
+        return denormalize_plays(data)
+    raise ValueError(f"Unsupported raw encoding: {encoding}")
+
+
+def envelope_metadata(data: Dict) -> Dict:
+    """Batch metadata of a play envelope (fetched_at, user_id, ...)."""
+    return {k: v for k, v in data.items() if k not in _ENVELOPE_DATA_FIELDS}
+
+
+def iter_records(body: Union[bytes, IO[bytes]], output_format: str, records_field: str = 'tracks') -> Iterator[Dict]:
+    """
+    Yield records from a raw object in any format.
+
+    Args:
+        body: Object bytes or readable stream
+        output_format: One of FORMATS
+        records_field: Envelope array holding the records (json format only)
+
+    Yields:
+        Record dicts
+    """
+    if output_format == 'json':
+        data = json.loads(body if isinstance(body, (bytes, bytearray, str)) else body.read())
+        yield from envelope_records(data, records_field)
+    else:
+        yield from iter_ndjson(body, output_format)
@@ -0,0 +1,335 @@
+"""
+Storage backends for raw data and pipeline state.
+
+The pipeline reads and writes small keyed objects (raw batches, state,
+tokens). The same code runs against any of:
+
+    S3Storage      a bucket, through one pooled boto3 client per process
+    LocalStorage   a directory; keys map to relative paths (local runs)
+    MemoryStorage  a dict (tests and dry runs)
+
+Creating a boto3 client costs session setup, endpoint resolution and a new
+connection pool (so a new TLS handshake). shared_s3_client() creates it once
+per process and keeps it across warm Lambda invocations; every S3Storage
+without an explicit client uses it. Its API calls and uploaded bytes are
+counted as `s3_requests` and `bytes_written` in the running invocation's
+metrics (see metrics.py).
+
+State that several invocations update (read, change, write back) uses
+get_versioned() and put_bytes_if(): the write only succeeds if the object
+is still the version that was read, otherwise WriteConflict is raised and
+the caller merges and retries. S3 does this with ETags (IfMatch /
+IfNoneMatch on PutObject); the local backends compare content hashes.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10  # botocore's default max_pool_connections
+
+_s3_client = None
+_s3_pool_size = 0
+_s3_lock = threading.Lock()
+
+
+def shared_s3_client(pool_size: int = DEFAULT_POOL_SIZE):
+    """
+    Process-wide boto3 S3 client, created on first use and kept warm.
+
+    A later call asking for a bigger pool replaces the client with one
+    that fits; smaller requests reuse the existing one.
+
+    Args:
+        pool_size: Minimum max_pool_connections needed by the caller
+
+    Returns:
+        boto3 S3 client (thread-safe)
+    """
+    global _s3_client, _s3_pool_size
+    with _s3_lock:
+        if _s3_client is None or pool_size > _s3_pool_size:
+            import boto3
+            from botocore.config import Config
+            _s3_client = boto3.client('s3', config=Config(max_pool_connections=pool_size))
+            _register_metric_hooks(_s3_client)
+            _s3_pool_size = pool_size
+            logger.info(f"Created shared S3 client (pool size {pool_size})")
+        return _s3_client
+
+
+def _register_metric_hooks(client) -> None:
+    """Count requests and uploaded bytes through botocore's event hooks."""
+    if not hasattr(client, 'meta'):
+        return  # test doubles and stand-ins
+    client.meta.events.register('before-call.s3', _count_s3_request)
+    for operation in ('PutObject', 'UploadPart'):
+        client.meta.events.register(f'before-parameter-build.s3.{operation}', _count_bytes_written)
+
+
+def _count_s3_request(**kwargs) -> None:
+    metrics.count('s3_requests')
+
+
+def _count_bytes_written(params, **kwargs) -> None:
+    body = params.get('Body')
+    if isinstance(body, (bytes, bytearray, str)):
+        metrics.count('bytes_written', len(body))
+
+
+def reset_shared_s3_client() -> None:
+    """Drop the process-wide client (tests)."""
+    global _s3_client, _s3_pool_size
+    with _s3_lock:
+        _s3_client = None
+        _s3_pool_size = 0
+
+
+class WriteConflict(Exception):
+    """A conditional write found the object changed since it was read."""
+
+
+def _content_version(body: bytes) -> str:
+    return hashlib.md5(body).hexdigest()
+
+
+class StorageBackend:
+    """Keyed byte storage. Keys are '/'-separated, like S3 keys."""
+
+    _write_lock = threading.Lock()  # makes the local check-and-put atomic within a process
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """Object body, or None if the key does not exist."""
+        raise NotImplementedError
+
+    def put_bytes(self, key: str, body: bytes, content_type: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def open(self, key: str) -> Optional[IO[bytes]]:
+        """Readable binary stream of an object body, or None if the key does not exist."""
+        body = self.get_bytes(key)
+        return None if body is None else io.BytesIO(body)
+
+    def get_versioned(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """(body, version) of an object, or (None, None) if the key does not exist."""
+        body = self.get_bytes(key)
+        return (None, None) if body is None else (body, _content_version(body))
+
+    def put_bytes_if(
+        self, key: str, body: bytes, version: Optional[str], content_type: Optional[str] = None
+    ) -> str:
+        """
+        Write an object only if it is still at `version`.
+
+        Args:
+            version: From get_versioned (None: the key must not exist yet)
+
+        Returns:
+            Version of the written object
+
+        Raises:
+            WriteConflict: Another writer changed the object first
+        """
+        with self._write_lock:
+            _, current = self.get_versioned(key)
+            if current != version:
+                raise WriteConflict(f"{self.location(key)} changed since it was read")
+            self.put_bytes(key, body, content_type)
+            return _content_version(body.encode('utf-8') if isinstance(body, str) else bytes(body))
+
+    def list_keys(self, prefix: str = '', start_after: str = '') -> Iterator[str]:
+        """Keys starting with prefix that sort after start_after, in sorted order."""
+        raise NotImplementedError
+
+    def list_prefixes(self, prefix: str = '', delimiter: str = '/') -> List[str]:
+        """
+        Distinct key prefixes one level below prefix, like S3 CommonPrefixes.
+
+        'raw/' over 'raw/year=2025/...' and 'raw/user_id=u1/...' gives
+        ['raw/user_id=u1/', 'raw/year=2025/'].
+        """
+        children = set()
+        for key in self.list_keys(prefix):
+            rest = key[len(prefix):]
+            if delimiter in rest:
+                children.add(prefix + rest.split(delimiter, 1)[0] + delimiter)
+        return sorted(children)
+
+    def location(self, key: str) -> str:
+        """Human-readable location of a key (for logs and return values)."""
+        return key
+
+    def get_json(self, key: str) -> Optional[Dict]:
+        """Parsed JSON object, or None if the key does not exist."""
+        body = self.get_bytes(key)
+        return None if body is None else json.loads(body)
+
+    def put_json(self, key: str, data, indent: Optional[int] = 2) -> None:
+        body = json.dumps(data, indent=indent, ensure_ascii=False).encode('utf-8')
+        self.put_bytes(key, body, 'application/json')
+
+
+class S3Storage(StorageBackend):
+    """Objects in an S3 bucket."""
+
+    def __init__(self, bucket: str, client=None, pool_size: int = DEFAULT_POOL_SIZE):
+        """
+        Initialize S3 storage.
+
+        Args:
+            bucket: S3 bucket name
+            client: boto3 S3 client (process-wide pooled client if None)
+            pool_size: Connections the caller needs when using the shared client
+        """
+        self.bucket = bucket
+        self._client = client
+        self._pool_size = pool_size
+
+    @property
+    def client(self):
+        """The boto3 client (resolved lazily, so import stays light)."""
+        if self._client is None:
+            self._client = shared_s3_client(self._pool_size)
+        return self._client
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchKey':
+                return None
+            raise
+
+    def open(self, key: str) -> Optional[IO[bytes]]:
+        """The S3 StreamingBody itself, so large objects are read as they arrive."""
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchKey':
+                return None
+            raise
+
+    def put_bytes(self, key: str, body: bytes, content_type: Optional[str] = None) -> None:
+        params = {'Bucket': self.bucket, 'Key': key, 'Body': body}
+        if content_type:
+            params['ContentType'] = content_type
+        self.client.put_object(**params)
+
+    def get_versioned(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Body and ETag."""
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchKey':
+                return None, None
+            raise
+        return response['Body'].read(), response['ETag']
+
+    def put_bytes_if(
+        self, key: str, body: bytes, version: Optional[str], content_type: Optional[str] = None
+    ) -> str:
+        """Conditional PutObject: IfMatch the read ETag, or IfNoneMatch '*' for a new key."""
+        from botocore.exceptions import ClientError
+
+        params = {'Bucket': self.bucket, 'Key': key, 'Body': body}
+        if content_type:
+            params['ContentType'] = content_type
+        if version is None:
+            params['IfNoneMatch'] = '*'
+        else:
+            params['IfMatch'] = version
+        try:
+            return self.client.put_object(**params)['ETag']
+        except ClientError as e:
+            # 412 when the ETag moved on, 409 when a concurrent conditional write is in flight
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                raise WriteConflict(f"{self.location(key)} changed since it was read") from e
+            raise
+
+    def list_keys(self, prefix: str = '', start_after: str = '') -> Iterator[str]:
+        params = {'Bucket': self.bucket, 'Prefix': prefix}
+        if start_after:
+            params['StartAfter'] = start_after
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(**params):
+            for obj in page.get('Contents', []):
+                yield obj['Key']
+
+    def list_prefixes(self, prefix: str = '', delimiter: str = '/') -> List[str]:
+        """One delimited listing instead of walking every key."""
+        children = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter=delimiter):
+            children.extend(common['Prefix'] for common in page.get('CommonPrefixes', []))
+        return children
+
+    def location(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+
+class LocalStorage(StorageBackend):
+    """Files under a root directory (keys are relative paths)."""
+
+    def __init__(self, root: str = 'data'):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def put_bytes(self, key: str, body: bytes, content_type: Optional[str] = None) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body.encode('utf-8') if isinstance(body, str) else body)
+
+    def list_keys(self, prefix: str = '', start_after: str = '') -> Iterator[str]:
+        keys = []
+        for directory, _, files in os.walk(self.root):
+            relative = os.path.relpath(directory, self.root).replace(os.sep, '/')
+            for name in files:
+                key = name if relative == '.' else f"{relative}/{name}"
+                if key.startswith(prefix) and key > start_after:
+                    keys.append(key)
+        return iter(sorted(keys))
+
+    def location(self, key: str) -> str:
+        return self._path(key)
+
+
+class MemoryStorage(StorageBackend):
+    """Objects in a dict (tests and dry runs)."""
+
+    def __init__(self, objects: Optional[Dict[str, bytes]] = None):
+        self.objects: Dict[str, bytes] = dict(objects or {})
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        return self.objects.get(key)
+
+    def put_bytes(self, key: str, body: bytes, content_type: Optional[str] = None) -> None:
+        self.objects[key] = body.encode('utf-8') if isinstance(body, str) else bytes(body)
+
+    def list_keys(self, prefix: str = '', start_after: str = '') -> Iterator[str]:
+        return iter(sorted(k for k in self.objects if k.startswith(prefix) and k > start_after))
+
+    def location(self, key: str) -> str:
+        return f"memory://{key}"
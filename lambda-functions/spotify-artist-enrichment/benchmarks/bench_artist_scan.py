@@ -0,0 +1,101 @@
+"""
+Benchmark: sequential full-parse scan vs the concurrent streaming scanner.
+
+Builds N small raw play files (50 plays each, like one ingestion run) in an
+in-memory bucket whose GETs sleep for --latency-ms to mimic S3 round-trips,
+then extracts artist IDs both ways and reports objects/s and MB/s.
+
+Usage: python benchmarks/bench_artist_scan.py [--files 10000] [--latency-ms 15] [--workers 16]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+sys.path.insert(0, os.path.join(HERE, '..', '..', 'shared'))
+
+from artist_scan import scan_artist_ids  # noqa: E402
+from storage import S3Storage  # noqa: E402
+
+
+class SlowS3:
+    """Dict-backed bucket with a fixed per-GET latency."""
+
+    def __init__(self, objects, latency):
+        self.objects = objects
+        self.latency = latency
+
+    def get_object(self, Bucket, Key):
+        time.sleep(self.latency)
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+
+def make_files(count):
+    objects = {}
+    for f in range(count):
+        tracks = [{
+            'played_at': '2025-12-22T09:00:51.968Z',
+            'played_at_timestamp': 1766394051968,
+            'track_id': f"track{(f * 50 + i) % 5000:018d}",
+            'track_name': f"Track {i}",
+            'artist_id': f"artist{(f * 7 + i) % 1500:016d}",
+            'artist_name': f"Artist {i}",
+            'album_id': f"album{i:017d}",
+            'album_name': f"Album {i}",
+            'release_date': '2020-01-01',
+            'duration_ms': 200000,
+            'popularity': 50,
+        } for i in range(50)]
+        key = f"raw/year=2025/month=12/day=22/spotify_plays_{f:06d}.json"
+        objects[key] = json.dumps({'fetched_at': '2025-12-22T09:00:00Z', 'track_count': 50, 'tracks': tracks}, indent=2).encode()
+    return objects
+
+
+def sequential(s3, keys):
+    """What get_unique_artists did before: one GET, read(), json.loads at a time."""
+    ids = set()
+    for key in keys:
+        data = json.loads(s3.get_object(Bucket='b', Key=key)['Body'].read())
+        for track in data.get('tracks', []):
+            if track.get('artist_id'):
+                ids.add(track['artist_id'])
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=10000)
+    parser.add_argument('--latency-ms', type=float, default=15.0)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--skip-sequential', action='store_true')
+    args = parser.parse_args()
+
+    objects = make_files(args.files)
+    total_mb = sum(map(len, objects.values())) / 1e6
+    s3 = SlowS3(objects, args.latency_ms / 1000)
+    keys = sorted(objects)
+    print(f"{args.files} files, {total_mb:.1f} MB, {args.latency_ms:.0f} ms per GET")
+
+    if not args.skip_sequential:
+        started = time.perf_counter()
+        expected = sequential(s3, keys)
+        elapsed = time.perf_counter() - started
+        print(f"sequential:  {elapsed:7.2f}s  {len(keys) / elapsed:8.0f} objects/s  {total_mb / elapsed:6.2f} MB/s")
+    else:
+        expected = None
+
+    ids, stats = scan_artist_ids(S3Storage('b', client=s3), ((k, 'json') for k in keys), max_workers=args.workers)
+    print(
+        f"concurrent:  {stats.seconds:7.2f}s  {stats.objects_per_second:8.0f} objects/s  "
+        f"{stats.mb_per_second:6.2f} MB/s  ({args.workers} workers)"
+    )
+    if expected is not None:
+        assert ids == expected, "scanners disagree"
+
+
+if __name__ == '__main__':
+    main()
@@ -4,15 +4,25 @@ Extends SpotifyClient functionality for artist-specific operations.
 """
 import os
 import logging
-from typing import Dict, List, Set
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
 from datetime import datetime, timezone
 
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+from auth_cache import get_spotify
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Spotify's max IDs per /artists request
+BATCH_SIZE = 50
+# Attempts per 50-ID batch before its IDs are reported as unresolved
+MAX_BATCH_ATTEMPTS = 3
+# Client errors that mean an ID is invalid; other 4xx (401, 403) are account or token problems
+PERMANENT_STATUSES = (400, 404)
+# Concurrent batch requests (all share one rate limiter)
+MAX_CONCURRENT_BATCHES = int(os.getenv('ARTIST_FETCH_WORKERS', '4'))
+
 
 class SpotifyArtistClient:
     """Handle Spotify Artist API operations."""
@@ -32,96 +42,122 @@ class SpotifyArtistClient:
             raise ValueError("Missing Spotify credentials")
         
         self.sp = None
+        self.unresolved_ids: List[str] = []  # failed on errors a later attempt may not hit
+        self.rejected_ids: List[str] = []    # Spotify has no artist for these (null result or 400/404)
+        self.retry_backoff = 1.0  # seconds, multiplied by the attempt number
         logger.info("SpotifyArtistClient initialized")
     
     def authenticate(self) -> None:
-        """Authenticate with Spotify (reuses token from ingestion Lambda)."""
-        is_lambda = 'AWS_EXECUTION_ENV' in os.environ
-        
-        if is_lambda:
-            cache_path = '/tmp/.spotify_cache'
-            try:
-                import boto3
-                s3 = boto3.client('s3')
-                bucket = os.getenv('S3_BUCKET')
-                s3.download_file(bucket, 'secrets/spotify_token', cache_path)
-                logger.info("Downloaded Spotify token from S3")
-            except Exception as e:
-                logger.error(f"Failed to download token: {str(e)}")
-                raise
-            open_browser = False
-        else:
-            cache_path = ".spotify_cache"
-            open_browser = True
+        """
+        Authenticate with Spotify (reuses token from ingestion Lambda).
         
+        Warm invocations reuse the cached client and skip the S3 token
+        download and validation call while the token is valid.
+        """
         try:
-            auth_manager = SpotifyOAuth(
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-                redirect_uri=self.redirect_uri,
-                scope="user-read-recently-played",
-                cache_path=cache_path,
-                open_browser=open_browser
-            )
-            
-            self.sp = spotipy.Spotify(auth_manager=auth_manager)
-            user = self.sp.current_user()
-            logger.info(f"Authenticated as: {user['display_name']}")
-            
-            # Upload refreshed token if in Lambda
-            if is_lambda:
-                try:
-                    s3.upload_file(cache_path, bucket, 'secrets/spotify_token')
-                    logger.info("Uploaded refreshed token to S3")
-                except Exception as e:
-                    logger.error(f"Failed to upload token: {str(e)}")
+            self.sp = get_spotify(self.client_id, self.client_secret, self.redirect_uri)
+            logger.info("Authenticated with Spotify")
         
         except Exception as e:
             logger.error(f"Authentication failed: {str(e)}")
             raise
     
-    def get_artists(self, artist_ids: List[str]) -> List[Dict]:
+    def get_artists(self, artist_ids: List[str], max_workers: int = MAX_CONCURRENT_BATCHES) -> List[Dict]:
         """
-        Fetch artist details in batches.
+        Fetch artist details in concurrent batches.
         
-        Spotify allows max 50 artists per request.
+        Spotify allows max 50 artists per request. IDs are deduplicated and
+        sorted first, so batch composition and result order are the same on
+        every run regardless of which batch finishes first. Up to
+        `max_workers` batches are in flight; all of them draw from the shared
+        rate limiter, so concurrency never exceeds the request rate. Each
+        batch is retried up to MAX_BATCH_ATTEMPTS times on transient errors;
+        IDs that still fail are left in `self.unresolved_ids`. IDs Spotify
+        does not know (null results, or a 400/404 narrowed down to them by
+        splitting the batch) are left in `self.rejected_ids`: retrying them
+        will not help.
         
         Args:
             artist_ids: List of Spotify artist IDs
+            max_workers: Concurrent batch requests
             
         Returns:
-            List of artist detail dictionaries
+            List of artist detail dictionaries, ordered by artist ID
         """
         if not self.sp:
             raise ValueError("Not authenticated")
         
+        ids = sorted(set(artist_ids))
+        batches = [ids[i:i + BATCH_SIZE] for i in range(0, len(ids), BATCH_SIZE)]
+        
+        workers = max(1, min(max_workers, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(self._fetch_batch, batches))
+        
         all_artists = []
-        batch_size = 50
+        self.unresolved_ids = []
+        self.rejected_ids = []
+        for artists, unresolved, rejected in results:
+            all_artists.extend(artists)
+            self.unresolved_ids.extend(unresolved)
+            self.rejected_ids.extend(rejected)
         
-        for i in range(0, len(artist_ids), batch_size):
-            batch = artist_ids[i:i + batch_size]
-            logger.info(f"Fetching artists batch {i//batch_size + 1}: {len(batch)} artists")
-            
+        if self.unresolved_ids:
+            logger.error(f"{len(self.unresolved_ids)} artists unresolved: {self.unresolved_ids}")
+        if self.rejected_ids:
+            logger.warning(f"{len(self.rejected_ids)} artist IDs unknown to Spotify: {self.rejected_ids}")
+        
+        logger.info(f"Fetched details for {len(all_artists)} artists in {len(batches)} batches")
+        return all_artists
+    
+    def _fetch_batch(self, batch: List[str]) -> Tuple[List[Dict], List[str], List[str]]:
+        """
+        Fetch one batch with per-batch retries.
+        
+        A 400/404 for the whole batch usually means one malformed ID, so the
+        batch is split in halves until the invalid IDs are isolated and the
+        rest are fetched.
+        
+        Returns:
+            (artist dicts, IDs left unresolved, IDs rejected as unknown)
+        """
+        for attempt in range(1, MAX_BATCH_ATTEMPTS + 1):
+            logger.info(f"Fetching artists batch: {len(batch)} artists (attempt {attempt})")
             try:
                 results = self.sp.artists(batch)
-                
-                for artist in results['artists']:
-                    if artist:  # API can return None for invalid IDs
-                        artist_data = {
-                            'artist_id': artist['id'],
-                            'artist_name': artist['name'],
-                            'genres': artist.get('genres', []),
-                            'followers': artist['followers']['total'],
-                            'popularity': artist['popularity'],
-                            'image_url': artist['images'][0]['url'] if artist['images'] else None,
-                            'fetched_at': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-                        }
-                        all_artists.append(artist_data)
-                
+                break
             except Exception as e:
-                logger.error(f"Failed to fetch batch: {str(e)}")
-                # Continue with other batches even if one fails
-                continue
+                # 4xx (other than 429, which the rate limiter already waited out) won't succeed on retry
+                status = getattr(e, 'http_status', None)
+                if status in PERMANENT_STATUSES:
+                    if len(batch) == 1:
+                        logger.warning(f"Artist rejected ({status}): {batch[0]}")
+                        return [], [], list(batch)
+                    half = len(batch) // 2
+                    left, right = self._fetch_batch(batch[:half]), self._fetch_batch(batch[half:])
+                    return left[0] + right[0], left[1] + right[1], left[2] + right[2]
+                if status is not None and 400 <= status < 500 and status != 429:
+                    logger.error(f"Batch rejected ({status}): {str(e)}")
+                    return [], list(batch), []
+                if attempt == MAX_BATCH_ATTEMPTS:
+                    logger.error(f"Batch failed after {attempt} attempts: {str(e)}")
+                    return [], list(batch), []
+                logger.warning(f"Batch failed, retrying: {str(e)}")
+                time.sleep(self.retry_backoff * attempt)
         
-        logger.info(f"Fetched details for {len(all_artists)} artists")
-        return all_artists
+        fetched_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        artists = []
+        returned = set()
+        for artist in results['artists']:
+            if artist:  # API can return None for invalid IDs
+                artists.append({
+                    'artist_id': artist['id'],
+                    'artist_name': artist['name'],
+                    'genres': artist.get('genres', []),
+                    'followers': artist['followers']['total'],
+                    'popularity': artist['popularity'],
+                    'image_url': artist['images'][0]['url'] if artist['images'] else None,
+                    'fetched_at': fetched_at
+                })
+                returned.add(artist['id'])
+        return artists, [], [artist_id for artist_id in batch if artist_id not in returned]
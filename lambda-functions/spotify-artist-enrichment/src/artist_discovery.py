@@ -0,0 +1,101 @@
+"""
+Incremental discovery of artist IDs from raw play objects.
+
+Instead of listing and reading every object under raw/ on each run, the
+enrichment Lambda keeps two small objects in its storage backend:
+
+    state/artist_discovery/checkpoint.json    last key read per raw root and
+                                               last backfill manifest read
+    state/artist_discovery/artist_ids.txt.gz  every artist ID seen so far
+                                               (sorted, one per line, gzip)
+
+Each run lists raw/ after the checkpoint and reads only objects written
+since the last run, plus keys announced in new backfill manifests (history
+imports into past partitions; see raw_checkpoint.py).
+"""
+import gzip
+import logging
+from typing import Dict, Iterable, List, Set, Tuple
+
+from artist_scan import DEFAULT_MAX_WORKERS, scan_artist_ids
+from raw_checkpoint import (
+    ARTIST_DISCOVERY_CHECKPOINT,
+    CheckpointCursor,
+    empty_checkpoint,
+    iter_new_raw_keys,
+    load_checkpoint,
+    pending_backfills,
+    save_checkpoint,
+)
+from raw_format import format_for_key
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = ARTIST_DISCOVERY_CHECKPOINT
+ARTIST_IDS_KEY = "state/artist_discovery/artist_ids.txt.gz"
+
+
+def load_artist_ids(storage, key: str = ARTIST_IDS_KEY) -> Set[str]:
+    """Accumulated artist ID set (empty on the first run)."""
+    body = storage.get_bytes(key)
+    if not body:
+        return set()
+    return set(gzip.decompress(body).decode('ascii').split())
+
+
+def save_artist_ids(storage, artist_ids: Iterable[str], key: str = ARTIST_IDS_KEY) -> None:
+    """Store the artist ID set sorted and gzipped (~12 bytes per ID)."""
+    body = gzip.compress(('\n'.join(sorted(artist_ids)) + '\n').encode('ascii'))
+    storage.put_bytes(key, body, 'application/gzip')
+
+
+def discover_artists(
+    storage, full_rescan: bool = False, max_workers: int = DEFAULT_MAX_WORKERS
+) -> Tuple[Set[str], Set[str], Dict]:
+    """
+    Update the accumulated artist ID set from raw objects written since the last run.
+
+    Args:
+        storage: StorageBackend holding raw/ and state/
+        full_rescan: Ignore the checkpoint and re-read every raw object
+        max_workers: Concurrent object fetches (see artist_scan.py)
+
+    Returns:
+        (all known artist IDs, IDs first seen in this run, stats dict)
+    """
+    checkpoint = empty_checkpoint() if full_rescan else load_checkpoint(storage, CHECKPOINT_KEY)
+    known = set() if full_rescan else load_artist_ids(storage)
+    backfills = pending_backfills(storage, checkpoint)
+
+    listed: List[Tuple[str, str]] = []  # (root or backfill manifest, key) in listing order
+
+    def listed_keys():
+        for stream, key in iter_new_raw_keys(storage, checkpoint, backfills):
+            listed.append((stream, key))
+            yield key, format_for_key(key)
+
+    discovered, scan = scan_artist_ids(storage, listed_keys(), max_workers)
+
+    # Objects finish out of order; the checkpoint only moves once the scan is done
+    failed = set(scan.failed_keys)
+    cursor = CheckpointCursor(checkpoint, backfills)
+    for stream, key in listed:
+        cursor.advance(stream, key, key not in failed)
+
+    new_ids = discovered - known
+    all_ids = known | discovered
+
+    # ID set first: a crash before the checkpoint only means re-reading
+    if new_ids or full_rescan:
+        save_artist_ids(storage, all_ids)
+    save_checkpoint(storage, cursor.checkpoint, CHECKPOINT_KEY)
+
+    stats = {
+        'files_scanned': scan.objects,
+        'files_failed': scan.failed,
+        'new_artists': len(new_ids),
+        'total_artists': len(all_ids),
+        'scan': scan.as_dict(),
+    }
+    logger.info(f"Discovery: {len(new_ids)} new artists, {len(all_ids)} total")
+    return all_ids, new_ids, stats
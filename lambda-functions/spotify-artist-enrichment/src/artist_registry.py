@@ -0,0 +1,206 @@
+"""
+Persistent registry of enriched artists.
+
+One compact keyed file (gzip JSON) maps each artist ID to when it was last
+fetched, a hash of its attributes and its popularity:
+
+    {"6qqNVTkY8uBg9cP3Jd7DAH": [1766394051, "9f2c51e0a4b3d7e1", 98], ...}
+
+Enrichment uses it to request only new artists plus stale ones (older than
+the TTL), capped by a refresh budget that goes to the most popular stale
+artists first. Fetched artists whose hash is unchanged are not written out
+again; only their last-fetched time moves. IDs Spotify does not know are
+registered without a hash, so they are not requested again before the TTL.
+
+Stored through a storage backend (state/artist_registry.json.gz) or, for
+local runs, a file. The scheduled run and concurrent SQS invocations all
+update the same object, so save_to() is a conditional write against the
+version load_from() read; on a conflict it reloads, re-applies the entries
+this instance recorded and tries again.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from storage import WriteConflict
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_KEY = "state/artist_registry.json.gz"
+DEFAULT_TTL_DAYS = float(os.environ.get('ARTIST_TTL_DAYS', '30'))
+# Max stale artists refreshed per run (None: no cap)
+DEFAULT_REFRESH_BUDGET = int(os.environ['ARTIST_REFRESH_BUDGET']) if os.environ.get('ARTIST_REFRESH_BUDGET') else None
+
+# Conditional save attempts before a conflict is raised
+SAVE_ATTEMPTS = 5
+
+# Per-run fields that are not artist attributes
+_VOLATILE_FIELDS = ('fetched_at',)
+
+
+def content_hash(artist: Dict) -> str:
+    """Stable hash of an artist's attributes (fetch time excluded)."""
+    attributes = {k: v for k, v in artist.items() if k not in _VOLATILE_FIELDS}
+    encoded = json.dumps(attributes, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+def _epoch(now: Optional[datetime]) -> int:
+    return int((now or datetime.now(timezone.utc)).timestamp())
+
+
+class ArtistRegistry:
+    """Artist ID → (last fetched epoch seconds, content hash, popularity)."""
+
+    def __init__(self, entries: Optional[Dict[str, List]] = None, version: Optional[str] = None):
+        self.entries: Dict[str, List] = entries or {}
+        self.version = version  # storage version this was loaded from (None: not stored yet)
+        self._recorded: Dict[str, List] = {}  # entries set since loading, re-applied on conflicts
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, artist_id: str) -> bool:
+        return artist_id in self.entries
+
+    # Persistence
+
+    def to_bytes(self) -> bytes:
+        return gzip.compress(json.dumps(self.entries, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> 'ArtistRegistry':
+        return cls(json.loads(gzip.decompress(body)))
+
+    @classmethod
+    def load_from(cls, storage, key: str = REGISTRY_KEY) -> 'ArtistRegistry':
+        """Load the registry from a storage backend (empty if it does not exist yet)."""
+        body, version = storage.get_versioned(key)
+        if body is None:
+            logger.info("No artist registry found - every artist is new")
+            return cls()
+        registry = cls.from_bytes(body)
+        registry.version = version
+        logger.info(f"Loaded artist registry: {len(registry)} artists")
+        return registry
+
+    def save_to(self, storage, key: str = REGISTRY_KEY, attempts: int = SAVE_ATTEMPTS) -> None:
+        """
+        Save only if nobody else saved since this registry was loaded.
+
+        On a conflict the stored registry is reloaded and this instance's
+        recorded entries are applied on top (the later fetch wins per artist).
+
+        Raises:
+            WriteConflict: Still conflicting after `attempts` tries
+        """
+        for attempt in range(1, attempts + 1):
+            try:
+                self.version = storage.put_bytes_if(key, self.to_bytes(), self.version, 'application/gzip')
+                break
+            except WriteConflict:
+                if attempt == attempts:
+                    raise
+                logger.warning(f"Artist registry changed since it was loaded - merging (attempt {attempt})")
+                self._merge_stored(storage, key)
+        logger.info(f"Saved artist registry ({len(self)} artists) to {storage.location(key)}")
+
+    def _merge_stored(self, storage, key: str) -> None:
+        """Replace entries with the stored registry plus what this instance recorded."""
+        stored = ArtistRegistry.load_from(storage, key)
+        for artist_id, entry in self._recorded.items():
+            current = stored.entries.get(artist_id)
+            if current is None or current[0] <= entry[0]:
+                stored.entries[artist_id] = entry
+        self.entries = stored.entries
+        self.version = stored.version
+
+    @classmethod
+    def load(cls, path: str) -> 'ArtistRegistry':
+        """Load from a local file (local runs and tests)."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    # Policy
+
+    def select_for_refresh(
+        self,
+        artist_ids: Iterable[str],
+        ttl_days: float = DEFAULT_TTL_DAYS,
+        refresh_budget: Optional[int] = DEFAULT_REFRESH_BUDGET,
+        now: Optional[datetime] = None,
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Choose which artists to fetch this run.
+
+        Args:
+            artist_ids: Every known artist ID
+            ttl_days: Artists fetched longer ago than this are stale
+            refresh_budget: Max stale artists to refetch (most popular first)
+            now: Current time (for tests)
+
+        Returns:
+            (new artist IDs, stale artist IDs chosen for refresh), each sorted
+        """
+        cutoff = _epoch(now) - ttl_days * 86400
+        new, stale = [], []
+        for artist_id in artist_ids:
+            entry = self.entries.get(artist_id)
+            if entry is None:
+                new.append(artist_id)
+            elif entry[0] <= cutoff:
+                stale.append(artist_id)
+
+        # Popular artists change more (followers, images): refresh them first, oldest first on ties
+        stale.sort(key=lambda a: (-(self.entries[a][2] or 0), self.entries[a][0], a))
+        if refresh_budget is not None:
+            stale = stale[:refresh_budget]
+        return sorted(new), sorted(stale)
+
+    def record(self, artists: Iterable[Dict], now: Optional[datetime] = None) -> List[Dict]:
+        """
+        Register fetched artists.
+
+        Args:
+            artists: Artist dicts from SpotifyArtistClient.get_artists
+            now: Fetch time (for tests)
+
+        Returns:
+            Artists that are new or whose attributes changed (the ones to write)
+        """
+        fetched = _epoch(now)
+        changed = []
+        for artist in artists:
+            digest = content_hash(artist)
+            entry = self.entries.get(artist['artist_id'])
+            if entry is None or entry[1] != digest:
+                changed.append(artist)
+            self._set(artist['artist_id'], [fetched, digest, artist.get('popularity')])
+        return changed
+
+    def record_missing(self, artist_ids: Iterable[str], now: Optional[datetime] = None) -> None:
+        """
+        Register IDs Spotify has no artist for, so they count as fetched until the TTL.
+
+        An ID already known keeps its hash and popularity (the artist may
+        come back); only its fetch time moves.
+        """
+        fetched = _epoch(now)
+        for artist_id in artist_ids:
+            entry = self.entries.get(artist_id)
+            self._set(artist_id, [fetched, entry[1], entry[2]] if entry else [fetched, None, None])
+
+    def _set(self, artist_id: str, entry: List) -> None:
+        self.entries[artist_id] = entry
+        self._recorded[artist_id] = entry
@@ -4,26 +4,58 @@ Fetches artist details for all unique artists found in plays data.
 """
 import os
 import json
-import boto3
 from datetime import datetime, timezone
-from botocore.exceptions import ClientError
+from uuid import uuid4
 
+import api_telemetry
+import metrics
 from artist_client import SpotifyArtistClient
+from artist_queue import coalesce, decode_message
+from artist_discovery import discover_artists
+from artist_registry import DEFAULT_REFRESH_BUDGET, DEFAULT_TTL_DAYS, ArtistRegistry
+from artist_scan import DEFAULT_MAX_WORKERS as SCAN_MAX_WORKERS
+from profiling import profiled
+from raw_format import NDJSON_CONTENT_TYPE, encode_ndjson, resolve_format
+from storage import S3Storage
 
 BUCKET_NAME = os.environ.get('S3_BUCKET', 'spotify-pipeline-ivan-1766559048')
+# One pooled connection per scan worker; the client is created on first use and kept warm
+STORAGE = S3Storage(BUCKET_NAME, pool_size=SCAN_MAX_WORKERS)
 
 
+@profiled('artist-enrichment', lambda: STORAGE)
 def lambda_handler(event, context):
-    """Lambda entry point."""
+    """
+    Lambda entry point.
+    
+    Pass {"full_rescan": true} to rebuild the artist set from all raw objects.
+    {"ttl_days": N, "refresh_budget": M} override the staleness policy.
+    Every run emits one EMF metrics line (stage timings and counters,
+    see metrics.py) when it finishes. {"profile": "cpu"|"memory"|"all"}
+    (or the PROFILE variable) stores a profile of the run (see profiling.py).
+    """
+    event = event or {}
+    if 'Records' in event:
+        with metrics.invocation('artist-enrichment', mode='events'), api_telemetry.invocation():
+            return artist_events_handler(event)
+    
+    with metrics.invocation('artist-enrichment', mode='scheduled'), api_telemetry.invocation():
+        return enrich_handler(event)
+
+
+def enrich_handler(event):
+    """Scheduled run: discover artists in plays data and refresh new or stale ones."""
     print("Starting artist enrichment...")
     
     try:
-        s3 = boto3.client('s3')
         spotify = SpotifyArtistClient()
-        spotify.authenticate()
+        with metrics.span('auth'):
+            spotify.authenticate()
         
         print("Extracting unique artists from plays data...")
-        artist_ids = get_unique_artists_from_s3(s3, BUCKET_NAME)
+        with metrics.span('discover'):
+            artist_ids = get_unique_artists(STORAGE, full_rescan=bool(event.get('full_rescan')))
+        metrics.count('artists_found', len(artist_ids))
         
         if not artist_ids:
             print("No artists found in plays data")
@@ -31,93 +63,197 @@ def lambda_handler(event, context):
         
         print(f"Found {len(artist_ids)} unique artists")
         
+        with metrics.span('registry_load'):
+            registry = ArtistRegistry.load_from(STORAGE)
+        new_ids, stale_ids = registry.select_for_refresh(
+            artist_ids,
+            ttl_days=float(event.get('ttl_days', DEFAULT_TTL_DAYS)),
+            refresh_budget=event.get('refresh_budget', DEFAULT_REFRESH_BUDGET),
+        )
+        to_fetch = new_ids + stale_ids
+        print(f"{len(new_ids)} new and {len(stale_ids)} stale artists to fetch")
+        
+        if not to_fetch:
+            print("All artists are fresh")
+            return {'statusCode': 200, 'body': 'No artists to refresh'}
+        
         print("Fetching artist details from Spotify API...")
-        artists = spotify.get_artists(list(artist_ids))
+        with metrics.span('fetch'):
+            artists = spotify.get_artists(to_fetch)
+        metrics.count('artists_fetched', len(artists))
         
-        if not artists:
+        if not artists and not spotify.rejected_ids:
             print("No artist data fetched")
             return {'statusCode': 200, 'body': 'No artist data retrieved'}
         
         print(f"Fetched details for {len(artists)} artists")
         
-        print("Saving artist data to S3...")
-        s3_key = save_artists_to_s3(s3, BUCKET_NAME, artists)
+        # Only new or changed artists are written; unchanged ones just get a new fetch time
+        changed = registry.record(artists)
+        registry.record_missing(spotify.rejected_ids)
+        print(f"{len(changed)} artists new or changed, {len(artists) - len(changed)} unchanged")
+        
+        if changed:
+            print("Saving artist data...")
+            with metrics.span('save'):
+                key = write_artists(STORAGE, changed)
+            print(f"✅ Successfully saved to: {STORAGE.location(key)}")
+        metrics.count('artists_changed', len(changed))
         
-        print(f"✅ Successfully saved to: s3://{BUCKET_NAME}/{s3_key}")
+        with metrics.span('registry_save'):
+            registry.save_to(STORAGE)
         
-        return {'statusCode': 200, 'body': f'Processed {len(artists)} artists'}
+        return {'statusCode': 200, 'body': f'Processed {len(artists)} artists ({len(changed)} changed)'}
         
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         raise
 
 
-def get_unique_artists_from_s3(s3, bucket: str) -> set:
-    """Extract unique artist IDs from all plays files."""
-    artist_ids = set()
+def artist_events_handler(event, storage=None, spotify=None):
+    """
+    SQS trigger: enrich artists announced by ingestion.
     
-    try:
-        paginator = s3.get_paginator('list_objects_v2')
-        pages = paginator.paginate(Bucket=bucket, Prefix='raw/')
-        
-        file_count = 0
-        for page in pages:
-            if 'Contents' not in page:
-                continue
-            
-            for obj in page['Contents']:
-                key = obj['Key']
-                
-                if not key.endswith('.json'):
-                    continue
-                
-                try:
-                    response = s3.get_object(Bucket=bucket, Key=key)
-                    data = json.loads(response['Body'].read())
-                    
-                    for track in data.get('tracks', []):
-                        artist_id = track.get('artist_id')
-                        if artist_id:
-                            artist_ids.add(artist_id)
-                    
-                    file_count += 1
-                    
-                except Exception as e:
-                    print(f"Warning: Failed to process {key}: {str(e)}")
-                    continue
-        
-        print(f"Scanned {file_count} play files")
-        
-    except ClientError as e:
-        print(f"Error reading from S3: {str(e)}")
-        raise
+    The event source mapping micro-batches messages (BatchSize and
+    MaximumBatchingWindowInSeconds), so one invocation sees the IDs from many
+    ingestion runs and fetches them in full 50-ID requests. Messages with
+    an artist that failed on a retryable error are returned as
+    batchItemFailures and redelivered. IDs Spotify does not know (null
+    results, 400/404) are registered as missing and their messages deleted
+    like the rest: redelivering them would only fail again until the
+    queue's redrive policy moved them to the dead-letter queue.
+    """
+    records = event.get('Records', [])
+    messages = [(r['messageId'], decode_message(r['body'])) for r in records]
+    artist_ids = set().union(*(ids for _, ids in messages))
+    print(f"Received {len(artist_ids)} artist IDs in {len(records)} messages")
+    
+    unresolved = enrich_artist_ids(artist_ids, storage=storage, spotify=spotify)
+    failures = [{'itemIdentifier': message_id} for message_id in _messages_to_retry(messages, unresolved)]
+    return {'batchItemFailures': failures}
+
+
+def _messages_to_retry(messages, unresolved: set) -> list:
+    """Handles (message IDs or receipts) of messages with an unresolved artist."""
+    return [handle for handle, ids in messages if unresolved.intersection(ids)]
+
+
+def drain_artist_queue(queue, storage=None, spotify=None, max_wait: float = 2.0) -> int:
+    """
+    Local consumer: enrich coalesced batches until the queue is empty.
     
+    Each round waits up to max_wait seconds for 50 IDs. Messages are deleted
+    only after their batch is saved; as in artist_events_handler, messages
+    with an artist that failed on a retryable error are left undeleted so
+    the queue redelivers them.
+    
+    Returns:
+        Number of artist IDs processed
+    """
+    processed = 0
+    while True:
+        artist_ids, messages = coalesce(queue, max_wait=max_wait)
+        if not messages:
+            return processed
+        unresolved = enrich_artist_ids(artist_ids, storage=storage, spotify=spotify)
+        retry = set(_messages_to_retry(messages, unresolved))
+        queue.delete([receipt for receipt, _ in messages if receipt not in retry])
+        processed += len(artist_ids) - len(unresolved)
+
+
+def enrich_artist_ids(artist_ids, storage=None, spotify=None) -> set:
+    """
+    Fetch and save the given artists if the registry does not have them yet.
+    
+    Stale artists are left to the scheduled run, which applies the refresh
+    budget.
+    
+    Args:
+        artist_ids: Announced artist IDs
+        storage: StorageBackend (the Lambda's S3Storage if None)
+        spotify: Authenticated SpotifyArtistClient (created on first use if None)
+    
+    Returns:
+        Artist IDs that failed on a retryable error (IDs Spotify does not
+        know are registered as missing, not returned)
+    """
+    storage = storage or STORAGE
+    
+    with metrics.span('registry_load'):
+        registry = ArtistRegistry.load_from(storage)
+    new_ids, _ = registry.select_for_refresh(artist_ids, refresh_budget=0)
+    if not new_ids:
+        print("All announced artists are already enriched")
+        return set()
+    
+    if spotify is None:
+        spotify = SpotifyArtistClient()
+        with metrics.span('auth'):
+            spotify.authenticate()
+    
+    with metrics.span('fetch'):
+        artists = spotify.get_artists(new_ids)
+    metrics.count('artists_fetched', len(artists))
+    metrics.count('artists_rejected', len(spotify.rejected_ids))
+    changed = registry.record(artists)
+    registry.record_missing(spotify.rejected_ids)
+    if changed:
+        with metrics.span('save'):
+            key = write_artists(storage, changed)
+        print(f"✅ Saved {len(changed)} new artists to {storage.location(key)}")
+    metrics.count('artists_changed', len(changed))
+    with metrics.span('registry_save'):
+        registry.save_to(storage)
+    return set(spotify.unresolved_ids)
+
+
+def get_unique_artists(storage, full_rescan: bool = False) -> set:
+    """
+    Return every artist ID seen in plays data.
+    
+    Only raw objects written since the last run are read; the accumulated
+    set and per-root checkpoint live under state/ (see artist_discovery.py).
+    """
+    artist_ids, new_ids, stats = discover_artists(storage, full_rescan=full_rescan)
+    
+    scan = stats['scan']
+    metrics.count('files_scanned', scan['objects'])
+    metrics.count('bytes_scanned', scan['bytes'])
+    print(f"Scanned {scan['objects']} new play files ({len(new_ids)} new artists)")
+    print(f"Scan throughput: {scan['objects_per_second']} objects/s, {scan['mb_per_second']} MB/s")
     return artist_ids
 
 
-def save_artists_to_s3(s3, bucket: str, artists: list) -> str:
-    """Save artist data to S3 with date partitioning."""
-    now = datetime.now(timezone.utc)
-    timestamp = now.strftime("%Y%m%d_%H%M%S")
-    s3_key = f"artists/year={now.year}/month={now.month:02d}/day={now.day:02d}/artist_data_{timestamp}.json"
+def write_artists(storage, artists: list, output_format: str = None) -> str:
+    """
+    Save artist data to any storage backend with date partitioning.
     
-    data = {
-        "fetched_at": now.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "artist_count": len(artists),
-        "artists": artists
-    }
+    output_format is 'json' (envelope), 'ndjson.gz' or 'ndjson.zst'
+    (one artist per line); defaults to RAW_OUTPUT_FORMAT.
     
-    try:
-        s3.put_object(
-            Bucket=bucket,
-            Key=s3_key,
-            Body=json.dumps(data, indent=2, ensure_ascii=False),
-            ContentType='application/json'
-        )
-        print(f"Saved {len(artists)} artists to s3://{bucket}/{s3_key}")
-        
-    except ClientError as e:
-        print(f"Error saving to S3: {str(e)}")
-        raise
+    Returns:
+        Key of the written object
+    """
+    output_format = resolve_format(output_format)
+    now = datetime.now(timezone.utc)
+    # Suffix: concurrent invocations writing in the same second must not overwrite each other
+    timestamp = f"{now.strftime('%Y%m%d_%H%M%S')}_{uuid4().hex[:8]}"
+    key = f"artists/year={now.year}/month={now.month:02d}/day={now.day:02d}/artist_data_{timestamp}.{output_format}"
+    fetched_at = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+    
+    if output_format == 'json':
+        data = {
+            "fetched_at": fetched_at,
+            "artist_count": len(artists),
+            "artists": artists
+        }
+        body = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+        content_type = 'application/json'
+    else:
+        # Each artist already carries its own fetched_at; batch time goes in batch_fetched_at
+        body = encode_ndjson(artists, output_format, {"batch_fetched_at": fetched_at})
+        content_type = NDJSON_CONTENT_TYPE
     
-    return s3_key
+    storage.put_bytes(key, body, content_type)
+    print(f"Saved {len(artists)} artists to {storage.location(key)}")
+    return key
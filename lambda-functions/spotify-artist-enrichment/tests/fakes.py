@@ -0,0 +1,51 @@
+"""In-memory S3 bucket for the enrichment tests."""
+import hashlib
+import io
+
+from botocore.exceptions import ClientError
+
+
+def etag(body):
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+class ListingS3:
+    """Supports the list (Prefix/Delimiter/StartAfter), get and put calls we make."""
+
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.gets = []
+        self.fail_once = set()  # keys whose next GET returns a 500
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix='', Delimiter=None, StartAfter=''):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix) and k > StartAfter)
+        if Delimiter:
+            children = sorted({
+                Prefix + k[len(Prefix):].split(Delimiter, 1)[0] + Delimiter
+                for k in keys if Delimiter in k[len(Prefix):]
+            })
+            yield {
+                'CommonPrefixes': [{'Prefix': p} for p in children],
+                'Contents': [{'Key': k} for k in keys if Delimiter not in k[len(Prefix):]],
+            }
+        else:
+            yield {'Contents': [{'Key': k} for k in keys]}
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        if Key in self.fail_once:
+            self.fail_once.discard(Key)
+            raise ClientError({'Error': {'Code': 'InternalError'}}, 'GetObject')
+        self.gets.append(Key)
+        return {'Body': io.BytesIO(self.objects[Key]), 'ETag': etag(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        current = etag(self.objects[Key]) if Key in self.objects else None
+        if (IfNoneMatch == '*' and current is not None) or (IfMatch is not None and IfMatch != current):
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+        self.objects[Key] = Body.encode('utf-8') if isinstance(Body, str) else Body
+        return {'ETag': etag(self.objects[Key])}
@@ -0,0 +1,131 @@
+"""Tests for SpotifyArtistClient batching (Spotify API replaced by a stub)."""
+import random
+import threading
+import time
+
+import pytest
+
+from artist_client import MAX_BATCH_ATTEMPTS, SpotifyArtistClient
+
+
+def make_artist(artist_id):
+    return {
+        'id': artist_id,
+        'name': f"Artist {artist_id}",
+        'genres': ['rock'],
+        'followers': {'total': 10},
+        'popularity': 50,
+        'images': [],
+    }
+
+
+class FlakySpotify:
+    """Fails the first `failures` calls for any batch containing `flaky_id`."""
+
+    def __init__(self, flaky_id=None, failures=0):
+        self.flaky_id = flaky_id
+        self.failures = failures
+        self.calls = []
+
+    def artists(self, batch):
+        self.calls.append(list(batch))
+        if self.flaky_id in batch and self.failures:
+            self.failures -= 1
+            raise RuntimeError('503')
+        return {'artists': [make_artist(a) for a in batch]}
+
+
+@pytest.fixture
+def client():
+    client = SpotifyArtistClient(client_id='id', client_secret='secret', redirect_uri='http://localhost')
+    client.retry_backoff = 0
+    return client
+
+
+def test_failed_batch_is_requeued_not_dropped(client):
+    ids = [f"a{i}" for i in range(120)]
+    client.sp = FlakySpotify(flaky_id='a60', failures=1)
+
+    artists = client.get_artists(ids)
+
+    assert sorted(a['artist_id'] for a in artists) == sorted(ids)
+    assert client.unresolved_ids == []
+    assert len(client.sp.calls) == 4
+
+
+def test_batch_reported_unresolved_after_max_attempts(client):
+    ids = [f"a{i}" for i in range(60)]
+    client.sp = FlakySpotify(flaky_id='a0', failures=MAX_BATCH_ATTEMPTS)
+
+    artists = client.get_artists(ids)
+
+    assert len(artists) == 10
+    assert client.unresolved_ids == sorted(ids)[:50]
+
+
+class SlowSpotify:
+    """Random per-call latency; records peak concurrency."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def artists(self, batch):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(random.uniform(0, 0.02))
+        with self.lock:
+            self.active -= 1
+        return {'artists': [make_artist(a) if a != 'bad' else None for a in batch]}
+
+
+def test_concurrent_results_are_deterministic(client):
+    ids = [f"a{i:03d}" for i in range(300)] + ['a005', 'bad']
+    random.shuffle(ids)
+    client.sp = SlowSpotify()
+
+    artists = client.get_artists(ids, max_workers=4)
+
+    assert [a['artist_id'] for a in artists] == [f"a{i:03d}" for i in range(300)]
+    assert client.unresolved_ids == []
+    assert client.rejected_ids == ['bad']
+    assert client.sp.peak > 1
+
+
+class RejectingSpotify:
+    """Rejects any batch containing `invalid` with `status`."""
+
+    def __init__(self, status=400, invalid=('bad',)):
+        self.status = status
+        self.invalid = set(invalid)
+        self.calls = []
+
+    def artists(self, batch):
+        self.calls.append(list(batch))
+        if self.invalid.intersection(batch):
+            error = RuntimeError('invalid id')
+            error.http_status = self.status
+            raise error
+        return {'artists': [make_artist(a) for a in batch]}
+
+
+def test_rejected_batch_is_split_to_isolate_invalid_ids(client):
+    ids = [f"a{i:02d}" for i in range(49)] + ['bad']
+    client.sp = RejectingSpotify()
+
+    artists = client.get_artists(ids)
+
+    assert len(artists) == 49
+    assert client.rejected_ids == ['bad']
+    assert client.unresolved_ids == []
+
+
+def test_auth_errors_are_not_retried_but_stay_unresolved(client):
+    client.sp = RejectingSpotify(status=401, invalid=['a1'])
+
+    assert client.get_artists(['a1', 'a2']) == []
+    assert client.unresolved_ids == ['a1', 'a2']
+    assert client.rejected_ids == []
+    assert len(client.sp.calls) == 1
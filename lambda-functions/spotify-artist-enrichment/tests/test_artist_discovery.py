@@ -0,0 +1,104 @@
+"""Tests for incremental artist discovery (checkpoint + accumulated ID set)."""
+import json
+
+from artist_discovery import ARTIST_IDS_KEY, discover_artists, load_artist_ids
+from raw_checkpoint import list_roots, record_backfill
+from fakes import ListingS3
+from storage import S3Storage
+from raw_format import encode_ndjson
+
+
+def plays_file(*artist_ids):
+    return json.dumps({'tracks': [{'artist_id': a} for a in artist_ids]}).encode()
+
+
+def test_roots_split_legacy_and_per_user_layouts():
+    s3 = ListingS3({
+        'raw/year=2025/month=12/day=20/spotify_plays_1.json': plays_file('a1'),
+        'raw/year=2026/month=01/day=01/spotify_plays_2.json': plays_file('a1'),
+        'raw/user_id=u1/year=2025/month=12/day=20/spotify_plays_1.json': plays_file('a2'),
+    })
+
+    assert list_roots(S3Storage('b', client=s3)) == ['raw/user_id=u1/', 'raw/year=']
+
+
+def test_second_run_reads_only_new_objects():
+    s3 = ListingS3({
+        'raw/year=2025/month=12/day=20/spotify_plays_20251220_1.json': plays_file('a1', 'a2'),
+        'raw/year=2025/month=12/day=21/spotify_plays_20251221_1.json': plays_file('a2'),
+        'raw/user_id=u1/year=2025/month=12/day=21/spotify_plays_20251221_1.ndjson.gz': encode_ndjson([{'artist_id': 'a3'}]),
+    })
+    all_ids, new_ids, stats = discover_artists(S3Storage('b', client=s3))
+    assert all_ids == new_ids == {'a1', 'a2', 'a3'}
+    assert stats['files_scanned'] == 3
+
+    s3.objects['raw/year=2025/month=12/day=22/spotify_plays_20251222_1.json'] = plays_file('a4')
+    s3.gets.clear()
+    all_ids, new_ids, stats = discover_artists(S3Storage('b', client=s3))
+
+    assert all_ids == {'a1', 'a2', 'a3', 'a4'}
+    assert new_ids == {'a4'}
+    assert [k for k in s3.gets if k.startswith('raw/')] == ['raw/year=2025/month=12/day=22/spotify_plays_20251222_1.json']
+    assert load_artist_ids(S3Storage('b', client=s3)) == all_ids
+
+
+def test_later_object_in_checkpoint_day_is_read():
+    day = 'raw/year=2025/month=12/day=21'
+    s3 = ListingS3({f"{day}/spotify_plays_20251221_080000.json": plays_file('a1')})
+    discover_artists(S3Storage('b', client=s3))
+
+    s3.objects[f"{day}/spotify_plays_20251221_200000.json"] = plays_file('a5')
+    s3.gets.clear()
+    _, new_ids, _ = discover_artists(S3Storage('b', client=s3))
+
+    assert new_ids == {'a5'}
+    assert s3.gets[-1] == f"{day}/spotify_plays_20251221_200000.json"
+
+
+def test_failed_object_is_retried_next_run():
+    s3 = ListingS3({
+        'raw/year=2025/month=12/day=21/spotify_plays_20251221_1.json': plays_file('a1'),
+        'raw/year=2025/month=12/day=22/spotify_plays_20251222_1.json': plays_file('a2'),
+        'raw/year=2025/month=12/day=23/spotify_plays_20251223_1.json': plays_file('a3'),
+    })
+    s3.fail_once.add('raw/year=2025/month=12/day=22/spotify_plays_20251222_1.json')
+
+    _, new_ids, stats = discover_artists(S3Storage('b', client=s3))
+    assert new_ids == {'a1', 'a3'}
+    assert stats['files_failed'] == 1
+
+    _, new_ids, _ = discover_artists(S3Storage('b', client=s3))
+    assert new_ids == {'a2'}
+
+
+def test_backfilled_objects_behind_the_checkpoint_are_read():
+    s3 = ListingS3({'raw/year=2025/month=12/day=22/spotify_plays_20251222_1.json': plays_file('a1')})
+    storage = S3Storage('b', client=s3)
+    discover_artists(storage)
+
+    # A history import writes into a past partition StartAfter will not list again
+    old = 'raw/year=2020/month=01/day=01/spotify_history_a_00000.ndjson.gz'
+    s3.objects[old] = encode_ndjson([{'artist_id': 'a6'}])
+    s3.fail_once.add(old)
+    record_backfill(storage, [old])
+
+    _, new_ids, stats = discover_artists(storage)
+    assert new_ids == set() and stats['files_failed'] == 1
+
+    _, new_ids, _ = discover_artists(storage)
+    assert new_ids == {'a6'}
+
+    s3.gets.clear()
+    _, new_ids, _ = discover_artists(storage)
+    assert new_ids == set()
+    assert not [k for k in s3.gets if k.startswith('raw/')]
+
+
+def test_full_rescan_rebuilds_set():
+    s3 = ListingS3({'raw/year=2025/month=12/day=20/spotify_plays_1.json': plays_file('a1')})
+    s3.put_object('b', ARTIST_IDS_KEY, b'')  # corrupt/empty set
+
+    all_ids, _, _ = discover_artists(S3Storage('b', client=s3), full_rescan=True)
+
+    assert all_ids == {'a1'}
+    assert load_artist_ids(S3Storage('b', client=s3)) == {'a1'}
@@ -0,0 +1,163 @@
+"""Tests for event-driven enrichment: queue coalescing and the SQS consumer."""
+import itertools
+from datetime import datetime, timezone
+
+import handler
+import metrics
+from artist_queue import LocalArtistQueue, coalesce, encode_message
+from artist_registry import REGISTRY_KEY, ArtistRegistry
+from fakes import ListingS3
+from handler import artist_events_handler, drain_artist_queue
+from raw_format import format_for_key, iter_records
+from storage import S3Storage
+
+
+class StubSpotify:
+    """get_artists stand-in that records request sizes and can leave IDs unresolved or rejected."""
+
+    def __init__(self, unresolved=(), rejected=()):
+        self.unresolved = set(unresolved)
+        self.rejected = set(rejected)
+        self.unresolved_ids = []
+        self.rejected_ids = []
+        self.requests = []
+
+    def get_artists(self, artist_ids):
+        self.requests.append(list(artist_ids))
+        self.unresolved_ids = sorted(self.unresolved.intersection(artist_ids))
+        self.rejected_ids = sorted(self.rejected.intersection(artist_ids))
+        return [
+            {'artist_id': a, 'artist_name': a, 'popularity': 1, 'fetched_at': 'x'}
+            for a in artist_ids if a not in self.unresolved | self.rejected
+        ]
+
+
+def fake_clock(step=0.5):
+    ticks = itertools.count()
+    return lambda: next(ticks) * step
+
+
+def test_coalesce_stops_at_batch_size():
+    queue = LocalArtistQueue()
+    for i in range(0, 60, 5):
+        queue.send([f"a{i + j:02d}" for j in range(5)])
+
+    ids, messages = coalesce(queue, batch_size=50, max_wait=10)
+
+    assert len(ids) == 50 and len(messages) == 10
+    assert len(queue) == 2
+
+
+def test_coalesce_returns_partial_batch_when_window_closes():
+    queue = LocalArtistQueue()
+    queue.send(['a2', 'a1'])
+    queue.send(['a1'])
+
+    ids, messages = coalesce(queue, batch_size=50, max_wait=2, clock=fake_clock())
+
+    assert ids == ['a1', 'a2'] and [r for r, _ in messages] == ['local-1', 'local-2']
+
+
+def test_sqs_event_fetches_only_unregistered_artists():
+    s3 = ListingS3()
+    registry = ArtistRegistry()
+    registry.record([{'artist_id': 'known'}])
+    registry.save_to(S3Storage('bucket', client=s3))
+    spotify = StubSpotify()
+    event = {'Records': [
+        {'messageId': 'm1', 'body': encode_message(['a1', 'known'])},
+        {'messageId': 'm2', 'body': encode_message(['a2', 'a1'])},
+    ]}
+
+    result = artist_events_handler(event, storage=S3Storage('bucket', client=s3), spotify=spotify)
+
+    assert result == {'batchItemFailures': []}
+    assert spotify.requests == [['a1', 'a2']]
+    saved = ArtistRegistry.from_bytes(s3.objects[REGISTRY_KEY])
+    assert {'a1', 'a2', 'known'} <= set(saved.entries)
+
+
+def test_messages_with_unresolved_artists_are_redelivered():
+    s3 = ListingS3()
+    event = {'Records': [
+        {'messageId': 'm1', 'body': encode_message(['a1'])},
+        {'messageId': 'm2', 'body': encode_message(['bad', 'a2'])},
+    ]}
+
+    result = artist_events_handler(event, storage=S3Storage('bucket', client=s3), spotify=StubSpotify(unresolved={'bad'}))
+
+    assert result == {'batchItemFailures': [{'itemIdentifier': 'm2'}]}
+
+
+def test_invocations_in_the_same_second_keep_their_artists(monkeypatch):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2025, 12, 25, 10, 0, 0, tzinfo=timezone.utc)
+
+    monkeypatch.setattr(handler, 'datetime', FrozenDatetime)
+    s3 = ListingS3()
+    for message_id, artist_id in [('m1', 'a1'), ('m2', 'a2')]:
+        event = {'Records': [{'messageId': message_id, 'body': encode_message([artist_id])}]}
+        artist_events_handler(event, storage=S3Storage('bucket', client=s3), spotify=StubSpotify())
+
+    written = [k for k in s3.objects if k.startswith('artists/year=2025/month=12/day=25/artist_data_20251225_100000_')]
+    assert len(written) == 2
+    saved = [a['artist_id'] for k in written for a in iter_records(s3.objects[k], format_for_key(k), 'artists')]
+    assert sorted(saved) == ['a1', 'a2']
+
+
+def test_unknown_artists_are_registered_not_redelivered():
+    s3 = ListingS3()
+    event = {'Records': [{'messageId': 'm1', 'body': encode_message(['gone', 'a1'])}]}
+    spotify = StubSpotify(rejected={'gone'})
+
+    result = artist_events_handler(event, storage=S3Storage('bucket', client=s3), spotify=spotify)
+
+    assert result == {'batchItemFailures': []}
+    assert 'gone' in ArtistRegistry.from_bytes(s3.objects[REGISTRY_KEY])
+    # Registered as missing: a later announcement does not request it again
+    artist_events_handler(event, storage=S3Storage('bucket', client=s3), spotify=spotify)
+    assert len(spotify.requests) == 1
+
+
+def test_local_consumer_keeps_messages_with_unresolved_artists():
+    queue = LocalArtistQueue()
+    queue.send(['a1'])
+    queue.send(['bad'])
+
+    processed = drain_artist_queue(
+        queue, storage=S3Storage('bucket', client=ListingS3()), spotify=StubSpotify(unresolved={'bad'}), max_wait=0.05,
+    )
+
+    assert processed == 1
+    queue.release()
+    assert [ids for _, ids in queue.receive()] == [['bad']]
+
+
+def test_local_consumer_drains_queue_in_coalesced_batches():
+    s3, queue, spotify = ListingS3(), LocalArtistQueue(), StubSpotify()
+    for i in range(0, 120, 10):
+        queue.send([f"a{i + j:03d}" for j in range(10)])
+
+    processed = drain_artist_queue(queue, storage=S3Storage('bucket', client=s3), spotify=spotify, max_wait=0.05)
+
+    assert processed == 120
+    # One receive returns up to 10 messages; get_artists splits each round into 50-ID calls
+    assert [len(r) for r in spotify.requests] == [100, 20]
+    assert len(queue) == 0
+
+
+def test_sqs_invocation_emits_stage_metrics():
+    s3 = ListingS3()
+    sink = metrics.LocalSink()
+    event = {'Records': [{'messageId': 'm1', 'body': encode_message(['a1', 'a2'])}]}
+
+    with metrics.invocation('artist-enrichment', sink=sink, mode='events'):
+        artist_events_handler(event, storage=S3Storage('bucket', client=s3), spotify=StubSpotify(unresolved=['a2']))
+
+    record = sink.last
+    assert record['Function'] == 'artist-enrichment'
+    assert {'registry_load_ms', 'fetch_ms', 'save_ms', 'registry_save_ms'} <= set(record)
+    assert record['artists_fetched'] == 1
+    assert record['artists_changed'] == 1
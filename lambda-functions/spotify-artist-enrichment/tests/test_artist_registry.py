@@ -0,0 +1,77 @@
+"""Tests for the artist registry staleness policy."""
+from datetime import datetime, timedelta, timezone
+
+from artist_registry import ArtistRegistry
+from storage import MemoryStorage
+
+NOW = datetime(2025, 12, 25, tzinfo=timezone.utc)
+
+
+def artist(artist_id, popularity=50, followers=10):
+    return {'artist_id': artist_id, 'artist_name': artist_id, 'genres': [], 'followers': followers,
+            'popularity': popularity, 'image_url': None, 'fetched_at': 'x'}
+
+
+def test_only_new_and_stale_artists_selected():
+    registry = ArtistRegistry()
+    registry.record([artist('fresh')], now=NOW - timedelta(days=1))
+    registry.record([artist('stale')], now=NOW - timedelta(days=40))
+
+    new, stale = registry.select_for_refresh(['fresh', 'stale', 'new'], ttl_days=30, refresh_budget=None, now=NOW)
+
+    assert new == ['new']
+    assert stale == ['stale']
+
+
+def test_refresh_budget_prefers_popular_artists():
+    registry = ArtistRegistry()
+    for i, popularity in enumerate([10, 90, 50]):
+        registry.record([artist(f"a{i}", popularity=popularity)], now=NOW - timedelta(days=60))
+
+    _, stale = registry.select_for_refresh(['a0', 'a1', 'a2'], ttl_days=30, refresh_budget=2, now=NOW)
+
+    assert stale == ['a1', 'a2']
+
+
+def test_unchanged_artists_are_not_returned_for_writing():
+    registry = ArtistRegistry()
+    registry.record([artist('a1'), artist('a2')], now=NOW - timedelta(days=40))
+
+    changed = registry.record([artist('a1'), artist('a2', followers=11)], now=NOW)
+
+    assert [a['artist_id'] for a in changed] == ['a2']
+    assert registry.entries['a1'][0] == int(NOW.timestamp())
+
+
+def test_round_trips_through_storage_and_file(tmp_path):
+    registry = ArtistRegistry()
+    registry.record([artist('a1')], now=NOW)
+    storage = MemoryStorage()
+
+    registry.save_to(storage)
+    registry.save(str(tmp_path / 'registry.json.gz'))
+
+    assert ArtistRegistry.load_from(storage).entries == registry.entries
+    assert ArtistRegistry.load(str(tmp_path / 'registry.json.gz')).entries == registry.entries
+    assert len(ArtistRegistry.load_from(MemoryStorage())) == 0
+
+
+def test_missing_artists_count_as_fetched_until_the_ttl():
+    registry = ArtistRegistry()
+    registry.record_missing(['gone'], now=NOW - timedelta(days=1))
+
+    assert registry.select_for_refresh(['gone'], ttl_days=30, refresh_budget=None, now=NOW) == ([], [])
+    assert registry.record([artist('gone')], now=NOW) == [artist('gone')]
+
+
+def test_concurrent_saves_merge_instead_of_overwriting():
+    storage = MemoryStorage()
+    ArtistRegistry().save_to(storage)
+    first, second = ArtistRegistry.load_from(storage), ArtistRegistry.load_from(storage)
+    first.record([artist('a1')], now=NOW)
+    second.record([artist('a2')], now=NOW)
+
+    first.save_to(storage)
+    second.save_to(storage)
+
+    assert set(ArtistRegistry.load_from(storage).entries) == {'a1', 'a2'}
@@ -0,0 +1,53 @@
+"""Tests for the concurrent, streaming artist ID scanner."""
+import io
+import json
+
+from artist_scan import artist_ids_in_body, iter_artist_ids, scan_artist_ids
+from fakes import ListingS3
+from raw_format import encode_ndjson, normalize_plays
+from storage import S3Storage
+
+
+def test_ids_split_across_chunks_are_found():
+    body = json.dumps({'tracks': [{'track_id': 't', 'artist_id': f"artist{i:03d}"} for i in range(200)]}, indent=2)
+
+    ids = {v.decode() for v in iter_artist_ids(io.BytesIO(body.encode()), chunk_size=7)}
+
+    assert ids == {f"artist{i:03d}" for i in range(200)}
+
+
+def test_reads_every_raw_format():
+    plays = [{'artist_id': 'a1'}, {'artist_id': 'a2'}]
+
+    json_ids, json_bytes = artist_ids_in_body(io.BytesIO(json.dumps({'tracks': plays}).encode()), 'json')
+    gz_body = encode_ndjson(plays, metadata={'fetched_at': 'x'})
+    gz_ids, gz_bytes = artist_ids_in_body(io.BytesIO(gz_body), 'ndjson.gz')
+
+    assert json_ids == gz_ids == {'a1', 'a2'}
+    assert gz_bytes == len(gz_body)
+
+
+def test_reads_normalized_envelope_track_table():
+    rows = [('2025-12-22T09:00:00.000Z', 1766394000000, f"t{i % 2}", 'T', f"a{i % 2}") + (None,) * 6 for i in range(10)]
+    body = json.dumps({'fetched_at': 'x', **normalize_plays(rows)}, separators=(',', ':')).encode()
+
+    ids, _ = artist_ids_in_body(io.BytesIO(body), 'json')
+
+    assert ids == {'a0', 'a1'}
+
+
+def test_concurrent_scan_merges_sets_and_reports_throughput():
+    s3 = ListingS3({
+        f"raw/k{i}.json": json.dumps({'tracks': [{'artist_id': f"a{i % 10}"}]}).encode()
+        for i in range(100)
+    })
+    s3.objects['raw/broken.ndjson.gz'] = b'not gzip'
+    keys = [(k, 'ndjson.gz' if k.endswith('.gz') else 'json') for k in sorted(s3.objects)]
+
+    ids, stats = scan_artist_ids(S3Storage('b', client=s3), keys, max_workers=8)
+
+    assert ids == {f"a{i}" for i in range(10)}
+    assert stats.objects == 100
+    assert stats.failed_keys == ['raw/broken.ndjson.gz']
+    assert stats.bytes == sum(len(s3.objects[k]) for k, _ in keys if k != 'raw/broken.ndjson.gz')
+    assert stats.objects_per_second > 0
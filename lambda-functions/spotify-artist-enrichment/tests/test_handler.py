@@ -0,0 +1,28 @@
+"""Tests for raw-file scanning and artist output in the enrichment handler."""
+import json
+
+from fakes import ListingS3
+from handler import get_unique_artists, write_artists
+from raw_format import encode_ndjson, iter_ndjson
+from storage import MemoryStorage, S3Storage
+
+
+def test_scan_reads_json_and_ndjson_plays():
+    s3 = ListingS3({
+        'raw/year=2025/month=12/day=20/a.json': json.dumps({'tracks': [{'artist_id': 'a1'}, {'artist_id': 'a2'}]}).encode(),
+        'raw/year=2025/month=12/day=21/b.ndjson.gz': encode_ndjson([{'artist_id': 'a2'}, {'artist_id': 'a3'}], metadata={'fetched_at': 'x'}),
+        'raw/year=2025/month=12/day=21/notes.txt': b'ignored',
+    })
+
+    assert get_unique_artists(S3Storage('bucket', client=s3)) == {'a1', 'a2', 'a3'}
+
+
+def test_save_artists_ndjson_one_artist_per_line():
+    storage = MemoryStorage()
+    artists = [{'artist_id': 'a1', 'fetched_at': 'x'}, {'artist_id': 'a2', 'fetched_at': 'x'}]
+
+    key = write_artists(storage, artists, output_format='ndjson.gz')
+
+    rows = list(iter_ndjson(storage.objects[key], 'ndjson.gz'))
+    assert [r['artist_id'] for r in rows] == ['a1', 'a2']
+    assert all('batch_fetched_at' in r for r in rows)
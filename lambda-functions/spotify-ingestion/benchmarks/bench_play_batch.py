@@ -0,0 +1,96 @@
+"""
+Micro-benchmark: PlayBatch decode vs the old per-play dict transform.
+
+Simulates a full-history backfill (N pages of 50 plays) and reports time
+and peak memory for decode + sort, with and without converting back to
+dicts at the end. Pages go through a JSON round-trip first so every string
+is a fresh object, exactly like a decoded API response.
+
+Usage: python benchmarks/bench_play_batch.py [--plays 50000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from play_batch import PlayBatch  # noqa: E402
+from tests.fakes import make_items  # noqa: E402
+
+
+def dict_path(pages):
+    """The transform SpotifyClient used before PlayBatch."""
+    all_tracks = []
+    for page in pages:
+        for item in page:
+            dt = datetime.fromisoformat(item['played_at'].replace('Z', '+00:00'))
+            all_tracks.append({
+                'played_at': item['played_at'],
+                'played_at_timestamp': int(dt.timestamp() * 1000),
+                'track_id': item['track']['id'],
+                'track_name': item['track']['name'],
+                'artist_id': item['track']['artists'][0]['id'],
+                'artist_name': item['track']['artists'][0]['name'],
+                'album_id': item['track']['album']['id'],
+                'album_name': item['track']['album']['name'],
+                'release_date': item['track']['album']['release_date'],
+                'duration_ms': item['track']['duration_ms'],
+                'popularity': item['track']['popularity'],
+            })
+    all_tracks.sort(key=lambda x: x['played_at_timestamp'])
+    return all_tracks
+
+
+def batch_path(pages):
+    """Columnar decode + sort, no dicts built."""
+    batch = PlayBatch()
+    for page in pages:
+        batch.extend_items(page)
+    batch.sort()
+    return batch
+
+
+def batch_to_dicts_path(pages):
+    """Columnar decode + sort, then materialize dicts once for JSON."""
+    return batch_path(pages).to_dicts()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--plays', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    items = make_items(args.plays, step_seconds=1)
+    pages = [json.loads(json.dumps(items[i:i + 50])) for i in range(0, len(items), 50)]
+
+    print(f"{args.plays} plays in {len(pages)} pages, best of {args.repeat}")
+    baseline = None
+    for name, fn in (
+        ('dict path', dict_path),
+        ('PlayBatch', batch_path),
+        ('PlayBatch + to_dicts', batch_to_dicts_path),
+    ):
+        best = min(timeit.repeat(lambda: fn(pages), number=1, repeat=args.repeat))
+        baseline = baseline or best
+
+        tracemalloc.start()
+        result = fn(pages)  # noqa: F841 - keep the result alive for the peak
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+
+        print(
+            f"  {name:<22} {best * 1000:8.1f} ms  ({baseline / best:4.2f}x)"
+            f"  peak {peak / 1e6:6.1f} MB"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark: flat vs normalized raw play envelopes.
+
+Builds a batch with heavy rotation (N plays cycling through D distinct
+tracks) and reports body size (raw and gzip) plus encode and decode time
+for each encoding.
+
+Usage: python benchmarks/bench_raw_encoding.py [--plays 5000] [--distinct 50] [--repeat 5]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '..', 'shared'))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from play_batch import PlayBatch  # noqa: E402
+from raw_format import envelope_records, normalize_plays  # noqa: E402
+from tests.fakes import make_item  # noqa: E402
+
+
+def encode_flat(batch):
+    return json.dumps({'fetched_at': 'x', 'track_count': len(batch), 'tracks': batch.to_dicts()},
+                      indent=2, ensure_ascii=False)
+
+
+def encode_normalized(batch):
+    return json.dumps({'fetched_at': 'x', **normalize_plays(batch.iter_rows())},
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def decode(body):
+    return list(envelope_records(json.loads(body)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--plays', type=int, default=5000)
+    parser.add_argument('--distinct', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    start = datetime(2025, 12, 22, 9, 0, 0, 123000, tzinfo=timezone.utc)
+    batch = PlayBatch.from_items([
+        make_item(i % args.distinct, start - timedelta(minutes=3 * i)) for i in range(args.plays)
+    ])
+
+    print(f"{args.plays} plays of {args.distinct} tracks, best of {args.repeat}")
+    baseline = None
+    for name, encode in (('flat', encode_flat), ('normalized/1', encode_normalized)):
+        body = encode(batch)
+        encode_s = min(timeit.repeat(lambda: encode(batch), number=1, repeat=args.repeat))
+        decode_s = min(timeit.repeat(lambda: decode(body), number=1, repeat=args.repeat))
+        size = len(body.encode('utf-8'))
+        gz_size = len(gzip.compress(body.encode('utf-8')))
+        baseline = baseline or size
+        print(
+            f"{name:>13}: {size / 1024:8.1f} KiB ({baseline / size:4.1f}x smaller), "
+            f"gzip {gz_size / 1024:6.1f} KiB, encode {encode_s * 1000:6.1f} ms, decode {decode_s * 1000:6.1f} ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
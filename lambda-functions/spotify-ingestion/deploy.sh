@@ -10,8 +10,9 @@ mkdir package
 # Install dependencies to package directory
 pip install -r requirements.txt -t package/
 
-# Copy source code
+# Copy source code (plus modules shared by both Lambdas)
 cp -r src/* package/
+cp ../shared/*.py package/
 
 # Create zip file
 cd package
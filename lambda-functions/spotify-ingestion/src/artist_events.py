@@ -0,0 +1,99 @@
+"""
+Announce newly seen artists to the enrichment queue.
+
+Ingestion remembers which artist IDs it has already announced
+(state/artist_events/seen_artist_ids.txt.gz, cached across warm
+invocations) and sends only the new ones, so enrichment hears about an
+artist once, minutes after its first play.
+
+The seen set is merged with the stored copy before every save, so
+concurrent writers lose at most a few updates. The only cost is an artist
+announced twice, which the enrichment registry then ignores.
+"""
+import gzip
+import logging
+import threading
+from typing import Iterable, Optional, Set, Union
+
+from artist_queue import get_artist_queue
+from play_batch import PlayBatch
+from utils import get_s3_client
+
+logger = logging.getLogger(__name__)
+
+SEEN_KEY = "state/artist_events/seen_artist_ids.txt.gz"
+
+_seen: Optional[Set[str]] = None
+_seen_lock = threading.Lock()
+
+
+def _load_seen(s3, bucket: str) -> Set[str]:
+    from botocore.exceptions import ClientError
+
+    try:
+        body = s3.get_object(Bucket=bucket, Key=SEEN_KEY)['Body'].read()
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            return set()
+        raise
+    return set(gzip.decompress(body).decode('ascii').split())
+
+
+def _save_seen(s3, bucket: str, seen: Set[str]) -> None:
+    body = gzip.compress(('\n'.join(sorted(seen)) + '\n').encode('ascii'))
+    s3.put_object(Bucket=bucket, Key=SEEN_KEY, Body=body, ContentType='application/gzip')
+
+
+def _artist_ids(tracks: Union[PlayBatch, Iterable[dict]]) -> Set[str]:
+    if isinstance(tracks, PlayBatch):
+        return {a for a in tracks.artist_id if a}
+    return {t['artist_id'] for t in tracks if t.get('artist_id')}
+
+
+def emit_new_artists(
+    tracks: Union[PlayBatch, Iterable[dict]],
+    bucket: str,
+    s3_client=None,
+    queue=None,
+    **context,
+) -> Set[str]:
+    """
+    Send the artist IDs in `tracks` that were never announced before.
+
+    Args:
+        tracks: Plays just saved to S3
+        bucket: S3 bucket holding the seen set
+        s3_client: Shared boto3 S3 client (created if None)
+        queue: Artist queue (ARTIST_QUEUE_URL queue if None; no-op if unset)
+        **context: Extra message fields (e.g. user_id, s3_key)
+
+    Returns:
+        The newly announced artist IDs
+    """
+    global _seen
+    if queue is None:
+        queue = get_artist_queue()
+    if queue is None:
+        return set()
+
+    s3 = get_s3_client(s3_client)
+    with _seen_lock:
+        if _seen is None:
+            _seen = _load_seen(s3, bucket)
+        new_ids = _artist_ids(tracks) - _seen
+        if not new_ids:
+            return set()
+
+        queue.send(new_ids, **context)
+        _seen = _load_seen(s3, bucket) | _seen | new_ids
+        _save_seen(s3, bucket, _seen)
+
+    logger.info(f"Announced {len(new_ids)} new artists")
+    return new_ids
+
+
+def reset_seen_cache() -> None:
+    """Forget the warm seen set (next call reloads it from S3)."""
+    global _seen
+    with _seen_lock:
+        _seen = None
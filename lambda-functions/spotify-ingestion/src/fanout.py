@@ -0,0 +1,236 @@
+"""
+Multi-user ingestion: one invocation, many listeners.
+
+Each user has their own token, state and raw partition in the bucket.
+Users are ingested concurrently on a bounded thread pool that shares one
+rate-limited HTTP session (Spotify) and one boto3 client (S3), so connection
+pools and cold-start cost are paid once per batch instead of once per user.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import metrics
+from artist_events import emit_new_artists
+from auth_cache import DEFAULT_TOKEN_KEY
+from spotify_client import SpotifyClient
+from storage import S3Storage, StorageBackend, shared_s3_client
+from utils import get_latest_timestamp, read_state, write_state, write_tracks
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_KEY = "state/last_run_state.json"
+DEFAULT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', '8'))
+
+# Threads per ingest_user call for overlapping independent I/O
+STARTUP_WORKERS = 2
+
+# Per-user layout in the bucket
+USER_TOKEN_KEY = "secrets/users/{user_id}/spotify_token"
+USER_STATE_KEY = "state/users/{user_id}/last_run_state.json"
+USER_RAW_PREFIX = "raw/user_id={user_id}"
+
+
+def build_http_session(pool_size: int) -> 'requests.Session':
+    """
+    Build one rate-limited HTTP session sized for `pool_size` workers.
+
+    All users draw request slots from the same process-wide scheduler.
+
+    Args:
+        pool_size: Max concurrent connections to keep per host
+
+    Returns:
+        Configured requests.Session
+    """
+    from rate_limiter import build_session
+    return build_session(pool_size=pool_size)
+
+
+def build_s3_client(pool_size: int):
+    """
+    Return the process-wide boto3 S3 client, with a pool that fits all worker threads.
+
+    boto3 clients are thread-safe, so a single client is shared (and
+    reused by every other S3 caller in the process).
+
+    Args:
+        pool_size: Max concurrent S3 connections
+
+    Returns:
+        boto3 S3 client
+    """
+    return shared_s3_client(pool_size)
+
+
+def ingest_user(
+    bucket: str,
+    user_id: Optional[str] = None,
+    requests_session: Optional['requests.Session'] = None,
+    s3_client=None,
+    storage: Optional[StorageBackend] = None,
+) -> Dict:
+    """
+    Run one incremental ingestion for a single user.
+
+    With user_id=None the legacy single-user keys are used, so the
+    original one-listener deployment keeps working unchanged.
+
+    Authentication (token download + validation call) and the state load
+    do not depend on each other, so they run concurrently; the state write
+    likewise overlaps the new-artist announcement. Per-phase wall-clock
+    times (ms) are returned in result["timings"].
+
+    Args:
+        bucket: S3 bucket name
+        user_id: Listener to ingest (None for the legacy single user)
+        requests_session: Shared HTTP session for Spotify calls
+        s3_client: Shared boto3 S3 client
+        storage: Backend for state and raw data (S3Storage over s3_client if None)
+
+    Returns:
+        Result dict: user_id, status, tracks, s3_key, last_timestamp, timings
+    """
+    if user_id is None:
+        token_key, state_key, raw_prefix = DEFAULT_TOKEN_KEY, DEFAULT_STATE_KEY, "raw"
+        cache_path = None
+        metadata = None
+    else:
+        token_key = USER_TOKEN_KEY.format(user_id=user_id)
+        state_key = USER_STATE_KEY.format(user_id=user_id)
+        raw_prefix = USER_RAW_PREFIX.format(user_id=user_id)
+        cache_path = f"/tmp/.spotify_cache_{user_id}"
+        metadata = {"user_id": user_id}
+
+    if storage is None:
+        storage = S3Storage(bucket, client=s3_client)
+
+    client = SpotifyClient(
+        token_key=token_key,
+        cache_path=cache_path,
+        requests_session=requests_session,
+        s3_client=s3_client,
+    )
+    timings = {}
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=STARTUP_WORKERS) as pool:
+        state_future = pool.submit(_timed, read_state, storage, state_key)
+        auth_ms, _ = _timed(client.authenticate)
+        timings["auth"] = auth_ms
+        timings["state_load"], last_timestamp = state_future.result()
+        timings["startup"] = _ms_since(started)
+
+        phase = time.perf_counter()
+        if last_timestamp:
+            logger.info(f"[{user_id}] Incremental fetch since: {last_timestamp}")
+            tracks = client.get_recent_plays_since(last_timestamp)
+        else:
+            logger.info(f"[{user_id}] First run - fetching last 50 plays")
+            tracks = client.get_recently_played(limit=50)
+        timings["fetch"] = _ms_since(phase)
+        metrics.count("plays", len(tracks))
+
+        result = {
+            "user_id": user_id,
+            "status": "ok",
+            "tracks": len(tracks),
+            "s3_key": None,
+            "last_timestamp": last_timestamp,
+            "timings": timings,
+        }
+
+        if not tracks:
+            logger.info(f"[{user_id}] No new tracks found")
+            timings["total"] = _ms_since(started)
+            return result
+
+        phase = time.perf_counter()
+        result["s3_key"] = write_tracks(storage, tracks, prefix=raw_prefix, metadata=metadata)
+        timings["save"] = _ms_since(phase)
+
+        # State goes out only after the data it points past is stored
+        latest_timestamp = get_latest_timestamp(tracks)
+        state_future = pool.submit(_timed, write_state, storage, latest_timestamp, state_key)
+        result["last_timestamp"] = latest_timestamp
+
+        # Event-driven enrichment; the weekly full run still catches anything missed here
+        try:
+            new_artists = emit_new_artists(
+                tracks, bucket, s3_client=s3_client, user_id=user_id, s3_key=result["s3_key"]
+            )
+            result["new_artists"] = len(new_artists)
+        except Exception as e:
+            logger.error(f"[{user_id}] Failed to announce new artists: {str(e)}")
+
+        timings["state_write"], _ = state_future.result()
+
+    timings["total"] = _ms_since(started)
+    logger.info(f"[{user_id}] Processed {len(tracks)} tracks")
+    return result
+
+
+def _ms_since(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _timed(fn, *args):
+    """Run fn(*args) and return (elapsed ms, result)."""
+    start = time.perf_counter()
+    value = fn(*args)
+    return _ms_since(start), value
+
+
+def run_fanout(
+    user_ids: List[str],
+    bucket: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> List[Dict]:
+    """
+    Ingest many users concurrently with shared HTTP and S3 pools.
+
+    A failure for one user never affects the others; it is reported
+    in that user's result instead of being raised.
+
+    Args:
+        user_ids: Listeners to ingest (duplicates are ignored)
+        bucket: S3 bucket name
+        max_workers: Upper bound on concurrent users
+
+    Returns:
+        One result dict per user, in the order given
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return []
+
+    workers = max(1, min(max_workers, len(user_ids)))
+    session, s3 = _shared_pools(workers)
+    logger.info(f"Fan-out: {len(user_ids)} users on {workers} workers")
+
+    def run_one(user_id: str) -> Dict:
+        try:
+            return ingest_user(bucket, user_id, requests_session=session, s3_client=s3)
+        except Exception as e:
+            logger.error(f"[{user_id}] Ingestion failed: {str(e)}")
+            return {"user_id": user_id, "status": "error", "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_one, user_ids))
+
+
+# Pools survive warm invocations, together with the cached per-user auth
+# (whose spotipy clients hold on to the session they were built with)
+_pools: Dict[int, Tuple['requests.Session', object]] = {}
+
+
+def _shared_pools(pool_size: int) -> Tuple['requests.Session', object]:
+    """Return the warm (HTTP session, S3 client) pair for a pool size."""
+    if pool_size not in _pools:
+        _pools[pool_size] = (build_http_session(pool_size), build_s3_client(pool_size))
+    return _pools[pool_size]
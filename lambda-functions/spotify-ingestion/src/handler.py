@@ -0,0 +1,128 @@
+"""AWS Lambda handler for Spotify data ingestion."""
+
+import json
+import os
+
+import api_telemetry
+import metrics
+from fanout import DEFAULT_MAX_WORKERS, ingest_user, run_fanout
+from profiling import profiled
+from spotify_client import SpotifyClient
+from storage import S3Storage
+from stream_writer import S3PlayStreamWriter
+from utils import write_state
+
+BUCKET_NAME = os.environ.get("S3_BUCKET", "spotify-pipeline-ivan-1766559048")
+# Module-level so warm invocations reuse the pooled client (created on first use)
+STORAGE = S3Storage(BUCKET_NAME)
+
+# ingest_user phases reported as spans (write_tracks times serialize/upload itself)
+RECORDED_PHASES = ("auth", "state_load", "startup", "fetch", "state_write")
+
+
+@profiled("ingestion", lambda: STORAGE)
+def lambda_handler(event, context):
+    """
+    Lambda entry point.
+
+    A plain scheduled event ingests the single default user. An event with
+    `user_ids` (and optional `max_workers`) fans out across those users.
+    An event with `backfill: true` streams all available history to S3.
+
+    Every route emits one EMF metrics line (stage timings and counters,
+    see metrics.py) when it finishes. `"profile": "cpu"|"memory"|"all"`
+    (or the PROFILE variable) stores a profile of the run (see profiling.py).
+    """
+    event = event or {}
+
+    if event.get("user_ids"):
+        with metrics.invocation("ingestion", mode="fanout"), api_telemetry.invocation():
+            return fanout_handler(event)
+
+    if event.get("backfill"):
+        with metrics.invocation("ingestion", mode="backfill"), api_telemetry.invocation():
+            return backfill_handler(event)
+
+    with metrics.invocation("ingestion", mode="incremental"), api_telemetry.invocation():
+        return ingest_handler(event)
+
+
+def ingest_handler(event):
+    """Incremental ingestion for the single default user."""
+    print("Starting Spotify data ingestion...")
+
+    try:
+        print(f"Authenticating and checking S3 for previous state: {BUCKET_NAME}")
+        result = ingest_user(BUCKET_NAME, storage=STORAGE)
+        print(f"Phase timings (ms): {json.dumps(result['timings'])}")
+        for phase in RECORDED_PHASES:
+            if phase in result["timings"]:
+                metrics.timing(phase, result["timings"][phase])
+
+        if not result["tracks"]:
+            print("No new tracks found")
+            return {"statusCode": 200, "body": "No new tracks"}
+
+        print(f"Saved to: s3://{BUCKET_NAME}/{result['s3_key']}")
+        print(f"State updated: {result['last_timestamp']}")
+
+        return {"statusCode": 200, "body": f"Processed {result['tracks']} tracks"}
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        raise
+
+
+def fanout_handler(event):
+    """Ingest every user in event['user_ids'] and report per-user results."""
+    user_ids = event["user_ids"]
+    max_workers = int(event.get("max_workers", DEFAULT_MAX_WORKERS))
+    print(f"Starting fan-out ingestion for {len(user_ids)} users...")
+
+    results = run_fanout(user_ids, BUCKET_NAME, max_workers=max_workers)
+    failed = [r["user_id"] for r in results if r["status"] != "ok"]
+    metrics.count("users", len(results))
+    metrics.count("users_failed", len(failed))
+
+    print(f"Fan-out complete: {len(results) - len(failed)} ok, {len(failed)} failed")
+    if failed:
+        print(f"Failed users: {', '.join(failed)}")
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps({
+            "users": len(results),
+            "succeeded": len(results) - len(failed),
+            "failed": len(failed),
+            "results": results,
+        }),
+    }
+
+
+def backfill_handler(event):
+    """Stream every available history page to S3 as it is fetched."""
+    mode = event.get("stream_mode", "multipart")
+    output_format = event.get("output_format")
+    print(f"Starting history backfill ({mode})...")
+
+    client = SpotifyClient()
+    with metrics.span("auth"):
+        client.authenticate()
+
+    with metrics.span("stream"), S3PlayStreamWriter(
+        BUCKET_NAME, s3_client=STORAGE.client, mode=mode, output_format=output_format
+    ) as writer:
+        for page in client.iter_history_pages():
+            writer.write_page(page)
+    metrics.count("plays", writer.track_count)
+
+    if not writer.track_count:
+        print("No history available")
+        return {"statusCode": 200, "body": "No new tracks"}
+
+    with metrics.span("state_write"):
+        write_state(STORAGE, writer.latest_timestamp)
+    print(f"Backfilled {writer.track_count} tracks in {writer.page_count} pages")
+    print(f"State updated: {writer.latest_timestamp}")
+
+    return {"statusCode": 200, "body": f"Processed {writer.track_count} tracks"}
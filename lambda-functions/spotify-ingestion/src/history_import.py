@@ -0,0 +1,480 @@
+"""
+Importer for Spotify Extended Streaming History exports.
+
+The recently-played endpoint only reaches back 50 plays. The privacy export
+("Extended streaming history") has every play since the account was
+created, as Streaming_History_Audio_<years>_<n>.json files: JSON arrays of
+about 12 MB each, gigabytes in total for a long-lived account.
+
+Each file is handled by its own worker process. It is read with a
+streaming decoder (fixed-size reads, one record decoded at a time), mapped
+onto the flat play schema and written out whenever `chunk_size` plays are
+buffered, so memory per worker stays bounded whatever the file size.
+
+Output: <raw prefix>/year=/month=/day=/spotify_history_<file>_<n>.<format>,
+partitioned by play date. The processing Lambda lists raw/ by LastModified
+and picks them up like any other new object. Artist and track discovery
+list each root after their checkpoint key, which is past these old
+partitions, so once every file is written the importer records the keys in
+a backfill manifest (raw_checkpoint.record_backfill) that both read on
+their next run; compaction leaves the partitions alone until they have.
+`import_streaming_history.py --layout processed` instead stages the chunks
+in a temp dir and merges them into processed Parquet with the processing
+package's history_merge.py (which needs pyarrow; this module does not).
+
+Record mapping (export field → play field):
+    ts                                  played_at, played_at_timestamp
+    spotify_track_uri                   track_id ('spotify:track:<id>')
+    master_metadata_track_name          track_name
+    master_metadata_album_artist_name   artist_name
+    master_metadata_album_album_name    album_name
+
+The export has no artist/album IDs, release date or track length. Before
+the files are imported, their track IDs are collected (a regex pass, no
+JSON decoding) and looked up with batched /tracks requests, 50 IDs per
+call; every play then gets its track's first artist, album, release date
+and duration, like an API-fetched play. Without them fct_plays (inner join
+on artist_id) would drop the plays and artist discovery would never see
+the artists. Popularity stays null: today's value says nothing about the
+play's date. Podcast episodes, audiobooks and local files (no
+spotify:track: URI) are skipped, and so are plays shorter than
+`min_ms_played`. The default of 30 s is Spotify's threshold for a counted
+stream.
+
+Each object's fetched_at is its newest play, which is older than any
+API fetch of the same plays, so the processing stage prefers the
+API-fetched copy (full metadata) when both exist. Object keys come from
+the file name and chunk number, so re-running an import overwrites the
+same objects instead of duplicating them.
+
+Usage (from the repo root):
+    python import_streaming_history.py <export dir or files> --bucket <bucket>
+    python import_streaming_history.py ~/Downloads/my_spotify_data --out data --user-id ivan
+"""
+import glob
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from play_batch import parse_played_at
+from raw_checkpoint import record_backfill
+from raw_format import resolve_format
+from storage import LocalStorage, StorageBackend
+from utils import write_tracks
+
+logger = logging.getLogger(__name__)
+
+EXPORT_PATTERN = 'Streaming_History_Audio_*.json'
+TRACK_URI_PREFIX = 'spotify:track:'
+TRACK_LOOKUP_BATCH = 50  # Spotify's max IDs per /tracks request
+DEFAULT_CHUNK_SIZE = 25_000
+DEFAULT_MIN_MS_PLAYED = 30_000
+READ_SIZE = 1 << 20  # characters per read while streaming a file
+# Export records are well under 1 KB; anything this big is a malformed file, not a record
+MAX_ELEMENT_SIZE = 16 << 20
+# A decode error this close to the end of the buffer may be a token cut by the read
+# (a literal, number or \uXXXX escape); further back it is malformed input
+_TRUNCATED_TOKEN = 16
+
+_WHITESPACE = re.compile(r'[\s,]*')
+_TRACK_URI = re.compile(r'"spotify_track_uri"\s*:\s*"spotify:track:([0-9A-Za-z]+)"')
+_URI_OVERLAP = 128  # characters kept between reads so a URI split by a read is still matched
+# Play fields looked up per track (the rest come from the export record)
+CATALOG_FIELDS = ('artist_id', 'album_id', 'release_date', 'duration_ms')
+
+
+def iter_json_array(
+    stream: IO[str], read_size: int = READ_SIZE, max_element_size: int = MAX_ELEMENT_SIZE
+) -> Iterator[Dict]:
+    """
+    Yield the objects of a top-level JSON array without loading the whole file.
+
+    Reads `read_size` characters at a time and decodes one element at a time
+    with JSONDecoder.raw_decode; only the undecoded tail is kept between reads.
+    An element that runs past the buffer is retried with more input, but only
+    if the decode error is at the buffer's end (or in a string still open
+    there); any other error is raised at once. Each retry at least doubles
+    the tail, so a long element is decoded a logarithmic number of times.
+
+    Args:
+        stream: Text stream positioned at the array
+        read_size: Characters per read
+        max_element_size: Largest element accepted, in characters
+
+    Yields:
+        One dict per array element
+
+    Raises:
+        ValueError: If the stream is not an array of objects, an element is
+            malformed or too large, or the array is truncated
+    """
+    decoder = json.JSONDecoder()
+    buffer = stream.read(read_size)
+    position = _WHITESPACE.match(buffer).end()
+    if buffer[position:position + 1] != '[':
+        raise ValueError("Expected a JSON array")
+    position += 1
+    eof = False
+
+    while True:
+        position = _WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            if eof:
+                raise ValueError("Truncated JSON array")
+            buffer, position = stream.read(read_size), 0
+            eof = not buffer
+            continue
+        if buffer[position] == ']':
+            return
+        if buffer[position] != '{':
+            raise ValueError(f"Expected an object at offset {position}")
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            cut_off = len(buffer) - e.pos <= _TRUNCATED_TOKEN or e.msg.startswith('Unterminated string')
+            if not cut_off:
+                raise
+            tail = len(buffer) - position
+            if tail >= max_element_size:
+                raise ValueError(f"Element at offset {position} exceeds {max_element_size} characters") from e
+            # Element runs past the buffer: read more and retry from its start
+            more = stream.read(max(read_size, tail))
+            if not more:
+                raise
+            buffer, position = buffer[position:] + more, 0
+            continue
+        yield record
+
+
+def track_id_from_uri(uri: Optional[str]) -> Optional[str]:
+    """'spotify:track:<id>' → '<id>'; None for episodes, local files and missing URIs."""
+    if uri and uri.startswith(TRACK_URI_PREFIX):
+        return uri[len(TRACK_URI_PREFIX):] or None
+    return None
+
+
+def scan_track_ids(path: str, read_size: int = READ_SIZE) -> Set[str]:
+    """Track IDs referenced by one export file (runs in a worker process)."""
+    track_ids = set()
+    tail = ''
+    with open(path, encoding='utf-8') as f:
+        for chunk in iter(lambda: f.read(read_size), ''):
+            text = tail + chunk
+            track_ids.update(_TRACK_URI.findall(text))
+            tail = text[-_URI_OVERLAP:]
+    return track_ids
+
+
+def lookup_tracks(sp, track_ids: Iterable[str], batch_size: int = TRACK_LOOKUP_BATCH) -> Dict[str, Dict]:
+    """
+    Catalog fields the export lacks (CATALOG_FIELDS), by track ID.
+
+    Args:
+        sp: Authenticated spotipy client (requests go through its rate-limited session)
+        track_ids: Track IDs to resolve
+        batch_size: IDs per /tracks request
+
+    Returns:
+        {track_id: {artist_id, album_id, release_date, duration_ms}}; tracks
+        Spotify no longer has are left out
+    """
+    ids = sorted(set(track_ids))
+    catalog = {}
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        for track_id, track in zip(batch, sp.tracks(batch)['tracks']):
+            if not track:
+                continue
+            artists = track.get('artists') or [{}]
+            album = track.get('album') or {}
+            catalog[track_id] = {
+                'artist_id': artists[0].get('id'),
+                'album_id': album.get('id'),
+                'release_date': album.get('release_date'),
+                'duration_ms': track.get('duration_ms'),
+            }
+    logger.info(f"Resolved {len(catalog)} of {len(ids)} tracks")
+    return catalog
+
+
+def map_record(
+    record: Dict, min_ms_played: int = DEFAULT_MIN_MS_PLAYED, catalog: Optional[Dict[str, Dict]] = None
+) -> Optional[Dict]:
+    """
+    Map one export record onto the flat play schema (PLAY_FIELDS).
+
+    Args:
+        record: Element of a Streaming_History_Audio file
+        min_ms_played: Skip plays shorter than this
+        catalog: lookup_tracks() result (catalog fields stay null for tracks not in it)
+
+    Returns:
+        Play dict, or None if the record is not an importable track play
+    """
+    track_id = track_id_from_uri(record.get('spotify_track_uri'))
+    if track_id is None or not record.get('ts'):
+        return None
+    if (record.get('ms_played') or 0) < min_ms_played:
+        return None
+
+    timestamp = parse_played_at(record['ts'])
+    played_at = datetime.fromtimestamp(timestamp // 1000, tz=timezone.utc)
+    track = (catalog or {}).get(track_id, {})
+    return {
+        'played_at': played_at.strftime('%Y-%m-%dT%H:%M:%S.') + f"{timestamp % 1000:03d}Z",
+        'played_at_timestamp': timestamp,
+        'track_id': track_id,
+        'track_name': record.get('master_metadata_track_name'),
+        'artist_id': track.get('artist_id'),
+        'artist_name': record.get('master_metadata_album_artist_name'),
+        'album_id': track.get('album_id'),
+        'album_name': record.get('master_metadata_album_album_name'),
+        'release_date': track.get('release_date'),
+        'duration_ms': track.get('duration_ms'),
+        'popularity': None,
+    }
+
+
+def history_key(prefix: str, day: str, source: str, chunk: int, output_format: str) -> str:
+    """Raw key of one imported chunk: partitioned by play date ('YYYY-MM-DD')."""
+    year, month, dd = day.split('-')
+    return f"{prefix}/year={year}/month={month}/day={dd}/spotify_history_{source}_{chunk:05d}.{output_format}"
+
+
+def find_exports(paths: Iterable[str]) -> List[str]:
+    """Expand directories to their Streaming_History_Audio_*.json files (sorted)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '**', EXPORT_PATTERN), recursive=True)))
+        else:
+            files.append(path)
+    return files
+
+
+class ChunkWriter:
+    """Buffers mapped plays by play date and writes them out every `chunk_size` plays."""
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        source: str,
+        prefix: str = 'raw',
+        metadata: Optional[Dict] = None,
+        output_format: Optional[str] = None,
+        encoding: Optional[str] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        self.storage = storage
+        self.source = source
+        self.prefix = prefix
+        self.metadata = metadata
+        self.output_format = output_format
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.days: Dict[str, List[Dict]] = {}
+        self.buffered = 0
+        self.chunks = 0
+        self.plays = 0
+        self.keys: List[str] = []
+
+    def add(self, play: Dict) -> None:
+        day = play['played_at'][:10]
+        self.days.setdefault(day, []).append(play)
+        self.buffered += 1
+        if self.buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write one object per buffered play date."""
+        output_format = resolve_format(self.output_format)
+        for day, plays in sorted(self.days.items()):
+            plays.sort(key=lambda p: p['played_at_timestamp'], reverse=True)  # newest first, like the API
+            newest = datetime.fromtimestamp(plays[0]['played_at_timestamp'] / 1000, tz=timezone.utc)
+            key = history_key(self.prefix, day, self.source, self.chunks, output_format)
+            write_tracks(
+                self.storage, plays, metadata=self.metadata, output_format=output_format,
+                encoding=self.encoding, key=key, fetched_at=newest,
+            )
+            self.keys.append(key)
+            self.chunks += 1
+            self.plays += len(plays)
+        self.days = {}
+        self.buffered = 0
+
+
+def import_file(
+    path: str,
+    storage: StorageBackend,
+    prefix: str = 'raw',
+    user_id: Optional[str] = None,
+    output_format: Optional[str] = None,
+    encoding: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    min_ms_played: int = DEFAULT_MIN_MS_PLAYED,
+    catalog: Optional[Dict[str, Dict]] = None,
+) -> Dict:
+    """
+    Stream one export file into raw-layout chunks (runs in a worker process).
+
+    Returns:
+        Stats: file, records, plays, skipped, objects, keys (written)
+    """
+    source = re.sub(r'[^0-9A-Za-z_-]+', '_', os.path.splitext(os.path.basename(path))[0])
+    metadata = {'source': os.path.basename(path)}
+    if user_id:
+        metadata['user_id'] = user_id
+    writer = ChunkWriter(storage, source, prefix, metadata, output_format, encoding, chunk_size)
+
+    records = 0
+    with open(path, encoding='utf-8') as f:
+        for record in iter_json_array(f):
+            records += 1
+            play = map_record(record, min_ms_played, catalog)
+            if play is not None:
+                writer.add(play)
+    writer.flush()
+
+    logger.info(f"{path}: {writer.plays} of {records} records imported in {len(writer.keys)} objects")
+    return {
+        'file': path,
+        'records': records,
+        'plays': writer.plays,
+        'skipped': records - writer.plays,
+        'objects': len(writer.keys),
+        'keys': writer.keys,
+    }
+
+
+def import_history(
+    paths: Iterable[str],
+    storage: StorageBackend,
+    user_id: Optional[str] = None,
+    output_format: Optional[str] = None,
+    encoding: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    min_ms_played: int = DEFAULT_MIN_MS_PLAYED,
+    workers: Optional[int] = None,
+    spotify=None,
+) -> Dict:
+    """
+    Import export files in parallel, one worker process per file.
+
+    The written keys are recorded in one backfill manifest at the end, so
+    an interrupted import is not announced; re-run it (same keys) instead.
+
+    Args:
+        paths: Export files or directories containing them
+        storage: Destination backend (S3Storage or LocalStorage; it is
+            pickled into the workers, which open their own connections)
+        user_id: Listener the export belongs to (None for the legacy single user)
+        output_format: Raw format (defaults to RAW_OUTPUT_FORMAT)
+        encoding: Raw json encoding
+        chunk_size: Plays buffered per worker before writing
+        min_ms_played: Skip shorter plays
+        workers: Worker processes (default: CPU count); 1 runs in-process
+        spotify: Authenticated spotipy client for the track lookup (None:
+            catalog fields stay null)
+
+    Returns:
+        Summary: files, records, plays, skipped, objects (and tracks,
+        tracks_resolved with a lookup)
+    """
+    files = find_exports(paths)
+    if not files:
+        raise ValueError("No Streaming_History_Audio_*.json files found")
+
+    prefix = f"raw/user_id={user_id}" if user_id else 'raw'
+    summary = {'files': len(files), 'records': 0, 'plays': 0, 'skipped': 0, 'objects': 0}
+
+    catalogs = [None] * len(files)
+    if spotify is not None:
+        # Each worker only gets the catalog entries of the tracks in its file
+        track_ids = _run(scan_track_ids, [(path,) for path in files], workers)
+        catalog = lookup_tracks(spotify, set().union(*track_ids))
+        catalogs = [{t: catalog[t] for t in ids if t in catalog} for ids in track_ids]
+        summary['tracks'] = len(set().union(*track_ids))
+        summary['tracks_resolved'] = len(catalog)
+
+    tasks = [
+        (path, storage, prefix, user_id, output_format, encoding, chunk_size, min_ms_played, file_catalog)
+        for path, file_catalog in zip(files, catalogs)
+    ]
+    keys = []
+    for stats in _run(import_file, tasks, workers):
+        for name in ('records', 'plays', 'skipped', 'objects'):
+            summary[name] += stats[name]
+        keys.extend(stats['keys'])
+    # Only after every object exists: discovery reads the manifest's keys on its next run
+    record_backfill(storage, keys)
+    return summary
+
+
+def _run(fn, tasks: List[Tuple], workers: Optional[int]) -> List:
+    """Run fn(*task) for every task, in worker processes unless workers == 1."""
+    if workers == 1 or len(tasks) <= 1:
+        return [fn(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fn, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def build_parser():
+    """Command-line options shared by this module and import_streaming_history.py."""
+    import argparse
+
+    from raw_format import FORMATS
+
+    parser = argparse.ArgumentParser(description="Import Spotify Extended Streaming History exports")
+    parser.add_argument('paths', nargs='+', help="Export directory or Streaming_History_Audio_*.json files")
+    destination = parser.add_mutually_exclusive_group(required=True)
+    destination.add_argument('--bucket', help="Write to this S3 bucket")
+    destination.add_argument('--out', help="Write to this local directory (e.g. data)")
+    parser.add_argument('--user-id', help="Import into raw/user_id=<id> (default: legacy single-user layout)")
+    parser.add_argument('--format', choices=FORMATS, help="Raw output format (default: RAW_OUTPUT_FORMAT)")
+    parser.add_argument('--encoding', choices=('flat', 'normalized'), help="Raw json encoding")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Plays buffered per worker")
+    parser.add_argument('--min-ms-played', type=int, default=DEFAULT_MIN_MS_PLAYED)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument(
+        '--skip-lookup', action='store_true',
+        help="Do not look up artist/album IDs (offline; fct_plays leaves such plays out until re-imported)",
+    )
+    return parser
+
+
+def destination(args) -> StorageBackend:
+    """Storage backend selected by --bucket / --out."""
+    from storage import S3Storage
+
+    return S3Storage(args.bucket) if args.bucket else LocalStorage(args.out)
+
+
+def catalog_client(args):
+    """Authenticated spotipy client for the track lookup (None with --skip-lookup)."""
+    if args.skip_lookup:
+        return None
+    from spotify_client import SpotifyClient
+
+    client = SpotifyClient()
+    client.authenticate()
+    return client.sp
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    summary = import_history(
+        args.paths, destination(args), user_id=args.user_id, output_format=args.format,
+        encoding=args.encoding, chunk_size=args.chunk_size, min_ms_played=args.min_ms_played,
+        workers=args.workers, spotify=catalog_client(args),
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
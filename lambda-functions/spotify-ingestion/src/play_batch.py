@@ -0,0 +1,270 @@
+"""
+Columnar container for decoded recently-played pages.
+
+Every page returned by `current_user_recently_played` is decoded straight into
+parallel columns instead of one dict per play. Timestamps live in an int64
+array, IDs are interned so repeated tracks/artists share one string, and
+dict rows are only built when a caller actually asks for them.
+"""
+from array import array
+from operator import itemgetter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from raw_format import PLAY_FIELDS
+
+# Column order matches the flat play schema written to S3 since day one
+FIELDS = PLAY_FIELDS
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_played_at(iso_string: str) -> int:
+    """
+    Convert a Spotify `played_at` string to Unix milliseconds.
+
+    Pure integer arithmetic on the timedelta from the epoch, so the result
+    is exact (no float rounding) and needs a single C-level parse per play.
+    The trailing 'Z' is rewritten because fromisoformat only accepts it
+    from Python 3.11 on.
+
+    Args:
+        iso_string: ISO 8601 timestamp (e.g., '2024-12-23T10:15:00.123Z')
+
+    Returns:
+        Unix timestamp in milliseconds
+    """
+    delta = datetime.fromisoformat(iso_string.replace('Z', '+00:00')) - _EPOCH
+    return delta.days * 86400000 + delta.seconds * 1000 + delta.microseconds // 1000
+
+
+class PlayBatch:
+    """
+    Compact, column-oriented batch of play events.
+
+    Behaves like a read-only sequence of play dicts (len, indexing,
+    iteration), so existing callers keep working, while the hot paths
+    (decode, extend, sort, timestamp min/max) never touch dicts at all.
+    """
+
+    # _ids: canonical copy of every ID in this batch. Works like sys.intern
+    # but is a plain dict, so whole columns can be interned with one C-level
+    # map() and null IDs (local files, podcasts) pass through untouched. It
+    # lives and dies with the batch, so warm invocations do not accumulate IDs.
+    __slots__ = FIELDS + ('_ids',)
+
+    def __init__(self):
+        """Create an empty batch."""
+        for name in FIELDS:
+            setattr(self, name, [])
+        self._ids: Dict[Optional[str], Optional[str]] = {}
+        self.played_at_timestamp = array('q')
+        self.duration_ms = array('q')
+
+    @classmethod
+    def from_items(cls, items: Iterable[Dict]) -> 'PlayBatch':
+        """
+        Decode raw API items (one recently-played page) into a new batch.
+
+        Args:
+            items: `items` list from a recently-played API response
+
+        Returns:
+            PlayBatch holding the decoded plays in API order
+        """
+        batch = cls()
+        batch.extend_items(items)
+        return batch
+
+    @classmethod
+    def from_dicts(cls, tracks: Iterable[Dict]) -> 'PlayBatch':
+        """
+        Build a batch from already-flattened play dicts (e.g. a saved file).
+
+        Args:
+            tracks: Play dictionaries in the flat S3 schema
+
+        Returns:
+            PlayBatch holding the same plays
+        """
+        batch = cls()
+        for track in tracks:
+            batch.append_row(tuple(track[name] for name in FIELDS))
+        return batch
+
+    def extend_items(self, items: Iterable[Dict]) -> int:
+        """
+        Decode raw API items and append them to this batch.
+
+        Args:
+            items: `items` list from a recently-played API response
+
+        Returns:
+            Number of plays appended
+        """
+        items = items if isinstance(items, list) else list(items)
+        tracks = [item['track'] for item in items]
+        artists = [track['artists'][0] for track in tracks]
+        albums = [track['album'] for track in tracks]
+        played_at = [item['played_at'] for item in items]
+        track_ids = [track['id'] for track in tracks]
+        artist_ids = [artist['id'] for artist in artists]
+        album_ids = [album['id'] for album in albums]
+
+        intern_ids = self._ids.setdefault
+        self.played_at.extend(played_at)
+        self.played_at_timestamp.fromlist(list(map(parse_played_at, played_at)))
+        self.track_id.extend(map(intern_ids, track_ids, track_ids))
+        self.track_name.extend([track['name'] for track in tracks])
+        self.artist_id.extend(map(intern_ids, artist_ids, artist_ids))
+        self.artist_name.extend([artist['name'] for artist in artists])
+        self.album_id.extend(map(intern_ids, album_ids, album_ids))
+        self.album_name.extend([album['name'] for album in albums])
+        self.release_date.extend([album['release_date'] for album in albums])
+        self.duration_ms.fromlist([track['duration_ms'] for track in tracks])
+        self.popularity.extend([track['popularity'] for track in tracks])
+
+        return len(items)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple]) -> 'PlayBatch':
+        """
+        Build a batch from plays given as tuples in FIELDS order.
+
+        Column-wise: one transpose and one extend per field, so large
+        generated or imported batches skip the per-row append.
+
+        Args:
+            rows: Play values ordered like FIELDS
+
+        Returns:
+            PlayBatch holding the plays in the given order
+        """
+        batch = cls()
+        columns = list(zip(*rows))
+        if not columns:
+            return batch
+        intern_ids = batch._ids.setdefault
+        for name, column in zip(FIELDS, columns):
+            if name in ('track_id', 'artist_id', 'album_id'):
+                column = map(intern_ids, column, column)
+            getattr(batch, name).extend(column)
+        return batch
+
+    def append_row(self, row: Tuple) -> None:
+        """
+        Append one play given as a tuple in FIELDS order.
+
+        Args:
+            row: Play values ordered like FIELDS
+        """
+        for name, value in zip(FIELDS, row):
+            if name in ('track_id', 'artist_id', 'album_id'):
+                value = self._ids.setdefault(value, value)
+            getattr(self, name).append(value)
+
+    def extend(self, other: 'PlayBatch') -> None:
+        """
+        Append all plays from another batch (column-wise, no dicts built).
+
+        Args:
+            other: Batch to append
+        """
+        for name in FIELDS:
+            getattr(self, name).extend(getattr(other, name))
+
+    def sort(self) -> None:
+        """Sort plays in place by timestamp, oldest first (stable)."""
+        timestamps = self.played_at_timestamp
+        if len(timestamps) < 2:
+            return
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        permute = itemgetter(*order)
+        for name in FIELDS:
+            column = getattr(self, name)
+            if isinstance(column, array):
+                setattr(self, name, array(column.typecode, permute(column)))
+            else:
+                setattr(self, name, list(permute(column)))
+
+    def column(self, name: str) -> Union[List, memoryview]:
+        """
+        Return a zero-copy view of one column.
+
+        Integer columns come back as a memoryview over the int64 buffer,
+        string columns as the underlying list. Callers must not mutate them.
+
+        Args:
+            name: Field name from FIELDS
+
+        Returns:
+            Column view
+        """
+        values = getattr(self, name)
+        if isinstance(values, array):
+            return memoryview(values)
+        return values
+
+    def iter_rows(self) -> Iterator[Tuple]:
+        """Yield each play as a tuple in FIELDS order (no dicts built)."""
+        return zip(*(getattr(self, name) for name in FIELDS))
+
+    def row(self, index: int) -> Dict:
+        """
+        Build the flat play dict for one position.
+
+        Args:
+            index: Play position (negative indexes allowed)
+
+        Returns:
+            Play dictionary in the flat S3 schema
+        """
+        return {name: getattr(self, name)[index] for name in FIELDS}
+
+    def to_dicts(self) -> List[Dict]:
+        """
+        Materialize the batch as a list of play dicts.
+
+        Returns:
+            List of play dictionaries, in batch order
+        """
+        return [
+            {
+                'played_at': played_at,
+                'played_at_timestamp': timestamp,
+                'track_id': track_id,
+                'track_name': track_name,
+                'artist_id': artist_id,
+                'artist_name': artist_name,
+                'album_id': album_id,
+                'album_name': album_name,
+                'release_date': release_date,
+                'duration_ms': duration_ms,
+                'popularity': popularity,
+            }
+            for (
+                played_at, timestamp, track_id, track_name, artist_id, artist_name,
+                album_id, album_name, release_date, duration_ms, popularity,
+            ) in self.iter_rows()
+        ]
+
+    def oldest_timestamp(self) -> Optional[int]:
+        """Smallest played_at_timestamp, or None if empty."""
+        return min(self.played_at_timestamp) if self else None
+
+    def latest_timestamp(self) -> Optional[int]:
+        """Largest played_at_timestamp, or None if empty."""
+        return max(self.played_at_timestamp) if self else None
+
+    def __len__(self) -> int:
+        return len(self.played_at_timestamp)
+
+    def __getitem__(self, index: int) -> Dict:
+        return self.row(index)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for values in self.iter_rows():
+            yield dict(zip(FIELDS, values))
+
+    def __repr__(self) -> str:
+        return f"PlayBatch({len(self)} plays)"
@@ -4,11 +4,14 @@ Production-ready code that works locally and in AWS Lambda.
 """
 import os
 import logging
-from typing import Dict, List, Optional
-from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Iterator, Optional
 
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+import metrics
+from auth_cache import DEFAULT_TOKEN_KEY, get_spotify
+from play_batch import PlayBatch, parse_played_at
+
+if TYPE_CHECKING:
+    import requests
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,6 +30,10 @@ class SpotifyClient:
         client_id: Optional[str] = None,
         client_secret: Optional[str] = None,
         redirect_uri: Optional[str] = None,
+        token_key: str = DEFAULT_TOKEN_KEY,
+        cache_path: Optional[str] = None,
+        requests_session: Optional['requests.Session'] = None,
+        s3_client=None,
     ):
         """
         Initialize Spotify client.
@@ -35,6 +42,12 @@ class SpotifyClient:
             client_id: Spotify app client ID (defaults to env var)
             client_secret: Spotify app client secret (defaults to env var)
             redirect_uri: OAuth redirect URI (defaults to env var)
+            token_key: S3 key of the cached OAuth token (Lambda only)
+            cache_path: Local token cache file (defaults per environment)
+            requests_session: Shared HTTP session for Spotify calls.
+                If None, a rate-limited session is built on first authenticate().
+            s3_client: Shared boto3 S3 client for the token round-trip.
+                If None, a module-level client is reused.
             
         Raises:
             ValueError: If credentials are missing
@@ -50,6 +63,11 @@ class SpotifyClient:
                 "SPOTIFY_CLIENT_SECRET, and SPOTIFY_REDIRECT_URI"
             )
         
+        self.token_key = token_key
+        self.cache_path = cache_path
+        self.requests_session = requests_session
+        self.s3_client = s3_client
+        
         self.sp = None
         logger.info("SpotifyClient initialized")
 
@@ -60,55 +78,21 @@ class SpotifyClient:
         
         In Lambda: Uses cached token from S3, uploads refreshed token back
         Locally: Uses browser-based OAuth flow
-        """
-        scope = "user-read-recently-played"
-        
-        # Check if running in Lambda (AWS_EXECUTION_ENV exists)
-        is_lambda = 'AWS_EXECUTION_ENV' in os.environ
-        
-        if is_lambda:
-            # Lambda: Download cached token from S3
-            cache_path = '/tmp/.spotify_cache'
-            try:
-                import boto3
-                s3 = boto3.client('s3')
-                bucket = os.environ.get('S3_BUCKET')
-                s3.download_file(bucket, 'secrets/spotify_token', cache_path)
-                logger.info("Downloaded Spotify token from S3")
-            except Exception as e:
-                logger.error(f"Failed to download token from S3: {str(e)}")
-                raise
-            
-            open_browser = False
-        else:
-            # Local: Use current directory
-            cache_path = ".spotify_cache"
-            open_browser = True
         
+        Warm Lambda invocations reuse the client built on the cold start and
+        skip the S3 download and validation call while the token is valid.
+        """
         try:
-            auth_manager = SpotifyOAuth(
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-                redirect_uri=self.redirect_uri,
-                scope=scope,
-                cache_path=cache_path,
-                open_browser=open_browser
+            self.sp = get_spotify(
+                self.client_id,
+                self.client_secret,
+                self.redirect_uri,
+                token_key=self.token_key,
+                cache_path=self.cache_path,
+                requests_session=self.requests_session,
+                s3_client=self.s3_client,
             )
-            
-            self.sp = spotipy.Spotify(auth_manager=auth_manager)
-            
-            # Test authentication (this triggers token refresh if needed)
-            user = self.sp.current_user()
-            logger.info(f"Authenticated as: {user['display_name']} ({user['id']})")
-            
-            # CRITICAL FIX: If in Lambda, upload refreshed token back to S3
-            if is_lambda:
-                try:
-                    s3.upload_file(cache_path, bucket, 'secrets/spotify_token')
-                    logger.info("Uploaded refreshed token to S3")
-                except Exception as e:
-                    logger.error(f"Failed to upload refreshed token to S3: {str(e)}")
-                    # Don't raise - authentication already worked
+            logger.info("Authenticated with Spotify")
             
         except Exception as e:
             logger.error(f"Authentication failed: {str(e)}")
@@ -118,7 +102,7 @@ class SpotifyClient:
         self, 
         limit: int = 50,
         after: Optional[int] = None
-    ) -> List[Dict]:
+    ) -> PlayBatch:
         """
         Fetch recently played tracks from Spotify.
         
@@ -127,7 +111,7 @@ class SpotifyClient:
             after: Unix timestamp (ms). Only fetch plays after this time.
             
         Returns:
-            List of simplified track dictionaries with play metadata
+            PlayBatch of plays (iterates/indexes as simplified track dicts)
             
         Raises:
             ValueError: If not authenticated
@@ -147,25 +131,10 @@ class SpotifyClient:
                 params['after'] = after
             
             logger.info(f"Fetching recently played: limit={limit}, after={after}")
-            results = self.sp.current_user_recently_played(**params)
+            results = self._recently_played_page(params)
             
-            # Transform to simpler structure
-            tracks = []
-            for item in results['items']:
-                track_data = {
-                    'played_at': item['played_at'],
-                    'played_at_timestamp': self._parse_timestamp(item['played_at']),
-                    'track_id': item['track']['id'],
-                    'track_name': item['track']['name'],
-                    'artist_id': item['track']['artists'][0]['id'],
-                    'artist_name': item['track']['artists'][0]['name'],
-                    'album_id': item['track']['album']['id'],
-                    'album_name': item['track']['album']['name'],
-                    'release_date': item['track']['album']['release_date'],
-                    'duration_ms': item['track']['duration_ms'],
-                    'popularity': item['track']['popularity'],
-                }
-                tracks.append(track_data)
+            # Decode the page into a columnar batch
+            tracks = PlayBatch.from_items(results['items'])
             
             logger.info(f"Fetched {len(tracks)} tracks")
             return tracks
@@ -174,6 +143,12 @@ class SpotifyClient:
             logger.error(f"Failed to fetch recently played: {str(e)}")
             raise
     
+    def _recently_played_page(self, params: dict) -> dict:
+        """One recently-played API page (counted as `api_pages`)."""
+        results = self.sp.current_user_recently_played(**params)
+        metrics.count('api_pages')
+        return results
+    
     @staticmethod
     def _parse_timestamp(iso_string: str) -> int:
         """
@@ -185,28 +160,31 @@ class SpotifyClient:
         Returns:
             Unix timestamp in milliseconds
         """
-        dt = datetime.fromisoformat(iso_string.replace('Z', '+00:00'))
-        return int(dt.timestamp() * 1000)
+        return parse_played_at(iso_string)
     
 
 
-    def get_all_recent_history(self) -> List[Dict]:
+    def iter_history_pages(self, max_pages: int = 100) -> Iterator[PlayBatch]:
         """
-        Fetch all available recently played tracks by paginating through API.
+        Yield each page of available history as soon as it is decoded.
         
-        Spotify's "recently played" typically stores ~2 weeks of history.
-        This method paginates backward in time until no more tracks are available.
+        Paginates backward in time (newest page first, plays within a page
+        newest first), so callers can write pages out while later pages are
+        still being fetched and memory stays at one page.
         
-        Returns:
-            List of all available track play events, ordered oldest to newest
+        Args:
+            max_pages: Safety cap on pages fetched
+            
+        Yields:
+            PlayBatch per API page (up to 50 plays)
             
         Raises:
             ValueError: If not authenticated
+            Exception: If the first page fails (later failures end the stream)
         """
         if not self.sp:
             raise ValueError("Not authenticated. Call authenticate() first.")
         
-        all_tracks = []
         before_timestamp = None  # Start with most recent
         page = 1
         
@@ -221,73 +199,75 @@ class SpotifyClient:
                 
                 # Fetch batch
                 logger.info(f"Fetching page {page}: before={before_timestamp}")
-                results = self.sp.current_user_recently_played(**params)
+                results = self._recently_played_page(params)
                 tracks_data = results.get('items', [])
                 
                 if not tracks_data:
                     logger.info("No more tracks available")
-                    break
-                
-                # Transform tracks
-                tracks = []
-                for item in tracks_data:
-                    track_data = {
-                        'played_at': item['played_at'],
-                        'played_at_timestamp': self._parse_timestamp(item['played_at']),
-                        'track_id': item['track']['id'],
-                        'track_name': item['track']['name'],
-                        'artist_id': item['track']['artists'][0]['id'],
-                        'artist_name': item['track']['artists'][0]['name'],
-                        'album_id': item['track']['album']['id'],
-                        'album_name': item['track']['album']['name'],
-                        'release_date': item['track']['album']['release_date'],
-                        'duration_ms': item['track']['duration_ms'],
-                        'popularity': item['track']['popularity'],
-                    }
-                    tracks.append(track_data)
-                
-                all_tracks.extend(tracks)
-                logger.info(f"Page {page}: Fetched {len(tracks)} tracks. Total so far: {len(all_tracks)}")
-                
-                # Check if we got less than 50 (indicates end of available history)
-                if len(tracks) < 50:
-                    logger.info("Received fewer than 50 tracks, reached end of history")
-                    break
+                    return
                 
-                # Update before_timestamp for next iteration
-                # Use the OLDEST track's timestamp from this batch
-                before_timestamp = tracks[-1]['played_at_timestamp']
-                
-                page += 1
-                
-                # Safety check: prevent infinite loops
-                if page > 100:
-                    logger.warning("Reached 100 pages, stopping to prevent infinite loop")
-                    break
+                # Decode the whole page into columns
+                tracks = PlayBatch.from_items(tracks_data)
                     
             except Exception as e:
                 logger.error(f"Error on page {page}: {str(e)}")
-                # Don't lose data we already fetched
-                if all_tracks:
-                    logger.info(f"Returning {len(all_tracks)} tracks fetched before error")
-                    break
-                else:
-                    raise
+                # Don't lose data we already handed out
+                if page > 1:
+                    logger.info(f"Stopping after {page - 1} pages fetched before error")
+                    return
+                raise
+            
+            logger.info(f"Page {page}: Fetched {len(tracks)} tracks")
+            yield tracks
+            
+            # Check if we got less than 50 (indicates end of available history)
+            if len(tracks) < 50:
+                logger.info("Received fewer than 50 tracks, reached end of history")
+                return
+            
+            # Update before_timestamp for next iteration
+            # Use the OLDEST track's timestamp from this batch
+            before_timestamp = tracks.played_at_timestamp[-1]
+            
+            page += 1
+            
+            # Safety check: prevent infinite loops
+            if page > max_pages:
+                logger.warning(f"Reached {max_pages} pages, stopping to prevent infinite loop")
+                return
+
+    def get_all_recent_history(self) -> PlayBatch:
+        """
+        Fetch all available recently played tracks by paginating through API.
+        
+        Spotify's "recently played" typically stores ~2 weeks of history.
+        This method paginates backward in time until no more tracks are available.
+        For long backfills prefer iter_history_pages() with a streaming writer.
+        
+        Returns:
+            PlayBatch of all available play events, ordered oldest to newest
+            
+        Raises:
+            ValueError: If not authenticated
+        """
+        all_tracks = PlayBatch()
+        for tracks in self.iter_history_pages():
+            all_tracks.extend(tracks)
         
         # Sort by timestamp (oldest first)
-        all_tracks.sort(key=lambda x: x['played_at_timestamp'])
+        all_tracks.sort()
         
         logger.info(f"Completed history fetch: {len(all_tracks)} total tracks")
         
         if all_tracks:
-            oldest = all_tracks[0]['played_at']
-            newest = all_tracks[-1]['played_at']
+            oldest = all_tracks.played_at[0]
+            newest = all_tracks.played_at[-1]
             logger.info(f"Date range: {oldest} to {newest}")
         
         return all_tracks
     
 
-    def get_recent_plays_since(self, after_timestamp: int) -> List[Dict]:
+    def get_recent_plays_since(self, after_timestamp: int) -> PlayBatch:
         """
         Fetch recently played tracks after a specific timestamp.
         
@@ -297,7 +277,7 @@ class SpotifyClient:
             after_timestamp: Unix timestamp in milliseconds. Fetch plays after this time.
             
         Returns:
-            List of new track play events since the timestamp
+            PlayBatch of new play events since the timestamp, oldest first
             
         Raises:
             ValueError: If not authenticated
@@ -307,7 +287,7 @@ class SpotifyClient:
         
         logger.info(f"Fetching plays after timestamp: {after_timestamp}")
         
-        all_new_tracks = []
+        all_new_tracks = PlayBatch()
         current_after = after_timestamp
         page = 1
         
@@ -317,30 +297,15 @@ class SpotifyClient:
                 params = {'limit': 50, 'after': current_after}
                 
                 logger.info(f"Incremental fetch page {page}: after={current_after}")
-                results = self.sp.current_user_recently_played(**params)
+                results = self._recently_played_page(params)
                 tracks_data = results.get('items', [])
                 
                 if not tracks_data:
                     logger.info("No new tracks found")
                     break
                 
-                # Transform tracks
-                tracks = []
-                for item in tracks_data:
-                    track_data = {
-                        'played_at': item['played_at'],
-                        'played_at_timestamp': self._parse_timestamp(item['played_at']),
-                        'track_id': item['track']['id'],
-                        'track_name': item['track']['name'],
-                        'artist_id': item['track']['artists'][0]['id'],
-                        'artist_name': item['track']['artists'][0]['name'],
-                        'album_id': item['track']['album']['id'],
-                        'album_name': item['track']['album']['name'],
-                        'release_date': item['track']['album']['release_date'],
-                        'duration_ms': item['track']['duration_ms'],
-                        'popularity': item['track']['popularity'],
-                    }
-                    tracks.append(track_data)
+                # Decode the whole page into columns
+                tracks = PlayBatch.from_items(tracks_data)
                 
                 all_new_tracks.extend(tracks)
                 logger.info(f"Page {page}: Fetched {len(tracks)} new tracks. Total: {len(all_new_tracks)}")
@@ -351,7 +316,7 @@ class SpotifyClient:
                     break
                 
                 # Update timestamp for next page (use newest track from this batch)
-                current_after = tracks[0]['played_at_timestamp']
+                current_after = tracks.played_at_timestamp[0]
                 page += 1
                 
                 # Safety check
@@ -368,7 +333,7 @@ class SpotifyClient:
                     raise
         
         # Sort chronologically (oldest first)
-        all_new_tracks.sort(key=lambda x: x['played_at_timestamp'])
+        all_new_tracks.sort()
         
         logger.info(f"Incremental fetch complete: {len(all_new_tracks)} new tracks")
         return all_new_tracks
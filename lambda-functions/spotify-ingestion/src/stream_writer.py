@@ -0,0 +1,244 @@
+"""
+Incremental S3 writer for long history backfills.
+
+Pages from SpotifyClient.iter_history_pages() are serialized and shipped
+as they arrive instead of being collected, sorted and dumped as one big
+string, so peak memory stays at roughly one upload part regardless of how
+long the backfill runs.
+
+Two modes:
+    multipart: one object per run, uploaded with S3 multipart upload.
+               Same envelope as save_tracks_to_s3 (track_count is written
+               last because it is only known at the end).
+    parts:     one small envelope object per page, written immediately, so
+               the first bytes land in S3 after a single page's latency.
+
+With an NDJSON output format (see raw_format.py) the same modes write
+compressed one-play-per-line objects instead of envelopes; in multipart
+mode the compressor runs across pages, so parts carry compressed bytes.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Union
+
+from play_batch import FIELDS, PlayBatch
+from raw_format import NDJSON_CONTENT_TYPE, NDJSONEncoder, encode_ndjson, resolve_format
+from utils import get_s3_client
+
+logger = logging.getLogger(__name__)
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3PlayStreamWriter:
+    """
+    Write play pages to S3 incrementally.
+
+    Use as a context manager: on error the multipart upload is aborted so
+    no half-written object (or orphaned parts) is left behind.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        prefix: str = "raw",
+        s3_client=None,
+        mode: str = "multipart",
+        part_size: int = MIN_PART_SIZE,
+        metadata: Optional[Dict] = None,
+        output_format: Optional[str] = None,
+    ):
+        """
+        Initialize writer.
+
+        Args:
+            bucket_name: S3 bucket name
+            prefix: S3 key prefix (e.g., 'raw')
+            s3_client: Shared boto3 S3 client (created if None)
+            mode: 'multipart' (one object) or 'parts' (one object per page)
+            part_size: Bytes buffered before a multipart part is uploaded
+            metadata: Extra envelope fields (e.g., user_id)
+            output_format: 'json', 'ndjson.gz' or 'ndjson.zst'
+                (defaults to RAW_OUTPUT_FORMAT)
+        """
+        if mode not in ("multipart", "parts"):
+            raise ValueError(f"Unknown stream mode: {mode}")
+
+        self.bucket_name = bucket_name
+        self.s3 = get_s3_client(s3_client)
+        self.mode = mode
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.metadata = metadata or {}
+        self.output_format = resolve_format(output_format)
+        self.content_type = 'application/json' if self.output_format == 'json' else NDJSON_CONTENT_TYPE
+
+        now = datetime.now(timezone.utc)
+        self.fetched_at = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.key_base = (
+            f"{prefix}/year={now.year}/month={now.month:02d}/day={now.day:02d}/"
+            f"spotify_plays_{now.strftime('%Y%m%d_%H%M%S')}"
+        )
+
+        self.keys: List[str] = []
+        self.track_count = 0
+        self.page_count = 0
+        self.bytes_written = 0
+        self.latest_timestamp: Optional[int] = None
+
+        self._upload_id = None
+        self._parts: List[Dict] = []
+        self._buffer = bytearray()
+        self._encoder: Optional[NDJSONEncoder] = None
+
+    def write_page(self, tracks: Union[PlayBatch, List[Dict]]) -> None:
+        """
+        Serialize one page and ship it (or buffer it for the next part).
+
+        Args:
+            tracks: One decoded page of plays
+        """
+        if not tracks:
+            return
+
+        if isinstance(tracks, PlayBatch):
+            latest = tracks.latest_timestamp()
+            records = [dict(zip(FIELDS, row)) for row in tracks.iter_rows()]
+        else:
+            latest = max(t['played_at_timestamp'] for t in tracks)
+            records = tracks
+        if self.latest_timestamp is None or latest > self.latest_timestamp:
+            self.latest_timestamp = latest
+
+        if self.mode == "parts":
+            self._put_page_object(records)
+        else:
+            self._append_multipart(records)
+
+        self.track_count += len(records)
+        self.page_count += 1
+
+    def close(self) -> Optional[str]:
+        """
+        Finish the upload.
+
+        Returns:
+            Key of the multipart object (or last part object), None if
+            nothing was written
+        """
+        if self.mode == "multipart" and self.track_count:
+            if self._encoder is not None:
+                self._buffer += self._encoder.finish()
+            else:
+                self._buffer += self._encode_footer()
+            self._upload_part(final=True)
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.keys[0],
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': self._parts},
+            )
+            self._upload_id = None
+            logger.info(
+                f"Streamed {self.track_count} tracks in {self.page_count} pages "
+                f"to s3://{self.bucket_name}/{self.keys[0]}"
+            )
+        elif self.mode == "parts" and self.keys:
+            logger.info(f"Streamed {self.track_count} tracks as {len(self.keys)} part objects")
+
+        return self.keys[-1] if self.keys else None
+
+    def abort(self) -> None:
+        """Abort an in-progress multipart upload."""
+        if self._upload_id:
+            self.s3.abort_multipart_upload(
+                Bucket=self.bucket_name, Key=self.keys[0], UploadId=self._upload_id
+            )
+            logger.warning(f"Aborted multipart upload for {self.keys[0]}")
+            self._upload_id = None
+
+    def __enter__(self) -> 'S3PlayStreamWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _put_page_object(self, records: List[Dict]) -> None:
+        """Write one complete object (envelope or NDJSON) for a single page."""
+        key = f"{self.key_base}_part{self.page_count + 1:04d}.{self.output_format}"
+        if self.output_format == 'json':
+            body = json.dumps({
+                "fetched_at": self.fetched_at,
+                **self.metadata,
+                "track_count": len(records),
+                "tracks": records,
+            }, ensure_ascii=False).encode('utf-8')
+        else:
+            body = encode_ndjson(records, self.output_format, self._batch_metadata())
+        self.s3.put_object(
+            Bucket=self.bucket_name, Key=key, Body=body, ContentType=self.content_type
+        )
+        self.keys.append(key)
+        self.bytes_written += len(body)
+
+    def _append_multipart(self, records: List[Dict]) -> None:
+        """Append records to the multipart stream, uploading full parts."""
+        if self._upload_id is None:
+            key = f"{self.key_base}.{self.output_format}"
+            response = self.s3.create_multipart_upload(
+                Bucket=self.bucket_name, Key=key, ContentType=self.content_type
+            )
+            self._upload_id = response['UploadId']
+            self.keys.append(key)
+            if self.output_format == 'json':
+                self._buffer += self._encode_header()
+            else:
+                self._encoder = NDJSONEncoder(self.output_format, self._batch_metadata())
+
+        if self._encoder is not None:
+            self._buffer += self._encoder.encode(records)
+        else:
+            self._append_envelope_records(records)
+
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+
+    def _append_envelope_records(self, records: List[Dict]) -> None:
+        """Append records to the open tracks array of a json envelope."""
+        separator = b"" if self.track_count == 0 else b",\n"
+        self._buffer += separator + ",\n".join(
+            json.dumps(record, ensure_ascii=False) for record in records
+        ).encode('utf-8')
+
+    def _upload_part(self, final: bool = False) -> None:
+        """Upload the buffered bytes as the next multipart part."""
+        if not self._buffer and not final:
+            return
+        part_number = len(self._parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.keys[0],
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=bytes(self._buffer),
+        )
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self.bytes_written += len(self._buffer)
+        self._buffer = bytearray()
+
+    def _batch_metadata(self) -> Dict:
+        """Columns repeated on every NDJSON line."""
+        return {"fetched_at": self.fetched_at, **self.metadata}
+
+    def _encode_header(self) -> bytes:
+        """Envelope start: metadata then the opening of the tracks array."""
+        head = json.dumps({"fetched_at": self.fetched_at, **self.metadata}, ensure_ascii=False)
+        return (head[:-1] + ', "tracks": [\n').encode('utf-8')
+
+    def _encode_footer(self) -> bytes:
+        """Envelope end: close tracks and append the final count."""
+        return f'\n], "track_count": {self.track_count}}}'.encode('utf-8')
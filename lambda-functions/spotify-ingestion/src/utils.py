@@ -2,20 +2,69 @@
 Utility functions for data persistence and state management.
 """
 import json
-import os
-from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 from datetime import datetime, timezone
 import logging
-import boto3
-from botocore.exceptions import ClientError
+
+import metrics
+from play_batch import PlayBatch
+from raw_format import (
+    NDJSON_CONTENT_TYPE,
+    PLAY_FIELDS,
+    encode_ndjson,
+    envelope_records,
+    normalize_plays,
+    resolve_encoding,
+    resolve_format,
+)
+
+from storage import LocalStorage, S3Storage, StorageBackend, shared_s3_client
 
 
 logger = logging.getLogger(__name__)
 
+STATE_KEY = "state/last_run_state.json"
+# Local runs keep state next to the data directory's raw files
+LOCAL_STATE_KEY = "last_run_state.json"
+
+
+def get_s3_client(s3_client=None):
+    """
+    Return the caller's S3 client, or the process-wide pooled one.
+    
+    boto3 is imported only when the shared client is first created, so
+    local-JSON runs never pay for it and warm invocations reuse its
+    connections (see storage.shared_s3_client).
+    """
+    if s3_client is not None:
+        return s3_client
+    return shared_s3_client()
+
+
+def _to_records(tracks: Union[PlayBatch, List[Dict]]) -> List[Dict]:
+    """
+    Return plain play dicts ready for JSON serialization.
+    
+    Args:
+        tracks: PlayBatch or list of track dictionaries
+        
+    Returns:
+        List of track dictionaries
+    """
+    if isinstance(tracks, PlayBatch):
+        return tracks.to_dicts()
+    return tracks
+
+
+def _to_rows(tracks: Union[PlayBatch, List[Dict]]):
+    """Plays as tuples in PLAY_FIELDS order (no dicts built for a PlayBatch)."""
+    if isinstance(tracks, PlayBatch):
+        return tracks.iter_rows()
+    return (tuple(track.get(name) for name in PLAY_FIELDS) for track in tracks)
+
 
 def save_tracks_to_json(
-    tracks: List[Dict],
+    tracks: Union[PlayBatch, List[Dict]],
     output_dir: str = "data",
     filename: Optional[str] = None
 ) -> str:
@@ -23,39 +72,20 @@ def save_tracks_to_json(
     Save tracks to a JSON file.
     
     Args:
-        tracks: List of track dictionaries
+        tracks: PlayBatch or list of track dictionaries
         output_dir: Directory to save file (created if doesn't exist)
         filename: Optional custom filename. If None, uses timestamp.
         
     Returns:
         Path to saved file
     """
-    # Create output directory if it doesn't exist
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
-    
-    # Generate timestamp once
-    now = datetime.now(timezone.utc)
-    
-    # Generate filename with timestamp if not provided
     if filename is None:
-        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
         filename = f"spotify_plays_{timestamp}.json"
     
-    filepath = os.path.join(output_dir, filename)
-    
-    # Prepare data with metadata
-    data = {
-        "fetched_at": now.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "track_count": len(tracks),
-        "tracks": tracks
-    }
-    
-    # Save to file
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    
-    logger.info(f"Saved {len(tracks)} tracks to {filepath}")
-    return filepath
+    storage = LocalStorage(output_dir)
+    write_tracks(storage, tracks, key=filename, output_format='json', encoding='flat')
+    return storage.location(filename)
 
 
 def load_tracks_from_json(filepath: str) -> List[Dict]:
@@ -71,17 +101,17 @@ def load_tracks_from_json(filepath: str) -> List[Dict]:
     with open(filepath, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
-    tracks = data.get('tracks', [])
+    tracks = list(envelope_records(data))
     logger.info(f"Loaded {len(tracks)} tracks from {filepath}")
     return tracks
 
 
-def get_latest_timestamp(tracks: List[Dict]) -> Optional[int]:
+def get_latest_timestamp(tracks: Union[PlayBatch, List[Dict]]) -> Optional[int]:
     """
     Get the most recent timestamp from a list of tracks.
     
     Args:
-        tracks: List of track dictionaries
+        tracks: PlayBatch or list of track dictionaries
         
     Returns:
         Most recent played_at_timestamp, or None if no tracks
@@ -89,15 +119,18 @@ def get_latest_timestamp(tracks: List[Dict]) -> Optional[int]:
     if not tracks:
         return None
     
+    if isinstance(tracks, PlayBatch):
+        return tracks.latest_timestamp()
+    
     return max(track['played_at_timestamp'] for track in tracks)
 
 
-def get_oldest_timestamp(tracks: List[Dict]) -> Optional[int]:
+def get_oldest_timestamp(tracks: Union[PlayBatch, List[Dict]]) -> Optional[int]:
     """
     Get the oldest timestamp from a list of tracks.
     
     Args:
-        tracks: List of track dictionaries
+        tracks: PlayBatch or list of track dictionaries
         
     Returns:
         Oldest played_at_timestamp, or None if no tracks
@@ -105,6 +138,9 @@ def get_oldest_timestamp(tracks: List[Dict]) -> Optional[int]:
     if not tracks:
         return None
     
+    if isinstance(tracks, PlayBatch):
+        return tracks.oldest_timestamp()
+    
     return min(track['played_at_timestamp'] for track in tracks)
 
 
@@ -122,21 +158,9 @@ def save_state(last_timestamp: int, state_dir: str = "data") -> str:
     Returns:
         Path to state file
     """
-    Path(state_dir).mkdir(parents=True, exist_ok=True)
-    
-    state_file = os.path.join(state_dir, "last_run_state.json")
-    
-    state = {
-        "last_processed_timestamp": last_timestamp,
-        "last_processed_at": datetime.fromtimestamp(last_timestamp / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "updated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-    }
-    
-    with open(state_file, 'w', encoding='utf-8') as f:
-        json.dump(state, f, indent=2)
-    
-    logger.info(f"Saved state: last_timestamp={last_timestamp}")
-    return state_file
+    storage = LocalStorage(state_dir)
+    write_state(storage, last_timestamp, key=LOCAL_STATE_KEY)
+    return storage.location(LOCAL_STATE_KEY)
 
 
 def load_state(state_dir: str = "data") -> Optional[int]:
@@ -149,18 +173,7 @@ def load_state(state_dir: str = "data") -> Optional[int]:
     Returns:
         Last processed timestamp in milliseconds, or None if no state exists
     """
-    state_file = os.path.join(state_dir, "last_run_state.json")
-    
-    if not os.path.exists(state_file):
-        logger.info("No previous state found - this is the first run")
-        return None
-    
-    with open(state_file, 'r', encoding='utf-8') as f:
-        state = json.load(f)
-    
-    last_timestamp = state.get('last_processed_timestamp')
-    logger.info(f"Loaded state: last_timestamp={last_timestamp}")
-    return last_timestamp
+    return read_state(LocalStorage(state_dir), key=LOCAL_STATE_KEY)
 
 
 def is_first_run(state_dir: str = "data") -> bool:
@@ -173,60 +186,160 @@ def is_first_run(state_dir: str = "data") -> bool:
     Returns:
         True if first run, False otherwise
     """
-    state_file = os.path.join(state_dir, "last_run_state.json")
-    return not os.path.exists(state_file)
+    return LocalStorage(state_dir).get_bytes(LOCAL_STATE_KEY) is None
 
 
-def save_tracks_to_s3(
-    tracks: List[Dict],
-    bucket_name: str,
-    prefix: str = "raw"
+def write_tracks(
+    storage: StorageBackend,
+    tracks: Union[PlayBatch, List[Dict]],
+    prefix: str = "raw",
+    metadata: Optional[Dict] = None,
+    output_format: Optional[str] = None,
+    encoding: Optional[str] = None,
+    key: Optional[str] = None,
+    fetched_at: Optional[datetime] = None
 ) -> str:
     """
-    Save tracks to S3 with date partitioning.
+    Write a batch of plays to any storage backend.
     
     Args:
-        tracks: List of track dictionaries
-        bucket_name: S3 bucket name
-        prefix: S3 key prefix (e.g., 'raw', 'processed')
+        storage: S3Storage, LocalStorage or MemoryStorage
+        tracks: PlayBatch or list of track dictionaries
+        prefix: Key prefix (e.g., 'raw', 'raw/user_id=<id>')
+        metadata: Extra envelope fields (e.g., user_id) stored next to tracks
+        output_format: 'json', 'ndjson.gz' or 'ndjson.zst'
+            (defaults to RAW_OUTPUT_FORMAT, see raw_format.py)
+        encoding: 'flat' or 'normalized' (json only; defaults to RAW_ENCODING).
+            Normalized envelopes store each distinct track once.
+        key: Exact key to write (default: date-partitioned under prefix)
+        fetched_at: Batch time for the key and envelope (default: now, UTC);
+            generators and importers pass the simulated or original time
         
     Returns:
-        S3 key where data was saved
+        Key where data was saved ("" if there was nothing to save)
     """
     if not tracks:
         logger.warning("No tracks to save")
         return ""
     
-    # Create S3 client
-    s3 = boto3.client('s3')
+    output_format = resolve_format(output_format)
+    encoding = resolve_encoding(encoding)
     
     # Generate timestamp once
-    now = datetime.now(timezone.utc)
-    timestamp = now.strftime("%Y%m%d_%H%M%S")
-    s3_key = f"{prefix}/year={now.year}/month={now.month:02d}/day={now.day:02d}/spotify_plays_{timestamp}.json"
+    now = fetched_at or datetime.now(timezone.utc)
+    if key is None:
+        key = raw_key(prefix, now, output_format)
     
-    # Prepare data with metadata
-    data = {
-        "fetched_at": now.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "track_count": len(tracks),
-        "tracks": tracks
-    }
+    batch_metadata = {"fetched_at": now.strftime("%Y-%m-%dT%H:%M:%SZ"), **(metadata or {})}
+    
+    with metrics.span('serialize'):
+        body, content_type = _encode_batch(tracks, batch_metadata, output_format, encoding)
     
-    # Upload to S3
-    s3.put_object(
-        Bucket=bucket_name,
-        Key=s3_key,
-        Body=json.dumps(data, indent=2, ensure_ascii=False),
-        ContentType='application/json'
+    with metrics.span('upload'):
+        storage.put_bytes(key, body.encode('utf-8') if isinstance(body, str) else body, content_type)
+    
+    logger.info(f"Saved {len(tracks)} tracks to {storage.location(key)}")
+    return key
+
+
+def _encode_batch(tracks, batch_metadata: Dict, output_format: str, encoding: str):
+    """Serialize a batch; returns (body, content type)."""
+    if output_format == 'json' and encoding == 'normalized':
+        # Track table + (index, timestamp) pairs; compact, since rows are tiny
+        data = {**batch_metadata, **normalize_plays(_to_rows(tracks))}
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        content_type = 'application/json'
+    elif output_format == 'json':
+        # Prepare data with metadata
+        data = {
+            **batch_metadata,
+            "track_count": len(tracks),
+            "tracks": _to_records(tracks)
+        }
+        body = json.dumps(data, indent=2, ensure_ascii=False)
+        content_type = 'application/json'
+    else:
+        # One play per line, batch metadata repeated as columns
+        body = encode_ndjson(_to_records(tracks), output_format, batch_metadata)
+        content_type = NDJSON_CONTENT_TYPE
+    return body, content_type
+
+
+def raw_key(prefix: str, fetched_at: datetime, output_format: str) -> str:
+    """Date-partitioned raw key: <prefix>/year=YYYY/month=MM/day=DD/spotify_plays_<ts>.<format>."""
+    timestamp = fetched_at.strftime("%Y%m%d_%H%M%S")
+    return (
+        f"{prefix}/year={fetched_at.year}/month={fetched_at.month:02d}/day={fetched_at.day:02d}/"
+        f"spotify_plays_{timestamp}.{output_format}"
     )
+
+
+def write_state(storage: StorageBackend, last_timestamp: int, key: str = STATE_KEY) -> None:
+    """
+    Save pipeline state to any storage backend.
     
-    logger.info(f"Saved {len(tracks)} tracks to s3://{bucket_name}/{s3_key}")
-    return s3_key
+    Args:
+        storage: S3Storage, LocalStorage or MemoryStorage
+        last_timestamp: Unix timestamp in milliseconds of last processed play
+        key: State key
+    """
+    state = {
+        "last_processed_timestamp": last_timestamp,
+        "last_processed_at": datetime.fromtimestamp(last_timestamp / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "updated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    }
+    storage.put_json(key, state)
+    logger.info(f"Saved state to {storage.location(key)}: last_timestamp={last_timestamp}")
+
+
+def read_state(storage: StorageBackend, key: str = STATE_KEY) -> Optional[int]:
+    """
+    Load pipeline state from any storage backend.
+    
+    Returns:
+        Last processed timestamp in milliseconds, or None if no state exists
+    """
+    state = storage.get_json(key)
+    if state is None:
+        logger.info("No previous state found - this is the first run")
+        return None
+    last_timestamp = state.get('last_processed_timestamp')
+    logger.info(f"Loaded state from {storage.location(key)}: last_timestamp={last_timestamp}")
+    return last_timestamp
+
+
+def save_tracks_to_s3(
+    tracks: Union[PlayBatch, List[Dict]],
+    bucket_name: str,
+    prefix: str = "raw",
+    s3_client=None,
+    metadata: Optional[Dict] = None,
+    output_format: Optional[str] = None,
+    encoding: Optional[str] = None
+) -> str:
+    """
+    Save tracks to S3 with date partitioning (see write_tracks).
+    
+    Args:
+        tracks: PlayBatch or list of track dictionaries
+        bucket_name: S3 bucket name
+        prefix: S3 key prefix (e.g., 'raw', 'processed')
+        s3_client: boto3 S3 client (shared pooled client if None)
+        metadata: Extra envelope fields (e.g., user_id) stored next to tracks
+        output_format: 'json', 'ndjson.gz' or 'ndjson.zst'
+        encoding: 'flat' or 'normalized'
+        
+    Returns:
+        S3 key where data was saved
+    """
+    storage = S3Storage(bucket_name, client=s3_client)
+    return write_tracks(storage, tracks, prefix, metadata, output_format, encoding)
 
 def save_state_to_s3(
     last_timestamp: int,
     bucket_name: str,
-    key: str = "state/last_run_state.json"
+    key: str = STATE_KEY,
+    s3_client=None
 ) -> None:
     """
     Save pipeline state to S3.
@@ -235,27 +348,14 @@ def save_state_to_s3(
         last_timestamp: Unix timestamp in milliseconds of last processed play
         bucket_name: S3 bucket name
         key: S3 key for state file
+        s3_client: boto3 S3 client (shared pooled client if None)
     """
-    s3 = boto3.client('s3')
-    
-    state = {
-        "last_processed_timestamp": last_timestamp,
-        "last_processed_at": datetime.fromtimestamp(last_timestamp / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "updated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-    }
-    
-    s3.put_object(
-        Bucket=bucket_name,
-        Key=key,
-        Body=json.dumps(state, indent=2),
-        ContentType='application/json'
-    )
-    
-    logger.info(f"Saved state to s3://{bucket_name}/{key}: last_timestamp={last_timestamp}")
+    write_state(S3Storage(bucket_name, client=s3_client), last_timestamp, key)
 
 def load_state_from_s3(
     bucket_name: str,
-    key: str = "state/last_run_state.json"
+    key: str = STATE_KEY,
+    s3_client=None
 ) -> Optional[int]:
     """
     Load pipeline state from S3.
@@ -263,20 +363,9 @@ def load_state_from_s3(
     Args:
         bucket_name: S3 bucket name
         key: S3 key for state file
+        s3_client: boto3 S3 client (shared pooled client if None)
         
     Returns:
         Last processed timestamp in milliseconds, or None if no state exists
     """
-    s3 = boto3.client('s3')
-    
-    try:
-        response = s3.get_object(Bucket=bucket_name, Key=key)
-        state = json.loads(response['Body'].read())
-        last_timestamp = state.get('last_processed_timestamp')
-        logger.info(f"Loaded state from S3: last_timestamp={last_timestamp}")
-        return last_timestamp
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'NoSuchKey':
-            logger.info("No previous state found in S3 - this is the first run")
-            return None
-        raise  # Re-raise other errors
\ No newline at end of file
+    return read_state(S3Storage(bucket_name, client=s3_client), key)
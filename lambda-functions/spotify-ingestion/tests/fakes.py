@@ -0,0 +1,96 @@
+"""
+Builders for fake Spotify API payloads used across tests.
+"""
+import hashlib
+import io
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+
+def make_item(index: int, played_at: datetime) -> Dict:
+    """Build one recently-played API item."""
+    return {
+        'played_at': played_at.strftime('%Y-%m-%dT%H:%M:%S.') + f"{played_at.microsecond // 1000:03d}Z",
+        'track': {
+            'id': f"track{index % 7}",
+            'name': f"Track {index % 7}",
+            'duration_ms': 200000 + index,
+            'popularity': index % 100,
+            'artists': [{'id': f"artist{index % 3}", 'name': f"Artist {index % 3}"}],
+            'album': {
+                'id': f"album{index % 5}",
+                'name': f"Album {index % 5}",
+                'release_date': '2020-01-01',
+            },
+        },
+    }
+
+
+def make_items(count: int, newest: datetime = None, step_seconds: int = 180) -> List[Dict]:
+    """Build `count` items ordered newest first, like the API returns them."""
+    newest = newest or datetime(2025, 12, 22, 9, 0, 51, 968000, tzinfo=timezone.utc)
+    return [make_item(i, newest - timedelta(seconds=step_seconds * i)) for i in range(count)]
+
+
+def etag(body: bytes) -> str:
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+class FakeS3:
+    """Minimal in-memory stand-in for the boto3 S3 client calls we use."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.calls = []
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        from botocore.exceptions import ClientError
+
+        self.calls.append(('put_object', Key))
+        current = etag(self.objects[Key]) if Key in self.objects else None
+        if (IfNoneMatch == '*' and current is not None) or (IfMatch is not None and IfMatch != current):
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+        self.objects[Key] = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        return {'ETag': etag(self.objects[Key])}
+
+    def get_object(self, Bucket, Key):
+        from botocore.exceptions import ClientError
+
+        self.calls.append(('get_object', Key))
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[Key]), 'ETag': etag(self.objects[Key])}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        self.calls.append(('create_multipart_upload', Key))
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        self.calls.append(('upload_part', Key))
+        return {'ETag': f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [p['PartNumber'] for p in MultipartUpload['Parts']]
+        self.objects[Key] = b"".join(parts[n] for n in numbers)
+        self.calls.append(('complete_multipart_upload', Key))
+        return {}
+
+    def download_file(self, Bucket, Key, Filename):
+        self.calls.append(('download_file', Key))
+        with open(Filename, 'wb') as f:
+            f.write(self.objects[Key])
+
+    def upload_file(self, Filename, Bucket, Key):
+        self.calls.append(('upload_file', Key))
+        with open(Filename, 'rb') as f:
+            self.objects[Key] = f.read()
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+        self.calls.append(('abort_multipart_upload', Key))
+        return {}
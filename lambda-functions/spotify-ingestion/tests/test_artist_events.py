@@ -0,0 +1,53 @@
+"""Tests for announcing newly seen artists to the enrichment queue."""
+import pytest
+
+from artist_events import SEEN_KEY, emit_new_artists, reset_seen_cache
+from artist_queue import LocalArtistQueue
+from play_batch import PlayBatch
+from tests.fakes import FakeS3, make_items
+
+
+@pytest.fixture(autouse=True)
+def cold_seen_cache():
+    reset_seen_cache()
+    yield
+    reset_seen_cache()
+
+
+def tracks(*artist_ids):
+    return [{'track_id': f"t{i}", 'artist_id': a} for i, a in enumerate(artist_ids)]
+
+
+def test_only_unseen_artists_are_sent():
+    s3, queue = FakeS3(), LocalArtistQueue()
+
+    assert emit_new_artists(tracks('a1', 'a2', 'a1'), 'bucket', s3, queue, user_id='u1') == {'a1', 'a2'}
+    assert emit_new_artists(tracks('a2', 'a3'), 'bucket', s3, queue) == {'a3'}
+    assert emit_new_artists(tracks('a1', 'a3'), 'bucket', s3, queue) == set()
+
+    messages = queue.receive(max_messages=10)
+    assert [ids for _, ids in messages] == [['a1', 'a2'], ['a3']]
+    assert SEEN_KEY in s3.objects
+
+
+def test_seen_set_survives_a_cold_start():
+    s3, queue = FakeS3(), LocalArtistQueue()
+    emit_new_artists(tracks('a1'), 'bucket', s3, queue)
+
+    reset_seen_cache()
+
+    assert emit_new_artists(tracks('a1', 'a2'), 'bucket', s3, queue) == {'a2'}
+
+
+def test_play_batch_input():
+    s3, queue = FakeS3(), LocalArtistQueue()
+    batch = PlayBatch.from_items(make_items(3))
+
+    assert emit_new_artists(batch, 'bucket', s3, queue) == set(batch.artist_id)
+
+
+def test_disabled_without_queue():
+    s3 = FakeS3()
+
+    assert emit_new_artists(tracks('a1'), 'bucket', s3) == set()
+    assert s3.calls == []
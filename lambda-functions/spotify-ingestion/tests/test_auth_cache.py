@@ -0,0 +1,58 @@
+"""Tests for warm-container Spotify auth reuse."""
+import json
+import time
+
+import pytest
+from spotipy.oauth2 import SpotifyOAuth
+
+import auth_cache
+from tests.fakes import FakeS3
+
+CREDENTIALS = ('id', 'secret', 'http://localhost')
+
+
+def token(access_token, expires_in):
+    return {
+        'access_token': access_token,
+        'refresh_token': 'refresh',
+        'token_type': 'Bearer',
+        'scope': auth_cache.SCOPE,
+        'expires_in': 3600,
+        'expires_at': int(time.time()) + expires_in,
+    }
+
+
+@pytest.fixture
+def lambda_env(monkeypatch, tmp_path):
+    monkeypatch.setenv('AWS_EXECUTION_ENV', 'AWS_Lambda_python3.11')
+    monkeypatch.setenv('S3_BUCKET', 'bucket')
+    auth_cache.clear_cache()
+    yield str(tmp_path / 'token')
+    auth_cache.clear_cache()
+
+
+def test_warm_invocation_makes_no_s3_calls(lambda_env):
+    s3 = FakeS3()
+    s3.objects[auth_cache.DEFAULT_TOKEN_KEY] = json.dumps(token('a1', 3600)).encode()
+
+    first = auth_cache.get_spotify(*CREDENTIALS, cache_path=lambda_env, s3_client=s3)
+    second = auth_cache.get_spotify(*CREDENTIALS, cache_path=lambda_env, s3_client=s3)
+
+    assert first is second
+    assert s3.calls == [('download_file', auth_cache.DEFAULT_TOKEN_KEY)]
+
+
+def test_uploads_only_when_token_refreshed(lambda_env, monkeypatch):
+    s3 = FakeS3()
+    s3.objects[auth_cache.DEFAULT_TOKEN_KEY] = json.dumps(token('old', -10)).encode()
+    monkeypatch.setattr(
+        SpotifyOAuth, 'refresh_access_token',
+        lambda self, refresh_token: (self.cache_handler.save_token_to_cache(token('new', 3600))
+                                     or token('new', 3600)),
+    )
+
+    auth_cache.get_spotify(*CREDENTIALS, cache_path=lambda_env, s3_client=s3)
+    auth_cache.get_spotify(*CREDENTIALS, cache_path=lambda_env, s3_client=s3)
+
+    assert [call[0] for call in s3.calls] == ['download_file', 'upload_file']
+    assert json.loads(s3.objects[auth_cache.DEFAULT_TOKEN_KEY])['access_token'] == 'new'
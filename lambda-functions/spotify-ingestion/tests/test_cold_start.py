@@ -0,0 +1,26 @@
+"""Cold-start guard: the handler must import fast and without heavy deps."""
+from tests.conftest import SRC_DIR
+from import_profiler import HEAVY_MODULES, check_budget, parse_importtime
+
+
+def test_handler_import_within_budget():
+    profile = check_budget(SRC_DIR, 'handler')
+
+    # Heavy SDKs are only loaded on first use
+    assert not set(HEAVY_MODULES) & {m.split('.')[0] for m in profile.modules}
+    assert 'handler' in profile.modules
+
+
+def test_parse_importtime():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   play_batch\n"
+        "import time:       300 |        420 | handler\n"
+    )
+
+    timings = parse_importtime(stderr)
+
+    assert [(t.module, t.self_us, t.cumulative_us, t.depth) for t in timings] == [
+        ('play_batch', 120, 120, 1),
+        ('handler', 300, 420, 0),
+    ]
@@ -0,0 +1,73 @@
+"""Tests for multi-user fan-out ingestion."""
+import json
+import threading
+import time
+
+import fanout
+import handler
+from storage import MemoryStorage
+
+
+def test_run_fanout_isolates_failures_and_shares_pools(monkeypatch):
+    seen = []
+    lock = threading.Lock()
+
+    def fake_ingest(bucket, user_id, requests_session=None, s3_client=None):
+        with lock:
+            seen.append((user_id, id(requests_session), id(s3_client)))
+        if user_id == 'bad':
+            raise RuntimeError('token expired')
+        return {'user_id': user_id, 'status': 'ok', 'tracks': 3}
+
+    monkeypatch.setattr(fanout, 'ingest_user', fake_ingest)
+
+    results = fanout.run_fanout(['alice', 'bad', 'bob', 'alice'], 'bucket', max_workers=2)
+
+    assert [r['user_id'] for r in results] == ['alice', 'bad', 'bob']
+    assert [r['status'] for r in results] == ['ok', 'error', 'ok']
+    assert results[1]['error'] == 'token expired'
+    assert len({(session, s3) for _, session, s3 in seen}) == 1
+
+
+def test_handler_routes_user_ids_to_fanout(monkeypatch):
+    monkeypatch.setattr(
+        handler, 'run_fanout',
+        lambda user_ids, bucket, max_workers: [
+            {'user_id': u, 'status': 'ok' if u != 'x' else 'error'} for u in user_ids
+        ],
+    )
+
+    response = handler.lambda_handler({'user_ids': ['a', 'x'], 'max_workers': 4}, None)
+    body = json.loads(response['body'])
+
+    assert response['statusCode'] == 200
+    assert (body['succeeded'], body['failed']) == (1, 1)
+
+
+class _SlowStorage(MemoryStorage):
+    def get_bytes(self, key):
+        time.sleep(0.2)
+        return super().get_bytes(key)
+
+
+def test_ingest_user_overlaps_auth_and_state_load(monkeypatch):
+    class FakeClient:
+        def __init__(self, **kwargs):
+            pass
+
+        def authenticate(self):
+            time.sleep(0.2)
+
+        def get_recent_plays_since(self, after):
+            return []
+
+    monkeypatch.setattr(fanout, 'SpotifyClient', FakeClient)
+    storage = _SlowStorage()
+    storage.put_json(fanout.DEFAULT_STATE_KEY, {'last_processed_timestamp': 1766394051968})
+
+    result = fanout.ingest_user('bucket', storage=storage)
+    timings = result['timings']
+
+    assert (result['tracks'], result['last_timestamp']) == (0, 1766394051968)
+    assert timings['auth'] >= 200 and timings['state_load'] >= 200
+    assert timings['startup'] < timings['auth'] + timings['state_load'] - 100
@@ -0,0 +1,216 @@
+"""Tests for the Extended Streaming History importer."""
+import io
+import json
+
+import pytest
+
+import history_import
+from history_import import import_history, iter_json_array, lookup_tracks, map_record, scan_track_ids
+from raw_checkpoint import BACKFILL_PREFIX
+from raw_format import iter_records
+from storage import LocalStorage
+
+def export_record(ts, track_id='4uLU6hMCjMI75M1A2tKUQC', ms_played=180000, **overrides):
+    record = {
+        'ts': ts,
+        'platform': 'android',
+        'ms_played': ms_played,
+        'conn_country': 'HR',
+        'master_metadata_track_name': 'Song',
+        'master_metadata_album_artist_name': 'Artist',
+        'master_metadata_album_album_name': 'Album',
+        'spotify_track_uri': f"spotify:track:{track_id}",
+        'episode_name': None,
+        'spotify_episode_uri': None,
+        'reason_start': 'trackdone',
+        'reason_end': 'trackdone',
+        'shuffle': False,
+        'skipped': None,
+    }
+    record.update(overrides)
+    return record
+
+
+def write_export(directory, name, records):
+    path = directory / name
+    path.write_text(json.dumps(records, indent=2), encoding='utf-8')
+    return path
+
+
+def test_iter_json_array_streams_across_small_reads():
+    records = [export_record(f"2020-01-0{i}T10:00:00Z", track_name='x' * 50) for i in range(1, 8)]
+    text = '  \n' + json.dumps(records, indent=4) + '\n'
+
+    assert list(iter_json_array(io.StringIO(text), read_size=7)) == records
+    assert list(iter_json_array(io.StringIO('[]'))) == []
+
+
+@pytest.mark.parametrize('text', ['{"a": 1}', '[{"a": 1}, 2]', '[{"a": 1}, {"b":'])
+def test_iter_json_array_rejects_bad_input(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), read_size=4))
+
+
+class CountingReader(io.StringIO):
+    def __init__(self, text):
+        super().__init__(text)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def test_iter_json_array_fails_fast_on_malformed_elements():
+    text = '[{"a": 1 "b": 2}, ' + ', '.join(['{"c": 3}'] * 1000) + ']'
+    stream = CountingReader(text)
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(stream, read_size=64))
+    assert stream.reads <= 2  # not one read per remaining chunk of the file
+
+
+def test_iter_json_array_caps_element_size():
+    text = '[{"a": "' + 'x' * 1000 + '"}]'
+
+    assert list(iter_json_array(io.StringIO(text), read_size=16)) == [{'a': 'x' * 1000}]
+    with pytest.raises(ValueError, match='exceeds'):
+        list(iter_json_array(io.StringIO(text), read_size=16, max_element_size=500))
+
+
+def test_map_record_matches_play_schema_and_skips_non_tracks():
+    play = map_record(export_record('2021-06-01T23:59:58Z'))
+
+    assert play == {
+        'played_at': '2021-06-01T23:59:58.000Z',
+        'played_at_timestamp': 1622591998000,
+        'track_id': '4uLU6hMCjMI75M1A2tKUQC',
+        'track_name': 'Song',
+        'artist_id': None,
+        'artist_name': 'Artist',
+        'album_id': None,
+        'album_name': 'Album',
+        'release_date': None,
+        'duration_ms': None,
+        'popularity': None,
+    }
+    episode = export_record('2021-06-01T10:00:00Z', spotify_track_uri=None, spotify_episode_uri='spotify:episode:x')
+    assert map_record(episode) is None
+    assert map_record(export_record('2021-06-01T10:00:00Z', spotify_track_uri='spotify:local:a:b:c:1')) is None
+    assert map_record(export_record('2021-06-01T10:00:00Z', ms_played=5000)) is None
+    assert map_record(export_record('2021-06-01T10:00:00Z', ms_played=5000), min_ms_played=0) is not None
+
+
+class CatalogSpotify:
+    """spotipy stand-in: /tracks returns an artist and album per ID (null for unknown IDs)."""
+
+    def __init__(self, unknown=()):
+        self.unknown = set(unknown)
+        self.requests = []
+
+    def tracks(self, track_ids):
+        self.requests.append(list(track_ids))
+        return {'tracks': [
+            None if t in self.unknown else {
+                'id': t, 'duration_ms': 200000,
+                'artists': [{'id': f"artist_{t}"}, {'id': 'featured'}],
+                'album': {'id': f"album_{t}", 'release_date': '2019-05-01'},
+            }
+            for t in track_ids
+        ]}
+
+
+def test_track_ids_are_resolved_in_batches(tmp_path):
+    path = write_export(tmp_path, 'Streaming_History_Audio_2020_0.json', [
+        export_record('2020-01-01T10:00:00Z', track_id=f"t{i:03d}") for i in range(120)
+    ] + [export_record('2020-01-01T11:00:00Z', track_id='gone')])
+    spotify = CatalogSpotify(unknown={'gone'})
+
+    track_ids = scan_track_ids(str(path), read_size=64)
+    catalog = lookup_tracks(spotify, track_ids)
+
+    assert len(track_ids) == 121
+    assert [len(r) for r in spotify.requests] == [50, 50, 21]
+    assert catalog['t007'] == {
+        'artist_id': 'artist_t007', 'album_id': 'album_t007', 'release_date': '2019-05-01', 'duration_ms': 200000,
+    }
+    assert 'gone' not in catalog
+    play = map_record(export_record('2020-01-01T10:00:00Z', track_id='t007'), catalog=catalog)
+    assert (play['artist_id'], play['album_id'], play['popularity']) == ('artist_t007', 'album_t007', None)
+
+
+def test_import_fills_artist_and_album_ids(tmp_path):
+    path = write_export(tmp_path, 'Streaming_History_Audio_2020_0.json', [
+        export_record('2020-01-01T10:00:00Z', track_id='t1'), export_record('2020-01-02T10:00:00Z', track_id='gone'),
+    ])
+    storage = LocalStorage(str(tmp_path / 'data'))
+
+    summary = import_history([str(path)], storage, output_format='ndjson.gz', workers=1,
+                             spotify=CatalogSpotify(unknown={'gone'}))
+
+    assert (summary['tracks'], summary['tracks_resolved']) == (2, 1)
+    plays = [p for key in storage.list_keys('raw/') for p in iter_records(storage.get_bytes(key), 'ndjson.gz')]
+    assert [(p['track_id'], p['artist_id'], p['album_id']) for p in plays] == [
+        ('t1', 'artist_t1', 'album_t1'), ('gone', None, None),
+    ]
+
+
+def test_import_writes_raw_partitions_by_play_date(tmp_path):
+    exports = tmp_path / 'export'
+    exports.mkdir()
+    write_export(exports, 'Streaming_History_Audio_2020_0.json', [
+        export_record('2020-01-01T10:00:00Z'),
+        export_record('2020-01-01T11:00:00Z', track_id='0VjIjW4GlUZAMYd2vXMi3b'),
+        export_record('2020-01-02T09:00:00Z'),
+        export_record('2020-01-02T09:05:00Z', spotify_track_uri=None),
+    ])
+    (exports / 'Userdata.json').write_text('{}')
+    storage = LocalStorage(str(tmp_path / 'data'))
+
+    summary = import_history([str(exports)], storage, user_id='ivan', output_format='ndjson.gz', workers=1)
+
+    assert summary == {'files': 1, 'records': 4, 'plays': 3, 'skipped': 1, 'objects': 2}
+    keys = list(storage.list_keys('raw/'))
+    assert keys == [
+        'raw/user_id=ivan/year=2020/month=01/day=01/spotify_history_Streaming_History_Audio_2020_0_00000.ndjson.gz',
+        'raw/user_id=ivan/year=2020/month=01/day=02/spotify_history_Streaming_History_Audio_2020_0_00001.ndjson.gz',
+    ]
+    # Past partitions are behind the discovery checkpoints: announce them
+    (manifest,) = storage.list_keys(BACKFILL_PREFIX)
+    assert storage.get_json(manifest) == {'keys': keys}
+    plays = list(iter_records(storage.get_bytes(keys[0]), 'ndjson.gz'))
+    assert [p['played_at'] for p in plays] == ['2020-01-01T11:00:00.000Z', '2020-01-01T10:00:00.000Z']
+    assert plays[0]['user_id'] == 'ivan'
+    assert plays[0]['fetched_at'] == '2020-01-01T11:00:00Z'
+
+    # Re-running overwrites the same objects
+    import_history([str(exports)], storage, user_id='ivan', output_format='ndjson.gz', workers=1)
+    assert list(storage.list_keys('raw/')) == keys
+
+
+def test_chunk_size_bounds_objects_per_flush(tmp_path):
+    path = write_export(tmp_path, 'Streaming_History_Audio_2020_0.json', [
+        export_record(f"2020-01-01T10:0{i}:00Z") for i in range(5)
+    ])
+    storage = LocalStorage(str(tmp_path / 'data'))
+
+    stats = history_import.import_file(str(path), storage, output_format='json', chunk_size=2)
+
+    assert stats['objects'] == 3
+    assert sum(
+        len(json.loads(storage.get_bytes(key))['tracks']) for key in storage.list_keys('raw/')
+    ) == 5
+
+
+def test_files_are_imported_in_parallel_processes(tmp_path):
+    for n in range(3):
+        write_export(tmp_path, f"Streaming_History_Audio_202{n}_{n}.json", [
+            export_record(f"202{n}-03-01T10:00:00Z"), export_record(f"202{n}-03-02T10:00:00Z"),
+        ])
+    storage = LocalStorage(str(tmp_path / 'data'))
+
+    summary = import_history([str(tmp_path)], storage, output_format='json', workers=2)
+
+    assert summary['files'] == 3
+    assert summary['plays'] == 6
+    assert len(list(storage.list_keys('raw/year='))) == 6
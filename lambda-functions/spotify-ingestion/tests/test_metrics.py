@@ -0,0 +1,135 @@
+"""Tests for the EMF metrics layer and the counters recorded by shared modules."""
+import io
+import threading
+
+import pytest
+import requests
+
+import metrics
+import storage
+from play_batch import PlayBatch
+from rate_limiter import RateLimitScheduler, RateLimitedAdapter
+from storage import MemoryStorage
+from tests.fakes import make_items
+from tests.test_rate_limiter import FakeClock
+from utils import write_tracks
+
+
+def test_invocation_emits_one_emf_record():
+    sink = metrics.LocalSink()
+
+    with metrics.invocation('ingestion', sink=sink, mode='incremental'):
+        with metrics.span('auth'):
+            pass
+        metrics.timing('fetch', 12.5)
+        metrics.timing('fetch', 2.5)
+        metrics.count('plays', 50)
+        metrics.count('bytes_written', 1024)
+
+    assert len(sink.records) == 1
+    record = sink.last
+    emf = record['_aws']['CloudWatchMetrics'][0]
+    units = {m['Name']: m['Unit'] for m in emf['Metrics']}
+
+    assert emf['Dimensions'] == [['Function']]
+    assert record['Function'] == 'ingestion'
+    assert record['mode'] == 'incremental'
+    assert record['fetch_ms'] == 15.0
+    assert record['plays'] == 50
+    assert units == {
+        'auth_ms': 'Milliseconds', 'fetch_ms': 'Milliseconds', 'total_ms': 'Milliseconds',
+        'plays': 'Count', 'bytes_written': 'Bytes',
+    }
+    # Every declared metric has a value on the record
+    assert all(name in record for name in units)
+
+
+def test_failed_invocation_still_emits_with_error():
+    sink = metrics.LocalSink()
+
+    with pytest.raises(ValueError):
+        with metrics.invocation('ingestion', sink=sink):
+            metrics.count('plays', 3)
+            raise ValueError('boom')
+
+    assert sink.last['error'] == 'ValueError'
+    assert sink.last['plays'] == 3
+    assert metrics.current() is None
+
+
+def test_helpers_are_no_ops_outside_an_invocation():
+    metrics.count('plays')
+    with metrics.span('auth'):
+        pass
+
+    assert metrics.current() is None
+
+
+def test_worker_threads_record_into_the_running_invocation():
+    sink = metrics.LocalSink()
+
+    with metrics.invocation('ingestion', sink=sink):
+        threads = [threading.Thread(target=lambda: [metrics.count('api_pages') for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert sink.last['api_pages'] == 400
+
+
+def test_adapter_counts_requests_and_throttles(monkeypatch):
+    statuses = [429, 200]
+
+    def fake_send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = statuses.pop(0)
+        response.headers['Retry-After'] = '2'
+        response.raw = io.BytesIO(b'')
+        return response
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, 'send', fake_send)
+    clock = FakeClock()
+    scheduler = RateLimitScheduler(clock=clock.time, sleep=clock.sleep)
+    request = requests.Request('GET', 'https://api.spotify.com/v1/me').prepare()
+    sink = metrics.LocalSink()
+
+    with metrics.invocation('ingestion', sink=sink):
+        RateLimitedAdapter(scheduler).send(request)
+
+    assert sink.last['api_requests'] == 2
+    assert sink.last['api_throttled'] == 1
+
+
+def test_write_tracks_times_serialize_and_upload():
+    sink = metrics.LocalSink()
+
+    with metrics.invocation('ingestion', sink=sink):
+        write_tracks(MemoryStorage(), PlayBatch.from_items(make_items(5)), output_format='json')
+
+    assert {'serialize_ms', 'upload_ms'} <= set(sink.last)
+
+
+def test_shared_s3_client_counts_requests_and_bytes(monkeypatch):
+    pytest.importorskip('boto3')
+    from botocore.stub import Stubber
+
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    storage.reset_shared_s3_client()
+    sink = metrics.LocalSink()
+    try:
+        client = storage.shared_s3_client()
+        with metrics.invocation('ingestion', sink=sink):
+            with Stubber(client) as stub:
+                stub.add_response('put_object', {}, {'Bucket': 'bucket', 'Key': 'k', 'Body': b'hello'})
+                client.put_object(Bucket='bucket', Key='k', Body=b'hello')
+            # The stubber answers before the request hook runs; fire it as a real send would
+            model = client.meta.service_model.operation_model('PutObject')
+            client.meta.events.emit('before-call.s3.PutObject', params={'headers': {}}, model=model, context={})
+    finally:
+        storage.reset_shared_s3_client()
+
+    assert sink.last['bytes_written'] == 5
+    assert sink.last['s3_requests'] == 1
@@ -0,0 +1,94 @@
+"""Tests for the columnar PlayBatch container."""
+from datetime import datetime
+
+from play_batch import FIELDS, PlayBatch, parse_played_at
+from tests.fakes import make_items
+
+
+def legacy_transform(item):
+    """The per-play dict the client built before PlayBatch existed."""
+    dt = datetime.fromisoformat(item['played_at'].replace('Z', '+00:00'))
+    return {
+        'played_at': item['played_at'],
+        'played_at_timestamp': int(dt.timestamp() * 1000),
+        'track_id': item['track']['id'],
+        'track_name': item['track']['name'],
+        'artist_id': item['track']['artists'][0]['id'],
+        'artist_name': item['track']['artists'][0]['name'],
+        'album_id': item['track']['album']['id'],
+        'album_name': item['track']['album']['name'],
+        'release_date': item['track']['album']['release_date'],
+        'duration_ms': item['track']['duration_ms'],
+        'popularity': item['track']['popularity'],
+    }
+
+
+def test_parse_played_at_matches_sample_data():
+    assert parse_played_at('2025-12-21T13:49:21.281Z') == 1766324961281
+    assert parse_played_at('2025-12-21T13:49:21Z') == 1766324961000
+    assert parse_played_at('2025-12-21T13:49:21+00:00') == 1766324961000
+
+
+def test_from_items_matches_legacy_dicts():
+    items = make_items(50)
+    batch = PlayBatch.from_items(items)
+
+    assert len(batch) == 50
+    assert batch.to_dicts() == [legacy_transform(item) for item in items]
+    assert batch[0] == legacy_transform(items[0])
+    assert batch[-1]['played_at'] == items[-1]['played_at']
+
+
+def test_sort_orders_all_columns_oldest_first():
+    batch = PlayBatch.from_items(make_items(20))
+    expected = sorted(batch.to_dicts(), key=lambda t: t['played_at_timestamp'])
+
+    batch.sort()
+
+    assert batch.to_dicts() == expected
+    assert batch.oldest_timestamp() == batch.played_at_timestamp[0]
+    assert batch.latest_timestamp() == batch.played_at_timestamp[-1]
+
+
+def test_extend_and_round_trip_through_dicts():
+    first = PlayBatch.from_items(make_items(3))
+    second = PlayBatch.from_dicts(first.to_dicts())
+    first.extend(second)
+
+    assert len(first) == 6
+    assert list(first.iter_rows())[3] == tuple(second.row(0)[name] for name in FIELDS)
+
+
+def test_from_rows_matches_iter_rows():
+    batch = PlayBatch.from_items(make_items(9))
+    rebuilt = PlayBatch.from_rows(list(batch.iter_rows()))
+
+    assert rebuilt.to_dicts() == batch.to_dicts()
+    assert rebuilt.track_id[0] is batch.track_id[0]
+    assert not PlayBatch.from_rows([])
+
+
+def test_ids_are_interned_and_columns_are_views():
+    batch = PlayBatch.from_items(make_items(14))
+
+    assert batch.track_id[0] is batch.track_id[7]
+    view = batch.column('played_at_timestamp')
+    assert isinstance(view, memoryview)
+    assert view[0] == batch.played_at_timestamp[0]
+    assert batch.column('track_id') is batch.track_id
+
+
+def test_id_pool_is_scoped_to_the_batch():
+    first = PlayBatch.from_items(make_items(14))
+    second = PlayBatch.from_items(make_items(14))
+
+    assert second._ids is not first._ids
+    assert len(first._ids) == len(set(first.track_id) | set(first.artist_id) | set(first.album_id))
+
+
+def test_empty_batch():
+    batch = PlayBatch()
+
+    assert not batch
+    assert batch.to_dicts() == []
+    assert batch.latest_timestamp() is None
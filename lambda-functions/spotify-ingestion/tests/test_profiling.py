@@ -0,0 +1,62 @@
+"""Tests for the on-demand invocation profiler."""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from profiling import format_run, list_runs, parse_modes, profiled
+from storage import MemoryStorage
+
+
+def make_handler(storage, calls=None):
+    @profiled('ingestion', lambda: storage)
+    def handler(event, context):
+        if calls is not None:
+            calls.append(event)
+        if event.get('fail'):
+            raise RuntimeError('boom')
+        return {'rows': len([str(i) * 10 for i in range(20000)])}
+
+    return handler
+
+
+def test_parse_modes():
+    assert parse_modes('cpu') == {'cpu'}
+    assert parse_modes('memory, cpu') == {'cpu', 'memory'}
+    assert parse_modes('all') == parse_modes(True) == {'cpu', 'memory'}
+    assert parse_modes('') == parse_modes(None) == parse_modes(False) == set()
+
+
+def test_switch_off_stores_nothing(monkeypatch):
+    monkeypatch.delenv('PROFILE', raising=False)
+    storage = MemoryStorage()
+    calls = []
+
+    assert make_handler(storage, calls)({}, None) == {'rows': 20000}
+    assert calls == [{}]
+    assert storage.objects == {}
+
+
+def test_event_flag_stores_cpu_and_memory_profiles():
+    storage = MemoryStorage()
+    context = SimpleNamespace(aws_request_id='req-1')
+
+    make_handler(storage)({'profile': 'all'}, context)
+
+    (run,) = list_runs(storage, 'ingestion')
+    assert run.startswith('profiles/ingestion/') and run.endswith('_req-1')
+    memory = json.loads(storage.objects[f"{run}/memory.json"])
+    assert memory['peak_bytes'] > 0 and memory['top']
+    summary = format_run(storage, run)
+    assert 'handler' in summary and 'Memory: peak' in summary
+
+
+def test_env_switch_and_failed_run(monkeypatch):
+    monkeypatch.setenv('PROFILE', 'cpu')
+    storage = MemoryStorage()
+
+    with pytest.raises(RuntimeError):
+        make_handler(storage)({'fail': True}, None)
+
+    keys = list(storage.objects)
+    assert len(keys) == 1 and keys[0].endswith('/cpu.pstats')
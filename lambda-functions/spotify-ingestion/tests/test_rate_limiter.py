@@ -0,0 +1,129 @@
+"""Tests for the shared Spotify rate-limit scheduler."""
+import io
+
+import requests
+
+import api_telemetry
+import metrics
+from api_telemetry import endpoint_of, percentile
+from rate_limiter import RateLimitScheduler, RateLimitedAdapter, parse_retry_after
+
+
+class FakeClock:
+    """Manual clock: sleeping just advances time."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_scheduler(clock, **kwargs):
+    return RateLimitScheduler(clock=clock.time, sleep=clock.sleep, **kwargs)
+
+
+def test_burst_then_refill_rate():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, rate=2, burst=2)
+
+    for _ in range(4):
+        scheduler.acquire()
+
+    # Two free slots, then 0.5s per slot at 2 req/s
+    assert clock.now == 1.0
+    assert scheduler.requests == 4
+
+
+def test_throttle_pauses_everyone_and_halves_rate():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, rate=4, burst=4, max_rate=4)
+
+    scheduler.on_throttle(3)
+    scheduler.acquire()
+
+    assert scheduler.rate == 2
+    assert clock.now >= 3
+    assert scheduler.throttled == 1
+
+    for _ in range(100):
+        scheduler.on_success()
+    assert scheduler.rate == 4
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('7') == 7.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') is None
+
+
+def test_adapter_resends_after_429(monkeypatch):
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    statuses = [429, 429, 200]
+
+    def fake_send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = statuses.pop(0)
+        response.headers['Retry-After'] = '2'
+        response.raw = io.BytesIO(b'')
+        return response
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, 'send', fake_send)
+    request = requests.Request('GET', 'https://api.spotify.com/v1/me').prepare()
+
+    response = RateLimitedAdapter(scheduler).send(request)
+
+    assert response.status_code == 200
+    assert scheduler.throttled == 2
+    assert clock.now >= 4
+
+
+def test_endpoint_of_groups_ids_and_drops_queries():
+    assert endpoint_of('https://api.spotify.com/v1/artists/?ids=a,b') == '/v1/artists'
+    assert endpoint_of('https://api.spotify.com/v1/tracks/4uLU6hMCjMI75M1A2tKUQC') == '/v1/tracks/{id}'
+    assert endpoint_of('https://api.spotify.com/v1/me/player/recently-played?limit=50') == '/v1/me/player/recently-played'
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert [percentile(values, p) for p in (50, 95, 99)] == [50, 95, 99]
+    assert percentile([], 50) == 0.0
+
+
+def test_adapter_records_latency_sizes_and_retry_after(monkeypatch):
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, rate=4, max_rate=4)
+    responses = [(429, b''), (200, b'{"items": []}'), (200, b'{"items": [1]}')]
+
+    def fake_send(self, request, **kwargs):
+        status, body = responses.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response.headers['Retry-After'] = '3'
+        response.raw = io.BytesIO(body)
+        return response
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, 'send', fake_send)
+    adapter = RateLimitedAdapter(scheduler)
+    sink = metrics.LocalSink()
+
+    with metrics.invocation('ingestion', sink=sink), api_telemetry.invocation() as telemetry:
+        for before in (1, 2):
+            url = f'https://api.spotify.com/v1/me/player/recently-played?before={before}'
+            adapter.send(requests.Request('GET', url).prepare())
+        summary = telemetry.summary()
+
+    stats = summary['endpoints']['/v1/me/player/recently-played']
+    assert stats['requests'] == 3
+    assert stats['statuses'] == {'200': 2, '429': 1}
+    assert stats['throttled'] == 1 and stats['retry_after_s'] == [3.0]
+    assert stats['bytes'] == 27 and stats['max_bytes'] == 14
+    assert stats['p50_ms'] <= stats['p95_ms'] <= stats['p99_ms']
+    assert summary['scheduler']['slots'] == 3
+    assert sink.last['api'] == summary
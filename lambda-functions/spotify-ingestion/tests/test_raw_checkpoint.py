@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+
+from raw_checkpoint import (
+    CheckpointCursor,
+    empty_checkpoint,
+    iter_new_raw_keys,
+    load_checkpoint,
+    load_discovery_checkpoints,
+    pending_backfills,
+    raw_root,
+    read_by_discovery,
+    record_backfill,
+    save_checkpoint,
+)
+from storage import MemoryStorage
+
+OLD = 'raw/year=2020/month=01/day=01/spotify_history_a_00000.ndjson.gz'
+NEW = 'raw/year=2024/month=01/day=02/b.json'
+
+
+def test_iter_new_raw_keys_lists_each_root_after_its_checkpoint():
+    storage = MemoryStorage()
+    for key in [
+        'raw/year=2024/month=01/day=01/a.json',
+        'raw/year=2024/month=01/day=02/b.json',
+        'raw/user_id=u1/year=2024/month=01/day=01/c.ndjson.gz',
+        'raw/user_id=u1/year=2024/month=01/day=01/notes.txt',
+    ]:
+        storage.put_bytes(key, b'{}')
+
+    checkpoint = {'roots': {'raw/year=': 'raw/year=2024/month=01/day=01/a.json'}, 'backfill': ''}
+    assert sorted(iter_new_raw_keys(storage, checkpoint)) == [
+        ('raw/user_id=u1/', 'raw/user_id=u1/year=2024/month=01/day=01/c.ndjson.gz'),
+        ('raw/year=', 'raw/year=2024/month=01/day=02/b.json'),
+    ]
+
+
+def test_checkpoint_round_trip():
+    storage = MemoryStorage()
+    assert load_checkpoint(storage, 'state/x.json') == empty_checkpoint()
+    checkpoint = {'roots': {'raw/year=': 'raw/year=2024/a.json'}, 'backfill': 'state/raw_backfills/1.json'}
+    save_checkpoint(storage, checkpoint, 'state/x.json')
+    assert load_checkpoint(storage, 'state/x.json') == checkpoint
+
+
+def test_cursor_stops_each_root_at_its_first_failure():
+    cursor = CheckpointCursor({'roots': {'raw/year=': 'raw/year=2024/a'}})
+
+    assert cursor.advance('raw/year=', 'raw/year=2024/b', True)
+    assert not cursor.advance('raw/year=', 'raw/year=2024/c', False)
+    assert not cursor.advance('raw/year=', 'raw/year=2024/d', True)
+    assert cursor.advance('raw/user_id=u1/', 'raw/user_id=u1/x', True)
+
+    assert cursor.roots == {'raw/year=': 'raw/year=2024/b', 'raw/user_id=u1/': 'raw/user_id=u1/x'}
+    assert cursor.failed == 1
+
+
+def test_backfilled_keys_behind_the_checkpoint_are_read_once():
+    storage = MemoryStorage({OLD: b'', NEW: b''})
+    checkpoint = {'roots': {'raw/year=': NEW}, 'backfill': ''}
+    manifest = record_backfill(storage, [OLD, 'raw/year=2025/month=01/day=01/later.json'],
+                               now=datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+    backfills = pending_backfills(storage, checkpoint)
+
+    # The key after the checkpoint is left to the root listing
+    assert backfills == [(manifest, [OLD])]
+    assert list(iter_new_raw_keys(storage, checkpoint, backfills)) == [(manifest, OLD)]
+    cursor = CheckpointCursor(checkpoint, backfills)
+    assert cursor.advance(manifest, OLD, True)
+    assert cursor.checkpoint == {'roots': {'raw/year=': NEW}, 'backfill': manifest}
+    assert pending_backfills(storage, cursor.checkpoint) == []
+
+
+def test_failed_backfill_key_holds_the_manifest_back():
+    checkpoint = {'roots': {'raw/year=': NEW}, 'backfill': ''}
+    backfills = [('state/raw_backfills/1.json', []), ('state/raw_backfills/2.json', [OLD])]
+    cursor = CheckpointCursor(checkpoint, backfills)
+
+    cursor.advance('state/raw_backfills/2.json', OLD, False)
+
+    assert cursor.checkpoint['backfill'] == 'state/raw_backfills/1.json'
+
+
+def test_read_by_discovery():
+    key = 'raw/user_id=u1/year=2024/month=01/day=02/a.json'
+    assert raw_root(key) == 'raw/user_id=u1/'
+
+    def checkpoint(mark, unread=()):
+        return {'roots': {'raw/user_id=u1/': mark}, 'unread': set(unread)}
+
+    assert read_by_discovery([key], [checkpoint(key)])
+    assert not read_by_discovery([key], [checkpoint(key), checkpoint('raw/user_id=u1/year=2024/month=01/day=01/z')])
+    assert not read_by_discovery([key], [checkpoint('raw/user_id=u1/year=2025', unread=[key])])
+    assert read_by_discovery([key], [{'roots': {'raw/year=': 'raw/year=2025'}}])  # root never listed
+
+
+def test_discovery_checkpoints_carry_their_unread_backfills():
+    storage = MemoryStorage({OLD: b''})
+    save_checkpoint(storage, {'roots': {'raw/year=': NEW}}, 'state/a.json')
+    manifest = record_backfill(storage, [OLD])
+    save_checkpoint(storage, {'roots': {'raw/year=': NEW}, 'backfill': manifest}, 'state/b.json')
+
+    checkpoints = load_discovery_checkpoints(storage, ['state/a.json', 'state/b.json', 'state/missing.json'])
+
+    assert [c['unread'] for c in checkpoints] == [{OLD}, set()]
+    assert not read_by_discovery([OLD], checkpoints)
@@ -0,0 +1,129 @@
+"""Tests for the raw formats: compressed NDJSON and the normalized play envelope."""
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from play_batch import PlayBatch
+from raw_format import (
+    NDJSONEncoder,
+    encode_ndjson,
+    envelope_records,
+    format_for_key,
+    format_played_at,
+    iter_ndjson,
+    iter_records,
+    normalize_plays,
+)
+from tests.fakes import FakeS3, make_item, make_items
+from utils import save_tracks_to_s3
+
+
+def test_encoder_repeats_metadata_on_every_line():
+    records = [{'track_id': 't1', 'duration_ms': 1}, {'track_id': 't2', 'duration_ms': 2}]
+
+    body = encode_ndjson(records, 'ndjson.gz', {'fetched_at': '2025-12-22T09:00:00Z', 'user_id': 'u1'})
+
+    lines = gzip.decompress(body).decode('utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'fetched_at': '2025-12-22T09:00:00Z', 'user_id': 'u1', 'track_id': 't1', 'duration_ms': 1},
+        {'fetched_at': '2025-12-22T09:00:00Z', 'user_id': 'u1', 'track_id': 't2', 'duration_ms': 2},
+    ]
+
+
+def test_encoder_merges_empty_and_overlapping_records():
+    records = [{}, {'user_id': 'u2', 'track_id': 't1'}]
+
+    body = encode_ndjson(records, 'ndjson.gz', {'fetched_at': '2025-12-22T09:00:00Z', 'user_id': 'u1'})
+
+    lines = gzip.decompress(body).decode('utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'fetched_at': '2025-12-22T09:00:00Z', 'user_id': 'u1'},
+        {'fetched_at': '2025-12-22T09:00:00Z', 'user_id': 'u2', 'track_id': 't1'},
+    ]
+    assert lines[1].count('"user_id"') == 1
+
+
+def test_streaming_chunks_concatenate_to_one_stream():
+    encoder = NDJSONEncoder('ndjson.gz')
+    body = b''.join(encoder.encode([{'i': i}]) for i in range(100))
+    body += encoder.finish()
+
+    assert [r['i'] for r in iter_ndjson(body, 'ndjson.gz')] == list(range(100))
+    assert encoder.line_count == 100
+    assert encoder.compressed_bytes == len(body)
+
+
+def test_save_tracks_ndjson_round_trip_and_is_smaller():
+    s3 = FakeS3()
+    batch = PlayBatch.from_items(make_items(50))
+
+    json_key = save_tracks_to_s3(batch, 'bucket', s3_client=s3, output_format='json')
+    ndjson_key = save_tracks_to_s3(batch, 'bucket', s3_client=s3, output_format='ndjson.gz')
+
+    assert format_for_key(ndjson_key) == 'ndjson.gz'
+    rows = list(iter_records(s3.objects[ndjson_key], 'ndjson.gz'))
+    assert [{k: r[k] for k in batch.to_dicts()[0]} for r in rows] == batch.to_dicts()
+    assert list(iter_records(s3.objects[json_key], 'json')) == batch.to_dicts()
+    assert len(s3.objects[ndjson_key]) * 5 < len(s3.objects[json_key])
+
+
+def test_zstd_round_trip():
+    pytest.importorskip('zstandard')
+    records = [{'track_id': f"t{i}"} for i in range(10)]
+
+    body = encode_ndjson(records, 'ndjson.zst', {'fetched_at': 'x'})
+
+    assert [r['track_id'] for r in iter_ndjson(body, 'ndjson.zst')] == [r['track_id'] for r in records]
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        save_tracks_to_s3([{'played_at_timestamp': 1}], 'bucket', s3_client=FakeS3(), output_format='csv')
+
+
+def looped_batch(plays=500, distinct=20):
+    """Heavy rotation: `plays` plays cycling through `distinct` tracks."""
+    start = datetime(2025, 12, 22, 9, 0, 0, 123000, tzinfo=timezone.utc)
+    return PlayBatch.from_items([make_item(i % distinct, start - timedelta(minutes=3 * i)) for i in range(plays)])
+
+
+def test_normalized_round_trip_restores_flat_schema():
+    batch = looped_batch()
+
+    data = normalize_plays(batch.iter_rows())
+
+    assert len(data['track_table']) == 20 and data['track_count'] == 500
+    assert list(envelope_records(json.loads(json.dumps(data)))) == batch.to_dicts()
+
+
+def test_normalized_keeps_non_canonical_played_at_verbatim():
+    rows = [('2025-12-22T09:00:00Z', 1766394000000) + ('t1',) + (None,) * 8]
+
+    data = normalize_plays(rows)
+
+    assert data['plays'] == [[0, 1766394000000, '2025-12-22T09:00:00Z']]
+    assert next(envelope_records(data))['played_at'] == '2025-12-22T09:00:00Z'
+    assert format_played_at(1766394000123) == '2025-12-22T09:00:00.123Z'
+
+
+def test_save_tracks_normalized_is_several_times_smaller():
+    s3 = FakeS3()
+    batch = looped_batch()
+
+    flat_key = save_tracks_to_s3(batch, 'bucket', s3_client=s3, output_format='json', encoding='flat')
+    s3.objects['flat'] = s3.objects.pop(flat_key)
+    key = save_tracks_to_s3(batch, 'bucket', s3_client=s3, output_format='json', encoding='normalized')
+
+    envelope = json.loads(s3.objects[key])
+    assert envelope['encoding'] == 'normalized/1' and 'fetched_at' in envelope
+    assert list(iter_records(s3.objects[key], 'json')) == batch.to_dicts()
+    assert len(s3.objects['flat']) > 4 * len(s3.objects[key])
+
+
+def test_unknown_encoding_rejected():
+    with pytest.raises(ValueError):
+        list(envelope_records({'encoding': 'normalized/99', 'plays': []}))
+    with pytest.raises(ValueError):
+        save_tracks_to_s3(looped_batch(5), 'bucket', s3_client=FakeS3(), encoding='columnar')
@@ -0,0 +1,69 @@
+"""Tests for SpotifyClient paging (Spotify API replaced by a stub)."""
+import pytest
+
+from play_batch import PlayBatch
+from spotify_client import SpotifyClient
+from tests.fakes import make_items
+
+
+class StubSpotify:
+    """Serves pre-built recently-played pages in order."""
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.calls = []
+
+    def current_user_recently_played(self, **params):
+        self.calls.append(params)
+        items = self.pages.pop(0) if self.pages else []
+        return {'items': items}
+
+
+@pytest.fixture
+def client():
+    return SpotifyClient(client_id='id', client_secret='secret', redirect_uri='http://localhost')
+
+
+def test_get_recently_played_returns_batch(client):
+    client.sp = StubSpotify([make_items(10)])
+
+    tracks = client.get_recently_played(limit=10)
+
+    assert isinstance(tracks, PlayBatch)
+    assert len(tracks) == 10
+    assert client.sp.calls == [{'limit': 10}]
+
+
+def test_get_all_recent_history_pages_backward_and_sorts(client):
+    items = make_items(120)
+    client.sp = StubSpotify([items[:50], items[50:100], items[100:]])
+
+    tracks = client.get_all_recent_history()
+
+    assert len(tracks) == 120
+    assert list(tracks.played_at_timestamp) == sorted(tracks.played_at_timestamp)
+    assert client.sp.calls[1]['before'] == PlayBatch.from_items(items[:50]).played_at_timestamp[-1]
+
+
+def test_get_recent_plays_since_sorts_oldest_first(client):
+    client.sp = StubSpotify([make_items(5)])
+
+    tracks = client.get_recent_plays_since(1)
+
+    assert tracks.played_at == sorted(tracks.played_at)
+    assert client.sp.calls == [{'limit': 50, 'after': 1}]
+
+
+def test_requires_authentication(client):
+    with pytest.raises(ValueError):
+        client.get_recently_played()
+
+
+def test_iter_history_pages_yields_each_page(client):
+    items = make_items(100)
+    client.sp = StubSpotify([items[:50], items[50:], []])
+
+    sizes = [len(page) for page in client.iter_history_pages()]
+
+    assert sizes == [50, 50]
+    assert len(client.sp.calls) == 3
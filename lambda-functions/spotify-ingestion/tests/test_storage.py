@@ -0,0 +1,119 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import storage
+from play_batch import PlayBatch
+from storage import LocalStorage, MemoryStorage, S3Storage, WriteConflict
+from tests.fakes import FakeS3, make_items
+from utils import load_state, read_state, save_state, write_state, write_tracks
+
+
+@pytest.fixture(params=['memory', 'local', 's3'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStorage()
+    if request.param == 'local':
+        return LocalStorage(str(tmp_path))
+    return S3Storage('bucket', client=FakeS3())
+
+
+def test_backends_round_trip_bytes_and_missing_keys(backend):
+    assert backend.get_bytes('state/missing.json') is None
+    assert backend.get_json('state/missing.json') is None
+
+    backend.put_bytes('raw/a.json', b'{"x": 1}', 'application/json')
+    backend.put_json('state/s.json', {'n': 2})
+
+    assert backend.get_bytes('raw/a.json') == b'{"x": 1}'
+    assert backend.get_json('state/s.json') == {'n': 2}
+
+
+@pytest.mark.parametrize('make', [MemoryStorage, LocalStorage])
+def test_list_keys_is_sorted_and_prefix_filtered(make, tmp_path):
+    backend = make() if make is MemoryStorage else make(str(tmp_path))
+    for key in ['raw/b/2.json', 'state/x.json', 'raw/a/1.json']:
+        backend.put_bytes(key, b'{}')
+
+    assert list(backend.list_keys('raw/')) == ['raw/a/1.json', 'raw/b/2.json']
+
+
+def test_open_streams_bodies_and_misses_return_none(backend):
+    backend.put_bytes('raw/a.json', b'{"x": 1}')
+
+    assert backend.open('raw/a.json').read() == b'{"x": 1}'
+    assert backend.open('raw/missing.json') is None
+
+
+@pytest.mark.parametrize('make', [MemoryStorage, LocalStorage])
+def test_list_keys_start_after_and_list_prefixes(make, tmp_path):
+    backend = make() if make is MemoryStorage else make(str(tmp_path))
+    for key in ['raw/year=2025/d1/a.json', 'raw/year=2025/d2/b.json', 'raw/user_id=u1/c.json', 'raw/top.json']:
+        backend.put_bytes(key, b'{}')
+
+    assert list(backend.list_keys('raw/year=', start_after='raw/year=2025/d1/a.json')) == ['raw/year=2025/d2/b.json']
+    assert backend.list_prefixes('raw/') == ['raw/user_id=u1/', 'raw/year=2025/']
+
+
+def test_tracks_and_state_through_any_backend():
+    backend = MemoryStorage()
+    batch = PlayBatch.from_items(make_items(5))
+
+    key = write_tracks(backend, batch, prefix='raw/user_id=u1', metadata={'user_id': 'u1'}, encoding='flat')
+    write_state(backend, 1766394051968)
+
+    data = json.loads(backend.get_bytes(key))
+    assert key.startswith('raw/user_id=u1/year=') and key.endswith('.json')
+    assert (data['user_id'], data['track_count']) == ('u1', 5)
+    assert read_state(backend) == 1766394051968
+    assert write_tracks(backend, []) == ""
+
+
+def test_write_tracks_uses_given_fetch_time():
+    backend = MemoryStorage()
+    at = datetime(2024, 3, 9, 17, 5, 1, tzinfo=timezone.utc)
+
+    key = write_tracks(backend, PlayBatch.from_items(make_items(2)), fetched_at=at, output_format='json')
+
+    assert key == 'raw/year=2024/month=03/day=09/spotify_plays_20240309_170501.json'
+    assert json.loads(backend.get_bytes(key))['fetched_at'] == '2024-03-09T17:05:01Z'
+
+
+def test_local_state_keeps_file_layout(tmp_path):
+    save_state(1766394051968, state_dir=str(tmp_path))
+
+    assert (tmp_path / 'last_run_state.json').exists()
+    assert load_state(state_dir=str(tmp_path)) == 1766394051968
+
+
+def test_shared_client_is_created_once_and_grows_on_demand(monkeypatch):
+    import boto3
+
+    created = []
+    monkeypatch.setattr(boto3, 'client', lambda service, config=None: created.append(config) or object())
+    storage.reset_shared_s3_client()
+    try:
+        first = S3Storage('bucket').client
+        assert S3Storage('other-bucket').client is first
+        assert storage.shared_s3_client(4) is first
+
+        bigger = storage.shared_s3_client(32)
+        assert bigger is not first
+        assert [c.max_pool_connections for c in created] == [10, 32]
+    finally:
+        storage.reset_shared_s3_client()
+
+
+def test_conditional_put_detects_concurrent_writers(backend):
+    assert backend.get_versioned('state/r.json') == (None, None)
+    version = backend.put_bytes_if('state/r.json', b'1', None)
+    with pytest.raises(WriteConflict):
+        backend.put_bytes_if('state/r.json', b'x', None)  # created by someone else
+
+    body, read_version = backend.get_versioned('state/r.json')
+    assert body == b'1' and read_version == version
+    backend.put_bytes_if('state/r.json', b'2', read_version)
+    with pytest.raises(WriteConflict):
+        backend.put_bytes_if('state/r.json', b'3', read_version)  # stale version
+    assert backend.get_bytes('state/r.json') == b'2'
@@ -0,0 +1,82 @@
+"""Tests for the incremental S3 backfill writer."""
+import json
+
+import pytest
+
+from play_batch import PlayBatch
+from raw_format import iter_ndjson
+from stream_writer import S3PlayStreamWriter
+from tests.fakes import FakeS3, make_items
+
+
+def pages(count, size=50):
+    items = make_items(count * size, step_seconds=1)
+    return [PlayBatch.from_items(items[i:i + size]) for i in range(0, len(items), size)]
+
+
+def test_multipart_writes_one_valid_envelope():
+    s3 = FakeS3()
+    source = pages(3)
+
+    with S3PlayStreamWriter('bucket', s3_client=s3, metadata={'user_id': 'u1'}) as writer:
+        for page in source:
+            writer.write_page(page)
+
+    data = json.loads(s3.objects[writer.keys[0]])
+    assert data['track_count'] == 150
+    assert data['user_id'] == 'u1'
+    assert data['tracks'][0] == source[0][0]
+    assert data['tracks'][-1] == source[-1][-1]
+    assert writer.latest_timestamp == source[0].latest_timestamp()
+
+
+def test_parts_mode_writes_each_page_immediately():
+    s3 = FakeS3()
+    writer = S3PlayStreamWriter('bucket', s3_client=s3, mode='parts')
+
+    writer.write_page(pages(1)[0])
+    assert len(s3.objects) == 1
+
+    writer.write_page(pages(1, size=10)[0])
+    writer.close()
+
+    counts = [json.loads(body)['track_count'] for body in s3.objects.values()]
+    assert counts == [50, 10]
+    assert writer.keys[0].endswith('_part0001.json')
+
+
+def test_error_aborts_multipart_upload():
+    s3 = FakeS3()
+
+    with pytest.raises(RuntimeError):
+        with S3PlayStreamWriter('bucket', s3_client=s3) as writer:
+            writer.write_page(pages(1)[0])
+            raise RuntimeError('API down')
+
+    assert s3.objects == {}
+    assert s3.uploads == {}
+    assert s3.calls[-1][0] == 'abort_multipart_upload'
+
+
+def test_empty_stream_writes_nothing():
+    s3 = FakeS3()
+
+    with S3PlayStreamWriter('bucket', s3_client=s3) as writer:
+        pass
+
+    assert writer.close() is None
+    assert s3.calls == []
+
+
+def test_multipart_ndjson_is_one_compressed_stream():
+    s3 = FakeS3()
+    source = pages(3)
+
+    with S3PlayStreamWriter('bucket', s3_client=s3, metadata={'user_id': 'u1'}, output_format='ndjson.gz') as writer:
+        for page in source:
+            writer.write_page(page)
+
+    assert writer.keys[0].endswith('.ndjson.gz')
+    rows = list(iter_ndjson(s3.objects[writer.keys[0]], 'ndjson.gz'))
+    assert len(rows) == writer.track_count == 150
+    assert rows[0] == {'fetched_at': writer.fetched_at, 'user_id': 'u1', **source[0][0]}
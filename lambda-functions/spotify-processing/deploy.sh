@@ -0,0 +1,23 @@
+#!/bin/bash
+# Package Lambda function with dependencies
+
+echo "Creating deployment package..."
+
+# Create clean directory
+rm -rf package
+mkdir package
+
+# Install dependencies to package directory
+pip install -r requirements.txt -t package/
+
+# Copy source code (plus modules shared by all Lambdas)
+cp -r src/* package/
+cp ../shared/*.py package/
+
+# Create zip file
+cd package
+zip -r ../spotify-processing-lambda.zip .
+cd ..
+
+echo "✅ Deployment package created: spotify-processing-lambda.zip"
+ls -lh spotify-processing-lambda.zip
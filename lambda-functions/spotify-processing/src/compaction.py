@@ -0,0 +1,326 @@
+"""
+Small-file compaction for the raw/ and artists/ prefixes.
+
+Every ingestion run writes one small object and every enrichment run writes
+another, so after a year listing and reading those prefixes is dominated by
+per-object overhead. Compaction merges all objects of a closed day (or
+month) partition into one sorted, deduplicated ndjson.gz object in the same
+partition and deletes the originals.
+
+Lineage: for each output a manifest is written to
+    compaction/manifests/<partition>/<output name>.json
+listing every source key (with size and ETag) it replaced.
+
+Idempotent and resumable:
+    - The output key is derived from the source keys, so re-running a
+      crashed compaction rewrites the same object.
+    - The manifest is written (status 'written') before any source is
+      deleted and marked 'complete' afterwards. A run that finds a
+      'written' manifest finishes its deletions instead of compacting again.
+    - A partition already reduced to a single compacted object is skipped.
+
+Discovery: artist and track discovery list each raw root with StartAfter
+their checkpoint key, so they never see an object whose key sorts before
+the checkpoint. A compacted object sorts before the objects it replaces
+(compacted_... < spotify_plays_..., and month=12/compacted_... <
+month=12/day=...), so a raw partition is only compacted once every source
+key is at or before every discovery checkpoint of its root and none is
+still waiting in a backfill manifest. Everything in the output has then
+been read already; partitions holding unread objects are deferred to a
+later run.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from processor import iter_raw_plays
+from raw_checkpoint import DISCOVERY_CHECKPOINTS, load_discovery_checkpoints, read_by_discovery
+from raw_format import NDJSON_CONTENT_TYPE, NDJSONEncoder, format_for_key, iter_records
+from storage import S3Storage
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PREFIX = "compaction/manifests"
+REPORT_PREFIX = "compaction/reports"
+COMPACTED_NAME = "compacted_{digest}.ndjson.gz"
+
+GRANULARITIES = ('day', 'month')
+
+
+def _iter_artists(body, output_format: str) -> Iterator[Dict]:
+    """Artist records with the batch fetch time attached (as in NDJSON artist lines)."""
+    if output_format == 'json':
+        data = json.loads(body.read() if hasattr(body, 'read') else body)
+        for artist in data.get('artists', []):
+            yield {'batch_fetched_at': data.get('fetched_at'), **artist}
+    else:
+        yield from iter_records(body, output_format)
+
+
+def _play_key(play: Dict) -> Tuple:
+    return (play.get('user_id'), play.get('track_id'), play.get('played_at_timestamp') or play.get('played_at'))
+
+
+def _play_sort(play: Dict) -> Tuple:
+    return (play.get('played_at_timestamp') or 0, play.get('user_id') or '', play.get('track_id') or '')
+
+
+def _artist_key(artist: Dict) -> Tuple:
+    return (artist.get('artist_id'),)
+
+
+def _artist_sort(artist: Dict) -> Tuple:
+    return (artist.get('artist_id') or '',)
+
+
+# How each compactable prefix is read, deduplicated and ordered
+DATASETS: Dict[str, Dict[str, Callable]] = {
+    'raw': {'read': iter_raw_plays, 'key': _play_key, 'sort': _play_sort},
+    'artists': {'read': _iter_artists, 'key': _artist_key, 'sort': _artist_sort},
+}
+
+
+def partition_of(key: str, granularity: str = 'day') -> Optional[str]:
+    """
+    Partition path an object belongs to at the given granularity.
+
+    'raw/user_id=u1/year=2025/month=12/day=22/x.json' → 'raw/user_id=u1/year=2025/month=12/day=22'
+    (or '.../month=12' for granularity='month'). None if the key is not partitioned.
+    """
+    parts = key.split('/')[:-1]
+    for index, part in enumerate(parts):
+        if part.startswith(f"{granularity}="):
+            return '/'.join(parts[:index + 1])
+    return None
+
+
+def _period_is_open(partition: str, granularity: str, now: datetime) -> bool:
+    """True if the partition is the current (still being written) day/month."""
+    values = dict(p.split('=', 1) for p in partition.split('/') if '=' in p)
+    try:
+        year, month = int(values['year']), int(values['month'])
+        day = int(values['day']) if granularity == 'day' else None
+    except (KeyError, ValueError):
+        return False
+    if granularity == 'day':
+        return (year, month, day) >= (now.year, now.month, now.day)
+    return (year, month) >= (now.year, now.month)
+
+
+def list_partitions(s3, bucket: str, prefix: str, granularity: str = 'day') -> Dict[str, List[Dict]]:
+    """
+    Group raw-format objects under `prefix` by partition.
+
+    Returns:
+        {partition path: [object summaries (Key, Size, ETag)]}
+    """
+    partitions: Dict[str, List[Dict]] = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix.rstrip('/')}/"):
+        for obj in page.get('Contents', []):
+            if format_for_key(obj['Key']) is None:
+                continue
+            partition = partition_of(obj['Key'], granularity)
+            if partition:
+                partitions.setdefault(partition, []).append(obj)
+    return partitions
+
+
+def compacted_key(partition: str, source_keys: Iterable[str]) -> str:
+    """Deterministic output key for a set of sources."""
+    digest = hashlib.sha1('\n'.join(sorted(source_keys)).encode('utf-8')).hexdigest()[:12]
+    return f"{partition}/{COMPACTED_NAME.format(digest=digest)}"
+
+
+def manifest_key(output_key: str) -> str:
+    """Lineage manifest key for a compacted object."""
+    return f"{MANIFEST_PREFIX}/{output_key.rsplit('.ndjson.gz', 1)[0]}.json"
+
+
+def _is_compacted(key: str) -> bool:
+    return key.rsplit('/', 1)[-1].startswith('compacted_')
+
+
+def _load_json(s3, bucket: str, key: str) -> Optional[Dict]:
+    from botocore.exceptions import ClientError
+
+    try:
+        return json.loads(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            return None
+        raise
+
+
+def _put_json(s3, bucket: str, key: str, data: Dict) -> None:
+    s3.put_object(Bucket=bucket, Key=key, Body=json.dumps(data, indent=2), ContentType='application/json')
+
+
+def _delete_sources(s3, bucket: str, keys: List[str]) -> None:
+    """Delete source objects in batches of 1000 (the DeleteObjects limit)."""
+    for i in range(0, len(keys), 1000):
+        s3.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': k} for k in keys[i:i + 1000]], 'Quiet': True},
+        )
+
+
+def resume_pending(s3, bucket: str, prefix: str) -> List[str]:
+    """
+    Finish compactions whose output was written but sources not yet deleted.
+
+    Returns:
+        Output keys whose compaction was completed now
+    """
+    resumed = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{MANIFEST_PREFIX}/{prefix.rstrip('/')}/"):
+        for obj in page.get('Contents', []):
+            manifest = _load_json(s3, bucket, obj['Key'])
+            if not manifest or manifest.get('status') != 'written':
+                continue
+            _delete_sources(s3, bucket, [s['key'] for s in manifest['sources'] if s['key'] != manifest['output_key']])
+            manifest['status'] = 'complete'
+            manifest['completed_at'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            _put_json(s3, bucket, obj['Key'], manifest)
+            resumed.append(manifest['output_key'])
+            logger.info(f"Resumed compaction of {manifest['output_key']}")
+    return resumed
+
+
+def compact_partition(s3, bucket: str, dataset: str, partition: str, objects: List[Dict]) -> Dict:
+    """
+    Merge one partition's objects into a single sorted, deduplicated object.
+
+    Args:
+        s3: boto3 S3 client
+        bucket: S3 bucket name
+        dataset: 'raw' or 'artists' (selects reader and dedupe key)
+        partition: Partition path (see partition_of)
+        objects: Object summaries in the partition
+
+    Returns:
+        Manifest dict for the new object
+    """
+    spec = DATASETS[dataset]
+    sources = sorted(objects, key=lambda o: (not _is_compacted(o['Key']), o['Key']))
+    output_key = compacted_key(partition, [o['Key'] for o in sources])
+
+    # Later sources win on duplicate keys: an earlier compacted object is read
+    # first, then the small objects in key (= fetch time) order
+    records: Dict[Tuple, Dict] = {}
+    read_count = 0
+    for obj in sources:
+        body = s3.get_object(Bucket=bucket, Key=obj['Key'])['Body']
+        for record in spec['read'](body, format_for_key(obj['Key'])):
+            records[spec['key'](record)] = record
+            read_count += 1
+
+    encoder = NDJSONEncoder('ndjson.gz')
+    body = encoder.encode(sorted(records.values(), key=spec['sort'])) + encoder.finish()
+    s3.put_object(Bucket=bucket, Key=output_key, Body=body, ContentType=NDJSON_CONTENT_TYPE)
+
+    manifest = {
+        'status': 'written',
+        'dataset': dataset,
+        'partition': partition,
+        'output_key': output_key,
+        'output_bytes': len(body),
+        'records_in': read_count,
+        'records_out': len(records),
+        'sources': [{'key': o['Key'], 'size': o.get('Size'), 'etag': o.get('ETag')} for o in sources],
+        'written_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+    }
+    _put_json(s3, bucket, manifest_key(output_key), manifest)
+
+    _delete_sources(s3, bucket, [o['Key'] for o in sources if o['Key'] != output_key])
+    manifest['status'] = 'complete'
+    manifest['completed_at'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    _put_json(s3, bucket, manifest_key(output_key), manifest)
+
+    logger.info(f"Compacted {len(sources)} objects ({read_count} → {len(records)} records) into {output_key}")
+    return manifest
+
+
+def compact_prefix(
+    s3,
+    bucket: str,
+    prefix: str,
+    granularity: str = 'day',
+    include_open: bool = False,
+    now: Optional[datetime] = None,
+) -> Dict:
+    """
+    Compact every closed partition under `prefix`.
+
+    Args:
+        s3: boto3 S3 client
+        bucket: S3 bucket name
+        prefix: 'raw' or 'artists'
+        granularity: 'day' or 'month'
+        include_open: Also compact the current day/month (still being written)
+        now: Current time (for tests)
+
+    Returns:
+        Report: object counts and bytes before/after, partitions compacted
+    """
+    dataset = prefix.strip('/').split('/')[0]
+    if dataset not in DATASETS:
+        raise ValueError(f"Cannot compact prefix: {prefix}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    now = now or datetime.now(timezone.utc)
+
+    resumed = resume_pending(s3, bucket, prefix)
+    partitions = list_partitions(s3, bucket, prefix, granularity)
+    checkpoints = (
+        load_discovery_checkpoints(S3Storage(bucket, client=s3), DISCOVERY_CHECKPOINTS)
+        if dataset == 'raw' else []
+    )
+
+    report = {
+        'prefix': prefix,
+        'granularity': granularity,
+        'objects_before': sum(len(objs) for objs in partitions.values()),
+        'bytes_before': sum(o.get('Size', 0) for objs in partitions.values() for o in objs),
+        'objects_after': 0,
+        'bytes_after': 0,
+        'partitions_compacted': 0,
+        'partitions_deferred': 0,
+        'resumed': resumed,
+        'outputs': [],
+    }
+
+    for partition, objects in sorted(partitions.items()):
+        already_compact = len(objects) == 1 and _is_compacted(objects[0]['Key'])
+        skip = already_compact or (not include_open and _period_is_open(partition, granularity, now))
+        if not skip and not read_by_discovery([o['Key'] for o in objects], checkpoints):
+            logger.info(f"Deferred {partition}: discovery has not read all of it yet")
+            report['partitions_deferred'] += 1
+            skip = True
+        if skip:
+            report['objects_after'] += len(objects)
+            report['bytes_after'] += sum(o.get('Size', 0) for o in objects)
+            continue
+
+        manifest = compact_partition(s3, bucket, dataset, partition, objects)
+        report['objects_after'] += 1
+        report['bytes_after'] += manifest['output_bytes']
+        report['partitions_compacted'] += 1
+        report['outputs'].append(manifest['output_key'])
+
+    logger.info(
+        f"Compaction of {prefix}: {report['objects_before']} → {report['objects_after']} objects, "
+        f"{report['bytes_before']} → {report['bytes_after']} bytes"
+    )
+    return report
+
+
+def publish_report(s3, bucket: str, reports: List[Dict]) -> str:
+    """Write the before/after report of one compaction run to S3."""
+    now = datetime.now(timezone.utc)
+    key = f"{REPORT_PREFIX}/compaction_{now.strftime('%Y%m%d_%H%M%S')}.json"
+    _put_json(s3, bucket, key, {'generated_at': now.strftime('%Y-%m-%dT%H:%M:%SZ'), 'prefixes': reports})
+    return key
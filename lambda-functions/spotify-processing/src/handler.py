@@ -0,0 +1,70 @@
+"""AWS Lambda handler for the raw → processed (Parquet) stage."""
+
+import json
+import os
+
+from compaction import compact_prefix, publish_report
+from processor import process_new_raw
+from storage import S3Storage
+
+BUCKET_NAME = os.environ.get("S3_BUCKET", "spotify-pipeline-ivan-1766559048")
+# Created on first use and kept warm across invocations
+STORAGE = S3Storage(BUCKET_NAME)
+
+
+def lambda_handler(event, context):
+    """
+    Lambda entry point.
+
+    Merges raw play objects written since the last run into
+    processed/plays/year=/month=/day= Parquet partitions (by play date).
+    An event with `compact` runs small-file compaction instead.
+    """
+    event = event or {}
+
+    if event.get("compact"):
+        return compaction_handler(event)
+
+    print("Starting raw → processed run...")
+
+    try:
+        summary = process_new_raw(STORAGE.client, BUCKET_NAME)
+
+        if not summary["raw_objects"]:
+            print("No new raw objects")
+            return {"statusCode": 200, "body": "No new raw objects"}
+
+        print(
+            f"Processed {summary['raw_objects']} raw objects ({summary['raw_plays']} plays) "
+            f"into {summary['partitions']} partitions"
+        )
+        return {"statusCode": 200, "body": json.dumps(summary)}
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        raise
+
+
+def compaction_handler(event):
+    """
+    Compact closed partitions of the raw/ and artists/ prefixes.
+
+    Event: {"compact": true, "prefixes": ["raw", "artists"], "granularity": "day"}
+    """
+    s3 = STORAGE.client
+
+    prefixes = event.get("prefixes", ["raw", "artists"])
+    granularity = event.get("granularity", "day")
+    print(f"Starting compaction of {', '.join(prefixes)} by {granularity}...")
+
+    reports = [compact_prefix(s3, BUCKET_NAME, prefix, granularity) for prefix in prefixes]
+    report_key = publish_report(s3, BUCKET_NAME, reports)
+
+    for report in reports:
+        print(
+            f"{report['prefix']}: {report['objects_before']} → {report['objects_after']} objects, "
+            f"{report['bytes_before']} → {report['bytes_after']} bytes"
+        )
+    print(f"Report: s3://{BUCKET_NAME}/{report_key}")
+
+    return {"statusCode": 200, "body": json.dumps({"report_key": report_key, "prefixes": reports})}
@@ -0,0 +1,74 @@
+"""
+Merge staged history plays straight into the processed Parquet layout.
+
+Used by `import_streaming_history.py --layout processed`: the ingestion
+importer (history_import.py) writes the export as raw-layout ndjson.gz
+chunks into a local staging directory, and this module merges each play
+date's chunks into processed/plays/year=/month=/day=/plays.parquet with
+the same normalization and deduplication as the processing stage. One
+worker process per day, so no two workers write the same partition.
+
+Bypasses the raw/ → processed watermark, so do not run it while the
+processing Lambda is running.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from processor import dedupe_plays, iter_raw_plays, normalize_play, parquet_to_plays, partition_key, plays_to_parquet
+from raw_format import format_for_key
+from storage import LocalStorage, StorageBackend
+
+logger = logging.getLogger(__name__)
+
+STAGING_FORMAT = 'ndjson.gz'
+
+
+def staged_days(staging_root: str) -> Dict[str, List[str]]:
+    """Staged raw keys by play date ('YYYY-MM-DD'), from their year=/month=/day= partitions."""
+    days: Dict[str, List[str]] = {}
+    for key in LocalStorage(staging_root).list_keys('raw/'):
+        parts = dict(p.split('=', 1) for p in key.split('/') if '=' in p)
+        days.setdefault(f"{parts['year']}-{parts['month']}-{parts['day']}", []).append(key)
+    return days
+
+
+def merge_day(day: str, keys: List[str], staging_root: str, storage: StorageBackend) -> Dict:
+    """
+    Merge one day's staged plays into its processed Parquet partition (runs in a worker).
+
+    Returns:
+        Stats: day, key, rows
+    """
+    staging = LocalStorage(staging_root)
+    plays = []
+    for key in keys:
+        plays.extend(normalize_play(p) for p in iter_raw_plays(staging.get_bytes(key), format_for_key(key)))
+
+    key = partition_key(day)
+    existing = storage.get_bytes(key)
+    merged = dedupe_plays((parquet_to_plays(existing) if existing else []) + plays)
+    storage.put_bytes(key, plays_to_parquet(merged), 'application/vnd.apache.parquet')
+    logger.info(f"Wrote {len(merged)} plays to {storage.location(key)}")
+    return {'day': day, 'key': storage.location(key), 'rows': len(merged)}
+
+
+def merge_staged_history(staging_root: str, storage: StorageBackend, workers: Optional[int] = None) -> Dict:
+    """
+    Merge every staged play date into processed Parquet, one worker process per day.
+
+    Args:
+        staging_root: Local directory holding the staged raw layout
+        storage: Destination backend (pickled into the workers)
+        workers: Worker processes (default: CPU count); 1 runs in-process
+
+    Returns:
+        Summary: partitions, rows_written
+    """
+    tasks = [(day, keys, staging_root, storage) for day, keys in sorted(staged_days(staging_root).items())]
+    if workers == 1 or len(tasks) <= 1:
+        results = [merge_day(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = [future.result() for future in [pool.submit(merge_day, *task) for task in tasks]]
+    return {'partitions': len(results), 'rows_written': sum(r['rows'] for r in results)}
@@ -0,0 +1,353 @@
+"""
+Raw → processed stage: partitioned, deduplicated Parquet plays.
+
+Raw objects are partitioned by when they were fetched; the same play can
+appear in several of them (overlapping incremental runs, backfills). This
+stage reads raw objects written since the last run, deduplicates plays on
+(user_id, track_id, played_at) and merges them into one Parquet file per
+*play* date:
+
+    processed/plays/year=YYYY/month=MM/day=DD/plays.parquet
+
+Each touched day is rewritten as old rows + new rows, deduplicated and
+sorted by played_at, so re-running over the same raw objects is a no-op.
+Files use typed columns (timestamps, ints), dictionary-encoded IDs and
+names, zstd compression and row-group statistics, so engines can prune
+by partition and by played_at min/max.
+"""
+import io
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from raw_format import envelope_metadata, envelope_records, format_for_key, iter_ndjson
+
+logger = logging.getLogger(__name__)
+
+RAW_PREFIX = "raw/"
+PROCESSED_PREFIX = "processed/plays"
+STATE_KEY = "state/processing_state.json"
+
+# Column order of the processed files
+COLUMNS = (
+    'played_at',
+    'played_at_timestamp',
+    'user_id',
+    'track_id',
+    'track_name',
+    'artist_id',
+    'artist_name',
+    'album_id',
+    'album_name',
+    'release_date',
+    'duration_ms',
+    'popularity',
+    'fetched_at',
+)
+
+# Low-cardinality, highly repeated columns
+DICTIONARY_COLUMNS = [
+    'user_id', 'track_id', 'track_name', 'artist_id', 'artist_name', 'album_id', 'album_name', 'release_date',
+]
+
+ROW_GROUP_SIZE = 64 * 1024
+
+
+def play_schema():
+    """Arrow schema of the processed plays (pyarrow imported on first use)."""
+    import pyarrow as pa
+
+    ms_utc = pa.timestamp('ms', tz='UTC')
+    return pa.schema([
+        ('played_at', ms_utc),
+        ('played_at_timestamp', pa.int64()),
+        ('user_id', pa.string()),
+        ('track_id', pa.string()),
+        ('track_name', pa.string()),
+        ('artist_id', pa.string()),
+        ('artist_name', pa.string()),
+        ('album_id', pa.string()),
+        ('album_name', pa.string()),
+        ('release_date', pa.string()),
+        ('duration_ms', pa.int32()),
+        ('popularity', pa.int16()),
+        ('fetched_at', ms_utc),
+    ])
+
+
+def _parse_ts(value: Optional[str]) -> Optional[int]:
+    """ISO-8601 string ('...Z') to epoch milliseconds."""
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return int(dt.timestamp() * 1000)
+
+
+def iter_raw_plays(body, output_format: str) -> Iterator[Dict]:
+    """
+    Yield plays from one raw object with the batch metadata attached.
+
+    Args:
+        body: Object bytes or readable stream
+        output_format: Raw format of the object (see raw_format.FORMATS)
+
+    Yields:
+        Play dicts including fetched_at and user_id (None if absent)
+    """
+    if output_format == 'json':
+        data = json.loads(body if isinstance(body, (bytes, bytearray, str)) else body.read())
+        batch = envelope_metadata(data)
+        for track in envelope_records(data):  # flat or normalized envelopes
+            yield {**batch, **track}
+    else:
+        yield from iter_ndjson(body, output_format)
+
+
+def normalize_play(play: Dict) -> Dict:
+    """Project a raw play onto COLUMNS with typed values."""
+    timestamp = play.get('played_at_timestamp')
+    if timestamp is None:
+        timestamp = _parse_ts(play.get('played_at'))
+    fetched_at = play.get('fetched_at')
+    return {
+        'played_at': timestamp,
+        'played_at_timestamp': timestamp,
+        'user_id': play.get('user_id'),
+        'track_id': play.get('track_id'),
+        'track_name': play.get('track_name'),
+        'artist_id': play.get('artist_id'),
+        'artist_name': play.get('artist_name'),
+        'album_id': play.get('album_id'),
+        'album_name': play.get('album_name'),
+        'release_date': play.get('release_date'),
+        'duration_ms': play.get('duration_ms'),
+        'popularity': play.get('popularity'),
+        'fetched_at': fetched_at if isinstance(fetched_at, int) or fetched_at is None else _parse_ts(fetched_at),
+    }
+
+
+def dedupe_plays(plays: Iterable[Dict]) -> List[Dict]:
+    """
+    Keep one row per (user_id, track_id, played_at), sorted by play time.
+
+    The most recently fetched copy wins, so re-fetched metadata
+    (e.g. a corrected track name) replaces older values.
+
+    Args:
+        plays: Normalized plays (see normalize_play)
+
+    Returns:
+        Deduplicated plays ordered by played_at_timestamp
+    """
+    latest: Dict[Tuple, Dict] = {}
+    for play in plays:
+        key = (play['user_id'], play['track_id'], play['played_at_timestamp'])
+        current = latest.get(key)
+        if current is None or (play['fetched_at'] or 0) >= (current['fetched_at'] or 0):
+            latest[key] = play
+    return sorted(latest.values(), key=lambda p: (p['played_at_timestamp'], p['user_id'] or '', p['track_id']))
+
+
+def partition_by_play_date(plays: Iterable[Dict]) -> Dict[str, List[Dict]]:
+    """
+    Group plays by the UTC date they were played.
+
+    Returns:
+        {'YYYY-MM-DD': [plays...]}
+    """
+    partitions: Dict[str, List[Dict]] = {}
+    for play in plays:
+        day = datetime.fromtimestamp(play['played_at_timestamp'] / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+        partitions.setdefault(day, []).append(play)
+    return partitions
+
+
+def partition_key(day: str, prefix: str = PROCESSED_PREFIX) -> str:
+    """S3 key of the Parquet file for a play date ('YYYY-MM-DD')."""
+    year, month, dd = day.split('-')
+    return f"{prefix}/year={year}/month={month}/day={dd}/plays.parquet"
+
+
+def plays_to_parquet(plays: List[Dict]) -> bytes:
+    """
+    Encode plays as one Parquet file.
+
+    Args:
+        plays: Normalized, deduplicated plays
+
+    Returns:
+        Parquet file bytes
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = play_schema()
+    table = pa.table({name: [p[name] for p in plays] for name in COLUMNS}, schema=schema)
+
+    buffer = io.BytesIO()
+    pq.write_table(
+        table,
+        buffer,
+        compression='zstd',
+        use_dictionary=DICTIONARY_COLUMNS,
+        write_statistics=True,
+        row_group_size=ROW_GROUP_SIZE,
+    )
+    return buffer.getvalue()
+
+
+def parquet_to_plays(body: bytes) -> List[Dict]:
+    """Decode a processed Parquet file back into normalized play dicts."""
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(io.BytesIO(body))
+    columns = {name: table.column(name).to_pylist() for name in COLUMNS}
+    # Timestamps come back as datetimes; keep the epoch-ms representation
+    for name in ('played_at', 'fetched_at'):
+        columns[name] = [int(v.timestamp() * 1000) if v is not None else None for v in columns[name]]
+    return [dict(zip(COLUMNS, row)) for row in zip(*(columns[name] for name in COLUMNS))]
+
+
+def load_processing_state(s3, bucket: str, key: str = STATE_KEY) -> Dict:
+    """
+    Load the raw-object watermark of the last run.
+
+    Returns:
+        {'last_modified': ISO string or None, 'keys_at_watermark': [...]}
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+        return json.loads(response['Body'].read())
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            logger.info("No processing state found - processing all raw objects")
+            return {'last_modified': None, 'keys_at_watermark': []}
+        raise
+
+
+def save_processing_state(s3, bucket: str, state: Dict, key: str = STATE_KEY) -> None:
+    """Persist the raw-object watermark."""
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(state, indent=2),
+        ContentType='application/json',
+    )
+
+
+def list_new_raw_objects(s3, bucket: str, state: Dict, prefix: str = RAW_PREFIX) -> List[Dict]:
+    """
+    List raw objects written after the watermark.
+
+    Objects sharing the watermark's LastModified second are compared by key,
+    so a file written in the same second as the last one seen is not skipped.
+
+    Returns:
+        S3 object summaries (Key, LastModified, Size), oldest first
+    """
+    watermark = state.get('last_modified')
+    seen_at_watermark = set(state.get('keys_at_watermark') or [])
+
+    new_objects = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if format_for_key(obj['Key']) is None:
+                continue
+            modified = _iso(obj['LastModified'])
+            if watermark and (modified < watermark or (modified == watermark and obj['Key'] in seen_at_watermark)):
+                continue
+            new_objects.append(obj)
+
+    new_objects.sort(key=lambda o: (_iso(o['LastModified']), o['Key']))
+    return new_objects
+
+
+def _iso(value) -> str:
+    """LastModified (datetime from boto3) as a sortable UTC string."""
+    if isinstance(value, str):
+        return value
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _advance_state(state: Dict, objects: List[Dict]) -> Dict:
+    """Watermark after processing `objects` (sorted oldest first)."""
+    if not objects:
+        return state
+    last = _iso(objects[-1]['LastModified'])
+    previous = state.get('keys_at_watermark', []) if state.get('last_modified') == last else []
+    keys = previous + [o['Key'] for o in objects if _iso(o['LastModified']) == last]
+    return {'last_modified': last, 'keys_at_watermark': sorted(set(keys))}
+
+
+def read_partition(s3, bucket: str, key: str) -> List[Dict]:
+    """Existing plays of one processed partition (empty if none yet)."""
+    from botocore.exceptions import ClientError
+
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            return []
+        raise
+    return parquet_to_plays(response['Body'].read())
+
+
+def process_new_raw(
+    s3,
+    bucket: str,
+    raw_prefix: str = RAW_PREFIX,
+    processed_prefix: str = PROCESSED_PREFIX,
+    state_key: str = STATE_KEY,
+) -> Dict:
+    """
+    Merge raw objects written since the last run into processed Parquet.
+
+    The watermark is only advanced after every touched partition has been
+    written, so a failed run is simply retried from the same point.
+
+    Args:
+        s3: boto3 S3 client
+        bucket: S3 bucket name
+        raw_prefix: Prefix holding raw play objects
+        processed_prefix: Prefix for the Parquet partitions
+        state_key: S3 key of the watermark file
+
+    Returns:
+        Summary: raw_objects, raw_plays, partitions, rows_written, keys
+    """
+    state = load_processing_state(s3, bucket, state_key)
+    objects = list_new_raw_objects(s3, bucket, state, raw_prefix)
+    summary = {'raw_objects': len(objects), 'raw_plays': 0, 'partitions': 0, 'rows_written': 0, 'keys': []}
+
+    if not objects:
+        logger.info("No new raw objects")
+        return summary
+
+    plays = []
+    for obj in objects:
+        response = s3.get_object(Bucket=bucket, Key=obj['Key'])
+        for play in iter_raw_plays(response['Body'], format_for_key(obj['Key'])):
+            if play.get('track_id') and (play.get('played_at') or play.get('played_at_timestamp')):
+                plays.append(normalize_play(play))
+    summary['raw_plays'] = len(plays)
+
+    for day, new_plays in sorted(partition_by_play_date(dedupe_plays(plays)).items()):
+        key = partition_key(day, processed_prefix)
+        merged = dedupe_plays(read_partition(s3, bucket, key) + new_plays)
+        s3.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=plays_to_parquet(merged),
+            ContentType='application/vnd.apache.parquet',
+        )
+        summary['partitions'] += 1
+        summary['rows_written'] += len(merged)
+        summary['keys'].append(key)
+        logger.info(f"Wrote {len(merged)} plays to s3://{bucket}/{key}")
+
+    save_processing_state(s3, bucket, _advance_state(state, objects), state_key)
+    return summary
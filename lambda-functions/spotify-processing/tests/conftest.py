@@ -0,0 +1,12 @@
+"""
+Shared pytest setup: make the Lambda source importable the same way
+the Lambda runtime does (flat modules on sys.path).
+"""
+import os
+import sys
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(LAMBDA_DIR, 'src')
+SHARED_DIR = os.path.join(os.path.dirname(LAMBDA_DIR), 'shared')
+sys.path.insert(0, SHARED_DIR)
+sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,51 @@
+"""In-memory S3 bucket and play builders shared by the processing tests."""
+import io
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+
+class BucketS3:
+    """In-memory bucket with LastModified, enough for list/get/put."""
+
+    def __init__(self):
+        self.objects = {}
+        self.modified = {}
+        self.clock = 0
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        self.clock += 1
+        self.modified[Key] = datetime.fromtimestamp(1_700_000_000 + self.clock, tz=timezone.utc)
+        return {}
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix))
+        yield {'Contents': [
+            {'Key': k, 'LastModified': self.modified[k], 'Size': len(self.objects[k]), 'ETag': f'"{k}"'}
+            for k in keys
+        ]}
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete['Objects']:
+            self.objects.pop(obj['Key'], None)
+            self.modified.pop(obj['Key'], None)
+        return {}
+
+
+def play(track_id, played_at, fetched_at='2025-12-22T10:00:00Z', **extra):
+    ts = int(datetime.fromisoformat(played_at.replace('Z', '+00:00')).timestamp() * 1000)
+    return {
+        'played_at': played_at, 'played_at_timestamp': ts, 'track_id': track_id,
+        'track_name': f"Track {track_id}", 'artist_id': 'a1', 'artist_name': 'Artist',
+        'album_id': 'al1', 'album_name': 'Album', 'release_date': '2020-01-01',
+        'duration_ms': 200000, 'popularity': 50, 'fetched_at': fetched_at, **extra,
+    }
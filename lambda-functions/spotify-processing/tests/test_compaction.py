@@ -0,0 +1,158 @@
+"""Tests for small-file compaction of raw/ and artists/."""
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from compaction import compact_partition, compact_prefix, manifest_key, partition_of
+from fakes import BucketS3, play
+from raw_checkpoint import DISCOVERY_CHECKPOINTS, raw_root, record_backfill
+from raw_format import encode_ndjson, iter_ndjson
+from storage import S3Storage
+
+NOW = datetime(2025, 12, 25, tzinfo=timezone.utc)
+DAY = 'raw/year=2025/month=12/day=22'
+
+
+def put_plays(s3, key, plays, fetched_at='2025-12-22T10:00:00Z'):
+    s3.put_object('b', key, json.dumps({'fetched_at': fetched_at, 'tracks': plays}))
+
+
+@pytest.fixture
+def bucket():
+    s3 = BucketS3()
+    put_plays(s3, f"{DAY}/spotify_plays_20251222_100000.json", [play('t1', '2025-12-22T09:00:00Z'), play('t2', '2025-12-22T09:05:00Z')])
+    put_plays(s3, f"{DAY}/spotify_plays_20251222_110000.json", [play('t2', '2025-12-22T09:05:00Z'), play('t3', '2025-12-22T10:30:00Z')])
+    s3.put_object('b', f"{DAY}/spotify_plays_20251222_120000.ndjson.gz", encode_ndjson(
+        [play('t0', '2025-12-22T08:00:00Z')], metadata={'fetched_at': '2025-12-22T12:00:00Z'}
+    ))
+    # Today's partition is still being written
+    put_plays(s3, 'raw/year=2025/month=12/day=25/spotify_plays_20251225_100000.json', [play('t9', '2025-12-25T09:00:00Z')])
+    return s3
+
+
+def test_partition_of():
+    assert partition_of('raw/user_id=u1/year=2025/month=12/day=22/x.json') == 'raw/user_id=u1/year=2025/month=12/day=22'
+    assert partition_of('raw/year=2025/month=12/day=22/x.json', 'month') == 'raw/year=2025/month=12'
+    assert partition_of('raw/x.json') is None
+
+
+def test_raw_root():
+    assert raw_root('raw/user_id=u1/year=2025/month=12/day=22/x.json') == 'raw/user_id=u1/'
+    assert raw_root('raw/year=2025/month=12/day=22/x.json') == 'raw/year='
+
+
+def save_discovery_checkpoint(s3, key, roots):
+    s3.put_object('b', key, json.dumps({'roots': roots}))
+
+
+def test_month_compaction_waits_for_discovery_to_pass_the_partition():
+    s3 = BucketS3()
+    month = 'raw/year=2025/month=11'
+    put_plays(s3, f"{month}/day=20/spotify_plays_20251120_100000.json", [play('t1', '2025-11-20T09:00:00Z')])
+    put_plays(s3, f"{month}/day=25/spotify_plays_20251125_100000.json", [play('t2', '2025-11-25T09:00:00Z')])
+    checkpoint_key = DISCOVERY_CHECKPOINTS[0]
+    save_discovery_checkpoint(s3, checkpoint_key, {'raw/year=': f"{month}/day=20/spotify_plays_20251120_100000.json"})
+
+    report = compact_prefix(s3, 'b', 'raw', granularity='month', now=NOW)
+
+    # day=25 is unread: a compacted object (sorting before day=20) would hide it
+    assert report['partitions_compacted'] == 0 and report['partitions_deferred'] == 1
+    assert f"{month}/day=25/spotify_plays_20251125_100000.json" in s3.objects
+
+    save_discovery_checkpoint(s3, checkpoint_key, {'raw/year=': f"{month}/day=25/spotify_plays_20251125_100000.json"})
+    report = compact_prefix(s3, 'b', 'raw', granularity='month', now=NOW)
+
+    assert report['partitions_compacted'] == 1
+    (key,) = [k for k in s3.objects if k.startswith(month)]
+    assert key < f"{month}/day=25/spotify_plays_20251125_100000.json"
+
+
+def test_day_compaction_waits_for_track_discovery():
+    s3 = BucketS3()
+    day = 'raw/year=2025/month=12/day=20'
+    put_plays(s3, f"{day}/spotify_plays_20251220_080000.json", [play('t1', '2025-12-20T07:00:00Z')])
+    put_plays(s3, f"{day}/spotify_plays_20251220_200000.json", [play('t2', '2025-12-20T19:00:00Z')])
+    # Artist discovery has read the whole day, track discovery only the first object
+    save_discovery_checkpoint(s3, DISCOVERY_CHECKPOINTS[0], {'raw/year=': f"{day}/spotify_plays_20251220_200000.json"})
+    save_discovery_checkpoint(s3, DISCOVERY_CHECKPOINTS[1], {'raw/year=': f"{day}/spotify_plays_20251220_080000.json"})
+
+    report = compact_prefix(s3, 'b', 'raw', now=datetime(2025, 12, 21, tzinfo=timezone.utc))
+
+    assert report['partitions_deferred'] == 1
+    assert f"{day}/spotify_plays_20251220_200000.json" in s3.objects
+
+
+def test_compaction_waits_for_backfilled_keys_to_be_read(bucket):
+    for checkpoint_key in DISCOVERY_CHECKPOINTS:
+        save_discovery_checkpoint(bucket, checkpoint_key, {'raw/year=': 'raw/year=2025/month=12/day=25/z.json'})
+    record_backfill(S3Storage('b', client=bucket), [f"{DAY}/spotify_plays_20251222_100000.json"])
+
+    report = compact_prefix(bucket, 'b', 'raw', now=NOW)
+
+    assert report['partitions_compacted'] == 0 and report['partitions_deferred'] == 1
+
+
+def test_roots_missing_from_the_checkpoint_are_not_deferred(bucket):
+    save_discovery_checkpoint(bucket, DISCOVERY_CHECKPOINTS[0], {'raw/user_id=u1/': 'raw/user_id=u1/year=2025/month=12/day=24/x.json'})
+
+    assert compact_prefix(bucket, 'b', 'raw', now=NOW)['partitions_compacted'] == 1
+
+
+def test_compacts_closed_day_into_one_sorted_deduplicated_object(bucket):
+    report = compact_prefix(bucket, 'b', 'raw', now=NOW)
+
+    day_keys = [k for k in bucket.objects if k.startswith(DAY)]
+    assert len(day_keys) == 1 and day_keys[0].endswith('.ndjson.gz')
+    rows = list(iter_ndjson(bucket.objects[day_keys[0]], 'ndjson.gz'))
+    assert [r['track_id'] for r in rows] == ['t0', 't1', 't2', 't3']
+
+    assert report['objects_before'] == 4 and report['objects_after'] == 2
+    assert report['partitions_compacted'] == 1
+    assert report['bytes_after'] < report['bytes_before']
+    assert any(k.startswith('raw/year=2025/month=12/day=25/') for k in bucket.objects)
+
+    manifest = json.loads(bucket.objects[manifest_key(day_keys[0])])
+    assert manifest['status'] == 'complete'
+    assert manifest['records_in'] == 5 and manifest['records_out'] == 4
+    assert len(manifest['sources']) == 3
+
+
+def test_rerun_is_a_no_op(bucket):
+    compact_prefix(bucket, 'b', 'raw', now=NOW)
+    snapshot = dict(bucket.objects)
+
+    report = compact_prefix(bucket, 'b', 'raw', now=NOW)
+
+    assert report['partitions_compacted'] == 0
+    assert bucket.objects == snapshot
+
+
+def test_resumes_after_crash_before_source_deletion(bucket, monkeypatch):
+    objects = [{'Key': k, 'Size': len(v)} for k, v in bucket.objects.items() if k.startswith(DAY)]
+    monkeypatch.setattr(bucket, 'delete_objects', lambda **kwargs: (_ for _ in ()).throw(RuntimeError('timeout')))
+    with pytest.raises(RuntimeError):
+        compact_partition(bucket, 'b', 'raw', DAY, objects)
+    monkeypatch.undo()
+
+    report = compact_prefix(bucket, 'b', 'raw', now=NOW)
+
+    assert len(report['resumed']) == 1
+    assert report['partitions_compacted'] == 0
+    assert [k for k in bucket.objects if k.startswith(DAY)] == report['resumed']
+
+
+def test_artists_keep_latest_fetch():
+    s3 = BucketS3()
+    part = 'artists/year=2025/month=12/day=20'
+    s3.put_object('b', f"{part}/artist_data_20251220_100000.json", json.dumps({
+        'fetched_at': '2025-12-20T10:00:00Z', 'artists': [{'artist_id': 'a1', 'popularity': 10}],
+    }))
+    s3.put_object('b', f"{part}/artist_data_20251220_110000.json", json.dumps({
+        'fetched_at': '2025-12-20T11:00:00Z', 'artists': [{'artist_id': 'a1', 'popularity': 20}],
+    }))
+
+    compact_prefix(s3, 'b', 'artists', now=NOW)
+
+    (key,) = [k for k in s3.objects if k.startswith(part)]
+    assert [r['popularity'] for r in iter_ndjson(s3.objects[key], 'ndjson.gz')] == [20]
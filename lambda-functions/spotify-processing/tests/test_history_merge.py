@@ -0,0 +1,34 @@
+"""Tests for merging staged history plays into processed Parquet."""
+import pytest
+
+from fakes import play
+from raw_format import encode_ndjson
+from storage import LocalStorage
+
+pytest.importorskip('pyarrow')
+
+from history_merge import merge_staged_history  # noqa: E402
+from processor import parquet_to_plays, partition_key  # noqa: E402
+
+
+def test_staged_days_merge_into_deduplicated_partitions(tmp_path):
+    staging = LocalStorage(str(tmp_path / 'staging'))
+    staging.put_bytes(
+        'raw/user_id=ivan/year=2020/month=01/day=01/spotify_history_a_00000.ndjson.gz',
+        encode_ndjson([play('t1', '2020-01-01T10:00:00Z')], 'ndjson.gz', {'user_id': 'ivan'}),
+    )
+    staging.put_bytes(  # same play in a second file of the export
+        'raw/user_id=ivan/year=2020/month=01/day=01/spotify_history_b_00000.ndjson.gz',
+        encode_ndjson([play('t1', '2020-01-01T10:00:00Z')], 'ndjson.gz', {'user_id': 'ivan'}),
+    )
+    staging.put_bytes(
+        'raw/user_id=ivan/year=2020/month=01/day=02/spotify_history_a_00001.ndjson.gz',
+        encode_ndjson([play('t2', '2020-01-02T09:00:00Z')], 'ndjson.gz', {'user_id': 'ivan'}),
+    )
+    storage = LocalStorage(str(tmp_path / 'data'))
+
+    summary = merge_staged_history(str(tmp_path / 'staging'), storage, workers=1)
+
+    assert summary == {'partitions': 2, 'rows_written': 2}
+    rows = parquet_to_plays(storage.get_bytes(partition_key('2020-01-01')))
+    assert [(r['user_id'], r['track_id']) for r in rows] == [('ivan', 't1')]
@@ -0,0 +1,85 @@
+"""Tests for the raw → processed Parquet stage."""
+import io
+import json
+
+import pytest
+
+from fakes import BucketS3, play
+from processor import (
+    dedupe_plays,
+    iter_raw_plays,
+    normalize_play,
+    partition_by_play_date,
+    partition_key,
+    process_new_raw,
+)
+from raw_format import PLAY_FIELDS, encode_ndjson, normalize_plays
+
+
+def test_dedupe_keeps_latest_fetch_and_sorts():
+    plays = [normalize_play(p) for p in [
+        play('t2', '2025-12-22T09:00:00Z'),
+        play('t1', '2025-12-22T08:00:00Z', track_name='old'),
+        play('t1', '2025-12-22T08:00:00Z', fetched_at='2025-12-23T10:00:00Z', track_name='new'),
+    ]]
+
+    result = dedupe_plays(plays)
+
+    assert [p['track_id'] for p in result] == ['t1', 't2']
+    assert result[0]['track_name'] == 'new'
+
+
+def test_partitions_by_play_date_not_fetch_date():
+    plays = [normalize_play(play('t1', '2025-12-21T23:59:59Z')), normalize_play(play('t2', '2025-12-22T00:00:00Z'))]
+
+    partitions = partition_by_play_date(plays)
+
+    assert sorted(partitions) == ['2025-12-21', '2025-12-22']
+    assert partition_key('2025-12-21') == 'processed/plays/year=2025/month=12/day=21/plays.parquet'
+
+
+def test_process_merges_formats_dedupes_and_is_incremental():
+    pq = pytest.importorskip('pyarrow.parquet')
+    s3 = BucketS3()
+    s3.put_object('b', 'raw/year=2025/month=12/day=22/spotify_plays_1.json', json.dumps({
+        'fetched_at': '2025-12-22T10:00:00Z', 'track_count': 2,
+        'tracks': [play('t1', '2025-12-21T23:00:00Z'), play('t2', '2025-12-22T01:00:00Z')],
+    }))
+    s3.put_object('b', 'raw/year=2025/month=12/day=22/spotify_plays_2.ndjson.gz', encode_ndjson(
+        [play('t2', '2025-12-22T01:00:00Z'), play('t3', '2025-12-22T02:00:00Z')],
+        metadata={'fetched_at': '2025-12-22T11:00:00Z'},
+    ))
+
+    summary = process_new_raw(s3, 'b')
+
+    assert summary['raw_objects'] == 2 and summary['raw_plays'] == 4
+    day = pq.read_table(io.BytesIO(s3.objects[partition_key('2025-12-22')]))
+    assert day.column('track_id').to_pylist() == ['t2', 't3']
+    assert str(day.schema.field('played_at').type) == 'timestamp[ms, tz=UTC]'
+    assert day.schema.field('duration_ms').type.bit_width == 32
+    meta = pq.ParquetFile(io.BytesIO(s3.objects[partition_key('2025-12-22')])).metadata
+    column = meta.row_group(0).column(meta.schema.names.index('track_id'))
+    assert column.statistics.has_min_max
+    assert 'RLE_DICTIONARY' in column.encodings
+
+    # Nothing new: no reads, no rewrites
+    assert process_new_raw(s3, 'b')['raw_objects'] == 0
+
+    # A later object touching an existing day is merged into it
+    s3.put_object('b', 'raw/year=2025/month=12/day=23/spotify_plays_3.json', json.dumps({
+        'fetched_at': '2025-12-23T10:00:00Z', 'tracks': [play('t3', '2025-12-22T02:00:00Z'), play('t4', '2025-12-22T03:00:00Z')],
+    }))
+    summary = process_new_raw(s3, 'b')
+    day = pq.read_table(io.BytesIO(s3.objects[partition_key('2025-12-22')]))
+    assert summary['raw_objects'] == 1
+    assert day.column('track_id').to_pylist() == ['t2', 't3', 't4']
+
+
+def test_normalized_envelope_yields_flat_plays_with_batch_metadata():
+    plays = [play('t1', '2025-12-22T08:00:00Z'), play('t1', '2025-12-22T09:00:00Z'), play('t2', '2025-12-22T09:03:00Z')]
+    rows = [tuple(p[name] for name in PLAY_FIELDS) for p in plays]
+    body = json.dumps({'fetched_at': '2025-12-22T10:00:00Z', 'user_id': 'u1', **normalize_plays(rows)}).encode()
+
+    result = list(iter_raw_plays(body, 'json'))
+
+    assert result == [{**p, 'user_id': 'u1'} for p in plays]
@@ -0,0 +1,134 @@
+"""
+Persistent caches of enriched catalog entities (tracks, albums).
+
+Track and album metadata does not change after release, so each entity is
+fetched at most once. A cache is one compact gzip JSON object mapping each
+ID to when it was fetched (plus per-dimension flags):
+
+    state/track_cache.json.gz  {"4uLU6hMCjMI75M1A2tKUQC": [1766394051, 1], ...}
+                               (second value: audio features came back)
+    state/album_cache.json.gz  {"6N9PS4QXF1D0OWPk0Sxtb4": [1766394051], ...}
+
+Stored through a storage backend or, for local runs, a file.
+"""
+import gzip
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACK_CACHE_KEY = "state/track_cache.json.gz"
+ALBUM_CACHE_KEY = "state/album_cache.json.gz"
+
+
+class DimensionCache:
+    """Entity ID → [fetched epoch seconds, ...]. Subclasses set the key and ID field."""
+
+    cache_key: str = ''
+    id_field: str = ''
+
+    def __init__(self, entries: Optional[Dict[str, List]] = None):
+        self.entries: Dict[str, List] = entries or {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self.entries
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    # Persistence
+
+    def to_bytes(self) -> bytes:
+        return gzip.compress(json.dumps(self.entries, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> 'DimensionCache':
+        return cls(json.loads(gzip.decompress(body)))
+
+    @classmethod
+    def load_from(cls, storage, key: Optional[str] = None) -> 'DimensionCache':
+        """Load the cache from a storage backend (empty if it does not exist yet)."""
+        key = key or cls.cache_key
+        body = storage.get_bytes(key)
+        if body is None:
+            logger.info(f"No cache at {key} - every {cls.id_field} is new")
+            return cls()
+        cache = cls.from_bytes(body)
+        logger.info(f"Loaded {key}: {len(cache)} entries")
+        return cache
+
+    def save_to(self, storage, key: Optional[str] = None) -> None:
+        key = key or self.cache_key
+        storage.put_bytes(key, self.to_bytes(), 'application/gzip')
+        logger.info(f"Saved {len(self)} entries to {storage.location(key)}")
+
+    @classmethod
+    def load(cls, path: str) -> 'DimensionCache':
+        """Load from a local file (local runs and tests)."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    # Lookups
+
+    def missing(self, play_counts: Counter) -> List[str]:
+        """
+        IDs that still need fetching, counting hits per play.
+
+        Args:
+            play_counts: Plays per ID in the new raw data
+
+        Returns:
+            Sorted IDs not in the cache
+        """
+        missing = []
+        for entity_id, plays in play_counts.items():
+            if entity_id in self.entries:
+                self.hits += plays
+            else:
+                self.misses += plays
+                missing.append(entity_id)
+        return sorted(missing)
+
+    def record(self, items: Iterable[Dict], now: Optional[datetime] = None) -> None:
+        """Register fetched entities."""
+        fetched = int((now or datetime.now(timezone.utc)).timestamp())
+        for item in items:
+            self.entries[item[self.id_field]] = self._entry(item, fetched)
+
+    def _entry(self, item: Dict, fetched: int) -> List:
+        return [fetched]
+
+
+class TrackCache(DimensionCache):
+    """Track ID → (fetched epoch seconds, has audio features)."""
+
+    cache_key = TRACK_CACHE_KEY
+    id_field = 'track_id'
+
+    def _entry(self, item: Dict, fetched: int) -> List:
+        return [fetched, int(item.get('tempo') is not None)]
+
+
+class AlbumCache(DimensionCache):
+    """Album ID → (fetched epoch seconds,)."""
+
+    cache_key = ALBUM_CACHE_KEY
+    id_field = 'album_id'
@@ -0,0 +1,147 @@
+"""
+AWS Lambda handler for Spotify track enrichment.
+Fetches track details, audio features and albums for tracks played since the last run.
+"""
+import os
+import json
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from dimension_cache import AlbumCache, TrackCache
+from raw_format import NDJSON_CONTENT_TYPE, encode_ndjson, resolve_format
+from storage import S3Storage
+from track_client import SpotifyTrackClient
+from track_discovery import DEFAULT_MAX_WORKERS as SCAN_MAX_WORKERS
+from track_discovery import CHECKPOINT_KEY, discover_play_ids
+from raw_checkpoint import save_checkpoint
+
+BUCKET_NAME = os.environ.get('S3_BUCKET', 'spotify-pipeline-ivan-1766559048')
+# One pooled connection per scan worker; the client is created on first use and kept warm
+STORAGE = S3Storage(BUCKET_NAME, pool_size=SCAN_MAX_WORKERS)
+
+
+def lambda_handler(event, context):
+    """
+    Lambda entry point.
+
+    Pass {"full_rescan": true} to re-read every raw object (cached tracks
+    and albums are still not refetched).
+    """
+    event = event or {}
+    print("Starting track and album enrichment...")
+
+    try:
+        return enrich_tracks(STORAGE, full_rescan=bool(event.get('full_rescan')))
+
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        raise
+
+
+def enrich_tracks(storage, spotify=None, full_rescan: bool = False) -> dict:
+    """
+    Fetch and save tracks and albums that are not cached yet.
+
+    Both dimensions come from one scan of the new raw objects.
+
+    Args:
+        storage: StorageBackend holding raw/, state/ and the dimension outputs
+        spotify: Authenticated SpotifyTrackClient (created on first use if None)
+        full_rescan: Ignore the discovery checkpoint
+
+    Returns:
+        Lambda response with per-dimension counts and cache hit rates
+    """
+    print("Counting track and album plays in new raw data...")
+    plays, stats, checkpoint = discover_play_ids(storage, full_rescan=full_rescan)
+    if not plays['track_id']:
+        print("No new plays found")
+        save_checkpoint(storage, checkpoint, CHECKPOINT_KEY)
+        return {'statusCode': 200, 'body': 'No tracks to process'}
+
+    clients = [spotify]
+
+    def client() -> SpotifyTrackClient:
+        if clients[0] is None:
+            clients[0] = SpotifyTrackClient()
+            clients[0].authenticate()
+        return clients[0]
+
+    tracks = _enrich_dimension(
+        storage, TrackCache, plays['track_id'], 'tracks', lambda ids: client().get_tracks(ids)
+    )
+    albums = _enrich_dimension(
+        storage, AlbumCache, plays['album_id'], 'albums', lambda ids: client().get_albums(ids)
+    )
+    save_checkpoint(storage, checkpoint, CHECKPOINT_KEY)
+
+    return {
+        'statusCode': 200,
+        'body': (
+            f"Fetched {tracks['fetched']} tracks (hit rate {tracks['cache_hit_rate']:.1%}), "
+            f"{albums['fetched']} albums (hit rate {albums['cache_hit_rate']:.1%})"
+        ),
+        'tracks': tracks,
+        'albums': albums,
+    }
+
+
+def _enrich_dimension(storage, cache_cls, play_counts, dataset: str, fetch) -> dict:
+    """
+    Fetch the uncached IDs of one dimension, save them, then update its cache.
+
+    The cache is saved only after the data is written, so a failed save
+    refetches next run.
+    """
+    cache = cache_cls.load_from(storage)
+    to_fetch = cache.missing(play_counts)
+    print(f"{dataset}: {len(play_counts)} seen, {len(to_fetch)} to fetch, cache hit rate {cache.hit_rate:.1%}")
+
+    records = fetch(to_fetch) if to_fetch else []
+    if records:
+        key = write_dimension(storage, dataset, records)
+        print(f"✅ Successfully saved to: {storage.location(key)}")
+        cache.record(records)
+        cache.save_to(storage)
+
+    return {
+        'fetched': len(records),
+        'unresolved': len(to_fetch) - len(records),
+        'cache_hit_rate': round(cache.hit_rate, 4),
+    }
+
+
+def write_dimension(storage, dataset: str, records: list, output_format: str = None) -> str:
+    """
+    Save track or album data to any storage backend with date partitioning.
+
+    dataset is 'tracks' or 'albums' (the key prefix and envelope field).
+    output_format is 'json' (envelope), 'ndjson.gz' or 'ndjson.zst'
+    (one record per line); defaults to RAW_OUTPUT_FORMAT.
+
+    Returns:
+        Key of the written object
+    """
+    output_format = resolve_format(output_format)
+    now = datetime.now(timezone.utc)
+    # Suffix: overlapping runs writing in the same second must not overwrite each other
+    timestamp = f"{now.strftime('%Y%m%d_%H%M%S')}_{uuid4().hex[:8]}"
+    entity = dataset.rstrip('s')
+    key = f"{dataset}/year={now.year}/month={now.month:02d}/day={now.day:02d}/{entity}_data_{timestamp}.{output_format}"
+    fetched_at = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    if output_format == 'json':
+        data = {
+            "fetched_at": fetched_at,
+            f"{entity}_count": len(records),
+            dataset: records
+        }
+        body = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+        content_type = 'application/json'
+    else:
+        body = encode_ndjson(records, output_format, {"batch_fetched_at": fetched_at})
+        content_type = NDJSON_CONTENT_TYPE
+
+    storage.put_bytes(key, body, content_type)
+    print(f"Saved {len(records)} {dataset} to {storage.location(key)}")
+    return key
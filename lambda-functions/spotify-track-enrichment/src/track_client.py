@@ -0,0 +1,257 @@
+"""
+Spotify catalog client for fetching track details, audio features and albums.
+Follows SpotifyArtistClient: sorted maximal batches, fetched concurrently
+through the shared rate limiter, with per-batch retries.
+"""
+import os
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+
+from auth_cache import get_spotify
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Spotify's max IDs per request
+TRACKS_BATCH_SIZE = 50
+AUDIO_FEATURES_BATCH_SIZE = 100
+ALBUMS_BATCH_SIZE = 20
+# Attempts per batch before its IDs are reported as unresolved
+MAX_BATCH_ATTEMPTS = 3
+# Concurrent batch requests (all share one rate limiter)
+MAX_CONCURRENT_BATCHES = int(os.getenv('TRACK_FETCH_WORKERS', '4'))
+
+AUDIO_FEATURE_FIELDS = (
+    'tempo', 'danceability', 'energy', 'valence', 'acousticness', 'instrumentalness',
+    'liveness', 'speechiness', 'loudness', 'key', 'mode', 'time_signature',
+)
+
+
+class BatchRejected(Exception):
+    """A batch failed with a client error that retrying will not fix."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class SpotifyTrackClient:
+    """Handle Spotify Track and Album API operations."""
+
+    def __init__(
+        self,
+        client_id: str = None,
+        client_secret: str = None,
+        redirect_uri: str = None
+    ):
+        """Initialize track client."""
+        self.client_id = client_id or os.getenv('SPOTIFY_CLIENT_ID')
+        self.client_secret = client_secret or os.getenv('SPOTIFY_CLIENT_SECRET')
+        self.redirect_uri = redirect_uri or os.getenv('SPOTIFY_REDIRECT_URI')
+
+        if not all([self.client_id, self.client_secret, self.redirect_uri]):
+            raise ValueError("Missing Spotify credentials")
+
+        self.sp = None
+        self.unresolved_ids: List[str] = []
+        # Spotify returns 403 on /audio-features for apps registered after Nov 2024
+        self.audio_features_available = True
+        self.retry_backoff = 1.0  # seconds, multiplied by the attempt number
+        logger.info("SpotifyTrackClient initialized")
+
+    def authenticate(self) -> None:
+        """Authenticate with Spotify (reuses token from ingestion Lambda)."""
+        try:
+            self.sp = get_spotify(self.client_id, self.client_secret, self.redirect_uri)
+            logger.info("Authenticated with Spotify")
+
+        except Exception as e:
+            logger.error(f"Authentication failed: {str(e)}")
+            raise
+
+    def get_tracks(self, track_ids: List[str], max_workers: int = MAX_CONCURRENT_BATCHES) -> List[Dict]:
+        """
+        Fetch track details and audio features in concurrent batches.
+
+        Tracks are requested 50 per call and audio features 100 per call.
+        IDs are deduplicated and sorted first, so batches and result order
+        are the same on every run. If the audio-features endpoint is not
+        available to this app, tracks are returned with null features.
+        Tracks that still fail after retries are left in
+        `self.unresolved_ids`.
+
+        Args:
+            track_ids: List of Spotify track IDs
+            max_workers: Concurrent batch requests
+
+        Returns:
+            List of track dictionaries, ordered by track ID
+        """
+        if not self.sp:
+            raise ValueError("Not authenticated")
+
+        ids = sorted(set(track_ids))
+        fetched_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        tracks, unresolved = self._fetch_all(
+            ids, TRACKS_BATCH_SIZE, lambda batch: self.sp.tracks(batch)['tracks'], max_workers
+        )
+        features = self.get_audio_features([t['id'] for t in tracks], max_workers)
+
+        all_tracks = [_track_record(t, features.get(t['id']), fetched_at) for t in tracks]
+        self.unresolved_ids = unresolved
+        if unresolved:
+            logger.error(f"{len(unresolved)} tracks unresolved: {unresolved}")
+
+        logger.info(f"Fetched {len(all_tracks)} tracks ({len(features)} with audio features)")
+        return all_tracks
+
+    def get_audio_features(self, track_ids: List[str], max_workers: int = MAX_CONCURRENT_BATCHES) -> Dict[str, Dict]:
+        """
+        Audio features by track ID (tracks without features are omitted).
+        """
+        if not self.audio_features_available or not track_ids:
+            return {}
+        try:
+            features, _ = self._fetch_all(
+                sorted(track_ids), AUDIO_FEATURES_BATCH_SIZE, self.sp.audio_features, max_workers,
+                raise_on_reject=True,
+            )
+        except BatchRejected as e:
+            if e.status != 403:
+                raise
+            logger.warning("Audio features endpoint not available to this app - skipping features")
+            self.audio_features_available = False
+            return {}
+        return {f['id']: f for f in features}
+
+    def get_albums(self, album_ids: List[str], max_workers: int = MAX_CONCURRENT_BATCHES) -> List[Dict]:
+        """
+        Fetch album details in concurrent batches of 20 (Spotify's max per request).
+
+        Albums that still fail after retries are left in `self.unresolved_ids`.
+
+        Args:
+            album_ids: List of Spotify album IDs
+            max_workers: Concurrent batch requests
+
+        Returns:
+            List of album dictionaries, ordered by album ID
+        """
+        if not self.sp:
+            raise ValueError("Not authenticated")
+
+        fetched_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        albums, unresolved = self._fetch_all(
+            sorted(set(album_ids)), ALBUMS_BATCH_SIZE, lambda batch: self.sp.albums(batch)['albums'], max_workers
+        )
+        self.unresolved_ids = unresolved
+        if unresolved:
+            logger.error(f"{len(unresolved)} albums unresolved: {unresolved}")
+
+        logger.info(f"Fetched {len(albums)} albums")
+        return [_album_record(album, fetched_at) for album in albums]
+
+    def _fetch_all(
+        self,
+        ids: List[str],
+        batch_size: int,
+        fetch: Callable[[List[str]], List[Optional[Dict]]],
+        max_workers: int,
+        raise_on_reject: bool = False,
+    ) -> Tuple[List[Dict], List[str]]:
+        """
+        Run `fetch` over maximal batches of `ids` concurrently.
+
+        Returns:
+            (non-null results in ID order, IDs left unresolved)
+        """
+        batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+        if not batches:
+            return [], []
+
+        workers = max(1, min(max_workers, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda b: self._fetch_batch(fetch, b, raise_on_reject), batches))
+
+        items, unresolved = [], []
+        for batch_items, batch_unresolved in results:
+            items.extend(batch_items)
+            unresolved.extend(batch_unresolved)
+        return items, unresolved
+
+    def _fetch_batch(
+        self, fetch: Callable, batch: List[str], raise_on_reject: bool = False
+    ) -> Tuple[List[Dict], List[str]]:
+        """
+        Fetch one batch with per-batch retries.
+
+        Returns:
+            (results, IDs left unresolved)
+        """
+        for attempt in range(1, MAX_BATCH_ATTEMPTS + 1):
+            logger.info(f"Fetching batch: {len(batch)} IDs (attempt {attempt})")
+            try:
+                results = fetch(batch)
+                break
+            except Exception as e:
+                # 4xx (other than 429, which the rate limiter already waited out) won't succeed on retry
+                status = getattr(e, 'http_status', None)
+                if status is not None and 400 <= status < 500 and status != 429:
+                    if raise_on_reject:
+                        raise BatchRejected(status, str(e)) from e
+                    logger.error(f"Batch rejected ({status}): {str(e)}")
+                    return [], list(batch)
+                if attempt == MAX_BATCH_ATTEMPTS:
+                    logger.error(f"Batch failed after {attempt} attempts: {str(e)}")
+                    return [], list(batch)
+                logger.warning(f"Batch failed, retrying: {str(e)}")
+                time.sleep(self.retry_backoff * attempt)
+
+        items = [item for item in results if item]  # API returns None for unknown IDs
+        returned = {item['id'] for item in items}
+        return items, [item_id for item_id in batch if item_id not in returned]
+
+
+def _track_record(track: Dict, features: Optional[Dict], fetched_at: str) -> Dict:
+    """Flatten a /tracks item and its audio features into one output row."""
+    album = track.get('album') or {}
+    record = {
+        'track_id': track['id'],
+        'track_name': track['name'],
+        'artist_ids': [a['id'] for a in track.get('artists', []) if a.get('id')],
+        'album_id': album.get('id'),
+        'album_name': album.get('name'),
+        'release_date': album.get('release_date'),
+        'duration_ms': track.get('duration_ms'),
+        'explicit': track.get('explicit'),
+        'popularity': track.get('popularity'),
+        'isrc': (track.get('external_ids') or {}).get('isrc'),
+    }
+    for field in AUDIO_FEATURE_FIELDS:
+        record[field] = features.get(field) if features else None
+    record['fetched_at'] = fetched_at
+    return record
+
+
+def _album_record(album: Dict, fetched_at: str) -> Dict:
+    """Flatten an /albums item into one output row (track listing omitted)."""
+    images = album.get('images') or []
+    return {
+        'album_id': album['id'],
+        'album_name': album['name'],
+        'album_type': album.get('album_type'),
+        'artist_ids': [a['id'] for a in album.get('artists', []) if a.get('id')],
+        'release_date': album.get('release_date'),
+        'release_date_precision': album.get('release_date_precision'),
+        'total_tracks': album.get('total_tracks'),
+        'label': album.get('label'),
+        'popularity': album.get('popularity'),
+        'upc': (album.get('external_ids') or {}).get('upc'),
+        'genres': album.get('genres', []),
+        'image_url': images[0]['url'] if images else None,
+        'fetched_at': fetched_at,
+    }
@@ -0,0 +1,155 @@
+"""
+Incremental discovery of played track and album IDs from raw play objects.
+
+Works like artist discovery: a per-root checkpoint
+(state/track_discovery/checkpoint.json, see raw_checkpoint.py) means each
+run lists raw keys with StartAfter and only reads objects written since the
+last run, plus keys announced in new backfill manifests. Objects are
+fetched on a bounded thread pool and `"track_id"` / `"album_id"` values are
+counted with a byte regex, so no play dicts are built. The counts feed the
+caches' per-play hit rates.
+
+Counts must not include plays that were already read, so compaction must
+never fold unread objects into a compacted object that sorts before the
+checkpoint. It defers raw partitions this checkpoint has not passed yet
+(see spotify-processing/src/compaction.py).
+
+Normalized envelopes (raw_format.NORMALIZED_ENCODING) list each track once
+in a track table, so the regex would count tracks rather than plays; those
+bodies are decoded instead.
+"""
+import gzip
+import io
+import json
+import logging
+import os
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, Optional, Tuple
+
+from raw_checkpoint import (
+    TRACK_DISCOVERY_CHECKPOINT,
+    CheckpointCursor,
+    empty_checkpoint,
+    iter_new_raw_keys,
+    load_checkpoint,
+    pending_backfills,
+)
+from raw_format import NORMALIZED_ENCODING, denormalize_plays, format_for_key
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = TRACK_DISCOVERY_CHECKPOINT
+DEFAULT_MAX_WORKERS = int(os.environ.get('TRACK_SCAN_WORKERS', '16'))
+CHUNK_SIZE = 64 * 1024
+
+ID_FIELDS = ('track_id', 'album_id')
+_PLAY_ID = re.compile(rb'"(track_id|album_id)":\s*"([0-9A-Za-z]+)"')
+# Longest possible match, kept across chunk boundaries
+_OVERLAP = 64
+# Only an envelope key can produce this byte sequence (inside a string the quotes are escaped)
+_NORMALIZED_MARKER = re.compile(rb'"encoding":\s*"' + re.escape(NORMALIZED_ENCODING.encode('ascii')) + rb'"')
+
+
+def _open_decoded(body: IO[bytes], output_format: str) -> IO[bytes]:
+    if output_format == 'ndjson.gz':
+        return gzip.GzipFile(fileobj=body)
+    if output_format == 'ndjson.zst':
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(body)
+    return body
+
+
+def count_play_ids(stream: IO[bytes], chunk_size: int = CHUNK_SIZE) -> Dict[str, Counter]:
+    """
+    Plays per track ID and per album ID in a decoded body, read chunk by chunk.
+
+    The carried-over tail starts after the last match, so no play is
+    counted twice.
+
+    Returns:
+        {'track_id': Counter, 'album_id': Counter}
+    """
+    counts = {field: Counter() for field in ID_FIELDS}
+    tail = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer = tail + chunk
+        last_end = 0
+        for match in _PLAY_ID.finditer(buffer):
+            counts[match.group(1).decode('ascii')][match.group(2).decode('ascii')] += 1
+            last_end = match.end()
+        tail = buffer[max(last_end, len(buffer) - _OVERLAP):]
+    return counts
+
+
+def count_json_play_ids(body: bytes) -> Dict[str, Counter]:
+    """Play counts for a json envelope, flat or normalized."""
+    if not _NORMALIZED_MARKER.search(body):
+        return count_play_ids(io.BytesIO(body))
+    counts = {field: Counter() for field in ID_FIELDS}
+    for play in denormalize_plays(json.loads(body)):
+        for field in ID_FIELDS:
+            if play.get(field):
+                counts[field][play[field]] += 1
+    return counts
+
+
+def discover_play_ids(
+    storage, full_rescan: bool = False, max_workers: int = DEFAULT_MAX_WORKERS
+) -> Tuple[Dict[str, Counter], Dict, Dict]:
+    """
+    Count plays per track ID and album ID in raw objects written since the last run.
+
+    The advanced checkpoint is returned, not saved: callers save it once
+    the tracks are stored, so a failed run re-reads the same objects.
+
+    Args:
+        storage: StorageBackend (for S3Storage, size its pool to max_workers)
+        full_rescan: Ignore the checkpoint and re-read every raw object
+        max_workers: Concurrent object fetches
+
+    Returns:
+        ({'track_id': plays per track, 'album_id': plays per album}, stats dict, new checkpoint)
+    """
+    checkpoint = empty_checkpoint() if full_rescan else load_checkpoint(storage, CHECKPOINT_KEY)
+    backfills = pending_backfills(storage, checkpoint)
+    new_keys = list(iter_new_raw_keys(storage, checkpoint, backfills))
+
+    def scan_one(key: str) -> Optional[Dict[str, Counter]]:
+        try:
+            body = storage.open(key)
+            if body is None:
+                raise FileNotFoundError(f"{key} no longer exists")
+            output_format = format_for_key(key)
+            if output_format == 'json':
+                return count_json_play_ids(body.read())
+            return count_play_ids(_open_decoded(body, output_format))
+        except Exception as e:
+            logger.warning(f"Failed to process {key}: {str(e)}")
+            return None
+
+    plays = {field: Counter() for field in ID_FIELDS}
+    cursor = CheckpointCursor(checkpoint, backfills)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for (stream, key), counts in zip(new_keys, pool.map(scan_one, [k for _, k in new_keys])):
+            # Objects after a root's failed one are re-read next run, so they are not counted now
+            if cursor.advance(stream, key, counts is not None):
+                for field in ID_FIELDS:
+                    plays[field].update(counts[field])
+
+    stats = {
+        'files_scanned': len(new_keys) - cursor.failed,
+        'files_failed': cursor.failed,
+        'plays': sum(plays['track_id'].values()),
+        'unique_tracks': len(plays['track_id']),
+        'unique_albums': len(plays['album_id']),
+    }
+    logger.info(
+        f"Discovery: {stats['plays']} plays of {stats['unique_tracks']} tracks "
+        f"on {stats['unique_albums']} albums"
+    )
+    return plays, stats, cursor.checkpoint
@@ -0,0 +1,97 @@
+"""In-memory S3 bucket and Spotify stub for the track enrichment tests."""
+import io
+
+from botocore.exceptions import ClientError
+
+
+class ListingS3:
+    """Supports the list (Prefix/Delimiter/StartAfter), get and put calls we make."""
+
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.gets = []
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix='', Delimiter=None, StartAfter=''):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix) and k > StartAfter)
+        if Delimiter:
+            children = sorted({
+                Prefix + k[len(Prefix):].split(Delimiter, 1)[0] + Delimiter
+                for k in keys if Delimiter in k[len(Prefix):]
+            })
+            yield {
+                'CommonPrefixes': [{'Prefix': p} for p in children],
+                'Contents': [{'Key': k} for k in keys if Delimiter not in k[len(Prefix):]],
+            }
+        else:
+            yield {'Contents': [{'Key': k} for k in keys]}
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        self.gets.append(Key)
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body.encode('utf-8') if isinstance(Body, str) else Body
+        return {}
+
+
+def make_track(track_id):
+    return {
+        'id': track_id,
+        'name': f"Track {track_id}",
+        'artists': [{'id': f"artist-{track_id}"}],
+        'album': {'id': f"album-{track_id}", 'name': 'Album', 'release_date': '2024-01-01'},
+        'duration_ms': 200000,
+        'explicit': False,
+        'popularity': 40,
+        'external_ids': {'isrc': 'USRC17607839'},
+    }
+
+
+def make_features(track_id):
+    return {'id': track_id, 'tempo': 120.0, 'danceability': 0.5, 'energy': 0.7, 'valence': 0.3}
+
+
+class StubSpotify:
+    """spotipy stand-in for /tracks, /audio-features and /albums."""
+
+    def __init__(self, features_error=None):
+        self.features_error = features_error
+        self.track_calls = []
+        self.feature_calls = []
+        self.album_calls = []
+
+    def tracks(self, batch):
+        self.track_calls.append(list(batch))
+        return {'tracks': [make_track(t) if not t.startswith('bad') else None for t in batch]}
+
+    def audio_features(self, batch):
+        self.feature_calls.append(list(batch))
+        if self.features_error:
+            raise self.features_error
+        return [make_features(t) for t in batch]
+
+    def albums(self, batch):
+        self.album_calls.append(list(batch))
+        return {'albums': [make_album(a) for a in batch]}
+
+
+def make_album(album_id):
+    return {
+        'id': album_id,
+        'name': f"Album {album_id}",
+        'album_type': 'album',
+        'artists': [{'id': 'artist-1'}],
+        'release_date': '2024-01-01',
+        'release_date_precision': 'day',
+        'total_tracks': 12,
+        'label': 'Label',
+        'popularity': 55,
+        'external_ids': {'upc': '00602547'},
+        'genres': [],
+        'images': [{'url': 'https://i.scdn.co/image/x'}],
+    }
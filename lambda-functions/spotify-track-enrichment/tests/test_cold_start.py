@@ -0,0 +1,9 @@
+"""Cold-start guard: the handler must import fast and without heavy deps."""
+from conftest import SRC_DIR
+from import_profiler import check_budget
+
+
+def test_handler_import_within_budget():
+    profile = check_budget(SRC_DIR, 'handler')
+
+    assert 'track_client' in profile.modules
@@ -0,0 +1,33 @@
+"""Tests for the persistent track and album caches."""
+from collections import Counter
+
+from dimension_cache import ALBUM_CACHE_KEY, AlbumCache, TrackCache
+
+
+def test_missing_counts_hits_per_play():
+    cache = TrackCache()
+    cache.record([{'track_id': 'a', 'tempo': 1.0}])
+
+    missing = cache.missing(Counter({'a': 9, 'b': 1}))
+
+    assert missing == ['b']
+    assert cache.hit_rate == 0.9
+
+
+def test_round_trip_through_file(tmp_path):
+    cache = TrackCache()
+    cache.record([{'track_id': 'a', 'tempo': None}])
+    path = str(tmp_path / 'cache' / 'tracks.json.gz')
+
+    cache.save(path)
+
+    assert TrackCache.load(path).entries['a'][1] == 0
+    assert len(TrackCache.load(str(tmp_path / 'absent.json.gz'))) == 0
+
+
+def test_album_cache_uses_its_own_key_and_id_field():
+    cache = AlbumCache()
+    cache.record([{'album_id': 'al1'}])
+
+    assert cache.cache_key == ALBUM_CACHE_KEY
+    assert cache.missing(Counter({'al1': 3, 'al2': 1})) == ['al2']
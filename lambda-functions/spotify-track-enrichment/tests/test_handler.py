@@ -0,0 +1,104 @@
+"""Tests for incremental play-ID discovery and the enrichment run."""
+import io
+import json
+from datetime import datetime, timezone
+
+import handler
+from dimension_cache import ALBUM_CACHE_KEY, TRACK_CACHE_KEY, TrackCache
+from fakes import ListingS3, StubSpotify
+from handler import enrich_tracks, write_dimension
+from raw_format import encode_ndjson, iter_records, normalize_plays
+from track_client import SpotifyTrackClient
+from storage import S3Storage
+from track_discovery import CHECKPOINT_KEY, count_json_play_ids, count_play_ids
+
+
+def raw_json(*track_ids):
+    plays = [{'track_id': t, 'artist_id': 'x', 'album_id': f"al{t}"} for t in track_ids]
+    return json.dumps({'tracks': plays}).encode()
+
+
+def client():
+    spotify = SpotifyTrackClient(client_id='id', client_secret='secret', redirect_uri='http://localhost')
+    spotify.sp = StubSpotify()
+    return spotify
+
+
+def test_count_play_ids_across_chunk_boundaries():
+    body = raw_json(*['t1'] * 40 + ['t2'] * 10)
+
+    for chunk_size in (7, 64, 1 << 16):
+        counts = count_play_ids(io.BytesIO(body), chunk_size)
+        assert counts['track_id'] == {'t1': 40, 't2': 10}
+        assert counts['album_id'] == {'alt1': 40, 'alt2': 10}
+
+
+def test_normalized_envelope_counts_plays_not_table_rows():
+    rows = [('2025-12-22T09:00:00.000Z', 1766394000000 + i, 't1', 'T', 'a1', 'A', 'al1') + (None,) * 4 for i in range(9)]
+    rows.append(('2025-12-22T09:00:00Z', 1766394000000, 't2', 'T', 'a1', 'A', 'al1') + (None,) * 4)
+    body = json.dumps({'fetched_at': 'x', **normalize_plays(rows)}).encode()
+
+    counts = count_json_play_ids(body)
+
+    assert counts['track_id'] == {'t1': 9, 't2': 1}
+    assert counts['album_id'] == {'al1': 10}
+
+
+def test_fetches_each_track_once_and_reports_hit_rate():
+    s3 = ListingS3({
+        'raw/year=2025/month=12/day=20/a.json': raw_json('t1', 't2', 't1'),
+        'raw/user_id=u1/year=2025/month=12/day=20/b.ndjson.gz': encode_ndjson([{'track_id': 't1'}], metadata={}),
+    })
+    spotify = client()
+
+    first = enrich_tracks(S3Storage('bucket', client=s3), spotify=spotify)
+
+    assert first['tracks']['cache_hit_rate'] == 0
+    assert spotify.sp.track_calls == [['t1', 't2']]
+    track_keys = [k for k in s3.objects if k.startswith('tracks/')]
+    assert [t['track_id'] for t in iter_records(s3.objects[track_keys[0]], 'json')] == ['t1', 't2']
+
+    # Only new objects are read; 9 of 10 plays hit the cache
+    s3.objects['raw/year=2025/month=12/day=21/c.json'] = raw_json(*['t1'] * 5 + ['t2'] * 4 + ['t3'])
+    second = enrich_tracks(S3Storage('bucket', client=s3), spotify=spotify)
+
+    assert second['tracks']['cache_hit_rate'] == 0.9
+    assert spotify.sp.track_calls[-1] == ['t3']
+    assert set(TrackCache.from_bytes(s3.objects[TRACK_CACHE_KEY]).entries) == {'t1', 't2', 't3'}
+    assert CHECKPOINT_KEY in s3.objects
+
+
+def test_no_new_plays_skips_api():
+    s3 = ListingS3()
+
+    assert enrich_tracks(S3Storage('bucket', client=s3), spotify=client())['body'] == 'No tracks to process'
+
+
+def test_albums_fetched_once_into_their_own_dataset():
+    s3 = ListingS3({'raw/year=2025/month=12/day=20/a.json': raw_json('t1', 't2', 't1')})
+    spotify = client()
+
+    result = enrich_tracks(S3Storage('bucket', client=s3), spotify=spotify)
+    s3.objects['raw/year=2025/month=12/day=21/b.json'] = raw_json('t1')
+    enrich_tracks(S3Storage('bucket', client=s3), spotify=spotify)
+
+    assert result['albums']['fetched'] == 2
+    assert spotify.sp.album_calls == [['alt1', 'alt2']]
+    album_keys = [k for k in s3.objects if k.startswith('albums/')]
+    assert [a['album_id'] for a in iter_records(s3.objects[album_keys[0]], 'json', 'albums')] == ['alt1', 'alt2']
+    assert ALBUM_CACHE_KEY in s3.objects
+
+
+def test_dimension_writes_in_the_same_second_do_not_overwrite(monkeypatch):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2025, 12, 25, 10, 0, 0, tzinfo=timezone.utc)
+
+    monkeypatch.setattr(handler, 'datetime', FrozenDatetime)
+    storage = S3Storage('bucket', client=ListingS3())
+
+    keys = [write_dimension(storage, 'tracks', [{'track_id': t}], 'json') for t in ('t1', 't2')]
+
+    assert keys[0] != keys[1]
+    assert [t['track_id'] for k in keys for t in iter_records(storage.get_bytes(k), 'json')] == ['t1', 't2']
@@ -0,0 +1,53 @@
+"""Tests for SpotifyTrackClient batching (Spotify API replaced by a stub)."""
+import pytest
+from spotipy.exceptions import SpotifyException
+
+from fakes import StubSpotify
+from track_client import ALBUMS_BATCH_SIZE, AUDIO_FEATURES_BATCH_SIZE, TRACKS_BATCH_SIZE, SpotifyTrackClient
+
+
+@pytest.fixture
+def client():
+    client = SpotifyTrackClient(client_id='id', client_secret='secret', redirect_uri='http://localhost')
+    client.sp = StubSpotify()
+    client.retry_backoff = 0
+    return client
+
+
+def test_uses_maximal_batches_per_endpoint(client):
+    ids = [f"t{i:03d}" for i in range(230)]
+
+    tracks = client.get_tracks(list(reversed(ids)), max_workers=4)
+
+    assert [t['track_id'] for t in tracks] == ids
+    assert sorted(len(b) for b in client.sp.track_calls) == [30] + [TRACKS_BATCH_SIZE] * 4
+    assert sorted(len(b) for b in client.sp.feature_calls) == [30] + [AUDIO_FEATURES_BATCH_SIZE] * 2
+    assert tracks[0]['tempo'] == 120.0 and tracks[0]['album_id'] == 'album-t000'
+
+
+def test_unknown_tracks_are_unresolved(client):
+    tracks = client.get_tracks(['t1', 'bad1'])
+
+    assert [t['track_id'] for t in tracks] == ['t1']
+    assert client.unresolved_ids == ['bad1']
+
+
+def test_features_endpoint_forbidden_returns_tracks_without_features(client):
+    client.sp = StubSpotify(features_error=SpotifyException(403, -1, 'forbidden'))
+
+    tracks = client.get_tracks(['t1', 't2'])
+    client.get_tracks(['t3'])
+
+    assert [t['tempo'] for t in tracks] == [None, None]
+    assert not client.audio_features_available
+    assert len(client.sp.feature_calls) == 1  # not retried on later calls
+
+
+def test_albums_fetched_in_batches_of_20(client):
+    ids = [f"al{i:02d}" for i in range(45)]
+
+    albums = client.get_albums(ids + ids[:5])
+
+    assert [a['album_id'] for a in albums] == ids
+    assert sorted(len(b) for b in client.sp.album_calls) == [5, ALBUMS_BATCH_SIZE, ALBUMS_BATCH_SIZE]
+    assert albums[0]['label'] == 'Label' and albums[0]['total_tracks'] == 12
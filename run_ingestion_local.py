@@ -7,13 +7,18 @@ import sys
 from dotenv import load_dotenv
 
 # Add lambda functions to path
+sys.path.insert(0, 'lambda-functions/shared')
 sys.path.insert(0, 'lambda-functions/spotify-ingestion/src')
 
 from spotify_client import SpotifyClient
-from utils import save_tracks_to_json, get_latest_timestamp, save_state, load_state
+from storage import LocalStorage
+from utils import LOCAL_STATE_KEY, get_latest_timestamp, read_state, write_state, write_tracks
 
 load_dotenv()
 
+# Local runs write under data/ with the same code path as the S3 runner
+storage = LocalStorage("data")
+
 
 def main():
     """Run the ingestion pipeline."""
@@ -28,7 +33,7 @@ def main():
         client.authenticate()
         
         # Load last processed timestamp (None if first run)
-        last_timestamp = load_state()
+        last_timestamp = read_state(storage, LOCAL_STATE_KEY)
         
         if last_timestamp:
             print(f"\n2. Fetching new plays since last run...")
@@ -52,14 +57,14 @@ def main():
         
         # Save data
         print("\n4. Saving data...")
-        filepath = save_tracks_to_json(tracks)
+        key = write_tracks(storage, tracks, output_format='json', encoding='flat')
         
         # Update state
         latest_timestamp = get_latest_timestamp(tracks)
-        save_state(latest_timestamp)
+        write_state(storage, latest_timestamp, LOCAL_STATE_KEY)
         
         print(f"\n✅ SUCCESS!")
-        print(f"   Data: {filepath}")
+        print(f"   Data: {storage.location(key)}")
         print(f"   State updated: {latest_timestamp}")
         
         print("\n💡 Note: Spotify API limited to 50 plays.")
@@ -8,20 +8,18 @@ from dotenv import load_dotenv
 from datetime import datetime, timezone
 
 # Add lambda functions to path
+sys.path.insert(0, 'lambda-functions/shared')
 sys.path.insert(0, 'lambda-functions/spotify-ingestion/src')
 
 from spotify_client import SpotifyClient
-from utils import (
-    save_tracks_to_s3,
-    get_latest_timestamp,
-    save_state_to_s3,
-    load_state_from_s3
-)
+from storage import S3Storage
+from utils import get_latest_timestamp, read_state, write_state, write_tracks
 
 load_dotenv()
 
 # S3 bucket name
 BUCKET_NAME = "spotify-pipeline-ivan-1766559048"
+storage = S3Storage(BUCKET_NAME)
 
 
 def main():
@@ -39,7 +37,7 @@ def main():
         # Load last processed timestamp from S3
         print(f"\n2. Checking S3 for previous state...")
         print(f"   Bucket: {BUCKET_NAME}")
-        last_timestamp = load_state_from_s3(BUCKET_NAME)
+        last_timestamp = read_state(storage)
         
         if last_timestamp:
             from datetime import datetime
@@ -69,12 +67,12 @@ def main():
         
         # Save to S3
         print(f"\n5. Saving to S3...")
-        s3_key = save_tracks_to_s3(tracks, BUCKET_NAME)
-        print(f"   Data saved to: s3://{BUCKET_NAME}/{s3_key}")
+        s3_key = write_tracks(storage, tracks)
+        print(f"   Data saved to: {storage.location(s3_key)}")
         
         # Update state in S3
         latest_timestamp = get_latest_timestamp(tracks)
-        save_state_to_s3(latest_timestamp, BUCKET_NAME)
+        write_state(storage, latest_timestamp)
         print(f"   State updated in S3: {latest_timestamp}")
         
         print(f"\n✅ SUCCESS!")
@@ -0,0 +1,18 @@
+with albums as (
+    select * from {{ ref('stg_albums') }}
+)
+
+select
+    album_id,
+    album_name,
+    album_type,
+    artist_ids,
+    release_date,
+    release_date_precision,
+    total_tracks,
+    label,
+    popularity,
+    upc,
+    genres,
+    image_url
+from albums
\ No newline at end of file
@@ -0,0 +1,28 @@
+with tracks as (
+    select * from {{ ref('stg_tracks') }}
+)
+
+select
+    track_id,
+    track_name,
+    artist_ids,
+    album_id,
+    album_name,
+    release_date,
+    duration_ms,
+    explicit,
+    popularity,
+    isrc,
+    tempo,
+    danceability,
+    energy,
+    valence,
+    acousticness,
+    instrumentalness,
+    liveness,
+    speechiness,
+    loudness,
+    key,
+    mode,
+    time_signature
+from tracks
\ No newline at end of file
@@ -4,15 +4,24 @@ with plays as (
 
 artists as (
     select * from {{ ref('dim_artists') }}
+),
+
+albums as (
+    select * from {{ ref('dim_albums') }}
 )
 
 select
+    plays.user_id,
     plays.played_at,
     plays.track_id,
     plays.track_name,
     plays.album_id,
-    plays.album_name,
-    plays.release_date,
+    -- Album attributes come from the dimension; play copies only cover not-yet-enriched albums
+    coalesce(albums.album_name, plays.album_name) as album_name,
+    coalesce(albums.release_date, plays.release_date) as release_date,
+    albums.album_type,
+    albums.label as album_label,
+    albums.total_tracks as album_total_tracks,
     plays.duration_ms,
     plays.popularity as track_popularity,
     plays.artist_id,
@@ -21,4 +30,5 @@ select
     artists.followers as artist_followers,
     artists.popularity as artist_popularity
 from plays
-inner join artists on plays.artist_id = artists.artist_id
\ No newline at end of file
+inner join artists on plays.artist_id = artists.artist_id
+left join albums on plays.album_id = albums.album_id
\ No newline at end of file
@@ -0,0 +1,66 @@
+with source as (
+    select * from {{ source('raw', 'raw_albums') }}
+),
+
+line_source as (
+    select * from {{ source('raw', 'raw_album_lines') }}
+),
+
+flattened as (
+    select
+        source.source_file,
+        source.loaded_at,
+        source.raw_json:fetched_at::timestamp_ntz as batch_fetched_at,
+        album.value:album_id::string as album_id,
+        album.value:album_name::string as album_name,
+        album.value:album_type::string as album_type,
+        album.value:artist_ids::array as artist_ids,
+        album.value:release_date::string as release_date,
+        album.value:release_date_precision::string as release_date_precision,
+        album.value:total_tracks::number as total_tracks,
+        album.value:label::string as label,
+        album.value:popularity::number as popularity,
+        album.value:upc::string as upc,
+        album.value:genres::array as genres,
+        album.value:image_url::string as image_url
+    from source,
+    lateral flatten(input => source.raw_json:albums) as album
+),
+
+-- NDJSON files: already one album per row, no flatten needed
+lines as (
+    select
+        source_file,
+        loaded_at,
+        raw_json:batch_fetched_at::timestamp_ntz as batch_fetched_at,
+        raw_json:album_id::string as album_id,
+        raw_json:album_name::string as album_name,
+        raw_json:album_type::string as album_type,
+        raw_json:artist_ids::array as artist_ids,
+        raw_json:release_date::string as release_date,
+        raw_json:release_date_precision::string as release_date_precision,
+        raw_json:total_tracks::number as total_tracks,
+        raw_json:label::string as label,
+        raw_json:popularity::number as popularity,
+        raw_json:upc::string as upc,
+        raw_json:genres::array as genres,
+        raw_json:image_url::string as image_url
+    from line_source
+),
+
+unioned as (
+    select * from flattened
+    union all
+    select * from lines
+),
+
+deduplicated as (
+    select *,
+        row_number() over (
+            partition by album_id
+            order by batch_fetched_at desc
+        ) as row_num
+    from unioned
+)
+
+select * from deduplicated where row_num = 1
\ No newline at end of file
@@ -2,6 +2,10 @@ with source as (
     select * from {{ source('raw', 'raw_artists') }}
 ),
 
+line_source as (
+    select * from {{ source('raw', 'raw_artist_lines') }}
+),
+
 flattened as (
     select
         source.source_file,
@@ -17,13 +21,34 @@ flattened as (
     lateral flatten(input => source.raw_json:artists) as artist
 ),
 
+-- NDJSON files: already one artist per row, no flatten needed
+lines as (
+    select
+        source_file,
+        loaded_at,
+        raw_json:batch_fetched_at::timestamp_ntz as batch_fetched_at,
+        raw_json:artist_id::string as artist_id,
+        raw_json:artist_name::string as artist_name,
+        raw_json:genres::array as genres,
+        raw_json:followers::number as followers,
+        raw_json:popularity::number as popularity,
+        raw_json:image_url::string as image_url
+    from line_source
+),
+
+unioned as (
+    select * from flattened
+    union all
+    select * from lines
+),
+
 deduplicated as (
     select *,
         row_number() over (
             partition by artist_id
             order by batch_fetched_at desc
         ) as row_num
-    from flattened
+    from unioned
 )
 
 select * from deduplicated where row_num = 1
\ No newline at end of file
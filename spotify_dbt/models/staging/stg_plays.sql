@@ -1,7 +1,7 @@
 {{
     config(
         materialized='incremental',
-        unique_key=['track_id', 'played_at']
+        unique_key=['user_id', 'track_id', 'played_at']
     )
 }}
 
@@ -12,11 +12,21 @@ with source as (
     {% endif %}
 ),
 
+line_source as (
+    select * from {{ source('raw', 'raw_play_lines') }}
+    {% if is_incremental() %}
+    where loaded_at > (select max(loaded_at) from {{ this }})
+    {% endif %}
+),
+
+-- Files from the legacy single-user layout (raw/year=...) carry no user_id;
+-- their plays are attributed to 'legacy' so the unique key is never null
 flattened as (
     select
         source.source_file,
         source.loaded_at,
         source.raw_json:fetched_at::timestamp_ntz as batch_fetched_at,
+        coalesce(source.raw_json:user_id::string, 'legacy') as user_id,
         track.value:played_at::timestamp_ntz as played_at,
         track.value:track_id::string as track_id,
         track.value:track_name::string as track_name,
@@ -31,13 +41,75 @@ flattened as (
     lateral flatten(input => source.raw_json:tracks) as track
 ),
 
+-- normalized/1 envelopes: plays are [track index, played_at_timestamp(, played_at)]
+-- pairs pointing into a per-file track table
+normalized_plays as (
+    select
+        source.source_file,
+        source.loaded_at,
+        source.raw_json:fetched_at::timestamp_ntz as batch_fetched_at,
+        coalesce(source.raw_json:user_id::string, 'legacy') as user_id,
+        play.value as play,
+        get(source.raw_json:track_table, play.value[0]::int) as track
+    from source,
+    lateral flatten(input => source.raw_json:plays) as play
+    where source.raw_json:encoding::string = 'normalized/1'
+),
+
+normalized as (
+    select
+        source_file,
+        loaded_at,
+        batch_fetched_at,
+        user_id,
+        coalesce(play[2]::timestamp_ntz, to_timestamp_ntz(play[1]::number, 3)) as played_at,
+        track:track_id::string as track_id,
+        track:track_name::string as track_name,
+        track:artist_id::string as artist_id,
+        track:artist_name::string as artist_name,
+        track:album_id::string as album_id,
+        track:album_name::string as album_name,
+        track:release_date::string as release_date,
+        track:duration_ms::number as duration_ms,
+        track:popularity::number as popularity
+    from normalized_plays
+),
+
+-- NDJSON files: already one play per row, no flatten needed
+lines as (
+    select
+        source_file,
+        loaded_at,
+        raw_json:fetched_at::timestamp_ntz as batch_fetched_at,
+        coalesce(raw_json:user_id::string, 'legacy') as user_id,
+        raw_json:played_at::timestamp_ntz as played_at,
+        raw_json:track_id::string as track_id,
+        raw_json:track_name::string as track_name,
+        raw_json:artist_id::string as artist_id,
+        raw_json:artist_name::string as artist_name,
+        raw_json:album_id::string as album_id,
+        raw_json:album_name::string as album_name,
+        raw_json:release_date::string as release_date,
+        raw_json:duration_ms::number as duration_ms,
+        raw_json:popularity::number as popularity
+    from line_source
+),
+
+unioned as (
+    select * from flattened
+    union all
+    select * from normalized
+    union all
+    select * from lines
+),
+
 deduplicated as (
     select *,
         row_number() over (
-            partition by track_id, played_at
+            partition by user_id, track_id, played_at
             order by loaded_at desc
         ) as row_num
-    from flattened
+    from unioned
 )
 
 select * from deduplicated where row_num = 1
\ No newline at end of file
@@ -0,0 +1,86 @@
+with source as (
+    select * from {{ source('raw', 'raw_tracks') }}
+),
+
+line_source as (
+    select * from {{ source('raw', 'raw_track_lines') }}
+),
+
+flattened as (
+    select
+        source.source_file,
+        source.loaded_at,
+        source.raw_json:fetched_at::timestamp_ntz as batch_fetched_at,
+        track.value:track_id::string as track_id,
+        track.value:track_name::string as track_name,
+        track.value:artist_ids::array as artist_ids,
+        track.value:album_id::string as album_id,
+        track.value:album_name::string as album_name,
+        track.value:release_date::string as release_date,
+        track.value:duration_ms::number as duration_ms,
+        track.value:explicit::boolean as explicit,
+        track.value:popularity::number as popularity,
+        track.value:isrc::string as isrc,
+        track.value:tempo::float as tempo,
+        track.value:danceability::float as danceability,
+        track.value:energy::float as energy,
+        track.value:valence::float as valence,
+        track.value:acousticness::float as acousticness,
+        track.value:instrumentalness::float as instrumentalness,
+        track.value:liveness::float as liveness,
+        track.value:speechiness::float as speechiness,
+        track.value:loudness::float as loudness,
+        track.value:key::number as key,
+        track.value:mode::number as mode,
+        track.value:time_signature::number as time_signature
+    from source,
+    lateral flatten(input => source.raw_json:tracks) as track
+),
+
+-- NDJSON files: already one track per row, no flatten needed
+lines as (
+    select
+        source_file,
+        loaded_at,
+        raw_json:batch_fetched_at::timestamp_ntz as batch_fetched_at,
+        raw_json:track_id::string as track_id,
+        raw_json:track_name::string as track_name,
+        raw_json:artist_ids::array as artist_ids,
+        raw_json:album_id::string as album_id,
+        raw_json:album_name::string as album_name,
+        raw_json:release_date::string as release_date,
+        raw_json:duration_ms::number as duration_ms,
+        raw_json:explicit::boolean as explicit,
+        raw_json:popularity::number as popularity,
+        raw_json:isrc::string as isrc,
+        raw_json:tempo::float as tempo,
+        raw_json:danceability::float as danceability,
+        raw_json:energy::float as energy,
+        raw_json:valence::float as valence,
+        raw_json:acousticness::float as acousticness,
+        raw_json:instrumentalness::float as instrumentalness,
+        raw_json:liveness::float as liveness,
+        raw_json:speechiness::float as speechiness,
+        raw_json:loudness::float as loudness,
+        raw_json:key::number as key,
+        raw_json:mode::number as mode,
+        raw_json:time_signature::number as time_signature
+    from line_source
+),
+
+unioned as (
+    select * from flattened
+    union all
+    select * from lines
+),
+
+deduplicated as (
+    select *,
+        row_number() over (
+            partition by track_id
+            order by batch_fetched_at desc
+        ) as row_num
+    from unioned
+)
+
+select * from deduplicated where row_num = 1
\ No newline at end of file